@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目录比较匹配算法扩展性基准测试
+对比原始两两比较与 DirectoryMatcher 在 1k / 10k / 100k 条目下的耗时，并校验结果一致
+
+用法:
+    python benchmarks/bench_compare.py [--sizes 1000 10000 100000] [--legacy-limit 10000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ssh_file_manager import FileManager, DirectoryMatcher
+
+WORDS = ['report', 'photo', 'IMG', 'backup', 'final', 'draft', 'video', 'music', 'notes', 'data',
+         'project', 'summary', 'invoice', 'scan', 'holiday', 'config', 'export', 'archive', '副本', '照片']
+EXTENSIONS = ['.jpg', '.mp4', '.txt', '.docx', '.pdf', '.zip', '.mkv', '']
+
+
+def make_items(count, seed):
+    """生成模拟的目录列表"""
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        is_dir = rng.random() < 0.1
+        name = f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{rng.randint(0, count)}"
+        if not is_dir:
+            name += rng.choice(EXTENSIONS)
+        items.append({
+            'path': f'/data/{name}',
+            'name': name,
+            'size': 0 if is_dir else int(rng.lognormvariate(12, 3)),
+            'is_dir': is_dir,
+            'modified': '2024-01-01 00:00:00'
+        })
+    return items
+
+
+def mutate(items, seed):
+    """基于第一组生成第二组：部分完全相同，部分略作修改"""
+    rng = random.Random(seed)
+    result = []
+    for item in items:
+        item = dict(item)
+        roll = rng.random()
+        if roll < 0.3:
+            base, ext = os.path.splitext(item['name'])
+            item['name'] = base + rng.choice(['_copy', ' (1)', '_v2', '']) + ext
+        elif roll < 0.4 and not item['is_dir']:
+            item['size'] = int(item['size'] * rng.uniform(0.85, 1.15))
+        item['path'] = '/backup/' + item['name']
+        result.append(item)
+    rng.shuffle(result)
+    return result
+
+
+def legacy_match(fm, items1, items2, threshold):
+    """原始实现中的两两比较（不含哈希计算）"""
+    exact, similar = [], []
+    for item1 in items1:
+        for item2 in items2:
+            if item1['name'] == item2['name'] and item1['is_dir'] == item2['is_dir']:
+                exact.append((item1['path'], item2['path']))
+            elif item1['is_dir'] == item2['is_dir']:
+                similarity = fm.calculate_name_similarity(item1['name'], item2['name'])
+                if similarity >= threshold:
+                    if not item1['is_dir']:
+                        if fm.calculate_size_similarity(item1['size'], item2['size']) >= 0.9:
+                            similar.append((item1['path'], item2['path'], similarity))
+                    else:
+                        similar.append((item1['path'], item2['path'], similarity))
+    return exact, similar
+
+
+def indexed_match(fm, items1, items2, threshold):
+    matcher = DirectoryMatcher(fm.calculate_name_similarity, fm.calculate_size_similarity, threshold)
+    exact, similar = matcher.match(items1, items2)
+    return ([(a['path'], b['path']) for a, b, _ in exact],
+            [(a['path'], b['path'], s) for a, b, s in similar])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='目录比较匹配算法基准测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--threshold', type=float, default=0.8)
+    parser.add_argument('--legacy-limit', type=int, default=1000,
+                        help='原始算法只在条目数不超过该值时运行（O(n·m)）')
+    args = parser.parse_args()
+
+    fm = FileManager()
+    for size in args.sizes:
+        items1 = make_items(size, size)
+        items2 = mutate(items1, size + 1)
+
+        start = time.time()
+        new_result = indexed_match(fm, items1, items2, args.threshold)
+        new_time = time.time() - start
+        line = (f"{size:>7} 条: 索引匹配 {new_time:8.2f} s  "
+                f"(完全 {len(new_result[0])}, 相似 {len(new_result[1])})")
+
+        if size <= args.legacy_limit:
+            start = time.time()
+            old_result = legacy_match(fm, items1, items2, args.threshold)
+            old_time = time.time() - start
+            line += f" | 两两比较 {old_time:8.2f} s | 结果{'一致' if old_result == new_result else '不一致!'}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+远程批量删除基准测试
+对比原始串行SFTP删除（逐个remove/rmdir）、连接池多通道并行SFTP删除与服务器端 rm -rf 的耗时
+
+需要连接本机的sshd（或其他SSH服务替身），每种方式删除前都会在本机 --path 下重新生成测试目录树:
+    python benchmarks/bench_delete.py --host 127.0.0.1 --user root --password xxx --path /tmp/delete_bench --files 20000
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ssh_file_manager import Config, FileManager, SFTPWalker
+
+
+def make_trees(root, files, trees=4, files_per_dir=100):
+    """在本机生成 trees 棵测试目录树，共约 files 个文件，返回各目录树的路径"""
+    shutil.rmtree(root, ignore_errors=True)
+    paths = []
+    per_tree = files // trees
+    for t in range(trees):
+        tree = os.path.join(root, f'tree_{t}')
+        paths.append(tree)
+        for i in range(per_tree):
+            directory = os.path.join(tree, f'dir_{i // files_per_dir // 10}', f'sub_{i // files_per_dir}')
+            if i % files_per_dir == 0:
+                os.makedirs(directory, exist_ok=True)
+            open(os.path.join(directory, f'file_{i}.o'), 'w').close()
+    return paths
+
+
+def legacy_delete(fm, paths):
+    """原始 batch_delete：逐个路径串行遍历，再逐个文件 remove、逐个目录 rmdir"""
+    for path in paths:
+        walker = SFTPWalker(fm.sftp)
+        listing = dict(walker.walk(path))
+        for entries in listing.values():
+            for entry in entries:
+                if not entry['is_dir']:
+                    fm.sftp.remove(entry['path'])
+        for directory in sorted(listing, key=lambda p: p.count('/'), reverse=True):
+            fm.sftp.rmdir(directory)
+
+
+def parallel_delete(fm, paths, use_exec):
+    Config.DELETE_USE_EXEC = use_exec
+    ok, message, _, summary = fm.batch_delete(paths)
+    if not ok:
+        raise RuntimeError(message)
+    return summary['method']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='远程批量删除基准测试')
+    parser.add_argument('--host', required=True)
+    parser.add_argument('--port', type=int, default=22)
+    parser.add_argument('--user', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--path', required=True, help='测试目录（本机路径，SSH服务需能访问同一路径）')
+    parser.add_argument('--files', type=int, default=20000, help='测试目录树中的文件总数')
+    parser.add_argument('--trees', type=int, default=4, help='一次批量删除的目录树个数')
+    args = parser.parse_args()
+
+    fm = FileManager()
+    fm.connection_history_file = os.path.join(tempfile.gettempdir(), 'bench_connection_history.json')
+    fm.set_mode('remote')
+    success, message = fm.connect(args.host, args.user, args.password, args.port)
+    if not success:
+        print(message)
+        return 1
+
+    methods = (
+        ('串行SFTP', lambda paths: legacy_delete(fm, paths) or 'sftp'),
+        ('并行SFTP', lambda paths: parallel_delete(fm, paths, False)),
+        ('rm -rf', lambda paths: parallel_delete(fm, paths, True)),
+    )
+    baseline = None
+    for name, delete in methods:
+        paths = make_trees(args.path, args.files, args.trees)
+        start = time.time()
+        method = delete(paths)
+        elapsed = time.time() - start
+        baseline = baseline or elapsed
+        left = sum(1 for path in paths if os.path.lexists(path))
+        note = ' (服务器不允许执行命令，已使用SFTP)' if name == 'rm -rf' and method != 'exec' else ''
+        print(f"{name:>8}: {elapsed:8.2f} s  {args.files / elapsed:10.0f} 文件/s  加速 {baseline / elapsed:5.1f}x"
+              f"{'  残留 ' + str(left) if left else ''}{note}")
+
+    shutil.rmtree(args.path, ignore_errors=True)
+    fm.disconnect()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+.gitignore 匹配微基准测试
+对比原始逐条 fnmatch 的 is_excluded 与编译后的 GitignoreMatcher，输出每秒处理的 规则×路径 数
+
+用法:
+    python benchmarks/bench_gitignore.py [--rules 10 100 500] [--paths 20000]
+"""
+
+import argparse
+import fnmatch
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ssh_file_manager import GitignoreMatcher, IgnoreStack
+
+WORDS = ['src', 'lib', 'build', 'dist', 'test', 'docs', 'node_modules', 'vendor', 'app', 'core',
+         'utils', 'assets', 'cache', 'tmp', 'config', 'scripts', 'packages', 'api', 'models', 'views']
+EXTENSIONS = ['.py', '.js', '.ts', '.log', '.pyc', '.map', '.min.js', '.json', '.md', '.o', '.tmp', '.css']
+
+
+def make_rules(count, rng):
+    """生成常见形式混合的规则：文件名、后缀、锚定目录、** 模式、字符类和取反"""
+    rules = []
+    for i in range(count):
+        kind = i % 6
+        word = rng.choice(WORDS) + str(i)
+        if kind == 0:
+            rules.append(word)
+        elif kind == 1:
+            rules.append(f'*{rng.choice(EXTENSIONS)}{i}')
+        elif kind == 2:
+            rules.append(f'/{word}/')
+        elif kind == 3:
+            rules.append(f'**/{word}/*.log')
+        elif kind == 4:
+            rules.append(f'{word}[0-9]?.txt')
+        else:
+            rules.append(f'!{word}.keep')
+    return rules
+
+
+def make_paths(count, rng):
+    paths = []
+    for _ in range(count):
+        depth = rng.randint(1, 6)
+        parts = [rng.choice(WORDS) for _ in range(depth)]
+        parts[-1] += rng.choice(EXTENSIONS)
+        paths.append(('/'.join(parts), rng.random() < 0.2))
+    return paths
+
+
+def legacy_is_excluded(rules, relative_path, is_dir):
+    """原始 TreeGenerator.is_excluded 的匹配逻辑（已知是否目录，不访问文件系统）"""
+    for rule in rules:
+        if rule.startswith('!'):
+            continue
+        if fnmatch.fnmatch(relative_path, rule) or fnmatch.fnmatch(os.path.basename(relative_path), rule):
+            return True
+        if rule.endswith('/') and is_dir:
+            rule = rule.rstrip('/')
+            if fnmatch.fnmatch(relative_path, rule) or fnmatch.fnmatch(os.path.basename(relative_path), rule):
+                return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='.gitignore 匹配微基准测试')
+    parser.add_argument('--rules', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--paths', type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    paths = make_paths(args.paths, rng)
+    for count in args.rules:
+        rules = make_rules(count, rng)
+
+        start = time.time()
+        for path, is_dir in paths:
+            legacy_is_excluded(rules, path, is_dir)
+        legacy_time = time.time() - start
+
+        start = time.time()
+        stack = IgnoreStack().push('', GitignoreMatcher(rules))
+        compile_time = time.time() - start
+        start = time.time()
+        for path, is_dir in paths:
+            stack.is_ignored(path, is_dir)
+        compiled_time = time.time() - start
+
+        work = count * len(paths)
+        print(f"{count:>5} 条规则: 原始 {work / legacy_time / 1e6:8.2f} M规则·路径/s | "
+              f"编译后 {work / compiled_time / 1e6:8.2f} M规则·路径/s (编译 {compile_time * 1000:.1f} ms) | "
+              f"加速 {legacy_time / compiled_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+远程哈希性能基准测试
+对比原始4KB同步读取与 prefetch / parallel / server 三种哈希模式
+
+用法:
+    python benchmarks/bench_hashing.py --host 127.0.0.1 --user root --password xxx --path /data/media
+"""
+
+import argparse
+import hashlib
+import os
+import stat
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ssh_file_manager import FileManager, Config
+
+
+def legacy_hash(sftp, path):
+    """原始实现：每次同步读取4KB"""
+    hash_md5 = hashlib.md5()
+    with sftp.open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(4096), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+def available_modes(fm):
+    """可用的哈希模式"""
+    return [mode for mode in fm.hasher.MODES if mode != 'server' or fm.can_exec()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='远程哈希模式基准测试')
+    parser.add_argument('--host', required=True)
+    parser.add_argument('--port', type=int, default=22)
+    parser.add_argument('--user', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--path', required=True, help='包含待哈希文件的远程目录')
+    parser.add_argument('--skip-legacy', action='store_true', help='跳过原始实现（大文件时很慢）')
+    args = parser.parse_args()
+
+    fm = FileManager()
+    fm.connection_history_file = os.path.join(tempfile.gettempdir(), 'bench_connection_history.json')
+    fm.hasher.cache = None  # 关闭哈希缓存，测量真实读取开销
+    fm.set_mode('remote')
+    success, message = fm.connect(args.host, args.user, args.password, args.port)
+    if not success:
+        print(message)
+        return 1
+
+    files = [
+        args.path.rstrip('/') + '/' + attr.filename
+        for attr in fm.sftp.listdir_attr(args.path)
+        if stat.S_ISREG(attr.st_mode)
+    ]
+    total_bytes = sum(fm.sftp.stat(path).st_size for path in files)
+    print(f"文件数: {len(files)}, 总大小: {total_bytes / 1024 / 1024:.1f} MB, "
+          f"并行线程: {Config.HASH_WORKERS}, 服务器端执行: {'可用' if fm.can_exec() else '不可用'}")
+
+    results = {}
+    if not args.skip_legacy:
+        start = time.time()
+        results['legacy'] = {path: legacy_hash(fm.sftp, path) for path in files}
+        print(f"{'legacy':>10}: {time.time() - start:8.2f} s")
+
+    for mode in available_modes(fm):
+        start = time.time()
+        results[mode] = fm.hasher.hash_files(files, mode)
+        elapsed = time.time() - start
+        speed = total_bytes / elapsed / 1024 / 1024 if elapsed else 0
+        print(f"{mode:>10}: {elapsed:8.2f} s  ({speed:.1f} MB/s)")
+
+    reference = next(iter(results.values()))
+    for mode, hashes in results.items():
+        if hashes != reference:
+            print(f"警告: {mode} 模式的结果与其他模式不一致")
+
+    fm.disconnect()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目录列表表示方式基准测试
+对比原始的每项字典（立即格式化修改时间）与 ListingEntry（__slots__，时间字符串按需生成）
+在构建列表、按名称/大小比较、序列化一页结果以及首次浏览时的耗时（timeit）与内存占用（tracemalloc）
+
+用法:
+    python benchmarks/bench_listing.py [--entries 300000] [--path /var/log/big]
+"""
+
+import argparse
+import json
+import os
+import random
+import stat
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ssh_file_manager import ListingEntry, BrowseCursors
+
+
+def make_raw(count, seed=0):
+    """生成模拟的 listdir_attr 结果：(名称, 大小, 模式, 修改时间)"""
+    rng = random.Random(seed)
+    raw = []
+    for i in range(count):
+        is_dir = rng.random() < 0.05
+        mode = stat.S_IFDIR | 0o755 if is_dir else stat.S_IFREG | 0o644
+        raw.append((f'app-{i:07d}.log', 0 if is_dir else rng.randint(0, 1 << 30), mode,
+                    1700000000 + rng.randint(0, 10 ** 7)))
+    return raw
+
+
+def read_raw(path):
+    """读取真实目录的原始字段"""
+    raw = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            raw.append((entry.name, st.st_size, st.st_mode, st.st_mtime))
+    return raw
+
+
+def build_dicts(directory, raw):
+    """原始 list_directory 的表示方式"""
+    return [
+        {
+            'path': os.path.join(directory, name),
+            'name': name,
+            'size': size,
+            'is_dir': stat.S_ISDIR(mode),
+            'mtime': mtime,
+            'modified': datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S')
+        }
+        for name, size, mode, mtime in raw
+    ]
+
+
+def build_entries(directory, raw):
+    return [ListingEntry(directory, name, size, mode, mtime) for name, size, mode, mtime in raw]
+
+
+def measure_memory(builder, directory, raw):
+    """构建列表后仍被占用的内存"""
+    tracemalloc.start()
+    items = builder(directory, raw)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return current
+
+
+def measure_time(directory, raw, repeat):
+    """各项操作的耗时；构建的列表在返回后释放，不影响之后的内存测量"""
+    legacy = build_dicts(directory, raw)
+    compact = build_entries(directory, raw)
+
+    def compare(items):
+        # compare_directories / batch_rename 的典型访问：名称、类型和大小
+        return sum(1 for item in items if not item['is_dir'] and item['size'] > 1024 and item['name'])
+
+    def compare_attributes(items):
+        return sum(1 for item in items if not item.is_dir and item.size > 1024 and item.name)
+
+    def serialize(items):
+        # /browse 只序列化一页，ListingEntry 此时才格式化时间，并按 FIELDS 输出元组
+        page = items[:200]
+        if page and isinstance(page[0], ListingEntry):
+            return json.dumps({'columns': ListingEntry.FIELDS, 'rows': ListingEntry.rows(page)}, ensure_ascii=False)
+        return json.dumps(page, ensure_ascii=False)
+
+    rows = [
+        ('构建列表', lambda: build_dicts(directory, raw), lambda: build_entries(directory, raw)),
+        ('名称/大小访问', lambda: compare(legacy), lambda: compare_attributes(compact)),
+        ('排序', lambda: sorted(legacy, key=lambda item: (not item['is_dir'], item['name'].lower())),
+         lambda: BrowseCursors.prepare(compact, 'name', 'asc')),
+        ('序列化一页', lambda: serialize(legacy), lambda: serialize(compact)),
+        # 目录未缓存时一次 /browse 请求的总耗时：构建列表、排序并序列化第一页
+        ('首次浏览', lambda: serialize(sorted(build_dicts(directory, raw),
+                                             key=lambda item: (not item['is_dir'], item['name'].lower()))),
+         lambda: serialize(BrowseCursors.prepare(build_entries(directory, raw), 'name', 'asc'))),
+    ]
+    for name, old, new in rows:
+        old_time = min(timeit.repeat(old, number=1, repeat=repeat))
+        new_time = min(timeit.repeat(new, number=1, repeat=repeat))
+        print(f"{name:>8}: 字典 {old_time * 1000:9.1f} ms | ListingEntry {new_time * 1000:9.1f} ms | "
+              f"加速 {old_time / max(new_time, 1e-9):.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='目录列表表示方式基准测试')
+    parser.add_argument('--entries', type=int, default=300000, help='模拟的目录项数')
+    parser.add_argument('--path', help='改用真实目录的内容')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    directory = args.path or '/var/log/app'
+    raw = read_raw(args.path) if args.path else make_raw(args.entries)
+    print(f"目录项数: {len(raw)}")
+
+    measure_time(directory, raw, args.repeat)
+    old_memory = measure_memory(build_dicts, directory, raw)
+    new_memory = measure_memory(build_entries, directory, raw)
+    print(f"{'内存':>8}: 字典 {old_memory / len(raw):9.1f} B/项 | ListingEntry {new_memory / len(raw):9.1f} B/项 | "
+          f"节省 {(1 - new_memory / old_memory) * 100:.0f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地目录遍历基准测试
+对比原始 os.listdir + os.path.isfile/isdir/os.stat 实现与基于 os.scandir 的实现
+（目录树、空目录扫描、目录列表），统计耗时与stat类调用次数
+
+用法:
+    python benchmarks/bench_local_walk.py --root /tmp/walk_bench --make-tree 1000000
+"""
+
+import argparse
+import os
+import stat
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ssh_file_manager import TreeGenerator, EmptyDirCleaner, FileManager, LocalWalker
+
+
+def make_tree(root, files, files_per_dir=100, fanout=10):
+    """生成约 files 个文件的测试目录树，每个目录 files_per_dir 个文件、fanout 个子目录"""
+    created = 0
+    queue = [root]
+    while queue and created < files:
+        directory = queue.pop(0)
+        os.makedirs(directory, exist_ok=True)
+        for i in range(min(files_per_dir, files - created)):
+            open(os.path.join(directory, f'file_{i}.dat'), 'w').close()
+            created += 1
+        queue.extend(os.path.join(directory, f'dir_{i}') for i in range(fanout))
+    return created
+
+
+def legacy_tree(directory, output, level=0, prefix=''):
+    """原始 TreeGenerator._build_tree 的文件系统访问方式（不含.gitignore）"""
+    items = []
+    for item in os.listdir(directory):
+        item_path = os.path.join(directory, item)
+        items.append((item, item_path))
+    items.sort(key=lambda x: (os.path.isfile(x[1]), x[0].lower()))
+    for i, (item, item_path) in enumerate(items):
+        is_last = i == len(items) - 1
+        output.append(prefix + ('└── ' if is_last else '├── ') + item)
+        if os.path.isdir(item_path):
+            legacy_tree(item_path, output, level + 1, prefix + ('    ' if is_last else '│   '))
+
+
+def legacy_empty_scan(directory):
+    """原始 EmptyDirCleaner._clean_recursive 的遍历部分（不删除）"""
+    subdirs = []
+    for item in os.listdir(directory):
+        item_path = os.path.join(directory, item)
+        if os.path.isdir(item_path):
+            subdirs.append(item_path)
+    for subdir in subdirs:
+        legacy_empty_scan(subdir)
+    return not os.listdir(directory)
+
+
+def legacy_list(path):
+    """原始 list_directory 的本地分支"""
+    items = []
+    for item in os.listdir(path):
+        item_path = os.path.join(path, item)
+        stat_info = os.stat(item_path)
+        items.append({
+            'path': item_path,
+            'name': item,
+            'size': stat_info.st_size,
+            'is_dir': os.path.isdir(item_path),
+            'mtime': stat_info.st_mtime,
+            'modified': datetime.fromtimestamp(stat_info.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+        })
+    return items
+
+
+def scan_empty_dirs(root):
+    """新实现的空目录扫描，禁止实际删除"""
+    original = os.rmdir
+
+    def refuse(path):
+        raise OSError('基准测试中不删除目录')
+
+    os.rmdir = refuse
+    try:
+        EmptyDirCleaner()._clean_tree(root)
+    finally:
+        os.rmdir = original
+
+
+def all_directories(root):
+    return [directory for directory, _ in LocalWalker().walk(root)]
+
+
+class StatCounter:
+    """统计 os.stat/os.lstat 以及 DirEntry.stat 的调用次数（计数时会拖慢速度，与计时分开运行）"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __enter__(self):
+        self.originals = (os.stat, os.lstat, os.scandir)
+        counter = self
+
+        def counted(func):
+            def wrapper(*args, **kwargs):
+                counter.count += 1
+                return func(*args, **kwargs)
+            return wrapper
+
+        class Entry:
+            def __init__(self, entry):
+                self._entry = entry
+                self._stat_cached = {}
+
+            def __getattr__(self, name):
+                return getattr(self._entry, name)
+
+            def stat(self, follow_symlinks=True):
+                if follow_symlinks not in self._stat_cached:
+                    counter.count += 1
+                    self._stat_cached[follow_symlinks] = self._entry.stat(follow_symlinks=follow_symlinks)
+                return self._stat_cached[follow_symlinks]
+
+            def is_dir(self, follow_symlinks=True):
+                # 只有符号链接（或文件系统不提供类型）时才需要stat
+                if self._entry.is_symlink() and follow_symlinks:
+                    return stat.S_ISDIR(self.stat().st_mode)
+                return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+            def is_file(self, follow_symlinks=True):
+                if self._entry.is_symlink() and follow_symlinks:
+                    return stat.S_ISREG(self.stat().st_mode)
+                return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+        class Scandir:
+            def __init__(self, path):
+                self._it = counter.originals[2](path)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                self._it.close()
+
+            def __iter__(self):
+                return (Entry(entry) for entry in self._it)
+
+        os.stat = counted(os.stat)
+        os.lstat = counted(os.lstat)
+        os.scandir = Scandir
+        return self
+
+    def __exit__(self, *exc):
+        os.stat, os.lstat, os.scandir = self.originals
+
+
+def measure(name, legacy, new):
+    results = []
+    for func in (legacy, new):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        with StatCounter() as counter:
+            func()
+        results.append((elapsed, counter.count))
+    (old_time, old_stats), (new_time, new_stats) = results
+    print(f"{name:>10}: 原始 {old_time:8.2f} s / {old_stats:>9} 次stat | "
+          f"scandir {new_time:8.2f} s / {new_stats:>9} 次stat | 加速 {old_time / max(new_time, 1e-9):.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地目录遍历基准测试')
+    parser.add_argument('--root', required=True, help='测试目录')
+    parser.add_argument('--make-tree', type=int, metavar='FILES', help='先生成约 FILES 个文件的测试目录树')
+    args = parser.parse_args()
+
+    if args.make_tree:
+        print(f"已生成 {make_tree(args.root, args.make_tree)} 个文件")
+
+    sys.setrecursionlimit(100000)
+    fm = FileManager()
+    directories = all_directories(args.root)
+    print(f"目录数: {len(directories)}")
+
+    measure('目录树', lambda: legacy_tree(args.root, []),
+            lambda: TreeGenerator().generate_tree(args.root, apply_gitignore=False))
+    measure('空目录扫描', lambda: legacy_empty_scan(args.root),
+            lambda: scan_empty_dirs(args.root))
+    measure('目录列表', lambda: [legacy_list(d) for d in directories],
+            lambda: [fm.list_directory(d) for d in directories])
+
+
+if __name__ == '__main__':
+    main()
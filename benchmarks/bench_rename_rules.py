@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重命名规则基准测试
+对比原始逐个文件 if/elif 分派的 _apply_rename_rule 与 RenamePipeline（每条规则的输出都做文件名检查），
+统计每秒处理的文件名数，并校验两者结果一致。两者都在每秒几十万个名称的量级，远快于实际的改名请求
+
+用法:
+    python benchmarks/bench_rename_rules.py [--names 100000]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ssh_file_manager import RenamePipeline
+
+WORDS = ['report', 'Photo', 'data', 'IMG', 'final', '会议纪要', 'backup', 'draft', 'v2', 'copy']
+EXTENSIONS = ['.txt', '.jpg', '.log', '.tar.gz', '.md', '']
+
+RULES = [
+    {'type': 'remove_number_prefix'},
+    {'type': 'add_sequence_suffix'},
+    {'type': 'remove_special_chars'},
+    {'type': 'to_lowercase'},
+    {'type': 'space_to_underscore'},
+    {'type': 'date_prefix'},
+    {'type': 'capitalize_words'},
+    {'type': 'regex', 'pattern': r'(\d+)', 'replacement': r'n\1'},
+]
+
+
+def make_names(count, seed=0):
+    rng = random.Random(seed)
+    names = []
+    for i in range(count):
+        words = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+        prefix = f'{rng.randint(0, 999):02d} - ' if rng.random() < 0.5 else ''
+        names.append(f'{prefix}{words} ({i}){rng.choice(EXTENSIONS)}')
+    return names
+
+
+def legacy_apply(filename, rename_type, pattern=None, replacement=None, custom_text=None, sequence_num=1):
+    """原始 FileManager._apply_rename_rule（只保留基准测试用到的规则）"""
+    name, ext = os.path.splitext(filename)
+    try:
+        if rename_type == 'remove_number_prefix':
+            return re.sub(r'^\d+\s*[-_]?\s*', '', name) + ext
+        elif rename_type == 'add_sequence_suffix':
+            return f"{name}_{sequence_num:03d}{ext}"
+        elif rename_type == 'remove_special_chars':
+            return re.sub(r'[^\w\u4e00-\u9fff.-]', '', name) + ext
+        elif rename_type == 'to_lowercase':
+            return filename.lower()
+        elif rename_type == 'space_to_underscore':
+            return filename.replace(' ', '_')
+        elif rename_type == 'regex':
+            if pattern:
+                return re.sub(pattern, replacement if replacement is not None else '', filename)
+            return filename
+        elif rename_type == 'date_prefix':
+            from datetime import datetime
+            return f"{datetime.now().strftime('%Y%m%d')}_{filename}"
+        elif rename_type == 'capitalize_words':
+            return ' '.join(word.capitalize() for word in name.split()) + ext
+        return filename
+    except Exception:
+        return filename
+
+
+def legacy_chain(names, rules):
+    """原始实现一次只能应用一条规则，串联时需要对每个文件逐条调用"""
+    results = []
+    for sequence, filename in enumerate(names, 1):
+        for rule in rules:
+            filename = legacy_apply(filename, rule['type'], rule.get('pattern'), rule.get('replacement'),
+                                    rule.get('custom_text'), sequence)
+        results.append(filename)
+    return results
+
+
+def pipeline_chain(names, rules):
+    pipeline = RenamePipeline(rules)
+    apply = pipeline.apply
+    return [apply(filename, sequence) for sequence, filename in enumerate(names, 1)]
+
+
+def measure(func, names, rules):
+    start = time.perf_counter()
+    results = func(names, rules)
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='重命名规则基准测试')
+    parser.add_argument('--names', type=int, default=100000)
+    args = parser.parse_args()
+
+    names = make_names(args.names)
+    cases = [(rule['type'], [rule]) for rule in RULES]
+    cases.append(('串联: 去前缀→小写→序号', [{'type': 'remove_number_prefix'}, {'type': 'to_lowercase'},
+                                        {'type': 'add_sequence_suffix'}]))
+    for label, rules in cases:
+        legacy_time, legacy = measure(legacy_chain, names, rules)
+        pipeline_time, pipelined = measure(pipeline_chain, names, rules)
+        same = '一致' if legacy == pipelined else '不一致!'
+        print(f"{label:>24}: 原始 {len(names) / legacy_time / 1e3:8.0f} K名/s | "
+              f"RenamePipeline {len(names) / pipeline_time / 1e3:8.0f} K名/s | 结果{same}")
+
+
+if __name__ == '__main__':
+    main()
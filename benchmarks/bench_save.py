@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+远程文件保存基准测试
+对比原始 write_file_content（把原文件读回本机再写成 .backup，然后原地截断覆盖）、
+AtomicFileWriter 整体保存（服务器端备份 + 流式写入临时文件后改名）与只提交一个修改块的补丁保存的耗时
+
+需要连接本机的sshd（或其他SSH服务替身），测试文件生成在本机 --path 下:
+    python benchmarks/bench_save.py --host 127.0.0.1 --user root --password xxx --path /tmp/save_bench --size 50
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ssh_file_manager import FileManager
+
+
+def legacy_save(fm, file_path, content):
+    """原始 write_file_content 的远程分支"""
+    backup_path = file_path + '.backup'
+    with fm.sftp.open(file_path, 'r') as src:
+        with fm.sftp.open(backup_path, 'w') as dst:
+            dst.write(src.read())
+    with fm.sftp.open(file_path, 'w') as f:
+        f.write(content.encode('utf-8'))
+    return {'backup': 'sftp'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='远程文件保存基准测试')
+    parser.add_argument('--host', required=True)
+    parser.add_argument('--port', type=int, default=22)
+    parser.add_argument('--user', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--path', required=True, help='测试目录（本机路径，SSH服务需能访问同一路径）')
+    parser.add_argument('--size', type=int, default=50, help='测试文件大小（MB）')
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    fm = FileManager()
+    fm.connection_history_file = os.path.join(tempfile.gettempdir(), 'bench_connection_history.json')
+    fm.set_mode('remote')
+    success, message = fm.connect(args.host, args.user, args.password, args.port)
+    if not success:
+        print(message)
+        return 1
+
+    os.makedirs(args.path, exist_ok=True)
+    file_path = os.path.join(args.path, 'config.txt')
+    line = '# 配置项 key = value\n'
+    content = line * (args.size * 1024 * 1024 // len(line.encode('utf-8')))
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+    methods = (
+        ('原始保存', lambda: legacy_save(fm, file_path, content)),
+        ('原子保存', lambda: fm.writer.write(file_path, fm.writer.encode_chunks(content))),
+        # 把文件开头的 # 替换为 #，内容不变但走完整的补丁保存流程
+        ('补丁保存', lambda: fm.writer.patch(file_path, [(0, 1, b'#', b'#')])),
+    )
+    baseline = None
+    for name, save in methods:
+        elapsed = 0
+        for _ in range(args.rounds):
+            start = time.time()
+            backup = save()['backup']
+            elapsed += time.time() - start
+        elapsed /= args.rounds
+        baseline = baseline or elapsed
+        with open(file_path, encoding='utf-8') as f:
+            same = f.read() == content
+        print(f"{name:>6}: {elapsed:8.2f} s  {args.size / elapsed:8.1f} MB/s  加速 {baseline / elapsed:5.1f}x"
+              f"  备份方式 {backup}{'' if same else '  内容不一致!'}")
+
+    shutil.rmtree(args.path, ignore_errors=True)
+    fm.disconnect()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
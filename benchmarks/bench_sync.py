@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目录同步基准测试
+目标目录为源目录的副本（相当于已经完整同步过一次），随机修改源目录中约 --churn 比例的字节（覆盖、插入和删除）后，
+分别用整体传输修改过的文件（服务器不能运行辅助程序时的方式）和差异传输同步，比较传输的字节数和耗时
+
+需要连接本机的sshd（或其他SSH服务替身），服务器需要 python3，测试文件生成在本机 --path 下:
+    python benchmarks/bench_sync.py --host 127.0.0.1 --user root --password xxx --path /tmp/sync_bench --size 500
+"""
+
+import argparse
+import filecmp
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ssh_file_manager import Config, DirectorySync, FileManager
+
+
+def make_tree(root, size, files):
+    """生成总大小约 size MB、共 files 个文件的目录树"""
+    shutil.rmtree(root, ignore_errors=True)
+    per_file = size * 1024 * 1024 // files
+    paths = []
+    for i in range(files):
+        directory = os.path.join(root, f'dir_{i % 8}')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'data_{i}.bin')
+        with open(path, 'wb') as f:
+            f.write(os.urandom(per_file))
+        paths.append(path)
+    return paths
+
+
+def churn(paths, ratio, rng):
+    """在随机位置修改总量约 ratio 的字节，返回修改的字节数；修改的文件设置新的修改时间"""
+    total = sum(os.path.getsize(path) for path in paths)
+    budget = int(total * ratio)
+    changed = 0
+    touched = set()
+    while changed < budget:
+        path = rng.choice(paths)
+        with open(path, 'rb') as f:
+            data = bytearray(f.read())
+        length = min(rng.randint(1024, 64 * 1024), budget - changed) or 1
+        position = rng.randrange(len(data))
+        kind = rng.random()
+        if kind < 0.6:
+            data[position:position + length] = os.urandom(length)
+        elif kind < 0.8:
+            data[position:position] = os.urandom(length)
+        else:
+            del data[position:position + length]
+        with open(path, 'wb') as f:
+            f.write(data)
+        changed += length
+        touched.add(path)
+    mtime = time.time() + 60
+    for path in touched:
+        os.utime(path, (mtime, mtime))
+    return changed, len(touched)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='目录同步基准测试')
+    parser.add_argument('--host', required=True)
+    parser.add_argument('--port', type=int, default=22)
+    parser.add_argument('--user', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--path', required=True, help='测试目录（本机路径，SSH服务需能访问同一路径）')
+    parser.add_argument('--size', type=int, default=500, help='目录树总大小（MB）')
+    parser.add_argument('--files', type=int, default=200, help='目录树中的文件数')
+    parser.add_argument('--churn', type=float, default=0.01, help='修改的字节比例')
+    args = parser.parse_args()
+
+    fm = FileManager()
+    fm.connection_history_file = os.path.join(tempfile.gettempdir(), 'bench_connection_history.json')
+    fm.set_mode('remote')
+    success, message = fm.connect(args.host, args.user, args.password, args.port)
+    if not success:
+        print(message)
+        return 1
+
+    source = os.path.join(args.path, 'source')
+    paths = make_tree(source, args.size, args.files)
+    targets = {}
+    for label in ('whole', 'delta'):
+        # 目标目录是本机上的副本（保留修改时间），相当于已经完整同步过一次
+        targets[label] = os.path.join(args.path, 'target_' + label)
+        shutil.rmtree(targets[label], ignore_errors=True)
+        shutil.copytree(source, targets[label])
+    changed, touched = churn(paths, args.churn, random.Random(0))
+    total = sum(os.path.getsize(path) for path in paths)
+    print(f"目录树 {total / 1024 / 1024:.0f} MB，{args.files} 个文件；修改 {changed / 1024 / 1024:.1f} MB"
+          f"（{changed / total:.2%}），涉及 {touched} 个文件")
+
+    default_min_size = Config.SYNC_DELTA_MIN_SIZE
+    for label, name in (('whole', '整体传输'), ('delta', '差异传输')):
+        # 整体传输：所有文件都低于差异传输的大小下限
+        Config.SYNC_DELTA_MIN_SIZE = float('inf') if label == 'whole' else default_min_size
+        start = time.time()
+        _, summary = DirectorySync(fm, 'upload').run(source, targets[label])
+        elapsed = time.time() - start
+        same = all(filecmp.cmp(path, os.path.join(targets[label], os.path.relpath(path, source)), shallow=False)
+                   for path in paths)
+        moved = summary['transferred_bytes']
+        print(f"{name}: {elapsed:7.2f} s  传输 {moved / 1024 / 1024:8.2f} MB（目录树的 {moved / total:6.2%}）"
+              f"{'' if same and not summary['failed'] else '  结果不一致!'}")
+    Config.SYNC_DELTA_MIN_SIZE = default_min_size
+
+    shutil.rmtree(args.path, ignore_errors=True)
+    fm.disconnect()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
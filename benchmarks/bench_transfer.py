@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件传输基准测试
+对比 paramiko 的 sftp.put / sftp.get（单个通道逐个文件传输）与 FileTransfer 分块并行传输（含MD5校验）
+上传、下载一个大文件和一个小文件目录的耗时
+
+需要连接本机的sshd（或其他SSH服务替身），测试文件生成在本机 --path 下:
+    python benchmarks/bench_transfer.py --host 127.0.0.1 --user root --password xxx --path /tmp/transfer_bench --size 200
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ssh_file_manager import Config, FileManager, FileTransfer
+
+
+def make_source(root, size, files):
+    """生成一个 size MB 的大文件和一个包含 files 个 16KB 小文件的目录"""
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(os.path.join(root, 'many'))
+    with open(os.path.join(root, 'big.bin'), 'wb') as f:
+        for _ in range(size):
+            f.write(os.urandom(1024 * 1024))
+    for i in range(files):
+        with open(os.path.join(root, 'many', f'file_{i}.dat'), 'wb') as f:
+            f.write(os.urandom(16 * 1024))
+
+
+def legacy_copy(fm, upload, source, target, is_dir):
+    """逐个文件调用 sftp.put / sftp.get"""
+    copy = fm.sftp.put if upload else fm.sftp.get
+    if not is_dir:
+        copy(source, target)
+        return
+    if upload:
+        fm.sftp.mkdir(target)
+        names = os.listdir(source)
+    else:
+        os.makedirs(target)
+        names = fm.sftp.listdir(source)
+    for name in names:
+        copy(source + '/' + name, target + '/' + name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文件传输基准测试')
+    parser.add_argument('--host', required=True)
+    parser.add_argument('--port', type=int, default=22)
+    parser.add_argument('--user', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--path', required=True, help='测试目录（本机路径，SSH服务需能访问同一路径）')
+    parser.add_argument('--size', type=int, default=200, help='大文件大小（MB）')
+    parser.add_argument('--files', type=int, default=500, help='小文件目录中的文件数')
+    args = parser.parse_args()
+
+    fm = FileManager()
+    fm.connection_history_file = os.path.join(tempfile.gettempdir(), 'bench_connection_history.json')
+    fm.set_mode('remote')
+    success, message = fm.connect(args.host, args.user, args.password, args.port)
+    if not success:
+        print(message)
+        return 1
+
+    source = os.path.join(args.path, 'source')
+    make_source(source, args.size, args.files)
+    checkpoints = os.path.join(args.path, 'checkpoints')
+    cases = (('大文件', 'big.bin', args.size), (f'{args.files} 个小文件', 'many', args.files * 16 / 1024))
+    for label, name, megabytes in cases:
+        for direction in ('upload', 'download'):
+            upload = direction == 'upload'
+            # 上传从本地源传到 remote_*，下载再从上传的结果传回 local_*
+            results = []
+            for method in ('legacy', 'parallel'):
+                src = os.path.join(source, name) if upload else os.path.join(args.path, 'remote_parallel', name)
+                dst_root = os.path.join(args.path, ('remote_' if upload else 'local_') + method)
+                os.makedirs(dst_root, exist_ok=True)
+                dst = os.path.join(dst_root, name)
+                start = time.time()
+                if method == 'legacy':
+                    legacy_copy(fm, upload, src, dst, name == 'many')
+                else:
+                    summary = FileTransfer(fm, direction, checkpoint_dir=checkpoints).run(src, dst)
+                    if summary['failed']:
+                        print(summary['failed'])
+                results.append(time.time() - start)
+            legacy, parallel = results
+            print(f"{label:>12} {'上传' if upload else '下载'}: sftp.{'put' if upload else 'get'} {legacy:7.2f} s | "
+                  f"分块并行 {parallel:7.2f} s ({megabytes / parallel:7.1f} MB/s, {Config.TRANSFER_WORKERS} 通道) | "
+                  f"加速 {legacy / parallel:4.1f}x")
+
+    shutil.rmtree(args.path, ignore_errors=True)
+    fm.disconnect()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+远程目录遍历基准测试
+对比串行SFTP listdir_attr、并发SFTP与服务器端单次 find -printf 遍历的耗时，并校验结果一致
+
+可以配合本机的sshd（或其他SSH服务替身）使用，--make-tree 会先在本机生成测试目录树:
+    python benchmarks/bench_walk.py --host 127.0.0.1 --user root --password xxx --path /tmp/walk --make-tree 4 6
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ssh_file_manager import FileManager, SFTPWalker, ConcurrentSFTPWalker, FindWalker
+
+
+def make_tree(root, depth, fanout, files_per_dir=3):
+    """在本机生成 fanout^depth 规模的测试目录树，返回目录数"""
+    count = 0
+    stack = [(root, 0)]
+    while stack:
+        directory, level = stack.pop()
+        os.makedirs(directory, exist_ok=True)
+        count += 1
+        for i in range(files_per_dir):
+            with open(os.path.join(directory, f'file_{i}.txt'), 'w') as f:
+                f.write('x' * i)
+        if level < depth:
+            stack.extend((os.path.join(directory, f'dir_{i}'), level + 1) for i in range(fanout))
+    return count
+
+
+def normalize(listing):
+    return {
+        directory: sorted((e['name'], e['is_dir'], e['size'], e['mtime']) for e in entries)
+        for directory, entries in listing.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='远程目录遍历基准测试')
+    parser.add_argument('--host', required=True)
+    parser.add_argument('--port', type=int, default=22)
+    parser.add_argument('--user', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--path', required=True, help='要遍历的远程目录')
+    parser.add_argument('--max-depth', type=int, default=None)
+    parser.add_argument('--make-tree', type=int, nargs=2, metavar=('DEPTH', 'FANOUT'),
+                        help='先在本机 --path 下生成测试目录树（仅适用于连接本机的SSH服务）')
+    args = parser.parse_args()
+
+    if args.make_tree:
+        print(f"已生成 {make_tree(args.path, *args.make_tree)} 个目录")
+
+    fm = FileManager()
+    fm.connection_history_file = os.path.join(tempfile.gettempdir(), 'bench_connection_history.json')
+    fm.set_mode('remote')
+    success, message = fm.connect(args.host, args.user, args.password, args.port)
+    if not success:
+        print(message)
+        return 1
+
+    results = {}
+    walkers = (
+        ('sftp', SFTPWalker(fm.sftp)),
+        ('concurrent', ConcurrentSFTPWalker(fm)),
+        ('find', FindWalker(fm.ssh, SFTPWalker(fm.sftp))),
+    )
+    for name, walker in walkers:
+        start = time.time()
+        listing = dict(walker.walk(args.path, args.max_depth))
+        elapsed = time.time() - start
+        entries = sum(len(items) for items in listing.values())
+        note = ' (find不可用，已回退到SFTP)' if getattr(walker, 'used_fallback', False) else ''
+        print(f"{name:>10}: {elapsed:8.2f} s  目录 {len(listing)}, 条目 {entries}{note}")
+        results[name] = normalize(listing)
+
+    consistent = all(listing == results['sftp'] for listing in results.values())
+    print(f"结果{'一致' if consistent else '不一致!'}")
+    fm.disconnect()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
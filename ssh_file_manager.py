@@ -2,19 +2,36 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import hashlib
+import codecs
+import mmap
 import subprocess
 import shutil
 import time
 import re
 import fnmatch
 import json
+import math
+import shlex
+import posixpath
+import sqlite3
+import threading
+import queue
+import uuid
+import heapq
+import inspect
+from collections import OrderedDict, Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager, ExitStack
 from pathlib import Path
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for
+from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, Response, stream_with_context, session
+from werkzeug.local import LocalProxy
 import paramiko
 from datetime import datetime
 import stat
 import difflib
+import sync_helper
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this'
@@ -32,314 +49,4855 @@ class Config:
     CHUNK_SIZE = 4096
     SSH_KEEPALIVE_INTERVAL = 30  # 保持连接活跃间隔
     SSH_MAX_RETRY = 3  # 最大重试次数
+    SSH_LIVENESS_TTL = 10  # 连接存活检测结果缓存时间（秒）
+    SSH_LIVENESS_TIMEOUT = 5  # 主动探测等待服务器响应的最长时间（秒）
+    SSH_POOL_MAX_HOSTS = 8  # 连接池最多保留的主机数
+    SFTP_POOL_SIZE = 4  # 每个主机最多的SFTP通道数
+    SSH_POOL_IDLE_TIMEOUT = 300  # 空闲通道/主机回收时间（秒）
+    SFTP_POOL_WAIT_TIMEOUT = 30  # 通道全部占用时的最长等待时间（秒）
+    CLIENT_IDLE_TIMEOUT = 1800  # 客户端（浏览器页面）超过此时间没有请求时断开其连接并回收（秒）
+    CLIENT_MAX = 32  # 最多同时保留的客户端数（超出时按最近最少使用回收空闲的客户端）
+    HASH_MODE = 'auto'  # 哈希模式：auto / prefetch / parallel / server
+    HASH_CHUNK_SIZE = 1024 * 1024  # 计算哈希时每次读取的块大小
+    HASH_WORKERS = 4  # 并行计算哈希的线程数
+    SFTP_PREFETCH_REQUESTS = 64  # SFTP预读时同时发出的最大请求数
+    REMOTE_HASH_BATCH = 200  # 服务器端md5sum每批处理的文件数
+    REMOTE_COMMAND_MAX_BYTES = 96 * 1024  # 单条远程命令中路径参数的最大总字节数（Linux 单个参数最长 128KB，整条命令作为 sh -c 的一个参数）
+    NAME_DIGIT_PENALTY = 0.8  # 文件名数字序列不同时的相似度折扣
+    DEDUPE_PARTIAL_SIZE = 64 * 1024  # 查重时部分哈希读取的首尾字节数
+    DEDUPE_BATCH = 200  # 查重时每批哈希的文件数
+    REMOTE_WALKER = 'auto'  # 远程目录遍历方式：auto / find / sftp
+    WALK_READ_CHUNK = 64 * 1024  # 读取find输出的块大小
+    WALK_MAX_INFLIGHT = 4  # SFTP遍历时同时进行的listdir请求数（受连接池通道数限制）
+    TREE_STREAM_BATCH = 500  # 目录树流式输出每批最多行数
+    TREE_STREAM_INTERVAL = 0.1  # 目录树流式输出的最长发送间隔（秒）
+    JOB_WORKERS = 2  # 后台任务同时运行的数量
+    JOB_RETENTION = 600  # 已结束任务的结果保留时间（秒）
+    JOB_MAX_RETAINED = 100  # 最多保留的已结束任务数
+    LISTING_CACHE_TTL = 300  # 目录列表缓存的最长保留时间（秒），期间每次使用前按目录修改时间校验
+    LISTING_CACHE_MAX_ITEMS = 200000  # 目录列表缓存最多保存的目录项总数（超出时按LRU淘汰整个目录）
+    BROWSE_PAGE_SIZE = 200  # 目录浏览每页默认条目数
+    BROWSE_MAX_PAGE_SIZE = 2000  # 目录浏览每页最多条目数
+    BROWSE_CURSOR_TTL = 300  # 目录浏览游标（已排序、过滤的列表）的保留时间（秒）
+    BROWSE_MAX_CURSORS = 16  # 最多保留的目录浏览游标数
+    EVENT_QUEUE_SIZE = 200  # 每个推送订阅者最多积压的事件数（超出时丢弃最早的事件）
+    EVENT_HEARTBEAT = 15  # 推送通道空闲时发送心跳的间隔（秒）
+    EVENT_JOB_INTERVAL = 0.5  # 同一任务进度事件的最短推送间隔（秒）
+    CONNECTION_MONITOR_INTERVAL = 10  # 有订阅者时后台检测连接状态的间隔（秒）
+    DELETE_WORKERS = 4  # 批量删除时同时进行的删除请求数（远程SFTP删除受连接池通道数限制）
+    DELETE_USE_EXEC = True  # 远程主机允许执行命令时使用 rm -rf 删除整棵目录树
+    DELETE_EXEC_BATCH = 100  # 每条 rm -rf 命令处理的路径数
+    DELETE_CHUNK_SIZE = 32  # 通过SFTP删除目录树时每个任务连续处理的路径数
+    READ_CHUNK_SIZE = 1024 * 1024  # 编辑器分页读取时每块的默认字节数
+    READ_MAX_LENGTH = 16 * 1024 * 1024  # 单次分块读取的最大字节数
+    READ_SNIFF_SIZE = 64 * 1024  # 判断文件编码时读取的开头字节数
+    LINE_INDEX_INTERVAL = 10000  # 行偏移索引每隔多少行记录一个检查点
+    LINE_INDEX_MAX_FILES = 16  # 最多保留行偏移索引的文件数（按LRU淘汰）
+    WRITE_CHUNK_SIZE = 256 * 1024  # 保存文件时每次编码、写入的字符数
+    RENAME_WORKERS = 4  # 批量重命名时同时执行的改名链数
+    RENAME_JOURNAL_FILE = 'rename_journal.jsonl'  # 批量重命名日志，用于回滚和撤销上一次批量重命名
+    HASH_CACHE_FILE = 'hash_cache.db'  # 哈希缓存数据库（与连接历史文件同目录）
+    HASH_CACHE_MAX_ENTRIES = 200000  # 哈希缓存最大条目数
+    TRANSFER_CHUNK_SIZE = 8 * 1024 * 1024  # 上传下载时每个分块的字节数（断点续传以分块为单位）
+    TRANSFER_WORKERS = 4  # 同时传输的分块数（每个分块使用连接池的一个SFTP通道）
+    TRANSFER_VERIFY = True  # 传输完成后比较两端的MD5
+    TRANSFER_CHECKPOINT_DIR = 'transfer_checkpoints'  # 传输断点目录，中断的传输再次执行时从断点继续
+    TRANSFER_CHECKPOINT_INTERVAL = 1  # 传输过程中保存断点的最短间隔（秒）
+    SYNC_WORKERS = 4  # 目录同步时同时进行差异传输的文件数（每个文件占用一个服务器端辅助进程）
+    SYNC_DELTA_MIN_SIZE = 64 * 1024  # 旧文件小于此大小时直接整体传输，不计算差异
+    SYNC_BLOCK_MIN = 2 * 1024  # 差异传输的最小块大小（字节）
+    SYNC_BLOCK_MAX = 128 * 1024  # 差异传输的最大块大小（字节）
+    SYNC_MTIME_TOLERANCE = 1  # 修改时间相差不超过此秒数视为相同（SFTP只保留整数秒）
 
-class TreeGenerator:
-    """Python实现的目录树生成器"""
+class GitignoreMatcher:
+    """编译后的单个.gitignore规则集
     
-    def __init__(self):
-        self.gitignore_rules = []
-        self.tree_output = []
+    支持完整的gitignore语义：注释与转义、! 取反、/ 锚定、末尾 / 仅匹配目录、* ? [] 与 ** 通配，
+    同一文件内后出现的规则优先。规则只编译一次：
+    - 不含通配符的文件名规则放入字典，按文件名直接查找
+    - *.ext 形式的规则按后缀放入字典
+    - 其余规则按优先级倒序合并成一个正则，一次匹配即可得到优先级最高的命中规则
+    """
     
-    def read_gitignore(self, directory):
-        """读取.gitignore文件"""
-        gitignore_file = os.path.join(directory, '.gitignore')
-        self.gitignore_rules = []
+    _WILDCARDS = re.compile(r'[*?\[\\]')
+    
+    def __init__(self, lines):
+        self.negated = []
+        self.dir_only = []
+        self.names = {}  # 文件名 -> [规则序号]
+        self.suffixes = {}  # 后缀 -> [规则序号]
+        self.paths = {}  # 相对路径 -> [规则序号]
+        name_patterns = []
+        path_patterns = []
         
-        if os.path.exists(gitignore_file):
-            try:
-                with open(gitignore_file, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-                for line in lines:
-                    line = line.strip()
-                    if line and not line.startswith('#'):
-                        self.gitignore_rules.append(line)
-            except:
-                pass
+        for line in lines:
+            rule = self._parse(line)
+            if rule is None:
+                continue
+            negated, dir_only, anchored, pattern = rule
+            index = len(self.negated)
+            self.negated.append(negated)
+            self.dir_only.append(dir_only)
+            
+            if not anchored and not self._WILDCARDS.search(pattern):
+                self.names.setdefault(pattern, []).append(index)
+            elif not anchored and pattern.startswith('*') and not self._WILDCARDS.search(pattern[1:]):
+                self.suffixes.setdefault(pattern[1:], []).append(index)
+            elif anchored and not self._WILDCARDS.search(pattern):
+                self.paths.setdefault(pattern, []).append(index)
+            elif anchored:
+                path_patterns.append((index, self._translate(pattern)))
+            else:
+                name_patterns.append((index, self._translate(pattern)))
+        
+        self._suffix_lengths = sorted({len(suffix) for suffix in self.suffixes})
+        self.name_regex = self._combine(name_patterns, False)
+        self.name_regex_dir = self._combine(name_patterns, True)
+        self.path_regex = self._combine(path_patterns, False)
+        self.path_regex_dir = self._combine(path_patterns, True)
     
-    def is_excluded(self, path, base_path):
-        """检查文件或目录是否应该被排除"""
-        if not self.gitignore_rules:
-            return False
+    @classmethod
+    def from_file(cls, path):
+        """读取并编译本地.gitignore文件，读取失败时返回None"""
+        try:
+            with open(path, 'rb') as f:
+                return cls.from_bytes(f.read())
+        except Exception:
+            return None
+    
+    @classmethod
+    def from_bytes(cls, content):
+        """编译.gitignore文件内容"""
+        return cls(content.decode('utf-8', errors='replace').splitlines())
+    
+    def __len__(self):
+        return len(self.negated)
+    
+    def _parse(self, line):
+        """解析一行规则，返回 (取反, 仅目录, 锚定, 模式) 或 None"""
+        line = line.rstrip('\n').rstrip('\r')
+        if not line or line.startswith('#'):
+            return None
         
-        relative_path = os.path.relpath(path, base_path)
-        relative_path = relative_path.replace('\\', '/')
+        # 去掉未转义的行尾空格
+        while line.endswith(' ') and not line.endswith('\\ '):
+            line = line[:-1]
         
-        for rule in self.gitignore_rules:
-            if rule.startswith('!'):
-                # 排除规则的例外
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            return None
+        
+        # 开头或中间有 / 的规则相对.gitignore所在目录锚定；**/name 等价于不锚定的 name
+        anchored = '/' in line
+        line = line.lstrip('/') if line.startswith('/') else line
+        if line.startswith('**/') and '/' not in line[3:]:
+            line = line[3:]
+            anchored = False
+        return negated, dir_only, anchored, line
+    
+    def _translate(self, pattern):
+        """把通配符模式翻译成正则表达式（不含捕获组）"""
+        result = []
+        i, n = 0, len(pattern)
+        while i < n:
+            char = pattern[i]
+            if char == '*':
+                j = i
+                while j < n and pattern[j] == '*':
+                    j += 1
+                at_segment_start = i == 0 or pattern[i - 1] == '/'
+                if j - i >= 2 and at_segment_start and j < n and pattern[j] == '/':
+                    # **/ 匹配零个或多个目录
+                    result.append('(?:.*/)?')
+                    j += 1
+                elif j - i >= 2 and at_segment_start and j == n:
+                    # 末尾的 ** 匹配其下的所有内容
+                    result.append('.*')
+                else:
+                    result.append('[^/]*')
+                i = j
                 continue
-            
-            # 简单的通配符匹配
-            if fnmatch.fnmatch(relative_path, rule) or fnmatch.fnmatch(os.path.basename(path), rule):
-                return True
-            
-            # 目录匹配
-            if rule.endswith('/') and os.path.isdir(path):
-                rule = rule.rstrip('/')
-                if fnmatch.fnmatch(relative_path, rule) or fnmatch.fnmatch(os.path.basename(path), rule):
-                    return True
+            if char == '?':
+                result.append('[^/]')
+            elif char == '[':
+                j = i + 1
+                if j < n and pattern[j] in '!^':
+                    j += 1
+                if j < n and pattern[j] == ']':
+                    j += 1
+                while j < n and pattern[j] != ']':
+                    j += 1
+                if j >= n:
+                    result.append('\\[')
+                else:
+                    body = pattern[i + 1:j]
+                    negate = body[0] in '!^'
+                    if negate:
+                        body = body[1:]
+                    body = body.replace('\\', '\\\\').replace('[', '\\[')
+                    result.append('[' + ('^/' if negate else '') + body + ']')
+                    i = j
+            elif char == '\\' and i + 1 < n:
+                i += 1
+                result.append(re.escape(pattern[i]))
+            else:
+                result.append(re.escape(char))
+            i += 1
+        return ''.join(result)
+    
+    def _combine(self, patterns, is_dir):
+        """按优先级倒序合并为一个正则，返回 (正则, 分组序号 -> 规则序号)"""
+        selected = [(index, regex) for index, regex in reversed(patterns)
+                    if is_dir or not self.dir_only[index]]
+        if not selected:
+            return None, None
+        combined = re.compile('|'.join(f'({regex})' for _, regex in selected), re.DOTALL)
+        return combined, [None] + [index for index, _ in selected]
+    
+    def match(self, relative_path, name, is_dir):
+        """返回 True（忽略）、False（被 ! 重新包含）或 None（没有规则命中）"""
+        best = -1
+        
+        for index in self.names.get(name, ()):
+            if index > best and (is_dir or not self.dir_only[index]):
+                best = index
+        for length in self._suffix_lengths:
+            if length <= len(name):
+                for index in self.suffixes.get(name[-length:], ()):
+                    if index > best and (is_dir or not self.dir_only[index]):
+                        best = index
+        for index in self.paths.get(relative_path, ()):
+            if index > best and (is_dir or not self.dir_only[index]):
+                best = index
+        
+        for (regex, groups), value in ((self.name_regex_dir if is_dir else self.name_regex, name),
+                                       (self.path_regex_dir if is_dir else self.path_regex, relative_path)):
+            if regex is not None:
+                matched = regex.fullmatch(value)
+                if matched and groups[matched.lastindex] > best:
+                    best = groups[matched.lastindex]
+        
+        if best < 0:
+            return None
+        return not self.negated[best]
+
+class IgnoreStack:
+    """随遍历逐层叠加的.gitignore规则，深层目录的规则优先；.git 目录总是被忽略"""
+    
+    def __init__(self, levels=()):
+        self.levels = levels  # ((相对根目录的路径, GitignoreMatcher), ...)，由浅到深
+    
+    def push(self, relative_dir, matcher):
+        """进入包含.gitignore的目录时返回新的规则栈"""
+        if not matcher:
+            return self
+        return IgnoreStack(self.levels + ((relative_dir, matcher),))
+    
+    def is_ignored(self, relative_path, is_dir):
+        """relative_path 为相对遍历根目录、以 / 分隔的路径"""
+        name = relative_path.rpartition('/')[2]
+        if is_dir and name == '.git':
+            return True
         
+        for base, matcher in reversed(self.levels):
+            result = matcher.match(relative_path[len(base) + 1:] if base else relative_path, name, is_dir)
+            if result is not None:
+                return result
         return False
+
+class TreeGenerator:
+    """Python实现的目录树生成器"""
+    
+    def __init__(self):
+        self.apply_gitignore = False
+        self.tree_output = []
     
     def generate_tree(self, directory, apply_gitignore=True, exclude_files=False, max_level=None):
         """生成目录树"""
-        self.tree_output = []
+        success, result = self.stream_tree(directory, apply_gitignore, exclude_files, max_level)
+        if not success:
+            return False, result
+        
+        try:
+            self.tree_output = list(result)
+            return True, '\n'.join(self.tree_output)
+        except Exception as e:
+            return False, f"生成目录树失败: {str(e)}"
+    
+    def stream_tree(self, directory, apply_gitignore=True, exclude_files=False, max_level=None):
+        """检查目录后返回 (True, 逐行产出目录树的生成器)，失败时返回 (False, 错误信息)
         
+        应用.gitignore时，各级目录中的.gitignore会在遍历到该目录时叠加，被忽略的目录不再深入。
+        """
         if not os.path.exists(directory):
             return False, f"目录不存在: {directory}"
         
         if not os.path.isdir(directory):
             return False, f"路径不是目录: {directory}"
         
-        if apply_gitignore:
-            self.read_gitignore(directory)
-        else:
-            self.gitignore_rules = []
-        
+        self.apply_gitignore = apply_gitignore
+        return True, self._iter_tree(directory, exclude_files, max_level)
+    
+    def _iter_tree(self, directory, exclude_files, max_level):
+        """深度优先逐行产出目录树；只保存当前路径上各层的子项，内存占用与深度相关"""
         # 添加根目录名称
-        self.tree_output.append(os.path.basename(directory) or directory)
+        yield os.path.basename(directory) or directory
         
-        try:
-            self._build_tree(directory, "", exclude_files, 0, max_level, directory)
-            return True, '\n'.join(self.tree_output)
-        except Exception as e:
-            return False, f"生成目录树失败: {str(e)}"
+        stack = []
+        if max_level is None or max_level > 0:
+            stack.append((self._list_children(directory, '', IgnoreStack(), exclude_files), ""))
+        
+        while stack:
+            items, prefix = stack[-1]
+            if isinstance(items, str):
+                # 列目录失败
+                stack.pop()
+                yield prefix + items
+                continue
+            
+            try:
+                item, item_path, relative_path, ignore, is_dir, is_last = next(items)
+            except StopIteration:
+                stack.pop()
+                continue
+            
+            if is_last:
+                yield prefix + "└── " + item
+                new_prefix = prefix + "    "
+            else:
+                yield prefix + "├── " + item
+                new_prefix = prefix + "│   "
+            
+            # 如果是目录，继续深入
+            if is_dir and (max_level is None or len(stack) < max_level):
+                stack.append((self._list_children(item_path, relative_path, ignore, exclude_files), new_prefix))
     
-    def _build_tree(self, directory, prefix, exclude_files, level, max_level, base_path):
-        """递归构建目录树"""
-        if max_level is not None and level >= max_level:
-            return
+    def _list_children(self, directory, relative_dir, ignore, exclude_files):
+        """返回子项迭代器 (名称, 路径, 相对路径, 规则栈, 是否目录, 是否最后一项)，失败时返回错误行文本
         
+        使用 os.scandir，文件类型来自目录项本身，只有符号链接才需要一次stat。
+        """
         try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+            
+            # 当前目录有.gitignore时叠加到规则栈，作用于本目录及其子目录
+            if self.apply_gitignore and any(entry.name == '.gitignore' for entry in entries):
+                ignore = ignore.push(relative_dir, GitignoreMatcher.from_file(os.path.join(directory, '.gitignore')))
+            
             items = []
-            for item in os.listdir(directory):
-                item_path = os.path.join(directory, item)
+            for entry in entries:
+                is_dir = entry.is_dir()
+                relative_path = relative_dir + '/' + entry.name if relative_dir else entry.name
                 
                 # 检查是否应该排除
-                if self.is_excluded(item_path, base_path):
+                if self.apply_gitignore and ignore.is_ignored(relative_path, is_dir):
                     continue
                 
                 # 如果排除文件且当前项是文件，跳过
-                if exclude_files and os.path.isfile(item_path):
+                is_file = entry.is_file()
+                if exclude_files and is_file:
                     continue
                 
-                items.append((item, item_path))
+                items.append((entry.name, entry.path, relative_path, is_dir, is_file))
             
             # 排序：目录在前，文件在后
-            items.sort(key=lambda x: (os.path.isfile(x[1]), x[0].lower()))
-            
-            for i, (item, item_path) in enumerate(items):
-                is_last = i == len(items) - 1
-                
-                if is_last:
-                    current_prefix = prefix + "└── " + item
-                    new_prefix = prefix + "    "
-                else:
-                    current_prefix = prefix + "├── " + item
-                    new_prefix = prefix + "│   "
-                
-                self.tree_output.append(current_prefix)
-                
-                # 如果是目录，递归处理
-                if os.path.isdir(item_path):
-                    self._build_tree(item_path, new_prefix, exclude_files, level + 1, max_level, base_path)
-        
+            items.sort(key=lambda x: (x[4], x[0].lower()))
         except PermissionError:
-            self.tree_output.append(prefix + "└── [权限拒绝]")
+            return "└── [权限拒绝]"
         except Exception as e:
-            self.tree_output.append(prefix + f"└── [错误: {str(e)}]")
+            return f"└── [错误: {str(e)}]"
+        
+        return ((name, path, relative_path, ignore, is_dir, i == len(items) - 1)
+                for i, (name, path, relative_path, is_dir, _) in enumerate(items))
 
 class RemoteTreeGenerator:
     """远程SSH目录树生成器"""
     
-    def __init__(self, sftp, ssh):
+    def __init__(self, sftp, ssh, walker=None):
         self.sftp = sftp
         self.ssh = ssh
+        self.walker = walker or SFTPWalker(sftp)
+        self.apply_gitignore = False
         self.tree_output = []
     
-    def generate_tree(self, directory, exclude_files=False, max_level=None):
+    def generate_tree(self, directory, exclude_files=False, max_level=None, apply_gitignore=False):
         """生成远程目录树"""
-        self.tree_output = []
+        success, result = self.stream_tree(directory, exclude_files, max_level, apply_gitignore)
+        if not success:
+            return False, result
         
         try:
-            # 检查目录是否存在
-            try:
-                stat_info = self.sftp.stat(directory)
-                if not stat.S_ISDIR(stat_info.st_mode):
-                    return False, f"路径不是目录: {directory}"
-            except:
-                return False, f"目录不存在或无法访问: {directory}"
-            
-            # 添加根目录名称
-            self.tree_output.append(os.path.basename(directory) or directory)
-            
-            self._build_tree(directory, "", exclude_files, 0, max_level)
+            self.tree_output = list(result)
             return True, '\n'.join(self.tree_output)
         except Exception as e:
             return False, f"生成目录树失败: {str(e)}"
     
-    def _build_tree(self, directory, prefix, exclude_files, level, max_level):
-        """递归构建目录树"""
-        if max_level is not None and level >= max_level:
-            return
+    def stream_tree(self, directory, exclude_files=False, max_level=None, apply_gitignore=False):
+        """检查目录后返回 (True, 逐行产出目录树的生成器)，失败时返回 (False, 错误信息)
         
+        应用.gitignore时，每个目录的.gitignore随目录列表一起读取并叠加，被忽略的目录不再列出。
+        """
+        # 检查目录是否存在
         try:
-            items = []
-            for item in self.sftp.listdir_attr(directory):
-                item_path = directory.rstrip('/') + '/' + item.filename
-                
-                # 如果排除文件且当前项是文件，跳过
-                if exclude_files and not stat.S_ISDIR(item.st_mode):
+            stat_info = self.sftp.stat(directory)
+            if not stat.S_ISDIR(stat_info.st_mode):
+                return False, f"路径不是目录: {directory}"
+        except:
+            return False, f"目录不存在或无法访问: {directory}"
+        
+        self.apply_gitignore = apply_gitignore
+        return True, self._iter_tree(directory, exclude_files, max_level)
+    
+    def _iter_tree(self, directory, exclude_files, max_level):
+        """深度优先逐行产出目录树，后台预先列出即将访问的子目录"""
+        # 添加根目录名称
+        yield os.path.basename(directory) or directory
+        
+        if max_level is not None and max_level <= 0:
+            return
+        
+        with DirectoryPrefetcher(self.walker, read_gitignore=self.apply_gitignore) as lister:
+            root = directory.rstrip('/') or '/'
+            stack = [(self._list_children(lister, root, '', IgnoreStack(), exclude_files, True), "")]
+            while stack:
+                items, prefix = stack[-1]
+                if isinstance(items, str):
+                    # 列目录失败
+                    stack.pop()
+                    yield prefix + items
                     continue
                 
-                items.append((item.filename, item_path, stat.S_ISDIR(item.st_mode)))
-            
-            # 排序：目录在前，文件在后
-            items.sort(key=lambda x: (not x[2], x[0].lower()))
-            
-            for i, (name, path, is_dir) in enumerate(items):
-                is_last = i == len(items) - 1
+                try:
+                    name, path, relative_path, ignore, is_dir, is_last = next(items)
+                except StopIteration:
+                    stack.pop()
+                    continue
                 
                 if is_last:
-                    current_prefix = prefix + "└── " + name
+                    yield prefix + "└── " + name
                     new_prefix = prefix + "    "
                 else:
-                    current_prefix = prefix + "├── " + name
+                    yield prefix + "├── " + name
                     new_prefix = prefix + "│   "
                 
-                self.tree_output.append(current_prefix)
-                
-                # 如果是目录，递归处理
-                if is_dir:
-                    self._build_tree(path, new_prefix, exclude_files, level + 1, max_level)
+                # 如果是目录，继续深入
+                if is_dir and (max_level is None or len(stack) < max_level):
+                    prefetch = max_level is None or len(stack) + 1 < max_level
+                    stack.append((self._list_children(lister, path, relative_path, ignore, exclude_files, prefetch),
+                                  new_prefix))
+    
+    def _list_children(self, lister, directory, relative_dir, ignore, exclude_files, prefetch):
+        """返回子项迭代器 (名称, 路径, 相对路径, 规则栈, 是否目录, 是否最后一项)，失败时返回错误行文本"""
+        try:
+            entries, gitignore = lister.listdir(directory)
+        except Exception as e:
+            return f"└── [错误: {str(e)}]"
+        
+        if gitignore is not None:
+            ignore = ignore.push(relative_dir, GitignoreMatcher.from_bytes(gitignore))
+        
+        items = []
+        for entry in entries:
+            relative_path = relative_dir + '/' + entry['name'] if relative_dir else entry['name']
+            
+            # 被忽略的目录直接剪枝，不会被列出或预取
+            if self.apply_gitignore and ignore.is_ignored(relative_path, entry['is_dir']):
+                continue
+            
+            # 如果排除文件且当前项是文件，跳过
+            if exclude_files and not entry['is_dir']:
+                continue
+            
+            items.append((entry['name'], entry['path'], relative_path, entry['is_dir']))
+        
+        # 排序：目录在前，文件在后
+        items.sort(key=lambda x: (not x[3], x[0].lower()))
+        if prefetch:
+            lister.prefetch(item[1] for item in items if item[3])
+        return ((name, path, relative_path, ignore, is_dir, i == len(items) - 1)
+                for i, (name, path, relative_path, is_dir) in enumerate(items))
+
+class RemoteEmptyDirCleaner:
+    """远程SSH空目录清理器"""
+    
+    def __init__(self, sftp, ssh, walker=None):
+        self.sftp = sftp
+        self.ssh = ssh
+        self.walker = walker or SFTPWalker(sftp)
+        self.removed_dirs = []
+    
+    def clean_empty_directories(self, directory, progress=None):
+        """清理远程空目录，progress 为进度回调（参数同 Job.report）"""
+        try:
+            # 检查目录是否存在
+            try:
+                stat_info = self.sftp.stat(directory)
+                if not stat.S_ISDIR(stat_info.st_mode):
+                    return False, f"路径不是目录: {directory}", []
+            except:
+                return False, f"目录不存在或无法访问: {directory}", []
+            
+            self.removed_dirs = []
+            self._clean_tree(directory, progress or (lambda **kwargs: None))
+            
+            if self.removed_dirs:
+                message = f"成功删除 {len(self.removed_dirs)} 个空目录:\n" + '\n'.join(self.removed_dirs)
+                return True, message, self.removed_dirs
+            else:
+                return True, "没有找到空目录", []
+        
+        except JobCancelled:
+            raise
+        except Exception as e:
+            return False, f"清理空目录失败: {str(e)}", []
+    
+    def _clean_tree(self, directory, progress):
+        """一次遍历取得整棵树，再从最深的目录开始删除空目录"""
+        root = directory.rstrip('/') or '/'
+        listing = {}
+        for path, entries in self.walker.walk(root):
+            listing[path] = entries
+            progress(done=len(listing), message='正在扫描目录')
+        progress(total=len(listing), message='正在删除空目录')
+        remaining = {path: len(entries) for path, entries in listing.items()}
+        parents = {
+            entry['path']: path
+            for path, entries in listing.items()
+            for entry in entries if entry['is_dir']
+        }
+        
+        # 子目录总是比父目录深，按深度倒序处理等价于后序遍历
+        for path in sorted(listing, key=lambda p: p.count('/'), reverse=True):
+            if remaining[path] != 0:
+                continue
+            try:
+                self.sftp.rmdir(path)
+                self.removed_dirs.append(path)
+            except Exception:
+                # 忽略无法删除的目录
+                continue
+            progress(message=f'已删除 {len(self.removed_dirs)} 个空目录')
+            parent = parents.get(path)
+            if parent in remaining:
+                remaining[parent] -= 1
+
+class EmptyDirCleaner:
+    """Python实现的空目录清理器"""
+    
+    def __init__(self):
+        self.removed_dirs = []
+    
+    def clean_empty_directories(self, directory, progress=None):
+        """清理空目录，progress 为进度回调（参数同 Job.report）"""
+        if not os.path.exists(directory):
+            return False, f"目录不存在: {directory}", []
+        
+        if not os.path.isdir(directory):
+            return False, f"路径不是目录: {directory}", []
+        
+        self.removed_dirs = []
+        
+        try:
+            self._clean_tree(directory, progress or (lambda **kwargs: None))
+            
+            if self.removed_dirs:
+                message = f"成功删除 {len(self.removed_dirs)} 个空目录:\n" + '\n'.join(self.removed_dirs)
+                return True, message, self.removed_dirs
+            else:
+                return True, "没有找到空目录", []
         
+        except JobCancelled:
+            raise
         except Exception as e:
-            self.tree_output.append(prefix + f"└── [错误: {str(e)}]")
+            return False, f"清理空目录失败: {str(e)}", []
+    
+    def _clean_tree(self, directory, progress):
+        """迭代遍历记录各目录的子项数，再按先序的逆序（子目录先于父目录）删除空目录"""
+        dirs = []  # [路径, 父目录下标, 剩余子项数]
+        stack = [(directory, -1)]
+        while stack:
+            path, parent = stack.pop()
+            try:
+                with os.scandir(path) as it:
+                    entries = list(it)
+            except OSError:
+                # 无法读取的目录视为非空
+                continue
+            index = len(dirs)
+            dirs.append([path, parent, len(entries)])
+            progress(done=len(dirs), message='正在扫描目录')
+            stack.extend((entry.path, index) for entry in entries if entry.is_dir(follow_symlinks=False))
+        progress(total=len(dirs), message='正在删除空目录')
+        
+        for record in reversed(dirs):
+            path, parent, remaining = record
+            if remaining:
+                continue
+            try:
+                os.rmdir(path)
+            except OSError:
+                # 忽略无法删除的目录
+                continue
+            self.removed_dirs.append(path)
+            progress(message=f'已删除 {len(self.removed_dirs)} 个空目录')
+            if parent >= 0:
+                dirs[parent][2] -= 1
+
+class LocalWalker:
+    """基于os.scandir的本地遍历器
+    
+    目录项自带文件类型，每个子项只做一次stat（获取大小和修改时间），并使用显式栈代替递归。
+    默认不跟随符号链接，与SFTP的lstat语义一致，也避免链接成环。
+    """
+    
+    def __init__(self, follow_symlinks=False):
+        self.follow_symlinks = follow_symlinks
+        self.errors = {}  # {目录: 错误信息}
+    
+    def walk(self, root, max_depth=None):
+        """遍历目录树，逐个产出 (目录, 子项列表)；深度小于 max_depth 的目录才会被列出"""
+        return self.walk_many([root], max_depth)
+    
+    def walk_many(self, roots, max_depth=None):
+        """依次遍历多个根目录"""
+        self.errors = {}
+        stack = [(root, 0) for root in reversed(roots)]
+        while stack:
+            directory, depth = stack.pop()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            try:
+                entries = self.scan(directory)
+            except OSError as e:
+                self.errors[directory] = str(e)
+                continue
+            
+            yield directory, entries
+            stack.extend((entry['path'], depth + 1) for entry in reversed(entries) if entry['is_dir'])
+    
+    def scan(self, directory):
+        """列出单个目录，返回子项列表"""
+        entries = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    info = entry.stat(follow_symlinks=self.follow_symlinks)
+                except OSError:
+                    continue
+                entries.append({
+                    'name': entry.name,
+                    'path': entry.path,
+                    'is_dir': stat.S_ISDIR(info.st_mode),
+                    'mode': info.st_mode,
+                    'size': info.st_size,
+                    'mtime': info.st_mtime,
+                    # Windows 上 scandir 缓存的 stat 不含 inode（为0）
+                    'inode': (info.st_dev, info.st_ino) if info.st_ino else None
+                })
+        return entries
+
+class SFTPWalker:
+    """基于SFTP逐目录listdir_attr的远程遍历器"""
+    
+    def __init__(self, sftp):
+        self.sftp = sftp
+        self.errors = {}  # {目录: 错误信息}
+    
+    def walk(self, root, max_depth=None):
+        """遍历目录树，逐个产出 (目录, 子项列表)；深度小于 max_depth 的目录才会被列出"""
+        return self.walk_many([root], max_depth)
+    
+    def walk_many(self, roots, max_depth=None):
+        """依次遍历多个根目录"""
+        self.errors = {}
+        stack = [(root.rstrip('/') or '/', 0) for root in reversed(roots)]
+        while stack:
+            directory, depth = stack.pop()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            try:
+                attrs = self.sftp.listdir_attr(directory)
+            except Exception as e:
+                self.errors[directory] = str(e)
+                continue
+            
+            entries = [make_walk_entry(directory, attr.filename, attr.st_mode, attr.st_size, attr.st_mtime)
+                       for attr in attrs]
+            yield directory, entries
+            stack.extend((entry['path'], depth + 1) for entry in reversed(entries) if entry['is_dir'])
+
+class ConcurrentSFTPWalker(SFTPWalker):
+    """广度优先的并发SFTP遍历器
+    
+    SFTP通道上的请求是串行的，因此每个listdir_attr从连接池借用独立通道，
+    最多同时进行 max_inflight 个请求，遍历速度取决于带宽而不是往返延迟。
+    产出顺序为完成顺序，不保证父目录之外的先后关系。
+    """
+    
+    def __init__(self, file_manager, sftp=None, max_inflight=None):
+        super().__init__(sftp or file_manager.sftp)
+        self.file_manager = file_manager
+        self.max_inflight = max_inflight or Config.WALK_MAX_INFLIGHT
+        self._sftp_lock = threading.Lock()
+    
+    def walk_many(self, roots, max_depth=None):
+        """同时遍历多个根目录"""
+        if self.max_inflight <= 1 or not self.file_manager.connection_id:
+            yield from super().walk_many(roots, max_depth)
+            return
+        
+        self.errors = {}
+        frontier = deque((root.rstrip('/') or '/', 0) for root in roots)
+        inflight = {}
+        with ThreadPoolExecutor(max_workers=self.max_inflight) as executor:
+            while frontier or inflight:
+                while frontier and len(inflight) < self.max_inflight:
+                    directory, depth = frontier.popleft()
+                    if max_depth is None or depth < max_depth:
+                        inflight[executor.submit(self._listdir, directory)] = (directory, depth)
+                if not inflight:
+                    break
+                
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    directory, depth = inflight.pop(future)
+                    try:
+                        attrs = future.result()
+                    except Exception as e:
+                        self.errors[directory] = str(e)
+                        continue
+                    
+                    entries = [make_walk_entry(directory, attr.filename, attr.st_mode, attr.st_size, attr.st_mtime)
+                               for attr in attrs]
+                    yield directory, entries
+                    frontier.extend((entry['path'], depth + 1) for entry in entries if entry['is_dir'])
+    
+    def _listdir(self, directory):
+        """在借用的通道上列出目录"""
+        return self._run(lambda sftp: sftp.listdir_attr(directory))
+    
+    def _run(self, task):
+        """在借用的通道上执行 task(sftp)；连接池不可用时退回到当前通道（串行）"""
+        fm = self.file_manager
+        try:
+            with fm.pool.checkout(fm.connection_id) as sftp:
+                return task(sftp)
+        except paramiko.SSHException:
+            pass
+        with self._sftp_lock:
+            return task(self.sftp)
+
+class DirectoryPrefetcher:
+    """按需列出目录，同时在后台预先列出即将访问的子目录
+    
+    适用于必须按顺序深度优先访问的场景（如逐行输出目录树）。预取结果最多缓存 2 * window 个，
+    内存占用不随目录树大小增长。最近一次 prefetch 传入的目录（当前目录的子目录）最先被访问，
+    优先级最高；缓存超过 window 个后只再接受比已预取目录更早访问的目录，上层目录的预取不会
+    占满窗口，深层目录同样能得到预取。read_gitignore 为真时，目录中的.gitignore会在同一个通道上
+    随列表一起读取，不需要额外的遍历。
+    """
+    
+    def __init__(self, walker, window=None, read_gitignore=False):
+        self.walker = walker
+        self.read_gitignore = read_gitignore
+        concurrent = isinstance(walker, ConcurrentSFTPWalker) and walker.max_inflight > 1
+        self.window = (window or walker.max_inflight * 4) if concurrent else 0
+        self._executor = ThreadPoolExecutor(max_workers=walker.max_inflight) if concurrent else None
+        self._lock = threading.RLock()  # 预取完成的回调在工作线程中补充新的请求
+        self._pending = {}  # 目录 -> (优先级, Future)
+        self._running = 0  # 已提交但尚未完成的请求数
+        self._wanted = []  # 等待预取的 (优先级, 目录) 堆，优先级越小越先访问
+        self._calls = 0
+        self._closed = False
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def listdir(self, directory):
+        """返回 (子项列表, .gitignore内容或None)，优先使用预取结果"""
+        if self._executor is None:
+            attrs, gitignore = self._fetch(self.walker.sftp, directory)
+        else:
+            with self._lock:
+                pending = self._pending.pop(directory, None)
+                if pending is not None:
+                    future = pending[1]
+                else:
+                    if any(wanted == directory for _, wanted in self._wanted):
+                        self._wanted = [item for item in self._wanted if item[1] != directory]
+                        heapq.heapify(self._wanted)
+                    future = self._submit(directory)
+            attrs, gitignore = future.result()
+            with self._lock:
+                self._fill()
+        entries = [make_walk_entry(directory, attr.filename, attr.st_mode, attr.st_size, attr.st_mtime)
+                   for attr in attrs]
+        return entries, gitignore
+    
+    def _fetch(self, sftp, directory):
+        attrs = sftp.listdir_attr(directory)
+        gitignore = None
+        if self.read_gitignore and any(attr.filename == '.gitignore' for attr in attrs):
+            try:
+                with sftp.open(directory.rstrip('/') + '/.gitignore', 'rb') as f:
+                    gitignore = f.read()
+            except IOError:
+                pass
+        return attrs, gitignore
+    
+    def prefetch(self, directories):
+        """把目录按访问顺序加入预取队列，它们的优先级高于之前加入的所有目录"""
+        if self._executor is None:
+            return
+        with self._lock:
+            self._calls += 1
+            for index, directory in enumerate(directories):
+                if directory not in self._pending:
+                    heapq.heappush(self._wanted, ((-self._calls, index), directory))
+            self._fill()
+    
+    def _fill(self):
+        """按优先级提交预取（调用方持有锁）
+        
+        同时进行的请求不超过通道数，线程池中不排队，新加入的高优先级目录不必等待先前提交的请求；
+        请求完成时在回调中继续提交。
+        """
+        while self._wanted and not self._closed and self._running < self.walker.max_inflight:
+            priority, directory = self._wanted[0]
+            if directory in self._pending:
+                heapq.heappop(self._wanted)
+                continue
+            if len(self._pending) >= self.window:
+                if len(self._pending) >= 2 * self.window:
+                    break
+                if priority > max(entry[0] for entry in self._pending.values()):
+                    break
+            heapq.heappop(self._wanted)
+            self._pending[directory] = (priority, self._submit(directory))
+    
+    def _submit(self, directory):
+        self._running += 1
+        future = self._executor.submit(self.walker._run, lambda sftp: self._fetch(sftp, directory))
+        future.add_done_callback(self._on_done)
+        return future
+    
+    def _on_done(self, future):
+        with self._lock:
+            self._running -= 1
+            self._fill()
+    
+    def close(self):
+        """取消未开始的预取并等待进行中的请求结束"""
+        with self._lock:
+            self._closed = True
+            for _, future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+            self._wanted = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+class FindWalker:
+    """在服务器端执行一次 find -printf 遍历整棵目录树，边接收边解析
+    
+    find 不可用（非GNU find、禁止执行命令等）时自动回退到SFTP遍历。
+    find 报告的目录错误（如无权限）记录在 errors 中，出错的目录和SFTP遍历一样不出现在结果里，
+    不会被当作空目录。
+    """
+    
+    # 类型、大小、修改时间、权限、设备号:inode、相对路径，以NUL分隔以支持任意文件名
+    PRINTF_FORMAT = '%y\\t%s\\t%T@\\t%m\\t%D:%i\\t%P\\0'
+    # find 的类型字母对应的文件类型，与八进制权限位合并为 st_mode
+    FILE_TYPES = {
+        'd': stat.S_IFDIR, 'f': stat.S_IFREG, 'l': stat.S_IFLNK, 'p': stat.S_IFIFO,
+        's': stat.S_IFSOCK, 'b': stat.S_IFBLK, 'c': stat.S_IFCHR
+    }
+    # LC_ALL=C 时 find 的错误信息格式：find: '路径': 原因
+    ERROR_PATTERN = re.compile(r"^find: '(.*)': (.*)$")
+    
+    def __init__(self, ssh, fallback):
+        self.ssh = ssh
+        self.fallback = fallback
+        self.errors = {}
+        self.used_fallback = False
+    
+    def walk(self, root, max_depth=None):
+        """遍历目录树，产出 (目录, 子项列表)，语义与 SFTPWalker.walk 相同"""
+        return self.walk_many([root], max_depth)
+    
+    def walk_many(self, roots, max_depth=None):
+        """每个根目录执行一次find"""
+        self.errors = {}
+        self.used_fallback = False
+        for root in roots:
+            try:
+                listing = None if self.used_fallback else self._run_find(root, max_depth)
+            except Exception:
+                listing = None
+            
+            if listing is None:
+                self.used_fallback = True
+                yield from self.fallback.walk(root, max_depth)
+                self.errors.update(self.fallback.errors)
+                continue
+            yield from listing.items()
+    
+    def _build_command(self, root, max_depth):
+        command = f"LC_ALL=C find -H {shlex.quote(root)} -mindepth 1"
+        if max_depth is not None:
+            command += f" -maxdepth {int(max_depth)}"
+        return command + f" -printf '{self.PRINTF_FORMAT}'"
+    
+    def _run_find(self, root, max_depth):
+        """执行find并增量解析输出，返回 {目录: 子项列表}；find不可用时返回None"""
+        if max_depth is not None and max_depth <= 0:
+            return {}
+        
+        stdin, stdout, stderr = self.ssh.exec_command(self._build_command(root, max_depth))
+        stdin.close()
+        channel = stdout.channel
+        # 错误输出在单独的线程中读取，避免错误信息过多时占满通道窗口、阻塞标准输出
+        errors = []
+        reader = threading.Thread(target=lambda: errors.append(stderr.read()), daemon=True)
+        reader.start()
+        
+        base = root.rstrip('/') or '/'
+        listing = {base: []}
+        buffer = b''
+        records = 0
+        while True:
+            chunk = channel.recv(Config.WALK_READ_CHUNK)
+            if not chunk:
+                break
+            buffer += chunk
+            *lines, buffer = buffer.split(b'\0')
+            for line in lines:
+                if self._add_record(listing, base, line, max_depth):
+                    records += 1
+        
+        status = channel.recv_exit_status()
+        reader.join()
+        failed = self._add_errors(listing, root, base, b''.join(errors).decode('utf-8', errors='replace'))
+        if status == 0:
+            return listing
+        # 没有任何输出也没有可识别的目录错误时，视为find不可用（非GNU find等）
+        if records == 0 and not failed:
+            return None
+        if not failed:
+            self.errors[base] = f'find 退出码 {status}'
+        return listing
+    
+    def _add_errors(self, listing, root, base, output):
+        """把find报告的目录错误记入 errors，并从结果中去掉出错的目录；返回识别出的错误数"""
+        failed = 0
+        for line in output.splitlines():
+            match = self.ERROR_PATTERN.match(line)
+            if not match:
+                continue
+            path, message = match.groups()
+            relative = path[len(root):].lstrip('/') if path.startswith(root) else None
+            if relative is None:
+                continue
+            directory = base.rstrip('/') + '/' + relative if relative else base
+            self.errors[directory] = message
+            listing.pop(directory, None)
+            failed += 1
+        return failed
+    
+    def _add_record(self, listing, base, line, max_depth):
+        """解析一条find输出并放入所属目录的子项列表"""
+        try:
+            kind, size, mtime, permissions, inode, relative = line.decode('utf-8', errors='replace').split('\t', 5)
+            mode = self.FILE_TYPES.get(kind, 0) | int(permissions, 8)
+        except ValueError:
+            return False
+        
+        parent_relative, _, name = relative.rpartition('/')
+        parent = base.rstrip('/') + '/' + parent_relative if parent_relative else base
+        entry = make_walk_entry(parent, name, mode, int(size), int(float(mtime)), inode)
+        listing.setdefault(parent, []).append(entry)
+        
+        # 在深度范围内的子目录即使为空也要出现在结果中
+        if kind == 'd' and (max_depth is None or relative.count('/') + 1 < max_depth):
+            listing.setdefault(entry['path'], [])
+        return True
+
+def make_walk_entry(directory, name, mode, size, mtime, inode=None):
+    """遍历结果中的一个子项；inode 为 (设备号, inode号)，SFTP无法获取时为None"""
+    return {
+        'name': name,
+        'path': directory.rstrip('/') + '/' + name,
+        'is_dir': stat.S_ISDIR(mode),
+        'mode': mode,
+        'size': size,
+        'mtime': mtime,
+        'inode': inode
+    }
+
+class ListingEntry:
+    """目录列表中的一项
+    
+    只保存原始字段（所在目录、名称、大小、模式、修改时间），完整路径和时间字符串在访问时才生成，
+    同一目录的所有子项共享目录字符串。支持 item['name'] 形式的访问，序列化时使用 to_dict。
+    """
+    
+    __slots__ = ('directory', 'name', 'size', 'mode', 'mtime', 'is_dir')
+    FIELDS = ('path', 'name', 'size', 'is_dir', 'mtime', 'modified')
+    
+    def __init__(self, directory, name, size, mode, mtime):
+        self.directory = directory
+        self.name = name
+        self.size = size
+        self.mode = mode
+        self.mtime = mtime
+        self.is_dir = stat.S_ISDIR(mode)
+    
+    @property
+    def path(self):
+        path = os.path.join(self.directory, self.name)
+        return path.replace('\\', '/') if os.sep == '\\' else path
+    
+    @property
+    def modified(self):
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.mtime))
+    
+    # 兼容 item['name'] 形式的访问；内部热路径直接使用属性访问
+    def __getitem__(self, key):
+        return getattr(self, key)
+    
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+    
+    def to_dict(self):
+        """转换为可序列化为JSON的字典"""
+        return {field: getattr(self, field) for field in self.FIELDS}
+    
+    @classmethod
+    def rows(cls, items):
+        """把一页列表项转换为按 FIELDS 排列的元组，供 /browse 直接序列化
+        
+        同一目录只拼接一次路径前缀，相同的修改时间只格式化一次；子类（如 DriveEntry）按属性逐项取值。
+        """
+        prefixes = {}
+        times = {}
+        rows = []
+        for item in items:
+            if type(item) is not cls:
+                rows.append(tuple(getattr(item, field) for field in cls.FIELDS))
+                continue
+            prefix = prefixes.get(item.directory)
+            if prefix is None:
+                prefix = os.path.join(item.directory, '')
+                if os.sep == '\\':
+                    prefix = prefix.replace('\\', '/')
+                prefixes[item.directory] = prefix
+            modified = times.get(item.mtime)
+            if modified is None:
+                modified = times[item.mtime] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(item.mtime))
+            rows.append((prefix + item.name, item.name, item.size, item.is_dir, item.mtime, modified))
+        return rows
+    
+    def __repr__(self):
+        return f"ListingEntry({self.path!r}, size={self.size}, is_dir={self.is_dir})"
+
+class DriveEntry(ListingEntry):
+    """Windows驱动器列表中的一项"""
+    
+    __slots__ = ('_path',)
+    
+    def __init__(self, letter):
+        super().__init__('', f"{letter}: 驱动器", 0, stat.S_IFDIR, 0)
+        self._path = f"{letter}:/"
+    
+    @property
+    def path(self):
+        return self._path
+    
+    @property
+    def modified(self):
+        return '系统驱动器'
+
+def file_version(st):
+    """由文件大小和修改时间组成的版本标识，保存时用来检测文件是否已被其他人修改
+    
+    SFTP只提供秒级的修改时间。
+    """
+    mtime_ns = getattr(st, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(st.st_mtime or 0) * 1000000000
+    return f'{st.st_size}-{mtime_ns}'
+
+class LineIndexCache:
+    """按文件版本缓存的稀疏行偏移索引：每 LINE_INDEX_INTERVAL 行记录一次该行开头的字节偏移
+    
+    按行窗口读取时从不超过目标行的最近检查点开始扫描，扫描经过的检查点追加到索引中，翻到文件后部时
+    不必每次从文件开头数换行符。文件版本（大小和修改时间）改变后旧索引被丢弃。
+    """
+    
+    def __init__(self, interval=None, max_files=None):
+        self.interval = interval or Config.LINE_INDEX_INTERVAL
+        self.max_files = max_files or Config.LINE_INDEX_MAX_FILES
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()  # (主机, 路径, 版本) -> 检查点列表，第 k 项为第 k*interval 行开头的偏移
+    
+    def get(self, host, path, version):
+        """返回文件当前版本的检查点列表（没有时新建）"""
+        key = (host, path, version)
+        with self._lock:
+            checkpoints = self._indexes.get(key)
+            if checkpoints is None:
+                for old in [old for old in self._indexes if old[:2] == key[:2]]:
+                    del self._indexes[old]
+                checkpoints = self._indexes[key] = [0]
+                while len(self._indexes) > self.max_files:
+                    self._indexes.popitem(last=False)
+            self._indexes.move_to_end(key)
+            return checkpoints
+    
+    def nearest(self, checkpoints, line):
+        """不超过 line 的最近检查点，返回 (行号, 偏移)"""
+        with self._lock:
+            index = min(line // self.interval, len(checkpoints) - 1)
+            return index * self.interval, checkpoints[index]
+    
+    def record(self, checkpoints, line, offset):
+        """扫描到第 line 行开头时调用，line 恰好是下一个检查点时记入索引"""
+        with self._lock:
+            if line == len(checkpoints) * self.interval:
+                checkpoints.append(offset)
+
+class RangedFileReader:
+    """按字节范围或行窗口读取文本文件，用于编辑器分页加载
+    
+    本地文件通过mmap读取，远程文件用SFTP readv 并发请求指定范围。编码只在首次读取时根据
+    文件开头的样本判断一次，之后由客户端带回；分块用增量解码器解码，分块末尾不完整的
+    多字节字符留给下一个分块。样本之后的内容不符合该编码时，分块带回 suggested_encoding，
+    客户端可以按建议的编码重新加载。
+    """
+    
+    ENCODINGS = ('utf-8', 'gbk')
+    
+    def __init__(self, file_manager, file_path):
+        self.file_manager = file_manager
+        self.file_path = file_path
+        self.size = 0
+        self.version = None
+        self._file = None
+        self._mmap = None
+        self._checkpoints = None
+    
+    def __enter__(self):
+        if self.file_manager.mode == 'local':
+            self._file = open(self.file_path, 'rb')
+            st = os.fstat(self._file.fileno())
+            self.size = st.st_size
+            # 空文件不能映射
+            if self.size:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._file = self.file_manager.sftp.open(self.file_path, 'rb')
+            st = self._file.stat()
+            self.size = st.st_size
+        self.version = file_version(st)
+        self._checkpoints = self.file_manager.line_indexes.get(self.file_manager.cache_host, self.file_path,
+                                                               self.version)
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+    
+    def read(self, offset, length):
+        """读取 [offset, offset+length) 范围内的字节"""
+        length = min(length, self.size - offset)
+        if length <= 0:
+            return b''
+        if self._mmap is not None:
+            return self._mmap[offset:offset + length]
+        return b''.join(self._file.readv([(offset, length)]))
+    
+    def detect_encoding(self):
+        """根据文件开头的样本判断编码"""
+        sample = self.read(0, Config.READ_SNIFF_SIZE)
+        if sample.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        final = len(sample) == self.size
+        for encoding in self.ENCODINGS:
+            try:
+                # 样本末尾可能截断了多字节字符，只有读到文件末尾时才要求完整
+                codecs.getincrementaldecoder(encoding)().decode(sample, final)
+                return encoding
+            except UnicodeDecodeError:
+                continue
+        raise UnicodeDecodeError('sniff', sample, 0, len(sample), '文件编码不支持，无法读取')
+    
+    def read_range(self, offset, length, encoding):
+        """解码 [offset, offset+length) 范围的内容，返回分块信息"""
+        offset = max(0, min(offset, self.size))
+        # 至少能容纳BOM加一个完整字符，保证每次都有进展
+        data = self.read(offset, max(length, 8))
+        if offset and encoding.startswith('utf-8'):
+            # 跳过不完整字符的后续字节，使任意偏移都从字符边界开始
+            skip = 0
+            while skip < min(3, len(data)) and 0x80 <= data[skip] < 0xC0:
+                skip += 1
+            offset += skip
+            data = data[skip:]
+        
+        eof = offset + len(data) >= self.size
+        content, consumed, lossy = self._decode(data, encoding, eof)
+        return {
+            'content': content,
+            'offset': offset,
+            'next_offset': offset + consumed,
+            'size': self.size,
+            'version': self.version,
+            'encoding': encoding,
+            'eof': eof,
+            'lossy': lossy,
+            'suggested_encoding': self._suggest(data, encoding, eof) if lossy else None
+        }
+    
+    def read_lines(self, start_line, line_count, encoding):
+        """读取从第 start_line 行（从0开始）起的 line_count 行"""
+        offset = self.line_offset(start_line)
+        chunk_size = Config.READ_CHUNK_SIZE
+        parts = []
+        position = offset
+        lines = 0
+        # 换行符在utf-8和gbk中都不会出现在多字节字符内部，可以直接按字节查找
+        while lines < line_count and position < self.size:
+            chunk = self.read(position, chunk_size)
+            found = chunk.count(b'\n')
+            if lines + found >= line_count:
+                end = -1
+                for _ in range(line_count - lines):
+                    end = chunk.find(b'\n', end + 1)
+                chunk = chunk[:end + 1]
+                found = line_count - lines
+            parts.append(chunk)
+            lines += found
+            position += len(chunk)
+            if position - offset > Config.READ_MAX_LENGTH:
+                raise ValueError(f'请求的行窗口超过 {Config.READ_MAX_LENGTH} 字节')
+        
+        data = b''.join(parts)
+        eof = position >= self.size
+        content, consumed, lossy = self._decode(data, encoding, True)
+        if eof and data and not data.endswith(b'\n'):
+            lines += 1
+        return {
+            'content': content,
+            'offset': offset,
+            'next_offset': offset + consumed,
+            'size': self.size,
+            'version': self.version,
+            'encoding': encoding,
+            'eof': eof,
+            'lossy': lossy,
+            'suggested_encoding': self._suggest(data, encoding, True) if lossy else None,
+            'start_line': start_line,
+            'line_count': lines,
+            'next_line': start_line + lines
+        }
+    
+    def line_offset(self, line):
+        """第 line 行（从0开始）开头的字节偏移，超过总行数时返回文件大小
+        
+        从行偏移索引中不超过 line 的最近检查点开始扫描，途经的检查点记入索引。
+        """
+        index = self.file_manager.line_indexes
+        current, position = index.nearest(self._checkpoints, line)
+        if current == line:
+            return position
+        chunk_size = Config.READ_CHUNK_SIZE
+        while position < self.size:
+            chunk = self.read(position, chunk_size)
+            available = chunk.count(b'\n')
+            start = 0
+            while True:
+                # 先停在下一个检查点，记入索引后再继续
+                target = min(line, (current // index.interval + 1) * index.interval)
+                need = target - current
+                if available < need:
+                    current += available
+                    break
+                end = start - 1
+                for _ in range(need):
+                    end = chunk.find(b'\n', end + 1)
+                available -= need
+                start = end + 1
+                current = target
+                index.record(self._checkpoints, current, position + start)
+                if current == line:
+                    return position + start
+            position += len(chunk)
+        return self.size
+    
+    def _suggest(self, data, encoding, final):
+        """按 encoding 解码有损时，返回能完整解码这段内容的其他编码（没有时返回None）"""
+        for candidate in self.ENCODINGS:
+            if encoding.startswith(candidate):
+                continue
+            try:
+                codecs.getincrementaldecoder(candidate)().decode(data, final)
+                return candidate
+            except UnicodeDecodeError:
+                continue
+        return None
+    
+    def _decode(self, data, encoding, final):
+        """增量解码，返回 (文本, 已解码的字节数, 是否有无法解码而被替换的内容)"""
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            content = decoder.decode(data, final)
+            lossy = False
+        except UnicodeDecodeError:
+            decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+            content = decoder.decode(data, final)
+            lossy = True
+        pending = decoder.getstate()[0]
+        return content, len(data) - len(pending), lossy
+
+class FileConflict(Exception):
+    """保存时文件已被修改：版本或补丁位置的原内容与编辑器加载时不一致"""
+    
+    def __init__(self, version=None):
+        super().__init__(version)
+        self.version = version
+
+class AtomicFileWriter:
+    """原子写入文件：新内容写入同目录下的临时文件，写完后改名替换原文件
+    
+    写入过程中连接中断或进程退出时原文件保持不变。远程文件的备份在服务器端完成，不经过本机中转：
+    依次尝试 cp --reflink=auto（需要执行命令权限）、SFTP copy-data 扩展和 hardlink@openssh.com
+    硬链接，都不可用时在替换前把原文件改名为备份文件。
+    
+    patch 只上传修改的部分：未修改的范围在服务器端从原文件复制到临时文件（copy-data 扩展或 dd），
+    都不可用时才经本机读出再写入。
+    """
+    
+    BACKUP_SUFFIX = '.backup'
+    
+    def __init__(self, file_manager):
+        self.file_manager = file_manager
+    
+    @staticmethod
+    def encode_chunks(content, encoding='utf-8', newline=None, chunk_size=None):
+        """把字符串按块编码为字节，newline 不为空时替换其中的换行符"""
+        chunk_size = chunk_size or Config.WRITE_CHUNK_SIZE
+        encoder = codecs.getincrementalencoder(encoding)()
+        for start in range(0, len(content), chunk_size):
+            text = content[start:start + chunk_size]
+            if newline:
+                text = text.replace('\n', newline)
+            yield encoder.encode(text)
+        yield encoder.encode('', final=True)
+    
+    def write(self, file_path, chunks, backup=True, base_version=None):
+        """把 chunks（字节块的可迭代对象）写入文件，返回 {'backup': 备份方式, 'version': 新版本, 'size': 新大小}
+        
+        base_version 不为空且与文件当前版本不一致时抛出 FileConflict。
+        """
+        in_place = ('wb', lambda f, st: self._stream(f, chunks))
+        if self.file_manager.mode == 'local':
+            return self._replace_local(file_path, lambda f, source, st: self._stream(f, chunks),
+                                       backup, base_version, in_place)
+        return self._replace_remote(file_path, lambda sftp, f, temp, source, st: self._stream(f, chunks),
+                                    backup, base_version, in_place)
+    
+    def patch(self, file_path, hunks, backup=True, base_version=None):
+        """按 hunks 修改文件，返回值同 write
+        
+        hunks 为按偏移排序、互不重叠的 (字节偏移, 原长度, 新内容, 原内容) 列表，原内容为 None 时不校验。
+        无法改名替换时原地修改，长度改变时重写第一处修改之后的内容。
+        """
+        in_place = ('r+b', lambda f, st: self._patch_in_place(f, st, hunks))
+        if self.file_manager.mode == 'local':
+            return self._replace_local(file_path, lambda f, source, st: self._fill_local(f, source, st, hunks),
+                                       backup, base_version, in_place)
+        return self._replace_remote(file_path,
+                                    lambda sftp, f, temp, source, st: self._fill_remote(sftp, f, temp, source, st, hunks),
+                                    backup, base_version, in_place)
+    
+    @staticmethod
+    def _sibling(paths, path, tag):
+        """与 path 同目录的临时文件名，改名时不会跨文件系统"""
+        directory, name = paths.split(path)
+        return paths.join(directory, f'.{name}.{tag}-{uuid.uuid4().hex[:12]}')
+    
+    @classmethod
+    def _stream(cls, f, chunks):
+        cls._write_all(f, ((None, chunk) for chunk in chunks))
+    
+    @staticmethod
+    def _write_all(f, writes):
+        """依次执行 writes 中的 (偏移或None, 数据) 写入，返回时全部写入都已完成
+        
+        SFTP文件以流水线方式写入，不等待每个写请求的响应；最后一个写请求在关闭流水线后发出，paramiko 会在
+        这次写入中按顺序收齐之前所有写请求的响应并检查错误（只使用公开的 set_pipelined/write）。每次写入不超过
+        一个SFTP请求的大小，等待响应的只有最后一个请求。写入期间不能在同一SFTP连接上发出其他请求：paramiko
+        会丢弃途中收到的写响应，之后再等待这些响应时会一直阻塞。
+        """
+        pipelined = hasattr(f, 'set_pipelined')
+        piece = getattr(f, 'MAX_REQUEST_SIZE', None)
+        
+        def pieces():
+            for offset, data in writes:
+                if not data:
+                    continue
+                if piece is None or len(data) <= piece:
+                    yield offset, data
+                    continue
+                for start in range(0, len(data), piece):
+                    yield offset if start == 0 else None, data[start:start + piece]
+        
+        def write(offset, data):
+            if offset is not None:
+                f.seek(offset)
+            f.write(data)
+        
+        last = None
+        if pipelined:
+            f.set_pipelined(True)
+        try:
+            for item in pieces():
+                if last is not None:
+                    write(*last)
+                last = item
+            if pipelined:
+                f.set_pipelined(False)
+            if last is not None:
+                write(*last)
+        finally:
+            if pipelined:
+                f.set_pipelined(False)
+    
+    @staticmethod
+    def _check_version(st, base_version):
+        if base_version is None:
+            return
+        version = file_version(st) if st is not None else None
+        if version != base_version:
+            raise FileConflict(version)
+    
+    @staticmethod
+    def _result(method, st):
+        return {'backup': method, 'version': file_version(st), 'size': st.st_size}
+    
+    @staticmethod
+    def _segments(hunks, size):
+        """新文件由原文件的未修改范围和补丁内容组成，返回 (复制段 [(源偏移, 目标偏移, 长度)], 写入段 [(目标偏移, 内容)])"""
+        copies, writes = [], []
+        position = target = 0
+        for offset, length, data, _ in hunks:
+            if offset < position or offset + length > size:
+                raise ValueError('补丁范围超出文件或相互重叠')
+            if offset > position:
+                copies.append((position, target, offset - position))
+                target += offset - position
+            if data:
+                writes.append((target, data))
+                target += len(data)
+            position = offset + length
+        if position < size:
+            copies.append((position, target, size - position))
+        return copies, writes
+    
+    @staticmethod
+    def _verify(hunks, read):
+        """校验补丁位置的原内容，read(偏移, 长度) 读取原文件"""
+        for offset, length, _, expected in hunks:
+            if expected is not None and read(offset, length) != expected:
+                raise FileConflict()
+    
+    def _patch_in_place(self, f, st, hunks):
+        self._segments(hunks, st.st_size)
+        
+        def read(offset, length):
+            f.seek(offset)
+            return f.read(length)
+        
+        self._verify(hunks, read)
+        if all(len(data) == length for _, length, data, _ in hunks):
+            self._write_all(f, ((offset, data) for offset, _, data, _ in hunks))
+            return
+        
+        start = hunks[0][0]
+        tail = read(start, st.st_size - start)
+        parts, position = [], start
+        for offset, length, data, _ in hunks:
+            parts.append(tail[position - start:offset - start])
+            parts.append(data)
+            position = offset + length
+        parts.append(tail[position - start:])
+        data = b''.join(parts)
+        self._write_all(f, [(start, data)])
+        f.truncate(start + len(data))
+    
+    def _replace_local(self, file_path, fill, backup, base_version, in_place):
+        # 符号链接替换的是它指向的文件，链接本身保持不变
+        target = os.path.realpath(file_path)
+        st = self._stat_local(target)
+        self._check_version(st, base_version)
+        # 改名替换会拆开硬链接、丢掉扩展属性（包括 ACL），这些情况只能原地写入
+        if st is not None and (st.st_nlink > 1 or self._has_xattrs(target)):
+            return self._in_place_local(target, st, in_place)
+        
+        temp = self._sibling(os.path, target, 'tmp')
+        try:
+            f = open(temp, 'xb')
+        except PermissionError:
+            # 目录不可写时无法创建临时文件，只能原地写入
+            return self._in_place_local(target, st, in_place)
+        if st is not None and not self._preserve_owner(f, st):
+            f.close()
+            self._remove_local(temp)
+            return self._in_place_local(target, st, in_place)
+        
+        try:
+            with f:
+                fill(f, target, st)
+                f.flush()
+                os.fsync(f.fileno())
+            if st is not None:
+                os.chmod(temp, stat.S_IMODE(st.st_mode))
+                # 写入期间文件可能又被修改
+                self._check_version(self._stat_local(target), base_version)
+            method = self._backup_local(target) if backup and st is not None else None
+            os.replace(temp, target)
+            return self._result(method, os.stat(target))
+        except Exception:
+            self._remove_local(temp)
+            raise
+    
+    def _in_place_local(self, target, st, in_place):
+        mode, fill_in_place = in_place
+        with open(target, mode) as f:
+            fill_in_place(f, st)
+        return self._result(None, os.stat(target))
+    
+    @staticmethod
+    def _has_xattrs(path):
+        if not hasattr(os, 'listxattr'):
+            return False
+        try:
+            return bool(os.listxattr(path))
+        except OSError:
+            return False
+    
+    @staticmethod
+    def _preserve_owner(f, st):
+        """把临时文件的属主改为原文件的属主，无法保持时返回 False"""
+        if not hasattr(os, 'fchown'):
+            return True
+        try:
+            os.fchown(f.fileno(), st.st_uid, st.st_gid)
+            return True
+        except PermissionError:
+            # 属主本来就相同时没有权限也无妨
+            current = os.fstat(f.fileno())
+            return (current.st_uid, current.st_gid) == (st.st_uid, st.st_gid)
+    
+    def _fill_local(self, f, source, st, hunks):
+        with open(source, 'rb') as reader:
+            def read(offset, length):
+                reader.seek(offset)
+                return reader.read(length)
+            
+            self._verify(hunks, read)
+            copies, writes = self._segments(hunks, st.st_size)
+            for offset, target, length in copies:
+                reader.seek(offset)
+                f.seek(target)
+                while length > 0:
+                    data = reader.read(min(length, Config.READ_CHUNK_SIZE))
+                    if not data:
+                        raise FileConflict()
+                    f.write(data)
+                    length -= len(data)
+            for target, data in writes:
+                f.seek(target)
+                f.write(data)
+    
+    @staticmethod
+    def _stat_local(path):
+        try:
+            return os.stat(path)
+        except FileNotFoundError:
+            return None
+    
+    def _backup_local(self, target):
+        backup_path = target + self.BACKUP_SUFFIX
+        temp = self._sibling(os.path, backup_path, 'tmp')
+        try:
+            try:
+                os.link(target, temp)
+                method = 'hardlink'
+            except OSError:
+                shutil.copy2(target, temp)
+                method = 'copy'
+            os.replace(temp, backup_path)
+            return method
+        except OSError:
+            # 备份失败不影响保存
+            self._remove_local(temp)
+            return None
+    
+    @staticmethod
+    def _remove_local(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    
+    def _replace_remote(self, file_path, fill, backup, base_version, in_place):
+        sftp = self.file_manager.sftp
+        target = file_path
+        try:
+            attrs = sftp.lstat(file_path)
+            if stat.S_ISLNK(attrs.st_mode):
+                target = sftp.normalize(file_path)
+                attrs = sftp.stat(target)
+        except FileNotFoundError:
+            attrs = None
+        self._check_version(attrs, base_version)
+        # SFTP 属性中没有链接数，能执行命令时才检查硬链接
+        if attrs is not None and self._link_count_remote(target) > 1:
+            return self._in_place_remote(sftp, target, attrs, in_place)
+        
+        temp = self._sibling(posixpath, target, 'tmp')
+        try:
+            f = sftp.open(temp, 'wbx')
+        except PermissionError:
+            return self._in_place_remote(sftp, target, attrs, in_place)
+        if attrs is not None and not self._preserve_owner_remote(f, attrs):
+            f.close()
+            self._remove_remote(sftp, temp)
+            return self._in_place_remote(sftp, target, attrs, in_place)
+        
+        backup_path = target + self.BACKUP_SUFFIX
+        moved = False
+        try:
+            with f:
+                fill(sftp, f, temp, target, attrs)
+                if attrs is not None:
+                    f.chmod(stat.S_IMODE(attrs.st_mode))
+            if attrs is not None:
+                self._check_version(self._stat_remote(sftp, target), base_version)
+            method = self._backup_remote(sftp, target, attrs) if backup and attrs is not None else None
+            if method == 'rename':
+                self._rename(sftp, target, backup_path)
+                moved = True
+            self._rename(sftp, temp, target)
+            return self._result(method, sftp.stat(target))
+        except Exception:
+            if moved:
+                self._rename(sftp, backup_path, target)
+            self._remove_remote(sftp, temp)
+            raise
+    
+    @staticmethod
+    def _in_place_remote(sftp, target, attrs, in_place):
+        mode, fill_in_place = in_place
+        with sftp.open(target, mode) as f:
+            fill_in_place(f, attrs)
+        return AtomicFileWriter._result(None, sftp.stat(target))
+    
+    def _link_count_remote(self, target):
+        """远程文件的硬链接数，无法执行命令时返回 1"""
+        file_manager = self.file_manager
+        if not file_manager.can_exec():
+            return 1
+        path = shlex.quote(target)
+        # GNU stat 用 -c，BSD stat 用 -f
+        try:
+            status, output, _ = file_manager.run_remote_command(
+                f'stat -c %h -- {path} 2>/dev/null || stat -f %l -- {path}', timeout=Config.SSH_TIMEOUT)
+            return int(output.strip()) if status == 0 else 1
+        except (OSError, ValueError, paramiko.SSHException):
+            return 1
+    
+    @staticmethod
+    def _preserve_owner_remote(f, attrs):
+        """同 _preserve_owner，作用于远程临时文件"""
+        if attrs.st_uid is None or attrs.st_gid is None:
+            return True
+        try:
+            f.chown(attrs.st_uid, attrs.st_gid)
+            return True
+        except PermissionError:
+            current = f.stat()
+            return (current.st_uid, current.st_gid) == (attrs.st_uid, attrs.st_gid)
+    
+    def _fill_remote(self, sftp, f, temp, source, attrs, hunks):
+        with sftp.open(source, 'rb') as reader:
+            self._verify(hunks, lambda offset, length: b''.join(reader.readv([(offset, length)])) if length else b'')
+            copies, writes = self._segments(hunks, attrs.st_size)
+            if copies and not self._copy_ranges_server(sftp, reader, f, source, temp, copies):
+                self._copy_ranges_stream(reader, f, copies)
+            self._write_all(f, writes)
+    
+    def _copy_ranges_server(self, sftp, reader, f, source, temp, copies):
+        """在服务器端把原文件的各个范围复制到临时文件，不可用时返回 False"""
+        file_manager = self.file_manager
+        if file_manager.supports_sftp_extension('copy-data'):
+            try:
+                for offset, target, length in copies:
+                    if not file_manager.sftp_extension(sftp, 'copy-data', reader.handle, paramiko.sftp.int64(offset),
+                                                       paramiko.sftp.int64(length), f.handle,
+                                                       paramiko.sftp.int64(target)):
+                        break
+                else:
+                    return True
+            except (OSError, paramiko.SSHException):
+                pass
+        
+        if file_manager.can_exec():
+            source, temp = shlex.quote(source), shlex.quote(temp)
+            # GNU dd 支持按字节指定偏移和长度，其他实现执行失败时改为经本机复制
+            command = ' && '.join(
+                f'dd if={source} of={temp} bs=1M skip={offset} seek={target} count={length} '
+                f'iflag=skip_bytes,count_bytes oflag=seek_bytes conv=notrunc status=none'
+                for offset, target, length in copies
+            )
+            try:
+                status, _, _ = file_manager.run_remote_command(command)
+                return status == 0
+            except (OSError, paramiko.SSHException):
+                pass
+        return False
+    
+    @staticmethod
+    def _copy_ranges_stream(reader, f, copies):
+        chunk_size = Config.READ_CHUNK_SIZE
+        # 每批最多 READ_MAX_LENGTH 字节，整批读完再写入：边读边写时服务器忙于发送读响应而不处理写请求，
+        # 双方的通道窗口会被占满而互相等待
+        batch = max(1, Config.READ_MAX_LENGTH // chunk_size)
+        for offset, target, length in copies:
+            f.seek(target)
+            ranges = [(offset + start, min(chunk_size, length - start)) for start in range(0, length, chunk_size)]
+            for index in range(0, len(ranges), batch):
+                blocks = list(reader.readv(ranges[index:index + batch]))
+                AtomicFileWriter._write_all(f, [(None, data) for data in blocks])
+    
+    @staticmethod
+    def _stat_remote(sftp, path):
+        try:
+            return sftp.stat(path)
+        except FileNotFoundError:
+            return None
+    
+    def _backup_remote(self, sftp, target, attrs):
+        """在服务器端把原文件复制为备份，返回使用的方式；都不可用时返回 rename，由调用方改名"""
+        backup_path = target + self.BACKUP_SUFFIX
+        for method, copy in (('cp', self._copy_exec), ('copy-data', self._copy_data),
+                             ('hardlink', self._copy_hardlink)):
+            temp = self._sibling(posixpath, backup_path, 'tmp')
+            try:
+                if copy(sftp, target, temp, attrs):
+                    self._rename(sftp, temp, backup_path)
+                    return method
+            except (OSError, paramiko.SSHException):
+                pass
+            self._remove_remote(sftp, temp)
+        return 'rename'
+    
+    def _copy_exec(self, sftp, source, destination, attrs):
+        file_manager = self.file_manager
+        if not file_manager.can_exec():
+            return False
+        source, destination = shlex.quote(source), shlex.quote(destination)
+        # 不支持 --reflink 的 cp（BSD、busybox）退回普通复制
+        command = (f'cp --reflink=auto -p -- {source} {destination} 2>/dev/null'
+                   f' || cp -p -- {source} {destination}')
+        status, _, _ = file_manager.run_remote_command(command)
+        return status == 0
+    
+    def _copy_data(self, sftp, source, destination, attrs):
+        file_manager = self.file_manager
+        if not file_manager.supports_sftp_extension('copy-data'):
+            return False
+        with sftp.open(source, 'rb') as reader, sftp.open(destination, 'wbx') as writer:
+            # 读取长度为 0 表示复制到文件末尾
+            if not file_manager.sftp_extension(sftp, 'copy-data', reader.handle, paramiko.sftp.int64(0),
+                                               paramiko.sftp.int64(0), writer.handle, paramiko.sftp.int64(0)):
+                return False
+            writer.chmod(stat.S_IMODE(attrs.st_mode))
+        return True
+    
+    def _copy_hardlink(self, sftp, source, destination, attrs):
+        return self.file_manager.sftp_extension(sftp, 'hardlink@openssh.com', source, destination)
+    
+    def _rename(self, sftp, source, destination):
+        """覆盖目标的原子改名；服务器不支持 posix-rename 扩展时先删除目标再改名"""
+        if self.file_manager.sftp_extension(sftp, 'posix-rename@openssh.com', source, destination):
+            return
+        try:
+            sftp.remove(destination)
+        except FileNotFoundError:
+            pass
+        sftp.rename(source, destination)
+    
+    @staticmethod
+    def _remove_remote(sftp, path):
+        try:
+            sftp.remove(path)
+        except (OSError, paramiko.SSHException):
+            pass
+
+class _PooledHost:
+    """连接池中单个主机的SSH传输及其SFTP通道"""
+    
+    def __init__(self, ssh, credential):
+        self.ssh = ssh
+        self.credentials = {credential}  # 已由服务器验证过、可以共用该传输的凭据摘要
+        self.idle_channels = []  # [(sftp, 最后使用时间)]
+        self.channel_count = 0
+        self.in_use = 0
+        self.holders = 1  # 使用该传输的客户端数，为0后由空闲回收机制关闭
+        self.last_used = time.time()
+    
+    def is_active(self):
+        transport = self.ssh.get_transport()
+        return transport is not None and transport.is_active()
+
+class SSHConnectionPool:
+    """按 username@host:port 管理SSH传输，每个传输上维护多个SFTP通道
+    
+    由所有客户端共用：连接同一主机的多个页面共用一个传输，主机数量上限和空闲回收对所有客户端生效。
+    关闭连接可能很慢，总是在释放锁之后进行，不会阻塞其他借用通道的请求。
+    """
+    
+    def __init__(self, max_hosts=None, channels_per_host=None, idle_timeout=None):
+        self.max_hosts = max_hosts or Config.SSH_POOL_MAX_HOSTS
+        self.channels_per_host = channels_per_host or Config.SFTP_POOL_SIZE
+        self.idle_timeout = idle_timeout or Config.SSH_POOL_IDLE_TIMEOUT
+        self._hosts = OrderedDict()  # connection_id -> _PooledHost
+        self._cond = threading.Condition()
+        self.stats = {'checkouts': 0, 'reused': 0, 'opened': 0, 'waits': 0, 'evicted': 0, 'shared': 0}
+    
+    def open(self, connection_id, credential, connect):
+        """获取主机的SSH客户端并登记一个持有者
+        
+        已有可用的传输、且 credential（凭据摘要）已验证过时直接共用；否则在锁外调用 connect()
+        新建并认证连接。认证成功时如果其他客户端已登记了可用的传输，继续共用那个传输并关闭新建的连接。
+        """
+        with self._cond:
+            host = self._hosts.get(connection_id)
+            if host is not None and credential in host.credentials and host.is_active():
+                return self._hold_locked(connection_id, host)
+        
+        ssh = connect()
+        to_close = []
+        with self._cond:
+            host = self._hosts.get(connection_id)
+            if host is not None and host.is_active():
+                host.credentials.add(credential)
+                to_close.append(ssh)
+                ssh = self._hold_locked(connection_id, host)
+            else:
+                if host is not None:
+                    del self._hosts[connection_id]
+                    to_close.append(host)
+                    self._cond.notify_all()
+                self._hosts[connection_id] = _PooledHost(ssh, credential)
+                to_close.extend(self._evict_locked())
+        self._close(to_close)
+        return ssh
+    
+    def _hold_locked(self, connection_id, host):
+        self.stats['shared'] += 1
+        host.holders += 1
+        host.last_used = time.time()
+        self._hosts.move_to_end(connection_id)
+        return host.ssh
+    
+    def release_host(self, connection_id, ssh, close=False):
+        """释放 open 登记的持有者；close 为真且没有其他持有者时立即关闭，否则之后由空闲回收机制关闭
+        
+        主机的传输已被替换（原传输失效后重新连接）时不做任何事，原传输在替换时已经关闭。
+        """
+        with self._cond:
+            host = self._hosts.get(connection_id)
+            if host is None or host.ssh is not ssh:
+                return
+            host.holders = max(host.holders - 1, 0)
+            host.last_used = time.time()
+            if not close or host.holders:
+                return
+            del self._hosts[connection_id]
+            self._cond.notify_all()
+        self._close([host])
+    
+    def get_client(self, connection_id):
+        """获取主机的SSH客户端"""
+        with self._cond:
+            host = self._hosts.get(connection_id)
+            return host.ssh if host else None
+    
+    @contextmanager
+    def checkout(self, connection_id):
+        """借出一个SFTP通道，使用完毕后自动归还"""
+        sftp, host = self._acquire(connection_id)
+        broken = False
+        try:
+            yield sftp
+        except (EOFError, OSError, paramiko.SSHException):
+            broken = sftp.sock.closed
+            raise
+        finally:
+            self._release(host, sftp, broken)
+    
+    def _acquire(self, connection_id):
+        deadline = time.time() + Config.SFTP_POOL_WAIT_TIMEOUT
+        self.evict_idle()
+        with self._cond:
+            while True:
+                host = self._hosts.get(connection_id)
+                if host is None:
+                    raise paramiko.SSHException(f"连接池中没有主机: {connection_id}")
+                self.stats['checkouts'] += 1
+                host.in_use += 1
+                host.last_used = time.time()
+                self._hosts.move_to_end(connection_id)
+                if host.idle_channels:
+                    self.stats['reused'] += 1
+                    return host.idle_channels.pop()[0], host
+                if host.channel_count < self.channels_per_host:
+                    host.channel_count += 1
+                    break
+                
+                # 通道已全部借出，等待归还
+                host.in_use -= 1
+                self.stats['checkouts'] -= 1
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise paramiko.SSHException("等待可用SFTP通道超时")
+                self.stats['waits'] += 1
+                self._cond.wait(remaining)
+        
+        # 在锁外打开新通道，避免阻塞其他请求
+        try:
+            sftp = host.ssh.open_sftp()
+        except Exception:
+            with self._cond:
+                host.channel_count -= 1
+                host.in_use -= 1
+                self._cond.notify()
+            raise
+        self.stats['opened'] += 1
+        return sftp, host
+    
+    def _release(self, host, sftp, broken=False):
+        with self._cond:
+            host.in_use -= 1
+            host.last_used = time.time()
+            if broken or host not in self._hosts.values():
+                host.channel_count -= 1
+                to_close = sftp
+            else:
+                host.idle_channels.append((sftp, time.time()))
+                to_close = None
+            self._cond.notify()
+        if to_close:
+            try:
+                to_close.close()
+            except Exception:
+                pass
+    
+    def evict_idle(self):
+        """回收空闲超时的通道和主机"""
+        with self._cond:
+            to_close = self._evict_locked()
+        self._close(to_close)
+    
+    def _evict_locked(self):
+        """从池中摘下空闲超时的通道和主机，返回需要关闭的对象（由调用方在锁外关闭）"""
+        now = time.time()
+        to_close = []
+        for connection_id, host in list(self._hosts.items()):
+            fresh = []
+            for sftp, last_used in host.idle_channels:
+                if now - last_used > self.idle_timeout:
+                    to_close.append(sftp)
+                    host.channel_count -= 1
+                else:
+                    fresh.append((sftp, last_used))
+            host.idle_channels = fresh
+            
+            if not host.holders and host.in_use == 0 and now - host.last_used > self.idle_timeout:
+                del self._hosts[connection_id]
+                to_close.append(host)
+        
+        # 超出主机数量上限时，按最近最少使用顺序回收没有持有者的主机
+        for connection_id in list(self._hosts.keys()):
+            if len(self._hosts) <= self.max_hosts:
+                break
+            host = self._hosts[connection_id]
+            if not host.holders and host.in_use == 0:
+                del self._hosts[connection_id]
+                to_close.append(host)
+        
+        self.stats['evicted'] += len(to_close)
+        return to_close
+    
+    def _close(self, items):
+        """关闭主机（_PooledHost）、SFTP通道或SSH客户端，忽略关闭时的错误"""
+        for item in items:
+            if isinstance(item, _PooledHost):
+                self._close_host(item)
+            else:
+                try:
+                    item.close()
+                except Exception:
+                    pass
+    
+    def _close_host(self, host):
+        for sftp, _ in host.idle_channels:
+            try:
+                sftp.close()
+            except Exception:
+                pass
+        host.idle_channels = []
+        try:
+            host.ssh.close()
+        except Exception:
+            pass
+    
+    def get_stats(self):
+        """获取连接池统计信息"""
+        with self._cond:
+            hosts = {
+                connection_id: {
+                    'channels': host.channel_count,
+                    'idle': len(host.idle_channels),
+                    'in_use': host.in_use,
+                    'holders': host.holders
+                }
+                for connection_id, host in self._hosts.items()
+            }
+        return dict(self.stats, hosts=hosts)
+
+class HashCache:
+    """持久化的文件哈希缓存，按 (主机, 路径) 存储，并用大小和修改时间校验有效性"""
+    
+    def __init__(self, db_path=None, max_entries=None):
+        self.db_path = db_path or Config.HASH_CACHE_FILE
+        self.max_entries = max_entries or Config.HASH_CACHE_MAX_ENTRIES
+        self._conn = None
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0}
+    
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS file_hash ('
+                'host TEXT NOT NULL, path TEXT NOT NULL, size INTEGER NOT NULL, '
+                'mtime REAL NOT NULL, digest TEXT NOT NULL, last_used REAL NOT NULL, '
+                'PRIMARY KEY (host, path))'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_file_hash_last_used ON file_hash (last_used)')
+            self._conn.commit()
+        return self._conn
+    
+    def get_many(self, host, entries):
+        """批量查询缓存，entries 为 {路径: (大小, 修改时间)}，返回命中的 {路径: MD5}"""
+        found = {}
+        if not entries:
+            return found
+        try:
+            with self._lock:
+                conn = self._connect()
+                paths = list(entries)
+                for i in range(0, len(paths), 500):
+                    batch = paths[i:i + 500]
+                    rows = conn.execute(
+                        'SELECT path, size, mtime, digest FROM file_hash WHERE host = ? AND path IN (%s)'
+                        % ','.join('?' * len(batch)),
+                        [host] + batch
+                    ).fetchall()
+                    for path, size, mtime, digest in rows:
+                        if (size, mtime) == tuple(entries[path]):
+                            found[path] = digest
+                        else:
+                            self.stats['stale'] += 1
+                
+                if found:
+                    now = time.time()
+                    conn.executemany(
+                        'UPDATE file_hash SET last_used = ? WHERE host = ? AND path = ?',
+                        [(now, host, path) for path in found]
+                    )
+                    conn.commit()
+        except sqlite3.Error as e:
+            print(f"读取哈希缓存失败: {e}")
+        
+        self.stats['hits'] += len(found)
+        self.stats['misses'] += len(entries) - len(found)
+        return found
+    
+    def put_many(self, host, records):
+        """批量写入缓存，records 为 [(路径, 大小, 修改时间, MD5)]"""
+        if not records:
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                now = time.time()
+                conn.executemany(
+                    'INSERT OR REPLACE INTO file_hash (host, path, size, mtime, digest, last_used) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    [(host, path, size, mtime, digest, now) for path, size, mtime, digest in records]
+                )
+                self._writes_since_trim += len(records)
+                # 每写入一定数量后检查一次容量，按最近最少使用淘汰
+                if self._writes_since_trim >= max(1, self.max_entries // 100):
+                    self._writes_since_trim = 0
+                    self._trim_locked(conn)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"写入哈希缓存失败: {e}")
+    
+    def _trim_locked(self, conn):
+        count = conn.execute('SELECT COUNT(*) FROM file_hash').fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute(
+                'DELETE FROM file_hash WHERE rowid IN '
+                '(SELECT rowid FROM file_hash ORDER BY last_used LIMIT ?)',
+                (excess,)
+            )
+            self.stats['evictions'] += excess
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute('DELETE FROM file_hash')
+            conn.commit()
+    
+    def get_stats(self):
+        """获取缓存统计信息"""
+        stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0
+        try:
+            with self._lock:
+                stats['entries'] = self._connect().execute('SELECT COUNT(*) FROM file_hash').fetchone()[0]
+        except sqlite3.Error:
+            stats['entries'] = None
+        stats['max_entries'] = self.max_entries
+        return stats
+
+class FileHasher:
+    """文件哈希引擎：支持SFTP预读、多通道并行计算和服务器端md5sum"""
+    
+    MODES = ('prefetch', 'parallel', 'server')
+    
+    def __init__(self, file_manager, cache=None):
+        self.file_manager = file_manager
+        self.cache = cache
+    
+    def hash_file(self, filepath, sftp=None, size=None, mtime=None):
+        """获取单个文件的MD5值，优先使用哈希缓存"""
+        return self.hash_files([filepath], stats={filepath: (size, mtime)} if size is not None else None,
+                               sftp=sftp).get(filepath)
+    
+    def _compute_hash(self, filepath, sftp=None):
+        """计算单个文件的MD5值，远程文件使用预读流水线读取"""
+        try:
+            hash_md5 = hashlib.md5()
+            if self.file_manager.mode == 'local':
+                with open(filepath, 'rb') as f:
+                    for chunk in iter(lambda: f.read(Config.HASH_CHUNK_SIZE), b""):
+                        hash_md5.update(chunk)
+            else:
+                sftp = sftp or self.file_manager.sftp
+                with sftp.open(filepath, 'rb') as f:
+                    # 一次性发出多个读请求，避免每块都等待一次往返
+                    f.prefetch(f.stat().st_size, Config.SFTP_PREFETCH_REQUESTS)
+                    for chunk in iter(lambda: f.read(Config.HASH_CHUNK_SIZE), b""):
+                        hash_md5.update(chunk)
+            return hash_md5.hexdigest()
+        except Exception:
+            return None
+    
+    def hash_files(self, paths, mode=None, stats=None, sftp=None):
+        """批量获取文件MD5值，返回 {路径: MD5或None}
+        
+        stats 为 {路径: (大小, 修改时间)}，用于查询哈希缓存；缺失时会先获取文件状态
+        """
+        paths = list(dict.fromkeys(paths))
+        if not paths:
+            return {}
+        
+        results = {}
+        stats = dict(stats or {})
+        if self.cache is not None:
+            missing_stats = [path for path in paths if stats.get(path, (None, None))[0] is None]
+            stats.update(self.stat_files(missing_stats, sftp))
+            known = {path: stats[path] for path in paths if stats.get(path)}
+            results.update(self.cache.get_many(self.file_manager.cache_host, known))
+        
+        pending = [path for path in paths if path not in results]
+        computed = self._compute_hashes(pending, mode, sftp)
+        results.update(computed)
+        
+        if self.cache is not None:
+            self.cache.put_many(self.file_manager.cache_host, [
+                (path, stats[path][0], stats[path][1], digest)
+                for path, digest in computed.items()
+                if digest and stats.get(path)
+            ])
+        return results
+    
+    def stat_files(self, paths, sftp=None):
+        """获取文件的 {路径: (大小, 修改时间)}，无法stat的路径不在结果中
+        
+        远程模式下未指定通道时，把路径分给最多 WALK_MAX_INFLIGHT 个线程，各自从连接池借用通道并行stat。
+        """
+        paths = list(paths)
+        fm = self.file_manager
+        workers = min(Config.WALK_MAX_INFLIGHT, len(paths))
+        if fm.mode == 'local' or sftp is not None or workers <= 1 or not fm.connection_id:
+            return self._stat_files(paths, sftp)
+        
+        def worker(batch):
+            try:
+                with fm.pool.checkout(fm.connection_id) as channel:
+                    return self._stat_files(batch, channel)
+            except paramiko.SSHException:
+                return None
+        
+        batches = [paths[i::workers] for i in range(workers)]
+        stats = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for batch, result in zip(batches, executor.map(worker, batches)):
+                # 借不到通道的批次在当前通道上补做
+                stats.update(self._stat_files(batch) if result is None else result)
+        return stats
+    
+    def _stat_files(self, paths, sftp=None):
+        """在一个通道上依次获取文件的 (大小, 修改时间)"""
+        stats = {}
+        for path in paths:
+            try:
+                if self.file_manager.mode == 'local':
+                    stat_info = os.stat(path)
+                else:
+                    stat_info = (sftp or self.file_manager.sftp).stat(path)
+                stats[path] = (stat_info.st_size, stat_info.st_mtime)
+            except Exception:
+                pass
+        return stats
+    
+    def _compute_hashes(self, paths, mode=None, sftp=None):
+        """按指定模式计算一批文件的MD5值"""
+        if not paths:
+            return {}
+        
+        mode = mode or Config.HASH_MODE
+        if mode == 'auto':
+            if self.file_manager.mode == 'remote' and self.file_manager.can_exec():
+                mode = 'server'
+            else:
+                mode = 'parallel'
+        
+        if mode == 'server' and self.file_manager.mode == 'remote':
+            return self._hash_files_server(paths)
+        if mode == 'parallel' and len(paths) > 1:
+            return self._hash_files_parallel(paths)
+        return {path: self._compute_hash(path, sftp) for path in paths}
+    
+    def _hash_files_parallel(self, paths):
+        """使用线程池并行计算，远程模式下每个线程从连接池借用独立通道"""
+        fm = self.file_manager
+        
+        def worker(path):
+            if fm.mode == 'remote' and fm.connection_id:
+                try:
+                    with fm.pool.checkout(fm.connection_id) as sftp:
+                        return path, self._compute_hash(path, sftp)
+                except paramiko.SSHException:
+                    pass
+            return path, self._compute_hash(path)
+        
+        with ThreadPoolExecutor(max_workers=Config.HASH_WORKERS) as executor:
+            return dict(executor.map(worker, paths))
+    
+    def _hash_files_server(self, paths):
+        """在服务器端执行md5sum，只传回摘要；没有得到摘要的文件改用SFTP并行读取"""
+        results = {path: None for path in paths}
+        for batch in command_batches(paths, Config.REMOTE_HASH_BATCH):
+            command = 'md5sum -- ' + ' '.join(shlex.quote(path) for path in batch)
+            try:
+                status, output, _ = self.file_manager.run_remote_command(command)
+            except Exception:
+                # 执行失败时回退到SFTP并行读取
+                results.update(self._hash_files_parallel(batch))
+                continue
+            
+            found = {}
+            # 退出码 1 表示部分文件无法读取，其余文件照常输出；其他退出码（如没有md5sum命令）时输出不可信
+            if status in (0, 1):
+                for line in output.decode('utf-8', errors='surrogateescape').split('\n'):
+                    digest, path = self._parse_md5sum_line(line)
+                    if path in results:
+                        found[path] = digest
+            results.update(found)
+            missing = [path for path in batch if path not in found]
+            if missing:
+                results.update(self._hash_files_parallel(missing))
+        return results
+    
+    def hash_partial_files(self, sizes, mode=None):
+        """计算文件首尾各 DEDUPE_PARTIAL_SIZE 字节的MD5，sizes 为 {路径: 大小}"""
+        paths = list(sizes)
+        if not paths:
+            return {}
+        
+        mode = mode or Config.HASH_MODE
+        if mode in ('auto', 'server') and self.file_manager.mode == 'remote' and self.file_manager.can_exec():
+            return self._hash_partial_server(sizes)
+        
+        fm = self.file_manager
+        
+        def worker(path):
+            if fm.mode == 'remote' and fm.connection_id:
+                try:
+                    with fm.pool.checkout(fm.connection_id) as sftp:
+                        return path, self._compute_partial_hash(path, sizes[path], sftp)
+                except paramiko.SSHException:
+                    pass
+            return path, self._compute_partial_hash(path, sizes[path])
+        
+        with ThreadPoolExecutor(max_workers=Config.HASH_WORKERS) as executor:
+            return dict(executor.map(worker, paths))
+    
+    def _compute_partial_hash(self, filepath, size, sftp=None):
+        """读取文件首尾两段计算MD5"""
+        length = Config.DEDUPE_PARTIAL_SIZE
+        try:
+            hash_md5 = hashlib.md5()
+            if self.file_manager.mode == 'local':
+                with open(filepath, 'rb') as f:
+                    hash_md5.update(f.read(length))
+                    f.seek(max(size - length, 0))
+                    hash_md5.update(f.read(length))
+            else:
+                sftp = sftp or self.file_manager.sftp
+                with sftp.open(filepath, 'rb') as f:
+                    # 两段读取一起发出，只等待一次往返
+                    for chunk in f.readv([(0, length), (max(size - length, 0), length)]):
+                        hash_md5.update(chunk)
+            return hash_md5.hexdigest()
+        except Exception:
+            return None
+    
+    def _hash_partial_server(self, sizes):
+        """在服务器端用 head/tail 读取首尾两段，每个文件输出一行摘要"""
+        length = Config.DEDUPE_PARTIAL_SIZE
+        paths = list(sizes)
+        results = {path: None for path in paths}
+        for batch in command_batches(paths, Config.REMOTE_HASH_BATCH):
+            command = (
+                'for f in ' + ' '.join(shlex.quote(path) for path in batch) + '; do '
+                f'if [ -r "$f" ]; then {{ head -c {length} -- "$f"; tail -c {length} -- "$f"; }} | md5sum; '
+                'else echo -; fi; done'
+            )
+            try:
+                status, output, _ = self.file_manager.run_remote_command(command)
+                lines = output.decode('utf-8', errors='replace').split('\n')
+                if status != 0 or len(lines) < len(batch):
+                    raise IOError('md5sum输出不完整')
+            except Exception:
+                # 执行失败时回退到SFTP并行读取
+                results.update(self.hash_partial_files({path: sizes[path] for path in batch}, 'parallel'))
+                continue
+            
+            for path, line in zip(batch, lines):
+                digest = line.split(' ', 1)[0].strip().lower()
+                results[path] = digest if len(digest) == 32 else None
+        return results
+    
+    def _parse_md5sum_line(self, line):
+        """解析md5sum输出行，处理含特殊字符文件名的转义格式"""
+        escaped = line.startswith('\\')
+        if escaped:
+            line = line[1:]
+        digest, sep, path = line.partition('  ')
+        if not sep or len(digest) != 32:
+            return None, None
+        if escaped:
+            path = path.replace('\\\\', '\0').replace('\\n', '\n').replace('\\r', '\r').replace('\0', '\\')
+        return digest.lower(), path
+
+class DirectoryMatcher:
+    """目录项匹配器：用索引代替两两比较
+    
+    - 完全匹配：按 (名称, 是否目录) 建立字典
+    - 模糊匹配：文件名字符多重集的前缀过滤生成候选，再用长度、位置和字符重叠上界剪枝，
+      最后才调用完整的名称相似度计算
+    - 数字序列不同的名称会被降权，按数字序列分组后可以整组跳过
+    - 文件按大小分段，只在相邻分段内比较
+    
+    所有剪枝条件都是相似度的严格上界，因此结果与两两比较完全一致。
+    """
+    
+    SIZE_THRESHOLD = 0.9
+    
+    def __init__(self, name_similarity, size_similarity, threshold, size_threshold=SIZE_THRESHOLD):
+        self.name_similarity = name_similarity
+        self.size_similarity = size_similarity
+        self.threshold = threshold
+        self.size_threshold = size_threshold
+        # 数字序列不同时需要达到的原始相似度
+        self.digit_threshold = threshold / Config.NAME_DIGIT_PENALTY
+        # 大小分段宽度（对数），略微放大以抵消浮点误差
+        self._size_band = -math.log(size_threshold) * (1 + 1e-9) if 0 < size_threshold < 1 else None
+    
+    def match(self, items1, items2):
+        """返回 (完全匹配, 相似匹配)，元素为 (item1, item2, 相似度)，顺序与两两比较时一致"""
+        exact_index = {}
+        for item2 in items2:
+            exact_index.setdefault((item2['name'], item2['is_dir']), []).append(item2)
+        
+        fuzzy = self.threshold <= 1
+        if fuzzy:
+            prepared1 = [self._prepare(item) for item in items1]
+            prepared2 = [self._prepare(item) for item in items2]
+            rank = self._token_rank(prepared1 + prepared2)
+            index = self._build_index(prepared2, rank)
+        
+        exact_pairs = []
+        similar_pairs = []
+        for i, item1 in enumerate(items1):
+            for item2 in exact_index.get((item1['name'], item1['is_dir']), ()):
+                exact_pairs.append((item1, item2, 1.0))
+            
+            if not fuzzy:
+                continue
+            for j in self._candidates(prepared1[i], rank, index, prepared2):
+                item2 = items2[j]
+                if item2['name'] == item1['name']:
+                    continue
+                if not item1['is_dir'] and \
+                        self.size_similarity(item1['size'], item2['size']) < self.size_threshold:
+                    continue
+                similarity = self.name_similarity(item1['name'], item2['name'])
+                if similarity >= self.threshold:
+                    similar_pairs.append((item1, item2, similarity))
+        
+        return exact_pairs, similar_pairs
+    
+    def _prepare(self, item):
+        """预处理：去扩展名的小写名称、字符多重集令牌、数字序列和大小分段"""
+        base = os.path.splitext(item['name'])[0].lower()
+        seen = Counter()
+        tokens = []
+        for char in base:
+            seen[char] += 1
+            tokens.append((char, seen[char]))
+        return {
+            'length': len(base),
+            'tokens': tokens,
+            'token_set': frozenset(tokens),
+            'digits': tuple(re.findall(r'\d+', base)),
+            'bucket': self._size_bucket(item)
+        }
+    
+    def _size_bucket(self, item):
+        """目录不分段；空文件单独一段；其余文件按大小对数分段"""
+        if item['is_dir']:
+            return ('dir', 0)
+        size = item['size'] or 0
+        if size <= 0 or self._size_band is None:
+            return ('file', None if self._size_band is None else -1)
+        return ('file', int(math.log(size) / self._size_band))
+    
+    def _neighbor_buckets(self, bucket):
+        kind, value = bucket
+        if kind == 'dir' or value is None or value == -1:
+            return [bucket]
+        return [(kind, value - 1), bucket, (kind, value + 1)]
+    
+    def _token_rank(self, prepared):
+        """按出现频率为令牌排序，稀有令牌优先放入前缀"""
+        frequency = Counter()
+        for record in prepared:
+            frequency.update(record['token_set'])
+        return {token: (count, token) for token, count in frequency.items()}
+    
+    def _min_overlap(self, length):
+        """与任意长度合法的对象达到阈值所需的最少公共字符数"""
+        return math.ceil(self.threshold * length / (2 - self.threshold) - 1e-9)
+    
+    def _prefix(self, record, rank):
+        length = record['length']
+        prefix_length = length - self._min_overlap(length) + 1
+        return sorted(record['tokens'], key=rank.__getitem__)[:prefix_length]
+    
+    def _build_index(self, prepared2, rank):
+        """按大小分段建立前缀令牌倒排索引，另按数字序列分组建立一份"""
+        index = {}
+        for j, record in enumerate(prepared2):
+            bucket = index.setdefault(record['bucket'], {'postings': {}, 'groups': {}, 'empty': [], 'all': []})
+            bucket['all'].append(j)
+            if record['length'] == 0:
+                bucket['empty'].append(j)
+                continue
+            group = bucket['groups'].setdefault(record['digits'], {})
+            for position, token in enumerate(self._prefix(record, rank)):
+                bucket['postings'].setdefault(token, []).append((j, position))
+                group.setdefault(token, []).append((j, position))
+        return index
+    
+    def _candidate_postings(self, record, bucket):
+        """数字序列不同的名称最多得到折扣后的相似度，达不到阈值时只查相同数字序列和无数字的分组"""
+        digits = record['digits']
+        if not digits or self.digit_threshold < 1:
+            return [bucket['postings']]
+        return [bucket['groups'][key] for key in {digits, ()} if key in bucket['groups']]
+    
+    def _pair_threshold(self, record, other):
+        """该对象需要达到的原始相似度"""
+        if record['digits'] and other['digits'] and record['digits'] != other['digits']:
+            return self.digit_threshold
+        return self.threshold
+    
+    def _candidates(self, record, rank, index, prepared2):
+        """生成候选下标（升序），并用长度、位置与字符重叠上界剪枝"""
+        buckets = [index[b] for b in self._neighbor_buckets(record['bucket']) if b in index]
+        length1 = record['length']
+        
+        # 阈值接近0时剪枝无效，退化为同类型全部比较
+        if self.threshold <= 1e-6:
+            return sorted(j for bucket in buckets for j in bucket['all'])
+        
+        if length1 == 0:
+            return sorted(j for bucket in buckets for j in bucket['empty'])
+        
+        postings_list = [postings for bucket in buckets for postings in self._candidate_postings(record, bucket)]
+        
+        # 前缀按全局顺序遍历，首次遇到某个对象时的公共令牌一定是两者的第一个公共令牌，
+        # 因此剩余令牌数给出了重叠数的上界（位置过滤）
+        seen = set()
+        result = []
+        for position, token in enumerate(self._prefix(record, rank)):
+            for postings in postings_list:
+                for j, other_position in postings.get(token, ()):
+                    if j in seen:
+                        continue
+                    seen.add(j)
+                    other = prepared2[j]
+                    threshold = self._pair_threshold(record, other)
+                    if threshold > 1:
+                        continue
+                    total = length1 + other['length']
+                    if 2.0 * min(length1, other['length']) / total < threshold:
+                        continue
+                    remaining = 1 + min(length1 - position - 1, other['length'] - other_position - 1)
+                    if 2.0 * remaining / total < threshold:
+                        continue
+                    if 2.0 * len(record['token_set'] & other['token_set']) / total < threshold:
+                        continue
+                    result.append(j)
+        result.sort()
+        return result
+
+class DuplicateFinder:
+    """递归查找多个根目录下的重复文件
+    
+    逐级筛选：按大小分组 -> 首尾部分哈希 -> 完整哈希，只有前两步都相同的文件才会被完整读取。
+    find() 是生成器，边遍历边比较：同大小的候选文件累计到一批就开始哈希，每确认一组重复文件就立即产出。
+    之后遍历到的同组文件会使该组以相同的 id 再次产出（包含全部文件），调用方应替换之前的结果。
+    只比较普通文件；硬链接（设备号和inode相同）只保留遇到的第一个路径。
+    """
+    
+    def __init__(self, file_manager):
+        self.file_manager = file_manager
+    
+    def find(self, roots, min_size=1, hash_mode=None):
+        """产出事件字典：progress（扫描进度/扫描完成）、group（一组重复文件）、summary（统计）"""
+        stats = {
+            'directories': 0,
+            'files': 0,
+            'hardlinks': 0,
+            'size_candidates': 0,
+            'partial_hashed': 0,
+            'full_hashed': 0,
+            'groups': 0,
+            'duplicate_files': 0,
+            'wasted_bytes': 0
+        }
+        
+        # 大小 -> {'items': 文件项, 'partial'/'full': {路径: 摘要}, 'reported': {摘要: 已报告的文件数}}
+        buckets = {}
+        dirty = {}  # 有新成员、需要再次比较的大小分组
+        pending = 0
+        for item in self._walk(roots, stats):
+            if item['size'] < min_size:
+                continue
+            bucket = buckets.setdefault(item['size'], {'items': [], 'partial': {}, 'full': {}, 'reported': {}})
+            bucket['items'].append(item)
+            count = len(bucket['items'])
+            if count < 2:
+                continue
+            added = 2 if count == 2 else 1
+            stats['size_candidates'] += added
+            dirty[item['size']] = bucket
+            pending += added
+            if pending >= Config.DEDUPE_BATCH:
+                yield {'type': 'progress', 'stage': 'scanning', 'stats': dict(stats)}
+                yield from self._process(dirty, hash_mode, stats)
+                dirty = {}
+                pending = 0
+        
+        yield {'type': 'progress', 'stage': 'scanned', 'stats': dict(stats)}
+        yield from self._process(dirty, hash_mode, stats)
+        yield {'type': 'summary', 'stats': stats}
+    
+    def _walk(self, roots, stats):
+        """遍历所有根目录，产出普通文件项；重叠的根目录只访问一次，同一文件的硬链接只产出一次"""
+        roots = [root for root in roots if root]
+        if self.file_manager.mode == 'remote':
+            listings = self.file_manager.get_remote_walker().walk_many(roots)
+        else:
+            listings = LocalWalker().walk_many(roots)
+        
+        visited = set()
+        inodes = set()
+        for directory, entries in listings:
+            stats['directories'] += 1
+            for item in entries:
+                if not stat.S_ISREG(item['mode']) or item['path'] in visited:
+                    continue
+                visited.add(item['path'])
+                inode = item.get('inode')
+                if inode is not None:
+                    if inode in inodes:
+                        stats['hardlinks'] += 1
+                        continue
+                    inodes.add(inode)
+                stats['files'] += 1
+                yield item
+    
+    def _process(self, buckets, hash_mode, stats):
+        """对有新成员的大小分组补做部分哈希和完整哈希，产出新确认或扩大了的重复组"""
+        hasher = self.file_manager.hasher
+        
+        # 不超过首尾两段大小的文件直接完整哈希
+        large = [item for bucket in buckets.values() for item in bucket['items']
+                 if item['size'] > 2 * Config.DEDUPE_PARTIAL_SIZE and item['path'] not in bucket['partial']]
+        if large:
+            partial = hasher.hash_partial_files({item['path']: item['size'] for item in large}, hash_mode)
+            stats['partial_hashed'] += len(large)
+            for item in large:
+                buckets[item['size']]['partial'][item['path']] = partial.get(item['path'])
+        
+        survivors = [item for bucket in buckets.values() for item in self._survivors(bucket)
+                     if item['path'] not in bucket['full']]
+        if survivors:
+            file_stats = {item['path']: (item['size'], item['mtime']) for item in survivors}
+            full = hasher.hash_files([item['path'] for item in survivors], hash_mode, file_stats)
+            stats['full_hashed'] += len(survivors)
+            for item in survivors:
+                buckets[item['size']]['full'][item['path']] = full.get(item['path'])
+        
+        # 大文件优先，最先报告最占空间的重复项
+        for size in sorted(buckets, reverse=True):
+            bucket = buckets[size]
+            groups = {}
+            for item in bucket['items']:
+                digest = bucket['full'].get(item['path'])
+                if digest:
+                    groups.setdefault(digest, []).append(item)
+            
+            for digest, group in groups.items():
+                reported = bucket['reported'].get(digest, 0)
+                if len(group) < 2 or len(group) == reported:
+                    continue
+                bucket['reported'][digest] = len(group)
+                if not reported:
+                    stats['groups'] += 1
+                    reported = 1
+                stats['duplicate_files'] += len(group) - reported
+                stats['wasted_bytes'] += size * (len(group) - reported)
+                yield {
+                    'type': 'group',
+                    'id': f'{size}-{digest}',
+                    'size': size,
+                    'hash': digest,
+                    'files': [
+                        {
+                            'path': item['path'],
+                            'name': item['name'],
+                            'modified': datetime.fromtimestamp(item['mtime']).strftime('%Y-%m-%d %H:%M:%S')
+                        }
+                        for item in sorted(group, key=lambda item: item['path'])
+                    ]
+                }
+    
+    def _survivors(self, bucket):
+        """分组中需要完整哈希的文件：小文件，以及部分哈希与组内其他文件相同的大文件"""
+        counts = Counter(digest for digest in bucket['partial'].values() if digest)
+        for item in bucket['items']:
+            if item['size'] <= 2 * Config.DEDUPE_PARTIAL_SIZE:
+                yield item
+            elif counts[bucket['partial'].get(item['path'])] > 1:
+                yield item
+
+def run_parallel(func, items, workers):
+    """用线程池并行执行 func(item)，按完成顺序产出 (item, 返回值, 异常)
+    
+    同时提交的任务数不超过 workers 的4倍；调用方提前退出（出错或任务被取消）时不再开始剩余的任务。
+    """
+    items = iter(items)
+    inflight = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            while True:
+                for item in items:
+                    inflight[executor.submit(func, item)] = item
+                    if len(inflight) >= workers * 4:
+                        break
+                if not inflight:
+                    return
+                
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = inflight.pop(future)
+                    error = future.exception()
+                    yield item, None if error else future.result(), error
+        finally:
+            for future in inflight:
+                future.cancel()
+
+def command_batches(items, max_count, path=lambda item: item):
+    """把 items 分成拼入一条远程命令的批次：每批最多 max_count 项，引用后的路径总长不超过 REMOTE_COMMAND_MAX_BYTES
+    
+    path(item) 返回项对应的路径；单个超长路径单独成批。
+    """
+    batches = []
+    batch, size = [], 0
+    for item in items:
+        length = len(shlex.quote(path(item)).encode('utf-8', errors='surrogateescape')) + 1
+        if batch and (len(batch) >= max_count or size + length > Config.REMOTE_COMMAND_MAX_BYTES):
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(item)
+        size += length
+    if batch:
+        batches.append(batch)
+    return batches
+
+class BatchDeleter:
+    """批量删除文件和目录，逐项结果与输入顺序一致
+    
+    远程模式下能执行命令时，每批路径只执行一条 rm -rf 脚本并逐个输出结果；否则在连接池的
+    多个SFTP通道上并行删除文件，目录树则先并行删除其中的文件，再从最深的一层开始逐层删除目录。
+    本地模式并行删除各个路径。
+    """
+    
+    # 每个路径输出一行：0 成功，2 不存在，1 失败（后跟rm错误信息的第一行）
+    EXEC_SCRIPT = (
+        'for p in {paths}; do '
+        'if [ -e "$p" ] || [ -L "$p" ]; then '
+        'err=$(rm -rf -- "$p" 2>&1) && echo 0 || printf \'1 %s\\n\' "$(printf \'%s\' "$err" | head -n 1)"; '
+        'else echo 2; fi; done'
+    )
+    
+    def __init__(self, file_manager, workers=None):
+        self.file_manager = file_manager
+        self.workers = workers or Config.DELETE_WORKERS
+        self.walker = ConcurrentSFTPWalker(file_manager)
+    
+    def delete(self, paths, progress=None):
+        """删除 paths，返回 (逐项结果, 删除方式)，删除方式为 local / exec / sftp"""
+        progress = progress or (lambda **kwargs: None)
+        fm = self.file_manager
+        results = [None] * len(paths)
+        finished = [0]
+        
+        def finish(index, success, message):
+            results[index] = {'path': paths[index], 'success': success, 'message': message}
+            finished[0] += 1
+            progress(done=finished[0], message=f'已删除 {paths[index]}' if success else None)
+        
+        progress(done=0, total=len(paths), message='正在删除')
+        # 去掉末尾的斜杠：指向目录的符号链接写成 link/ 时会删除链接目标中的内容，而不是链接本身
+        targets = [self._strip(path) for path in paths]
+        pending = []
+        for index, rejected, error in run_parallel(lambda index: self._is_root(targets[index]),
+                                                   range(len(paths)), self.workers):
+            if error is not None or rejected:
+                finish(index, False, '删除失败: 不允许删除根目录或以 .. 结尾的路径')
+            else:
+                pending.append(index)
+        pending.sort()
+        
+        try:
+            if fm.mode == 'local':
+                method = 'local'
+                for index, _, error in run_parallel(lambda index: self._remove_local(targets[index]), pending,
+                                                    self.workers):
+                    finish(index, *self._outcome(error))
+            else:
+                method = 'sftp'
+                remaining = pending
+                if Config.DELETE_USE_EXEC and fm.can_exec():
+                    method = 'exec'
+                    remaining = self._delete_exec(targets, pending, finish)
+                self._delete_sftp(targets, remaining, finish, progress)
+        finally:
+            # 任务被取消时部分路径可能已删除一半，同样需要使缓存失效
+            for index in pending:
+                fm.invalidate_listing(targets[index], recursive=True)
+        return results, method
+    
+    def remove_tree(self, path, progress=None):
+        """通过SFTP删除远程目录树：并行删除所有文件，再从最深的一层开始逐层并行删除目录"""
+        progress = progress or (lambda **kwargs: None)
+        walker = self.file_manager.get_remote_walker()
+        listing = dict(walker.walk(path))
+        if walker.errors:
+            directory, error = next(iter(walker.errors.items()))
+            raise IOError(f"{directory}: {error}")
+        
+        files = [entry['path'] for entries in listing.values() for entry in entries if not entry['is_dir']]
+        levels = {}
+        for directory in listing:
+            levels.setdefault(directory.count('/'), []).append(directory)
+        total = len(files) + len(listing)
+        removed = 0
+        
+        def run(action, chunk):
+            # 每个任务借用一个通道连续处理一小批路径，减少借还通道的开销
+            def task(sftp):
+                for item in chunk:
+                    getattr(sftp, action)(item)
+            self.walker._run(task)
+        
+        for items, action in [(files, 'remove')] + [(levels[depth], 'rmdir') for depth in sorted(levels, reverse=True)]:
+            size = max(1, min(Config.DELETE_CHUNK_SIZE, len(items) // self.workers))
+            chunks = [items[i:i + size] for i in range(0, len(items), size)]
+            for chunk, _, error in run_parallel(lambda chunk: run(action, chunk), chunks, self.workers):
+                if error is not None:
+                    raise error
+                removed += len(chunk)
+                progress(message=f'正在删除 {path}（{removed} / {total} 项）')
+    
+    def _strip(self, path):
+        """去掉路径末尾的分隔符（根目录除外）"""
+        separators = '/\\' if self.file_manager.mode == 'local' and os.name == 'nt' else '/'
+        stripped = path.rstrip(separators) or path[:1]
+        if stripped.endswith(':') and separators != '/':
+            # Windows 驱动器根目录保留分隔符（C: 表示该驱动器的当前目录）
+            return path[:len(stripped) + 1]
+        return stripped
+    
+    def _is_root(self, path):
+        """空路径、根目录和最后一级为 .. 的路径一律拒绝删除
+        
+        远程的相对路径相对于SFTP登录目录，先由服务器解析为绝对路径再判断（如 ../.. 可能就是根目录）。
+        """
+        if not path or path in ('.', '..'):
+            return True
+        if self.file_manager.mode == 'local':
+            if os.path.basename(path) == '..':
+                return True
+            path = os.path.abspath(path)
+            return os.path.dirname(path) == path
+        if posixpath.basename(path) == '..' or posixpath.normpath(path).strip('/') in ('', '.', '..'):
+            return True
+        try:
+            resolved = self.walker._run(lambda sftp: sftp.normalize(path))
+        except IOError:
+            # 路径不存在时无法解析，由后续删除报告错误
+            return False
+        return posixpath.normpath(resolved) == '/'
+    
+    def _outcome(self, error):
+        """将异常转换为 (是否成功, 消息)"""
+        if error is None:
+            return True, '删除成功'
+        return False, f"删除失败: {str(error)}"
+    
+    def _remove_local(self, path):
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    
+    def _delete_exec(self, paths, pending, finish):
+        """分批在服务器端执行 rm -rf，返回需要改用SFTP删除的路径序号"""
+        batches = command_batches(pending, Config.DELETE_EXEC_BATCH, lambda index: paths[index])
+        fallback = []
+        
+        def run(batch):
+            command = self.EXEC_SCRIPT.format(paths=' '.join(shlex.quote(paths[index]) for index in batch))
+            _, output, _ = self.file_manager.run_remote_command(command)
+            return output.decode('utf-8', errors='replace').split('\n')
+        
+        for batch, lines, error in run_parallel(run, batches, self.workers):
+            if error is not None:
+                # 执行失败时整批改用SFTP删除
+                fallback.extend(batch)
+                continue
+            for position, index in enumerate(batch):
+                line = lines[position] if position < len(lines) else ''
+                if line == '0':
+                    finish(index, True, '删除成功')
+                elif line == '2':
+                    finish(index, False, '删除失败: 文件或目录不存在')
+                elif line.startswith('1'):
+                    finish(index, False, f"删除失败: {line[2:] or 'rm 执行失败'}")
+                else:
+                    # 输出不完整（脚本被中断），剩余路径改用SFTP删除
+                    fallback.append(index)
+        return fallback
+    
+    def _delete_sftp(self, paths, pending, finish, progress):
+        """并行删除文件；目录逐个交给 remove_tree，在目录内部并行"""
+        files = []
+        directories = []
+        for index, attr, error in run_parallel(lambda index: self.walker._run(lambda sftp: sftp.lstat(paths[index])),
+                                               pending, self.workers):
+            if error is not None:
+                finish(index, *self._outcome(error))
+            elif stat.S_ISDIR(attr.st_mode):
+                directories.append(index)
+            else:
+                files.append(index)
+        
+        for index, _, error in run_parallel(lambda index: self.walker._run(lambda sftp: sftp.remove(paths[index])),
+                                            files, self.workers):
+            finish(index, *self._outcome(error))
+        for index in sorted(directories):
+            try:
+                self.remove_tree(paths[index], progress)
+                finish(index, True, '删除成功')
+            except JobCancelled:
+                raise
+            except Exception as e:
+                finish(index, *self._outcome(e))
+
+class RenamePipeline:
+    """重命名规则链：按顺序应用多条规则，每条规则的输出都会检查是否为合法文件名
+    
+    每种规则对应一个 _rule_<类型>(文件名, 序号, 规则) 方法。规则参数（正则、自定义文本）在构造时检查，
+    正则只编译一次，日期前缀也只取一次，同一批文件（包括冲突后重新规划）使用同一个日期。规则格式：
+    {'type': 规则类型, 'pattern': 正则, 'replacement': 替换内容, 'custom_text': 自定义文本}
+    """
+    
+    NUMBER_PREFIX = re.compile(r'^\d+\s*[-_]?\s*')
+    SPECIAL_CHARS = re.compile(r'[^\w\u4e00-\u9fff.-]')
+    MAX_NAME_BYTES = 255
+    
+    def __init__(self, rules):
+        if not rules:
+            raise ValueError('请选择重命名类型')
+        self.rules = []
+        for rule in rules:
+            rule_type = rule.get('type')
+            apply = getattr(self, f'_rule_{rule_type}', None) if rule_type else None
+            if apply is None:
+                raise ValueError(f'未知的重命名类型: {rule_type}')
+            rule = self._prepare_rule(rule)
+            self.rules.append((rule_type, apply, rule))
+        self.types = [rule_type for rule_type, _, _ in self.rules]
+    
+    def apply(self, name, sequence=1):
+        """依次应用所有规则，规则输出不合法时抛出 ValueError"""
+        for rule_type, apply, rule in self.rules:
+            name = apply(name, sequence, rule)
+            error = self.check_name(name)
+            if error:
+                raise ValueError(f'规则 {rule_type} 的结果无效: {error}')
+        return name
+    
+    __call__ = apply
+    
+    @classmethod
+    def check_name(cls, name, separators='/'):
+        """检查名称是否为合法的文件名，返回错误信息或None"""
+        if not name:
+            return '新名称为空'
+        if name in ('.', '..'):
+            return '新名称无效'
+        if '\0' in name or any(separator in name for separator in separators):
+            return '新名称不能包含路径分隔符'
+        # UTF-8 每个字符最多4字节，短名称不需要编码检查
+        if len(name) * 4 > cls.MAX_NAME_BYTES and len(name.encode('utf-8', errors='surrogateescape')) > cls.MAX_NAME_BYTES:
+            return f'新名称超过 {cls.MAX_NAME_BYTES} 字节'
+        return None
+    
+    def _prepare_rule(self, rule):
+        """检查规则参数，返回附带预编译正则（compiled）和日期（date）的规则副本，参数无效时抛出 ValueError"""
+        rule = dict(rule)
+        text = rule.get('custom_text') or ''
+        if text and rule['type'] in ('add_custom_prefix', 'add_custom_suffix') and self.check_name(text):
+            raise ValueError(f'自定义文本无效: {text}')
+        if rule['type'] == 'regex' and rule.get('pattern'):
+            try:
+                pattern = re.compile(rule['pattern'])
+            except re.error as e:
+                raise ValueError(f'正则表达式无效: {str(e)}')
+            try:
+                # 提前检查替换内容中的分组引用
+                pattern.sub(rule.get('replacement') or '', '')
+            except (re.error, IndexError) as e:
+                raise ValueError(f'替换内容无效: {str(e)}')
+            rule['compiled'] = pattern
+        if rule['type'] == 'date_prefix':
+            rule['date'] = datetime.now().strftime('%Y%m%d')
+        return rule
+    
+    def _rule_remove_number_prefix(self, filename, sequence, rule):
+        # 移除数字前缀：例如 "01 文件.txt" -> "文件.txt"
+        name, ext = os.path.splitext(filename)
+        return self.NUMBER_PREFIX.sub('', name) + ext
+    
+    def _rule_add_sequence_prefix(self, filename, sequence, rule):
+        # 添加序号前缀：例如 "文件.txt" -> "001_文件.txt"
+        return f"{sequence:03d}_{filename}"
+    
+    def _rule_add_sequence_suffix(self, filename, sequence, rule):
+        # 添加序号后缀：例如 "文件.txt" -> "文件_001.txt"
+        name, ext = os.path.splitext(filename)
+        return f"{name}_{sequence:03d}{ext}"
+    
+    def _rule_add_custom_prefix(self, filename, sequence, rule):
+        # 添加自定义前缀：例如 "文件.txt" -> "前缀_文件.txt"
+        text = rule.get('custom_text')
+        return f"{text}_{filename}" if text else filename
+    
+    def _rule_add_custom_suffix(self, filename, sequence, rule):
+        # 添加自定义后缀：例如 "文件.txt" -> "文件_后缀.txt"
+        text = rule.get('custom_text')
+        if not text:
+            return filename
+        name, ext = os.path.splitext(filename)
+        return f"{name}_{text}{ext}"
+    
+    def _rule_remove_special_chars(self, filename, sequence, rule):
+        # 移除特殊字符：保留字母、数字、中文、下划线、连字符和点
+        name, ext = os.path.splitext(filename)
+        return self.SPECIAL_CHARS.sub('', name) + ext
+    
+    def _rule_to_lowercase(self, filename, sequence, rule):
+        return filename.lower()
+    
+    def _rule_to_uppercase(self, filename, sequence, rule):
+        return filename.upper()
+    
+    def _rule_space_to_underscore(self, filename, sequence, rule):
+        return filename.replace(' ', '_')
+    
+    def _rule_underscore_to_space(self, filename, sequence, rule):
+        return filename.replace('_', ' ')
+    
+    def _rule_regex(self, filename, sequence, rule):
+        # 正则表达式替换，替换内容为空表示删除匹配部分
+        pattern = rule.get('compiled')
+        if pattern is None:
+            return filename
+        return pattern.sub(rule.get('replacement') or '', filename)
+    
+    def _rule_date_prefix(self, filename, sequence, rule):
+        # 添加日期前缀：例如 "文件.txt" -> "20231201_文件.txt"
+        return f"{rule['date']}_{filename}"
+    
+    def _rule_capitalize_words(self, filename, sequence, rule):
+        # 首字母大写：例如 "hello world.txt" -> "Hello World.txt"
+        name, ext = os.path.splitext(filename)
+        return ' '.join(word.capitalize() for word in name.split()) + ext
+
+class RenameJournal:
+    """批量重命名日志（JSON Lines）：开头一行记录主机和目录，之后每完成一步追加一行，最后一行记录结果
+    
+    执行失败时按日志逆序回滚；进程中断后也可以根据日志撤销未完成的批量重命名。
+    """
+    
+    def __init__(self, path=None):
+        self.path = path or Config.RENAME_JOURNAL_FILE
+        self._lock = threading.Lock()
+        self._file = None
+        self.steps = []
+    
+    def begin(self, host, directory):
+        """开始新的批量重命名，覆盖上一次的日志"""
+        self.steps = []
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._write({'host': host, 'directory': directory, 'started': time.time()})
+    
+    def record(self, src, dst):
+        """记录已完成的一步（名称相对于目录）"""
+        with self._lock:
+            self.steps.append((src, dst))
+            self._write({'src': src, 'dst': dst})
+    
+    def finish(self, status):
+        """记录结果：committed / rolled_back / rollback_failed"""
+        with self._lock:
+            self._write({'status': status})
+            self._file.close()
+            self._file = None
+    
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+    
+    def load(self):
+        """读取上一次的日志，返回 (头部, 已完成的步骤, 结果)；没有日志时返回 None"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                records = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            return None
+        if not records:
+            return None
+        steps = [(record['src'], record['dst']) for record in records if 'src' in record]
+        status = next((record['status'] for record in reversed(records) if 'status' in record), None)
+        return records[0], steps, status
+
+class BatchRenamer:
+    """批量重命名：先规划完整的 旧名称 -> 新名称 映射，再并行执行
+    
+    规划时排除新名称无效、多个项改成同一名称以及与不参与改名的项重名的情况；互相占用名称的
+    改名（a->b, b->c）按依赖顺序组成链，成环的（a->b, b->a）先借助临时名称拆开。互不依赖的链
+    在线程池中并行执行，远程模式下各自使用连接池的通道。每完成一步都写入日志，任一步失败或
+    任务被取消时按日志逆序回滚。
+    """
+    
+    def __init__(self, file_manager, journal=None, workers=None):
+        self.file_manager = file_manager
+        self.journal = journal or RenameJournal()
+        self.workers = workers or Config.RENAME_WORKERS
+        self.walker = ConcurrentSFTPWalker(file_manager)
+        # Windows和macOS的本地文件系统默认不区分大小写
+        self.case_insensitive = file_manager.mode == 'local' and sys.platform in ('win32', 'darwin')
+    
+    def plan(self, items, rename):
+        """rename(旧名称, 序号) 返回新名称；返回 (逐项结果, 执行链)
+        
+        序号在排除冲突后按顺序连续分配给会改名的项，只跳过会生成已存在名称的序号；执行链中的每一步
+        为 (原名称, 新名称, 所属项的旧名称)，同一条链内按顺序执行。
+        """
+        key = self._key
+        items = sorted(items, key=lambda item: (item.is_dir, item.name.lower()))
+        existing = {key(item.name): item.name for item in items}
+        results = {}
+        excluded = set()  # 因冲突不改名的项
+        reserved = set()  # 会生成已存在名称、需要跳过的序号
+        
+        # 被排除的项名称保持不变，可能又与其他项冲突，因此每次排除后为其余项重新生成新名称，直到没有冲突
+        while True:
+            targets = {}
+            sequences = {}
+            sequence = 1
+            for item in items:
+                old_name = item.name
+                if old_name in excluded:
+                    continue
+                while sequence in reserved:
+                    sequence += 1
+                try:
+                    new_name = rename(old_name, sequence)
+                except JobCancelled:
+                    raise
+                except Exception as e:
+                    results[old_name] = self._result(old_name, old_name, False, f'重命名失败: {str(e)}')
+                    continue
+                
+                if not new_name or new_name == old_name:
+                    results[old_name] = self._result(old_name, old_name, True, '无需重命名')
+                    continue
+                error = self._validate(new_name)
+                if error:
+                    results[old_name] = self._result(old_name, new_name, False, f'重命名失败: {error}')
+                    continue
+                targets[old_name] = new_name
+                sequences[old_name] = sequence
+                sequence += 1
+            
+            claimed = {}
+            for old_name, new_name in targets.items():
+                claimed.setdefault(key(new_name), []).append(old_name)
+            conflicts = {}
+            skipped = set()
+            for name_key, owners in claimed.items():
+                if len(owners) > 1:
+                    for owner in owners:
+                        others = '、'.join(other for other in owners if other != owner)
+                        conflicts[owner] = f'与 {others} 的新名称相同'
+                elif name_key in existing and existing[name_key] not in targets:
+                    owner = owners[0]
+                    if self._depends_on_sequence(rename, owner, sequences[owner], targets[owner]):
+                        skipped.add(sequences[owner])
+                    else:
+                        conflicts[owner] = f'目标名称已存在: {existing[name_key]}'
+            if not conflicts and not skipped:
+                break
+            # 正常情况下每个跳过的序号对应一个已存在的名称；超过项数时不再跳过，直接排除这些项，保证循环结束
+            if len(reserved) + len(skipped) > len(items):
+                for old_name in targets:
+                    if sequences[old_name] in skipped:
+                        conflicts[old_name] = f'目标名称已存在: {existing[key(targets[old_name])]}'
+                skipped = set()
+            reserved |= skipped
+            for old_name, message in conflicts.items():
+                results[old_name] = self._result(old_name, targets[old_name], False, f'重命名失败: {message}')
+                excluded.add(old_name)
+        
+        for old_name, new_name in targets.items():
+            results[old_name] = self._result(old_name, new_name, True, f'将重命名为 {new_name}')
+        ordered = [results[item.name] for item in items]
+        return ordered, self._build_chains(targets, existing)
+    
+    @staticmethod
+    def _depends_on_sequence(rename, old_name, sequence, new_name):
+        """换一个序号是否会得到不同的新名称"""
+        try:
+            return rename(old_name, sequence + 1) != new_name
+        except JobCancelled:
+            raise
+        except Exception:
+            return False
+    
+    def _build_chains(self, targets, existing):
+        """按名称占用关系把改名组织成链；环用临时名称拆开"""
+        key = self._key
+        owners = {key(old_name): old_name for old_name in targets}
+        # dependent[x] = y 表示 y 的新名称是 x 现在的名称，x 改名后 y 才能执行
+        dependent = {}
+        for old_name, new_name in targets.items():
+            blocker = owners.get(key(new_name))
+            if blocker is not None and blocker != old_name:
+                dependent[blocker] = old_name
+        blocked = set(dependent.values())
+        
+        chains = []
+        visited = set()
+        for old_name in targets:
+            if old_name in blocked:
+                continue
+            chain = []
+            current = old_name
+            while current is not None:
+                visited.add(current)
+                chain.append((current, targets[current], current))
+                current = dependent.get(current)
+            chains.append(chain)
+        
+        # 剩下的都在环中
+        for old_name in targets:
+            if old_name in visited:
+                continue
+            temp_name = self._temp_name(existing)
+            chain = [(old_name, temp_name, old_name)]
+            visited.add(old_name)
+            current = dependent[old_name]
+            while current != old_name:
+                visited.add(current)
+                chain.append((current, targets[current], current))
+                current = dependent[current]
+            chain.append((temp_name, targets[old_name], old_name))
+            chains.append(chain)
+        return chains
+    
+    def execute(self, directory, results, chains, progress=None):
+        """执行规划好的改名链并更新逐项结果，返回 (是否成功, 失败时的说明)"""
+        progress = progress or (lambda **kwargs: None)
+        by_name = {result['old_name']: result for result in results}
+        failure = None
+        
+        def run(chain):
+            for src, dst, _ in chain:
+                self._rename(self._join(directory, src), self._join(directory, dst))
+                self.journal.record(src, dst)
+        
+        progress(done=0, total=sum(len(chain) for chain in chains), message='正在重命名')
+        self.journal.begin(self.file_manager.cache_host, directory)
+        tasks = run_parallel(run, chains, self.workers)
+        try:
+            try:
+                for chain, _, error in tasks:
+                    if error is not None:
+                        failure = (chain, error)
+                        break
+                    for _, _, owner in chain:
+                        by_name[owner]['message'] = '重命名成功'
+                    progress(done=len(self.journal.steps))
+            finally:
+                # 等待已开始的链结束，之后日志中才是完整的已完成步骤
+                tasks.close()
+        except BaseException:
+            # 任务被取消时同样回滚
+            self._rollback(directory, results)
+            raise
+        
+        if failure is None:
+            self.journal.finish('committed')
+            return True, None
+        
+        chain, error = failure
+        restored = self._rollback(directory, results)
+        for _, _, owner in chain:
+            by_name[owner]['message'] = f'重命名失败: {str(error)}'
+        message = f'重命名 {chain[0][0]} 失败: {str(error)}，' + (
+            '已回滚全部改名' if restored else f'回滚未完成，日志保存在 {self.journal.path}')
+        return False, message
+    
+    def _rollback(self, directory, results):
+        """按日志逆序撤销已完成的步骤，返回是否全部撤销成功"""
+        restored = True
+        for src, dst in reversed(self.journal.steps):
+            try:
+                self._rename(self._join(directory, dst), self._join(directory, src))
+            except Exception:
+                restored = False
+        self.journal.finish('rolled_back' if restored else 'rollback_failed')
+        for result in results:
+            if result['success'] and result['new_name'] != result['old_name']:
+                result['success'] = False
+                result['message'] = '未更改（已回滚）' if restored else '回滚失败，请根据日志手动恢复'
+        return restored
+    
+    def undo(self, progress=None):
+        """撤销上一次已提交或中断的批量重命名，返回 (是否成功, 消息, 逐项结果)"""
+        progress = progress or (lambda **kwargs: None)
+        record = self.journal.load()
+        if record is None:
+            return False, '没有可撤销的批量重命名', []
+        header, steps, status = record
+        if header.get('host') != self.file_manager.cache_host:
+            return False, '上一次批量重命名不是在当前连接上执行的', []
+        if status == 'rolled_back':
+            return False, '上一次批量重命名已经撤销', []
+        
+        directory = header['directory']
+        results = []
+        progress(done=0, total=len(steps), message='正在撤销重命名')
+        for index, (src, dst) in enumerate(reversed(steps)):
+            try:
+                self._rename(self._join(directory, dst), self._join(directory, src))
+                results.append(self._result(dst, src, True, '已撤销'))
+            except Exception as e:
+                results.append(self._result(dst, dst, False, f'撤销失败: {str(e)}'))
+            progress(done=index + 1)
+        
+        failed_count = sum(1 for result in results if not result['success'])
+        self.journal.begin(header['host'], directory)
+        self.journal.finish('rolled_back' if failed_count == 0 else 'rollback_failed')
+        return failed_count == 0, f'撤销完成：恢复 {len(results) - failed_count} 项，失败 {failed_count} 项', results
+    
+    def _rename(self, src, dst):
+        fm = self.file_manager
+        if fm.mode == 'local':
+            # os.rename 在POSIX上会直接覆盖已存在的目标，这里先检查（大小写不同的同一文件除外）
+            if os.path.lexists(dst) and self._key(src) != self._key(dst):
+                raise FileExistsError(f'目标已存在: {dst}')
+            os.rename(src, dst)
+        else:
+            # SFTP的rename在目标已存在时失败，不会覆盖
+            self.walker._run(lambda sftp: sftp.rename(src, dst))
+    
+    def _join(self, directory, name):
+        if self.file_manager.mode == 'local':
+            return os.path.join(directory, name)
+        return directory.rstrip('/') + '/' + name
+    
+    def _key(self, name):
+        return name.lower() if self.case_insensitive else name
+    
+    def _validate(self, name):
+        """检查新名称是否可用，返回错误信息或None"""
+        separators = '/' + os.sep if self.file_manager.mode == 'local' else '/'
+        return RenamePipeline.check_name(name, separators)
+    
+    def _temp_name(self, existing):
+        while True:
+            name = f'.rename-{uuid.uuid4().hex[:12]}'
+            if self._key(name) not in existing:
+                return name
+    
+    def _result(self, old_name, new_name, success, message):
+        return {'success': success, 'old_name': old_name, 'new_name': new_name, 'message': message}
+
+class TransferCheckpoint:
+    """传输断点：记录每个文件已完成的分块，连接中断后再次执行同一传输时跳过这些分块
+    
+    同一主机、方向、源路径和目标路径的传输对应 TRANSFER_CHECKPOINT_DIR 下的一个JSON文件，
+    先写临时文件再改名替换，传输过程中最多每 TRANSFER_CHECKPOINT_INTERVAL 秒保存一次。
+    """
+    
+    def __init__(self, key, directory=None):
+        name = hashlib.md5(json.dumps(key, ensure_ascii=False).encode('utf-8')).hexdigest() + '.json'
+        self.path = os.path.join(directory or Config.TRANSFER_CHECKPOINT_DIR, name)
+        self._saved_at = 0
+    
+    def load(self):
+        """读取断点，不存在或已损坏时返回空字典"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def save(self, state, force=False):
+        now = time.time()
+        if not force and now - self._saved_at < Config.TRANSFER_CHECKPOINT_INTERVAL:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp = self.path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temp, self.path)
+        self._saved_at = now
+    
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+class FileTransfer:
+    """本地与远程之间的分块并行传输（direction 为 upload 或 download）
+    
+    文件按 TRANSFER_CHUNK_SIZE 切分，多个分块同时在连接池的不同通道上传输：下载时用 readv 一次发出
+    整块的读请求，上传时流水线写入，不必每次读写都等待一次往返。数据先写入目标旁的 .part 文件
+    （多块文件预先扩展到完整大小，分块可以按任意顺序写入），全部分块完成并比较两端的MD5后才改名为目标文件，
+    并带上源文件的修改时间和权限。已完成的分块记录在断点文件中，中断后再次执行同一传输会从断点继续。
+    """
+    
+    PART_SUFFIX = '.part'
+    BLOCK_SIZE = 1024 * 1024  # 分块内每次读写的字节数
+    
+    def __init__(self, file_manager, direction, workers=None, chunk_size=None, checkpoint_dir=None, limiter=None):
+        if direction not in ('upload', 'download'):
+            raise ValueError(f"不支持的传输方向: {direction}")
+        self.file_manager = file_manager
+        self.direction = direction
+        self.upload = direction == 'upload'
+        self.workers = workers or Config.TRANSFER_WORKERS
+        self.chunk_size = chunk_size or Config.TRANSFER_CHUNK_SIZE
+        self.checkpoint_dir = checkpoint_dir
+        self.limiter = limiter  # BandwidthLimiter，为 None 时不限速
+        self.walker = ConcurrentSFTPWalker(file_manager)
+        # 上传时源在本地、目标在远程，下载时相反
+        self.source_path = os.path if self.upload else posixpath
+        self.target_path = posixpath if self.upload else os.path
+    
+    def run(self, source, target, progress=None, verify=None):
+        """传输文件或目录 source 到 target，返回统计；传输中断时抛出异常，断点已保存"""
+        progress = progress or (lambda **kwargs: None)
+        progress(message='正在列出源文件')
+        files, directories, skipped = self._plan(source, target)
+        summary = self.transfer(files, directories, source, target, progress, verify)
+        summary['skipped'] = skipped
+        return summary
+    
+    def transfer(self, files, directories, source, target, progress=None, verify=None):
+        """创建目录 directories 并传输 files（_item 生成的文件项），source/target 用于区分断点"""
+        progress = progress or (lambda **kwargs: None)
+        verify = Config.TRANSFER_VERIFY if verify is None else verify
+        started = time.time()
+        
+        checkpoint = TransferCheckpoint([self.file_manager.cache_host, self.direction, source, target],
+                                        self.checkpoint_dir)
+        previous = checkpoint.load()
+        if previous.get('chunk_size') != self.chunk_size:
+            previous = {}
+        state = {'direction': self.direction, 'source': source, 'target': target,
+                 'chunk_size': self.chunk_size, 'files': {}}
+        
+        progress(message='正在准备目标文件')
+        self._make_directories(directories)
+        chunks, fresh, resumed_bytes = self._resume(files, previous.get('files', {}), state['files'])
+        for _, _, error in run_parallel(self._prepare_part, fresh, self.workers):
+            if error:
+                raise error
+        checkpoint.save(state, force=True)
+        
+        bytes_total = sum(self._chunk_range(item, index)[1] for item, index in chunks)
+        bytes_done = 0
+        errors = []
+        # 出错后不再开始新的分块，但仍记录已在传输中的分块，使断点尽量完整
+        pending = (work for work in chunks if not errors)
+        try:
+            for (item, index), length, error in run_parallel(self._copy_chunk, pending, self.workers):
+                if error:
+                    errors.append(error)
+                    continue
+                state['files'][item['target']]['done'].append(index)
+                checkpoint.save(state)
+                bytes_done += length
+                progress(bytes_done=bytes_done, bytes_total=bytes_total,
+                         message=f"正在传输 {self.source_path.basename(item['source'])}")
+        finally:
+            checkpoint.save(state, force=True)
+        if errors:
+            raise errors[0]
+        
+        failed = []
+        if verify and files:
+            progress(message='正在校验MD5')
+            for item in self._verify(files):
+                # 下次执行时重新传输整个文件
+                failed.append({'path': item['target'], 'message': 'MD5校验不一致'})
+                del state['files'][item['target']]
+                self._remove_part(item)
+        failed_targets = {record['path'] for record in failed}
+        
+        progress(message='正在完成传输')
+        for item, _, error in run_parallel(self._finish, [item for item in files if item['target'] not in failed_targets],
+                                           self.workers):
+            if error:
+                failed.append({'path': item['target'], 'message': str(error)})
+            else:
+                del state['files'][item['target']]
+        if state['files']:
+            checkpoint.save(state, force=True)
+        else:
+            checkpoint.remove()
+        
+        elapsed = time.time() - started
+        return {
+            'files': len(files),
+            'bytes': sum(item['size'] for item in files),
+            'transferred_bytes': bytes_done,
+            'resumed_bytes': resumed_bytes,
+            'verified': bool(verify),
+            'failed': failed,
+            'elapsed': round(elapsed, 2),
+            'rate': round(bytes_done / elapsed) if elapsed > 0 else None
+        }
+    
+    def _plan(self, source, target):
+        """列出要传输的普通文件，返回 (文件列表, 要创建的目标目录, 跳过的路径)"""
+        info = self._stat(not self.upload, source)
+        if info is None:
+            raise FileNotFoundError(f"源路径不存在: {source}")
+        if not stat.S_ISDIR(info.st_mode):
+            target_info = self._stat(self.upload, target)
+            if target_info is not None and stat.S_ISDIR(target_info.st_mode):
+                target = self.target_path.join(target, self.source_path.basename(source))
+            return [self._item(source, target, info.st_size, info.st_mtime, info.st_mode)], [], []
+        
+        files, directories, skipped = [], [target], []
+        walker = LocalWalker() if self.upload else self.walker
+        for directory, entries in walker.walk(source):
+            for entry in entries:
+                relative = self.source_path.relpath(entry['path'], source)
+                destination = self.target_path.join(target, *relative.split(self.source_path.sep))
+                if entry['is_dir']:
+                    directories.append(destination)
+                elif stat.S_ISREG(entry['mode']):
+                    files.append(self._item(entry['path'], destination, entry['size'], entry['mtime'], entry['mode']))
+                else:
+                    skipped.append(entry['path'])
+        if walker.errors:
+            directory, message = next(iter(walker.errors.items()))
+            raise IOError(f"无法列出目录 {directory}: {message}")
+        return files, directories, skipped
+    
+    def _item(self, source, target, size, mtime, mode):
+        return {
+            'source': source,
+            'target': target,
+            'part': target + self.PART_SUFFIX,
+            'size': size,
+            'mtime': mtime,
+            'mode': mode,
+            # 空文件也作为一个分块，用于创建 .part
+            'count': max(1, -(-size // self.chunk_size))
+        }
+    
+    def _resume(self, files, previous, records):
+        """按断点跳过已完成的分块，返回 (待传输的分块, 需要预先创建 .part 的文件, 跳过的字节数)"""
+        chunks, fresh, resumed_bytes = [], [], 0
+        for item in files:
+            record = previous.get(item['target'])
+            done = []
+            if record and record['size'] == item['size'] and record['mtime'] == item['mtime'] and record['done']:
+                # 多块文件的 .part 被删除或截断后不能继续写入；单块文件的 .part 由校验发现
+                if item['count'] == 1 or self._part_size(item) == item['size']:
+                    done = record['done']
+            if not done and item['count'] > 1:
+                fresh.append(item)
+            records[item['target']] = {'size': item['size'], 'mtime': item['mtime'], 'done': list(done)}
+            done = set(done)
+            for index in range(item['count']):
+                if index in done:
+                    resumed_bytes += self._chunk_range(item, index)[1]
+                else:
+                    chunks.append((item, index))
+        return chunks, fresh, resumed_bytes
+    
+    def _chunk_range(self, item, index):
+        offset = index * self.chunk_size
+        return offset, min(self.chunk_size, item['size'] - offset)
+    
+    def _stat(self, remote, path):
+        try:
+            if remote:
+                return self.walker._run(lambda sftp: sftp.stat(path))
+            return os.stat(path)
+        except FileNotFoundError:
+            return None
+    
+    def _part_size(self, item):
+        info = self._stat(self.upload, item['part'])
+        return info.st_size if info is not None else None
+    
+    def _make_directories(self, directories):
+        """创建目标目录；远程目录按深度逐层并行创建"""
+        if not self.upload:
+            for directory in directories:
+                os.makedirs(directory, exist_ok=True)
+            return
+        levels = {}
+        for directory in directories:
+            levels.setdefault(directory.rstrip('/').count('/'), []).append(directory)
+        for depth in sorted(levels):
+            for _, _, error in run_parallel(lambda directory: self.walker._run(
+                    lambda sftp: self._mkdir_remote(sftp, directory)), levels[depth], self.workers):
+                if error:
+                    raise error
+    
+    @staticmethod
+    def _mkdir_remote(sftp, directory):
+        try:
+            sftp.mkdir(directory)
+        except OSError:
+            # 目录已存在
+            try:
+                if stat.S_ISDIR(sftp.stat(directory).st_mode):
+                    return
+            except OSError:
+                pass
+            raise
+    
+    def _prepare_part(self, item):
+        """创建多块文件的 .part 并扩展到完整大小"""
+        if self.upload:
+            def task(sftp):
+                with sftp.open(item['part'], 'wb'):
+                    pass
+                sftp.truncate(item['part'], item['size'])
+            self.walker._run(task)
+        else:
+            with open(item['part'], 'wb') as f:
+                f.truncate(item['size'])
+    
+    def _copy_chunk(self, work):
+        """在借用的通道上传输一个分块，返回字节数"""
+        item, index = work
+        offset, length = self._chunk_range(item, index)
+        # 单块文件直接创建 .part，多块文件写入已扩展好的 .part
+        mode = 'wb' if item['count'] == 1 else 'r+b'
+        copy = self._upload_range if self.upload else self._download_range
+        self.walker._run(lambda sftp: copy(sftp, item, offset, length, mode))
+        return length
+    
+    def _download_range(self, sftp, item, offset, length, mode):
+        blocks = [(offset + start, min(self.BLOCK_SIZE, length - start))
+                  for start in range(0, length, self.BLOCK_SIZE)]
+        with sftp.open(item['source'], 'rb') as reader, open(item['part'], mode) as writer:
+            writer.seek(offset)
+            if self.limiter is None:
+                for data in reader.readv(blocks):
+                    writer.write(data)
+                return
+            # 限速时每块数据在取得配额后才发出读请求
+            for block in blocks:
+                self.limiter.consume(block[1])
+                for data in reader.readv([block]):
+                    writer.write(data)
+    
+    def _upload_range(self, sftp, item, offset, length, mode):
+        def blocks():
+            remaining = length
+            while remaining > 0:
+                data = reader.read(min(self.BLOCK_SIZE, remaining))
+                if not data:
+                    raise IOError(f"源文件在传输过程中被截断: {item['source']}")
+                if self.limiter is not None:
+                    self.limiter.consume(len(data))
+                yield None, data
+                remaining -= len(data)
+        
+        with open(item['source'], 'rb') as reader, sftp.open(item['part'], mode) as writer:
+            reader.seek(offset)
+            writer.seek(offset)
+            # 不等待每个写请求的响应，分块写完时统一检查
+            AtomicFileWriter._write_all(writer, blocks())
+    
+    def _verify(self, files):
+        """比较本地文件和远程文件的MD5（远程在服务器端计算），返回不一致的文件"""
+        local_paths = [item['source'] if self.upload else item['part'] for item in files]
+        remote_paths = [item['part'] if self.upload else item['source'] for item in files]
+        remote = self.file_manager.hasher._compute_hashes(remote_paths)
+        local = {path: digest for path, digest, _ in run_parallel(self._hash_local, local_paths, self.workers)}
+        return [item for item, local_path, remote_path in zip(files, local_paths, remote_paths)
+                if local.get(local_path) is None or local[local_path] != remote.get(remote_path)]
+    
+    @staticmethod
+    def _hash_local(path):
+        hash_md5 = hashlib.md5()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(Config.HASH_CHUNK_SIZE), b""):
+                hash_md5.update(chunk)
+        return hash_md5.hexdigest()
+    
+    def _finish(self, item):
+        """设置 .part 的修改时间和权限后改名为目标文件"""
+        part, target = item['part'], item['target']
+        times = (item['mtime'], item['mtime'])
+        permissions = stat.S_IMODE(item['mode'])
+        if self.upload:
+            def task(sftp):
+                sftp.utime(part, times)
+                if permissions:
+                    sftp.chmod(part, permissions)
+                self.file_manager.writer._rename(sftp, part, target)
+            self.walker._run(task)
+        else:
+            os.utime(part, times)
+            if permissions:
+                os.chmod(part, permissions)
+            os.replace(part, target)
+    
+    def _remove_part(self, item):
+        if self.upload:
+            self.walker._run(lambda sftp: AtomicFileWriter._remove_remote(sftp, item['part']))
+        else:
+            AtomicFileWriter._remove_local(item['part'])
+
+# 目录同步的辅助程序源码，服务器端通过 python3 -c 执行（serve 模式）
+SYNC_HELPER_SCRIPT = inspect.getsource(sync_helper)
+
+class BandwidthLimiter:
+    """多个线程共享的限速器：按速率为每次发送预约时间段，超出速率时等待"""
+    
+    def __init__(self, rate):
+        self.rate = rate  # 字节/秒
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+    
+    def consume(self, size):
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + size / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+class SyncSession:
+    """服务器上的同步辅助进程（python3 -c SYNC_HELPER_SCRIPT serve），通过一个 exec 通道收发请求和差异记录"""
+    
+    def __init__(self, ssh, limiter=None):
+        self.limiter = limiter
+        self.bytes = 0  # 收发的字节数
+        command = 'python3 -c ' + shlex.quote(SYNC_HELPER_SCRIPT) + ' serve'
+        self.stdin, self.stdout, _ = ssh.exec_command(command)
+        try:
+            header = self.request({'op': 'hello'})
+        except (OSError, ValueError, paramiko.SSHException):
+            header = None
+        if not header or header.get('version') != sync_helper.VERSION:
+            self.close()
+            raise IOError("服务器上无法运行同步辅助程序（需要 python3）")
+    
+    def read(self, size):
+        data = self.stdout.read(size)
+        self._count(len(data))
+        return data
+    
+    def write(self, data):
+        self._count(len(data))
+        self.stdin.write(data)
+    
+    def _count(self, size):
+        self.bytes += size
+        if self.limiter is not None and size:
+            self.limiter.consume(size)
+    
+    def send(self, header, payload=b''):
+        sync_helper.write_message(self.write, header)
+        if payload:
+            self.write(payload)
+        self.stdin.flush()
+    
+    def response(self):
+        header = sync_helper.read_message(self.read)
+        if header is None:
+            raise IOError("同步辅助程序已退出")
+        return header
+    
+    def request(self, header, payload=b''):
+        self.send(header, payload)
+        return self.response()
+    
+    def close(self):
+        try:
+            self.stdin.channel.close()
+        except Exception:
+            pass
+
+class DirectorySync:
+    """rsync 式的目录同步（direction 为 upload：本地 → 远程，download：远程 → 本地）
+    
+    按大小和修改时间比较两侧的目录树（checksum 为真时，大小相同的文件再比较MD5），只传输新增和修改的文件。
+    目标已有旧版本且服务器能运行 python3 时，接收方把旧文件按块计算 adler32 和MD5，发送方用滚动校验
+    在新文件中查找相同的块，只传输复制指令和不同的数据；其余文件用 FileTransfer 整体分块传输。
+    delete 为真时删除目标中源目录没有的文件和目录，dry_run 为真时只返回同步计划。
+    """
+    
+    def __init__(self, file_manager, direction, delete=False, checksum=False, bwlimit=None, workers=None):
+        self.file_manager = file_manager
+        self.direction = direction
+        self.delete = delete
+        self.checksum = checksum
+        self.limiter = BandwidthLimiter(bwlimit) if bwlimit else None
+        self.workers = workers or Config.SYNC_WORKERS
+        self.transfer = FileTransfer(file_manager, direction, limiter=self.limiter)
+        self.upload = self.transfer.upload
+        self._sessions = queue.Queue()
+        self._session_bytes = 0
+        self._lock = threading.Lock()
+    
+    def run(self, source, target, progress=None, dry_run=False):
+        """同步 source 到 target，返回 (计划, 统计)；计划中每项为 {'path', 'action', 'size'}"""
+        progress = progress or (lambda **kwargs: None)
+        started = time.time()
+        progress(message='正在比较目录')
+        plan, files = self._plan(source, target)
+        summary = {action: sum(1 for item in plan if item['action'] == action)
+                   for action in ('create', 'update', 'delete', 'mkdir', 'touch')}
+        summary['bytes'] = sum(item['size'] for item in plan if item['action'] in ('create', 'update'))
+        summary['skipped'] = [item['path'] for item in plan if item['action'] == 'skip']
+        if dry_run:
+            return plan, summary
+        
+        failed = []
+        self._delete([item for item in plan if item['action'] == 'delete'], failed, progress)
+        self.transfer._make_directories([item['target'] for item in plan if item['action'] == 'mkdir'])
+        
+        touched = [files[item['path']] for item in plan if item['action'] == 'touch']
+        for item, _, error in run_parallel(self._touch, touched, self.workers):
+            if error:
+                failed.append({'path': item['target'], 'message': str(error)})
+        
+        updates = [files[item['path']] for item in plan if item['action'] == 'update']
+        deltas = [item for item in updates if item['basis_size'] >= Config.SYNC_DELTA_MIN_SIZE]
+        summary['delta'] = bool(deltas) and self._delta_available()
+        if not summary['delta']:
+            deltas = []
+        delta_ids = {id(item) for item in deltas}
+        whole = [files[item['path']] for item in plan if item['action'] == 'create'] + \
+                [item for item in updates if id(item) not in delta_ids]
+        
+        try:
+            delta_size = self._sync_deltas(deltas, failed, progress)
+            transferred = 0
+            if whole:
+                progress(message='正在传输文件')
+                result = self.transfer.transfer(whole, [], source, target, progress)
+                failed.extend(result['failed'])
+                transferred = result['transferred_bytes']
+        finally:
+            self._close_sessions()
+        
+        elapsed = time.time() - started
+        summary.update({
+            'failed': failed,
+            'delta_files': len(deltas),
+            'delta_size': delta_size,
+            'transferred_bytes': transferred + self._session_bytes,
+            'elapsed': round(elapsed, 2)
+        })
+        return plan, summary
+    
+    def _scan(self, remote, root):
+        """列出一侧的目录树，返回 {相对路径: 子项}；根目录不存在时返回 None"""
+        try:
+            info = self.transfer.walker._run(lambda sftp: sftp.stat(root)) if remote else os.stat(root)
+        except FileNotFoundError:
+            return None
+        if not stat.S_ISDIR(info.st_mode):
+            raise NotADirectoryError(f"不是目录: {root}")
+        
+        path = posixpath if remote else os.path
+        walker = self.file_manager.get_remote_walker() if remote else LocalWalker()
+        tree = {}
+        for directory, entries in walker.walk(root):
+            for entry in entries:
+                relative = path.relpath(entry['path'], root)
+                tree[relative.replace(path.sep, '/')] = entry
+        if walker.errors:
+            directory, message = next(iter(walker.errors.items()))
+            raise IOError(f"无法列出目录 {directory}: {message}")
+        return tree
+    
+    def _plan(self, source, target):
+        """比较两侧目录树，返回 (计划, {相对路径: 传输文件项})"""
+        source_tree = self._scan(not self.upload, source)
+        if source_tree is None:
+            raise FileNotFoundError(f"源目录不存在: {source}")
+        target_tree = self._scan(self.upload, target)
+        
+        plan = []
+        files = {}
+        if target_tree is None:
+            target_tree = {}
+            plan.append({'path': '', 'target': target, 'action': 'mkdir', 'size': 0})
+        
+        def target_of(relative):
+            return self.transfer.target_path.join(target, *relative.split('/'))
+        
+        def add(relative, action, size=0):
+            plan.append({'path': relative, 'target': target_of(relative), 'action': action, 'size': size})
+        
+        conflicts = set()  # 类型不同、需要先删除的目标
+        blocked = set()  # 目标已有同名的非目录项、无法创建的目录
+        for relative in sorted(source_tree):
+            entry = source_tree[relative]
+            kind = self._kind(entry)
+            if kind == 'other' or relative.rpartition('/')[0] in blocked:
+                if kind == 'dir':
+                    blocked.add(relative)
+                add(relative, 'skip')
+                continue
+            
+            existing = target_tree.get(relative)
+            if existing is not None and self._kind(existing) != kind:
+                if not self.delete:
+                    # 不删除目标内容时保留类型不同的同名项
+                    if kind == 'dir':
+                        blocked.add(relative)
+                    add(relative, 'skip')
+                    continue
+                conflicts.add(relative)
+                existing = None
+            if kind == 'dir':
+                if existing is None:
+                    add(relative, 'mkdir')
+                continue
+            
+            item = self.transfer._item(entry['path'], target_of(relative), entry['size'], entry['mtime'], entry['mode'])
+            item['basis_size'] = 0
+            if existing is None:
+                add(relative, 'create', entry['size'])
+            elif existing['size'] != entry['size'] or abs(existing['mtime'] - entry['mtime']) > Config.SYNC_MTIME_TOLERANCE:
+                item['basis_size'] = existing['size']
+                add(relative, 'update', entry['size'])
+            else:
+                continue
+            files[relative] = item
+        
+        if self.checksum:
+            self._compare_checksums(plan, files, source_tree, target_tree)
+        
+        # 只删除最上层的多余路径，其下的内容随之删除；删除排在计划最前面（按路径逆序）
+        deletes = []
+        for relative in sorted(target_tree):
+            parent = relative.rpartition('/')[0]
+            if parent and (parent not in source_tree or parent in conflicts):
+                continue
+            if relative in conflicts or (self.delete and relative not in source_tree):
+                deletes.append({'path': relative, 'target': target_of(relative), 'action': 'delete', 'size': 0})
+        return deletes[::-1] + plan, files
+    
+    @staticmethod
+    def _kind(entry):
+        if entry['is_dir']:
+            return 'dir'
+        return 'file' if stat.S_ISREG(entry['mode']) else 'other'
+    
+    def _compare_checksums(self, plan, files, source_tree, target_tree):
+        """大小相同、修改时间不同的文件比较MD5，内容相同的只更新目标的修改时间"""
+        candidates = [item for item in plan if item['action'] == 'update'
+                      and source_tree[item['path']]['size'] == target_tree[item['path']]['size']]
+        if not candidates:
+            return
+        local_side, remote_side = (source_tree, target_tree) if self.upload else (target_tree, source_tree)
+        remote_stats = {remote_side[item['path']]['path']: (remote_side[item['path']]['size'], remote_side[item['path']]['mtime'])
+                        for item in candidates}
+        remote = self.file_manager.hasher.hash_files(list(remote_stats), stats=remote_stats)
+        local_paths = [local_side[item['path']]['path'] for item in candidates]
+        local = {path: digest for path, digest, _ in run_parallel(FileTransfer._hash_local, local_paths, self.workers)}
+        for item in candidates:
+            digest = local.get(local_side[item['path']]['path'])
+            if digest is not None and digest == remote.get(remote_side[item['path']]['path']):
+                item['action'] = 'touch'
+                item['size'] = 0
+    
+    def _delete(self, items, failed, progress):
+        if not items:
+            return
+        progress(message='正在删除多余的文件')
+        paths = [item['target'] for item in items]
+        if self.upload:
+            results, _ = BatchDeleter(self.file_manager, self.workers).delete(paths, progress)
+            failed.extend({'path': result['path'], 'message': result['message']}
+                          for result in results if not result['success'])
+            return
+        for path in paths:
+            try:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except OSError as e:
+                failed.append({'path': path, 'message': str(e)})
+    
+    def _touch(self, item):
+        times = (item['mtime'], item['mtime'])
+        if self.upload:
+            self.transfer.walker._run(lambda sftp: sftp.utime(item['target'], times))
+        else:
+            os.utime(item['target'], times)
+    
+    def _delta_available(self):
+        """服务器能否运行同步辅助程序"""
+        if not self.file_manager.can_exec():
+            return False
+        try:
+            self._sessions.put(SyncSession(self.file_manager.ssh, self.limiter))
+            return True
+        except Exception:
+            return False
+    
+    @contextmanager
+    def _session(self):
+        """借用一个辅助进程；出错时关闭，因为收发的数据可能已不完整"""
+        try:
+            session = self._sessions.get_nowait()
+        except queue.Empty:
+            session = SyncSession(self.file_manager.ssh, self.limiter)
+        try:
+            yield session
+        except BaseException:
+            self._retire(session)
+            raise
+        self._sessions.put(session)
+    
+    def _retire(self, session):
+        session.close()
+        with self._lock:
+            self._session_bytes += session.bytes
+    
+    def _close_sessions(self):
+        while True:
+            try:
+                self._retire(self._sessions.get_nowait())
+            except queue.Empty:
+                return
+    
+    @staticmethod
+    def block_size(size):
+        """按旧文件大小选择块大小（约为大小的平方根），签名数据约占文件的 20/块大小"""
+        block = int(math.sqrt(size)) // 1024 * 1024
+        return min(max(block, Config.SYNC_BLOCK_MIN), Config.SYNC_BLOCK_MAX)
+    
+    def _sync_deltas(self, items, failed, progress):
+        """用差异传输同步已有旧版本的文件，返回这些文件的总字节数"""
+        total = sum(item['size'] for item in items)
+        done = 0
+        sync = self._push_delta if self.upload else self._pull_delta
+        for item, _, error in run_parallel(sync, items, self.workers):
+            if error:
+                failed.append({'path': item['target'], 'message': str(error)})
+            done += item['size']
+            progress(bytes_done=done, bytes_total=total,
+                     message=f"正在差异同步 {self.transfer.source_path.basename(item['source'])}")
+        return total
+    
+    def _push_delta(self, item):
+        """服务器计算旧文件的块签名，本地生成差异记录发送给服务器重建"""
+        block = self.block_size(item['basis_size'])
+        with self._session() as session:
+            header = session.request({'op': 'sig', 'path': item['target'], 'block': block})
+            if not header['ok']:
+                raise IOError(header['error'])
+            signatures = session.read(header['length'])
+            session.send({'op': 'patch', 'basis': item['target'], 'target': item['target'], 'block': block,
+                          'mode': stat.S_IMODE(item['mode']), 'mtime': item['mtime']})
+            with open(item['source'], 'rb') as f:
+                data = sync_helper.open_data(f)
+                try:
+                    sync_helper.delta(data, signatures, block, header['size'], session.write)
+                finally:
+                    if isinstance(data, mmap.mmap):
+                        data.close()
+            session.stdin.flush()
+            result = session.response()
+            if not result['ok']:
+                raise IOError(result['error'])
+    
+    def _pull_delta(self, item):
+        """本地计算旧文件的块签名，服务器生成差异记录，本地重建后替换"""
+        target = item['target']
+        with open(target, 'rb') as basis:
+            basis_size = os.fstat(basis.fileno()).st_size
+            block = self.block_size(basis_size)
+            signatures = sync_helper.signature(basis, block)
+            with self._session() as session:
+                header = session.request({'op': 'delta', 'path': item['source'], 'block': block,
+                                          'basis_size': basis_size, 'length': len(signatures)}, signatures)
+                if not header['ok']:
+                    raise IOError(header['error'])
+                temp = AtomicFileWriter._sibling(os.path, target, 'sync')
+                try:
+                    with open(temp, 'xb') as out:
+                        digest, expected = sync_helper.patch(basis, out.write, session.read, block)
+                    if digest != expected:
+                        raise IOError("MD5校验不一致")
+                    permissions = stat.S_IMODE(item['mode'])
+                    if permissions:
+                        os.chmod(temp, permissions)
+                    os.utime(temp, (item['mtime'], item['mtime']))
+                    os.replace(temp, target)
+                except BaseException:
+                    AtomicFileWriter._remove_local(temp)
+                    raise
+
+class ConnectionLiveness:
+    """SSH连接存活检测器：缓存检测结果，仅在缓存过期时进行主动探测
+    
+    只有收到服务器的响应才算存活：keepalive、ignore包只是本端发出的数据，不能说明对端仍然在线
+    """
+    
+    def __init__(self, ttl=None, timeout=None):
+        self.ttl = Config.SSH_LIVENESS_TTL if ttl is None else ttl
+        self.timeout = Config.SSH_LIVENESS_TIMEOUT if timeout is None else timeout
+        self._lock = threading.Lock()
+        self._last_ok = 0.0
+        self._probing = None  # 正在进行的探测，完成时 set
+        self._probe_ok = False
+        self.stats = {}
+        self.reset_stats()
+    
+    def reset_stats(self):
+        """重置统计信息"""
+        self.stats = {
+            'checks': 0,
+            'cache_hits': 0,
+            'probes': 0,
+            'probe_waits': 0,
+            'probe_failures': 0,
+            'transport_failures': 0,
+            'probe_time_total': 0.0,
+            'last_probe_latency': None
+        }
+    
+    def mark_alive(self):
+        """标记连接刚刚确认可用（如连接建立后）"""
+        self._last_ok = time.time()
+    
+    def reset(self):
+        """清除缓存的检测结果"""
+        self._last_ok = 0.0
+    
+    def check(self, ssh, sftp):
+        """检查连接是否存活
+        
+        探测在锁外进行；同时到来的检查等待同一次探测的结果（最长 timeout 秒），不会各自发出探测
+        """
+        self.stats['checks'] += 1
+        transport = ssh.get_transport() if ssh else None
+        if transport is None or not transport.is_active():
+            self.stats['transport_failures'] += 1
+            self.reset()
+            return False
+        
+        with self._lock:
+            if time.time() - self._last_ok < self.ttl:
+                self.stats['cache_hits'] += 1
+                return True
+            probing = self._probing
+            if probing is None:
+                probing = self._probing = threading.Event()
+                owner = True
+            else:
+                owner = False
+        
+        if not owner:
+            self.stats['probe_waits'] += 1
+            probing.wait(self.timeout)
+            return self._probe_ok and transport.is_active()
+        
+        try:
+            ok = self._probe(transport, sftp)
+        finally:
+            with self._lock:
+                self._probing = None
+            probing.set()
+        return ok
+    
+    def _probe(self, transport, sftp):
+        """主动探测：优先使用SFTP stat，没有SFTP通道时打开一个会话通道
+        
+        两种方式都要等到服务器响应，等待超过 timeout 秒视为连接失效
+        """
+        self.stats['probes'] += 1
+        start = time.time()
+        try:
+            if sftp is not None:
+                channel = sftp.get_channel()
+                previous = channel.gettimeout()
+                channel.settimeout(self.timeout)
+                try:
+                    sftp.stat('.')
+                finally:
+                    channel.settimeout(previous)
+            else:
+                try:
+                    transport.open_session(timeout=self.timeout).close()
+                except paramiko.ChannelException:
+                    pass  # 服务器拒绝打开通道（如超过会话数限制）也是响应
+            ok = transport.is_active()
+        except Exception:
+            ok = False
+        latency = time.time() - start
+        self.stats['probe_time_total'] += latency
+        self.stats['last_probe_latency'] = round(latency * 1000, 2)
+        
+        self._probe_ok = ok
+        if ok:
+            self._last_ok = time.time()
+        else:
+            self.stats['probe_failures'] += 1
+            self._last_ok = 0.0
+        return ok
+    
+    def get_stats(self):
+        """获取探测统计信息（延迟单位：毫秒）"""
+        stats = dict(self.stats)
+        probe_time_total = stats.pop('probe_time_total')
+        stats['avg_probe_latency'] = round(probe_time_total / stats['probes'] * 1000, 2) if stats['probes'] else None
+        stats['probe_ratio'] = round(stats['probes'] / stats['checks'], 4) if stats['checks'] else 0
+        stats['ttl'] = self.ttl
+        return stats
+
+class ListingCache:
+    """内存中的目录列表缓存，按 (主机, 目录) 存储
+    
+    - 使用前用一次stat取得目录修改时间，与缓存时的修改时间不同则重新列出
+    - 超过TTL的条目直接丢弃；目录项总数超过上限时按LRU淘汰
+    - 本进程修改文件系统后调用 invalidate 使相关目录失效
+    目录修改时间只反映子项的增删和改名，子项自身大小和时间的变化由TTL和主动失效兜底。
+    """
+    
+    def __init__(self, ttl=None, max_items=None):
+        self.ttl = Config.LISTING_CACHE_TTL if ttl is None else ttl
+        self.max_items = Config.LISTING_CACHE_MAX_ITEMS if max_items is None else max_items
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (主机, 目录) -> (目录修改时间, 缓存时间, 目录项列表)
+        self._item_count = 0
+        self.stats = {}
+        self.reset_stats()
+    
+    def reset_stats(self):
+        """重置统计信息"""
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0}
+    
+    @staticmethod
+    def _normalize(path):
+        return path.replace('\\', '/').rstrip('/') or '/'
+    
+    def get(self, host, path, mtime):
+        """返回仍然有效的缓存列表，没有或已失效时返回None"""
+        key = (host, self._normalize(path))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            if time.time() - entry[1] > self.ttl:
+                self.stats['expired'] += 1
+                self._remove(key)
+                return None
+            if entry[0] != mtime:
+                self.stats['stale'] += 1
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[2]
+    
+    def put(self, host, path, mtime, items, mtime_after):
+        """缓存目录列表；mtime 和 mtime_after 为列目录前后两次stat得到的目录修改时间
+        
+        两者不同说明目录在列出期间被修改，列表可能不完整，这种情况不缓存。只比较服务器给出的时间，
+        不受本地与服务器时钟偏差的影响；列出后同一秒内的修改无法由修改时间发现，由TTL兜底。
+        """
+        if mtime is None or mtime != mtime_after or len(items) > self.max_items:
+            return
+        key = (host, self._normalize(path))
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (mtime, time.time(), items)
+            self._item_count += len(items)
+            while self._item_count > self.max_items:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats['evictions'] += 1
+    
+    def invalidate(self, host, path, recursive=False):
+        """使目录及其父目录的缓存失效；recursive 为真时同时使所有子目录失效"""
+        path = self._normalize(path)
+        parent = path.rsplit('/', 1)[0] or '/'
+        prefix = path.rstrip('/') + '/'
+        with self._lock:
+            keys = [
+                key for key in self._entries
+                if key[0] == host and (key[1] in (path, parent) or (recursive and key[1].startswith(prefix)))
+            ]
+            for key in keys:
+                self._remove(key)
+            self.stats['invalidations'] += len(keys)
+    
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._item_count -= len(entry[2])
+    
+    def get_stats(self):
+        """获取缓存统计信息"""
+        stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses'] + stats['stale'] + stats['expired']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0
+        stats['directories'] = len(self._entries)
+        stats['items'] = self._item_count
+        return stats
+
+class BrowseCursors:
+    """目录浏览的服务器端游标：保存排序、过滤后的完整列表，翻页时不再重新列出目录
+    
+    游标与创建时的目录、排序字段、顺序和过滤条件绑定，任一条件不同时视为无效。
+    """
+    
+    SORT_KEYS = {
+        'name': lambda item: item.name.lower(),
+        'size': lambda item: (item.size, item.name.lower()),
+        'mtime': lambda item: (item.mtime, item.name.lower())
+    }
+    
+    def __init__(self, max_cursors=None, ttl=None):
+        self.max_cursors = max_cursors or Config.BROWSE_MAX_CURSORS
+        self.ttl = Config.BROWSE_CURSOR_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._cursors = OrderedDict()  # 游标 -> (创建时间, (路径, 排序, 顺序, 过滤条件), 列表)
+    
+    @classmethod
+    def prepare(cls, items, sort='name', order='asc', pattern=None):
+        """按名称通配符过滤并排序，目录始终排在文件前面
+        
+        不含通配符的 pattern 按包含匹配，匹配不区分大小写。
+        """
+        if pattern:
+            if not GitignoreMatcher._WILDCARDS.search(pattern):
+                pattern = f'*{pattern}*'
+            match = re.compile(fnmatch.translate(pattern), re.IGNORECASE).match
+            items = [item for item in items if match(item.name)]
+        else:
+            items = list(items)
+        items.sort(key=cls.SORT_KEYS.get(sort, cls.SORT_KEYS['name']), reverse=order == 'desc')
+        items.sort(key=lambda item: not item.is_dir)
+        return items
+    
+    @staticmethod
+    def key(path, sort='name', order='asc', pattern=None):
+        """游标绑定的浏览条件"""
+        return path, sort, order, pattern or ''
+    
+    def create(self, key, items):
+        """保存列表并返回新游标，key 为 BrowseCursors.key() 的返回值"""
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._purge()
+            self._cursors[token] = (time.time(), key, items)
+            while len(self._cursors) > self.max_cursors:
+                self._cursors.popitem(last=False)
+        return token
+    
+    def get(self, token, key):
+        """返回游标对应的列表，游标不存在、已过期或浏览条件不同时返回None"""
+        with self._lock:
+            self._purge()
+            entry = self._cursors.get(token)
+            if entry is None or entry[1] != key:
+                return None
+            self._cursors.move_to_end(token)
+            return entry[2]
+    
+    def _purge(self):
+        now = time.time()
+        for token in [token for token, entry in self._cursors.items() if now - entry[0] > self.ttl]:
+            del self._cursors[token]
+
+class EventBus:
+    """进程内事件总线：每个订阅者一个有界队列，发布时复制给所有订阅者"""
+    
+    def __init__(self, queue_size=None):
+        self.queue_size = queue_size or Config.EVENT_QUEUE_SIZE
+        self._lock = threading.Lock()
+        self._subscribers = []
+    
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+    
+    def subscribe(self):
+        """新增订阅者，返回其事件队列"""
+        subscription = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+    
+    def publish(self, event, data):
+        """发布事件；订阅者积压过多时丢弃其最早的事件，不阻塞发布者"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            while True:
+                try:
+                    subscription.put_nowait((event, data))
+                    break
+                except queue.Full:
+                    try:
+                        subscription.get_nowait()
+                    except queue.Empty:
+                        pass
+
+class ConnectionMonitor:
+    """有推送订阅者时在后台定期检测各客户端的连接状态，状态变化通过各自的事件总线推送
+    
+    检测使用带缓存的存活检测，无论打开多少个页面，服务器端对每个连接的检测频率都是固定的。
+    """
+    
+    def __init__(self, clients, interval=None):
+        self.clients = clients
+        self.interval = interval or Config.CONNECTION_MONITOR_INTERVAL
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def ensure_running(self):
+        """启动监控线程（已在运行时不重复启动）"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='connection-monitor', daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                watched = [fm for fm in self.clients.managers() if fm.events.subscriber_count]
+                if not watched:
+                    # 没有订阅者时退出，下一个订阅者会重新启动
+                    self._thread = None
+                    return
+            for fm in watched:
+                if fm.mode == 'remote' and fm.connected:
+                    fm.is_connected()
+
+class JobCancelled(Exception):
+    """后台任务被取消"""
+
+class Job:
+    """后台任务：记录状态、进度和结果"""
+    
+    FINISHED = ('succeeded', 'failed', 'cancelled')
+    
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = 'pending'  # pending / running / succeeded / failed / cancelled
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.progress = {'done': 0, 'total': None, 'bytes': 0, 'bytes_total': None, 'message': ''}
+        self.result = None
+        self.error = None
+        self.future = None
+        self.notify = None  # 状态或进度变化时的回调 notify(job, force)
+        self.owner = None  # 提交任务的客户端
+        self.events = None  # 推送该任务事件的事件总线（提交任务的客户端的）
+        self._cancel = threading.Event()
+    
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED
+    
+    def report(self, done=None, total=None, bytes_done=None, bytes_total=None, message=None):
+        """更新进度；任务已被请求取消时抛出 JobCancelled"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        progress = self.progress
+        if done is not None:
+            progress['done'] = done
+        if total is not None:
+            progress['total'] = total
+        if bytes_done is not None:
+            progress['bytes'] = bytes_done
+        if bytes_total is not None:
+            progress['bytes_total'] = bytes_total
+        if message is not None:
+            progress['message'] = message
+        if self.notify is not None:
+            self.notify(self, False)
+    
+    def cancel(self):
+        """请求取消：未开始的任务直接取消，运行中的任务在下一次报告进度时停止"""
+        self._cancel.set()
+        if self.future is not None and self.future.cancel():
+            self._finish('cancelled')
+    
+    def _finish(self, status, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.finished = time.time()
+        self.status = status
+        if self.notify is not None:
+            self.notify(self, True)
+    
+    def eta(self):
+        """按已处理的字节数（没有时按条目数）估算剩余秒数"""
+        if self.status != 'running' or not self.started:
+            return None
+        progress = self.progress
+        if progress['bytes_total']:
+            done, total = progress['bytes'], progress['bytes_total']
+        else:
+            done, total = progress['done'], progress['total']
+        if not total or not done:
+            return None
+        elapsed = time.time() - self.started
+        return round(elapsed * max(total - done, 0) / done, 1)
+    
+    def to_dict(self, with_result=False):
+        """任务状态；with_result 为真时附带任务结果"""
+        end = self.finished or time.time()
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'eta': self.eta(),
+            'created': datetime.fromtimestamp(self.created).strftime('%Y-%m-%d %H:%M:%S'),
+            'elapsed': round(end - self.started, 2) if self.started else 0,
+            'error': self.error
+        }
+        if with_result:
+            data['result'] = self.result
+        return data
 
-class RemoteEmptyDirCleaner:
-    """远程SSH空目录清理器"""
+class JobManager:
+    """后台任务管理器：在线程池中运行耗时操作，已结束的任务按时间和数量淘汰
     
-    def __init__(self, sftp, ssh):
-        self.sftp = sftp
-        self.ssh = ssh
-        self.removed_dirs = []
+    任务状态变化和（限频后的）进度以 job 事件推送到提交时指定的事件总线，未指定时使用 events。
+    工作线程由所有客户端共用，任务按 owner 区分所属客户端。
+    """
     
-    def clean_empty_directories(self, directory):
-        """清理远程空目录"""
-        try:
-            # 检查目录是否存在
-            try:
-                stat_info = self.sftp.stat(directory)
-                if not stat.S_ISDIR(stat_info.st_mode):
-                    return False, f"路径不是目录: {directory}", []
-            except:
-                return False, f"目录不存在或无法访问: {directory}", []
-            
-            self.removed_dirs = []
-            self._clean_recursive(directory)
-            
-            if self.removed_dirs:
-                message = f"成功删除 {len(self.removed_dirs)} 个空目录:\n" + '\n'.join(self.removed_dirs)
-                return True, message, self.removed_dirs
-            else:
-                return True, "没有找到空目录", []
-        
-        except Exception as e:
-            return False, f"清理空目录失败: {str(e)}", []
+    def __init__(self, max_workers=None, retention=None, max_retained=None, events=None):
+        self.events = events
+        self._last_notified = {}  # 任务ID -> 最近一次推送进度的时间
+        self.retention = Config.JOB_RETENTION if retention is None else retention
+        self.max_retained = Config.JOB_MAX_RETAINED if max_retained is None else max_retained
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or Config.JOB_WORKERS,
+                                            thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # 任务ID -> Job，按提交顺序
     
-    def _clean_recursive(self, directory):
-        """递归清理空目录"""
-        try:
-            # 先处理子目录
-            subdirs = []
-            for item in self.sftp.listdir_attr(directory):
-                item_path = directory.rstrip('/') + '/' + item.filename
-                if stat.S_ISDIR(item.st_mode):
-                    subdirs.append(item_path)
-            
-            # 递归清理子目录
-            for subdir in subdirs:
-                self._clean_recursive(subdir)
-            
-            # 检查当前目录是否为空
-            if not self.sftp.listdir(directory):
-                try:
-                    self.sftp.rmdir(directory)
-                    self.removed_dirs.append(directory)
-                except Exception:
-                    # 忽略无法删除的目录
-                    pass
-        
-        except Exception:
-            pass
-
-class EmptyDirCleaner:
-    """Python实现的空目录清理器"""
+    def submit(self, kind, func, owner=None, events=None):
+        """提交任务，func(job) 的返回值作为任务结果"""
+        job = Job(kind)
+        job.notify = self._notify
+        job.owner = owner
+        job.events = events
+        with self._lock:
+            self._purge()
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, func)
+        self._notify(job, True)
+        return job
     
-    def __init__(self):
-        self.removed_dirs = []
+    def _notify(self, job, force):
+        """推送任务事件；进度事件按任务限频，状态变化总是推送"""
+        events = job.events if job.events is not None else self.events
+        if events is None or not events.subscriber_count:
+            return
+        now = time.time()
+        if not force and now - self._last_notified.get(job.id, 0) < Config.EVENT_JOB_INTERVAL:
+            return
+        self._last_notified[job.id] = now
+        if job.is_finished:
+            self._last_notified.pop(job.id, None)
+        events.publish('job', job.to_dict())
     
-    def clean_empty_directories(self, directory):
-        """清理空目录"""
-        if not os.path.exists(directory):
-            return False, f"目录不存在: {directory}", []
-        
-        if not os.path.isdir(directory):
-            return False, f"路径不是目录: {directory}", []
-        
-        self.removed_dirs = []
-        
+    def _run(self, job, func):
+        if job.is_finished:
+            return
+        job.started = time.time()
+        job.status = 'running'
+        self._notify(job, True)
         try:
-            self._clean_recursive(directory)
-            
-            if self.removed_dirs:
-                message = f"成功删除 {len(self.removed_dirs)} 个空目录:\n" + '\n'.join(self.removed_dirs)
-                return True, message, self.removed_dirs
-            else:
-                return True, "没有找到空目录", []
-        
+            result = func(job)
+        except JobCancelled as e:
+            job._finish('cancelled', error=str(e) or None)
         except Exception as e:
-            return False, f"清理空目录失败: {str(e)}", []
+            job._finish('failed', error=str(e))
+        else:
+            job._finish('succeeded', result)
     
-    def _clean_recursive(self, directory):
-        """递归清理空目录"""
-        try:
-            # 先处理子目录
-            subdirs = []
-            for item in os.listdir(directory):
-                item_path = os.path.join(directory, item)
-                if os.path.isdir(item_path):
-                    subdirs.append(item_path)
-            
-            # 递归清理子目录
-            for subdir in subdirs:
-                self._clean_recursive(subdir)
-            
-            # 检查当前目录是否为空
-            if not os.listdir(directory):
-                try:
-                    os.rmdir(directory)
-                    self.removed_dirs.append(directory)
-                except OSError as e:
-                    # 忽略无法删除的目录
-                    pass
-        
-        except PermissionError:
-            pass
-        except Exception:
-            pass
+    def get(self, job_id, owner=None):
+        """获取任务；指定 owner 时只返回该客户端的任务"""
+        with self._lock:
+            self._purge()
+            job = self._jobs.get(job_id)
+        if job is not None and owner is not None and job.owner != owner:
+            return None
+        return job
+    
+    def list(self, owner=None):
+        with self._lock:
+            self._purge()
+            return [job for job in self._jobs.values() if owner is None or job.owner == owner]
+    
+    def cancel(self, job_id, owner=None):
+        """取消任务，返回任务对象（不存在时返回None）"""
+        job = self.get(job_id, owner)
+        if job is not None and not job.is_finished:
+            job.cancel()
+        return job
+    
+    def _purge(self):
+        """淘汰过期的已结束任务，以及超出数量上限的最早提交的已结束任务"""
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.is_finished]
+        for index, job in enumerate(finished):
+            if now - job.finished > self.retention or index < len(finished) - self.max_retained:
+                del self._jobs[job.id]
 
 class FileManager:
-    def __init__(self):
+    def __init__(self, hash_cache=None, listing_cache=None, rename_lock=None, pool=None):
+        """hash_cache、listing_cache、rename_lock、pool 可由多个客户端的 FileManager 共用，未提供时各自创建"""
         self.ssh = None
-        self.sftp = None
+        self._sftp = None
         self.connected = False
         self.mode = 'local'  # 'local' 或 'remote'
         self.tree_generator = TreeGenerator()
         self.empty_dir_cleaner = EmptyDirCleaner()
         self.connection_info = {}  # 存储连接信息用于重连
         self.connection_history_file = 'connection_history.json'  # 连接历史文件
+        self.liveness = ConnectionLiveness()  # 连接存活检测器
+        self.pool = pool or SSHConnectionPool()  # 按主机划分的SSH/SFTP连接池
+        self.connection_id = None  # 当前连接的 username@host:port
+        self._local = threading.local()  # 当前线程借出的SFTP通道
+        self._exec_available = None  # 远程主机是否允许执行命令
+        self._sftp_unsupported = set()  # 远程SFTP服务器不支持的扩展
+        self.writer = AtomicFileWriter(self)
+        self.hasher = FileHasher(self, hash_cache or HashCache())
+        self.deduper = DuplicateFinder(self)
+        self.events = EventBus()  # 连接状态、重连和任务进度的推送事件
+        self.browse_cursors = BrowseCursors()
+        self.rename_lock = rename_lock or threading.Lock()  # 批量重命名和撤销共用一个日志文件，同一时间只运行一个
+        self.listing_cache = listing_cache or ListingCache()
+        self.line_indexes = LineIndexCache()
+        self._published_state = None
+    
+    @property
+    def sftp(self):
+        """当前线程使用的SFTP通道：优先使用借出的池化通道，否则使用主通道"""
+        session = getattr(self._local, 'sftp', None)
+        return session if session is not None else self._sftp
+    
+    @sftp.setter
+    def sftp(self, value):
+        self._sftp = value
+    
+    @contextmanager
+    def sftp_session(self):
+        """为当前请求从连接池借出独立的SFTP通道，使并发请求互不阻塞"""
+        if self.mode != 'remote' or not self.connected or not self.connection_id:
+            yield self.sftp
+            return
+        
+        with ExitStack() as stack:
+            try:
+                sftp = stack.enter_context(self.pool.checkout(self.connection_id))
+            except Exception:
+                # 连接池不可用时回退到主通道
+                sftp = None
+            if sftp is None:
+                yield self.sftp
+                return
+            
+            previous = getattr(self._local, 'sftp', None)
+            self._local.sftp = sftp
+            try:
+                yield sftp
+            finally:
+                self._local.sftp = previous
+    
+    @property
+    def cache_host(self):
+        """缓存中区分主机的标识：本地模式为 local，远程模式为连接标识"""
+        return self.connection_id if self.mode == 'remote' and self.connection_id else 'local'
+    
+    def _make_connection_id(self, hostname, username, port):
+        """生成连接标识"""
+        return f"{username}@{hostname}:{port}"
+    
+    @staticmethod
+    def _credential(*parts):
+        """连接池用来判断能否共用已认证传输的凭据摘要"""
+        return hashlib.sha256('\0'.join(parts).encode('utf-8', errors='surrogateescape')).digest()
+    
+    def _open_connection(self, hostname, username, port, credential, **auth):
+        """从连接池获取到主机的SSH连接（没有可共用的已认证传输时新建并认证），并打开主SFTP通道"""
+        def connect():
+            ssh = paramiko.SSHClient()
+            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            try:
+                # 设置更健壮的连接参数
+                ssh.connect(
+                    hostname=hostname,
+                    port=port,
+                    username=username,
+                    timeout=Config.SSH_TIMEOUT,
+                    banner_timeout=Config.SSH_BANNER_TIMEOUT,
+                    auth_timeout=Config.SSH_AUTH_TIMEOUT,
+                    look_for_keys=False,
+                    allow_agent=False,
+                    **auth
+                )
+            except Exception:
+                ssh.close()
+                raise
+            # 设置保持连接活跃
+            ssh.get_transport().set_keepalive(Config.SSH_KEEPALIVE_INTERVAL)
+            return ssh
+        
+        connection_id = self._make_connection_id(hostname, username, port)
+        ssh = self.pool.open(connection_id, credential, connect)
+        try:
+            sftp = ssh.open_sftp()
+        except Exception:
+            self.pool.release_host(connection_id, ssh, close=True)
+            raise
+        
+        previous_id, previous_ssh, previous_sftp = self.connection_id, self.ssh, self._sftp
+        self.ssh = ssh
+        self.sftp = sftp
+        self.connection_id = connection_id
+        self.connected = True
+        self.liveness.mark_alive()
+        self._exec_available = None
+        self._sftp_unsupported = set()
+        if previous_sftp is not None:
+            try:
+                previous_sftp.close()
+            except Exception:
+                pass
+        if previous_id:
+            self.pool.release_host(previous_id, previous_ssh)
+    
+    def run_remote_command(self, command, timeout=None):
+        """在远程主机执行命令，返回 (退出码, 标准输出, 标准错误)"""
+        stdin, stdout, stderr = self.ssh.exec_command(command, timeout=timeout)
+        stdin.close()
+        output = stdout.read()
+        error = stderr.read()
+        return stdout.channel.recv_exit_status(), output, error
+    
+    def can_exec(self):
+        """检测远程主机是否允许执行命令（结果按连接缓存）"""
+        if self.mode != 'remote' or not self.ssh:
+            return False
+        if self._exec_available is None:
+            try:
+                status, output, _ = self.run_remote_command('echo ok', timeout=Config.SSH_TIMEOUT)
+                self._exec_available = status == 0 and output.strip() == b'ok'
+            except Exception:
+                self._exec_available = False
+        return self._exec_available
+    
+    def supports_sftp_extension(self, name):
+        """SFTP扩展是否可能可用（尚未发现服务器不支持）"""
+        return name not in self._sftp_unsupported
+    
+    # 有公开接口的扩展（paramiko 2.2 起提供 posix_rename）
+    PUBLIC_SFTP_EXTENSIONS = {'posix-rename@openssh.com': 'posix_rename'}
+    
+    def sftp_extension(self, sftp, name, *args):
+        """发送SFTP扩展请求，服务器或 paramiko 不支持该扩展时返回 False（结果按连接缓存），调用方改用不依赖扩展的方式
+        
+        paramiko 不保留服务器声明的扩展列表，只能直接发送请求，由返回的状态判断是否支持。没有公开接口的扩展
+        （copy-data、hardlink@openssh.com）通过私有的 SFTPClient._request(类型, *参数) 发送：paramiko 1.x 至 3.3.1
+        （requirements 固定的版本）以及之后的 3.x、4.x 中签名相同；该方法不存在或签名改变时视为不支持。
+        """
+        if name in self._sftp_unsupported:
+            return False
+        public = self.PUBLIC_SFTP_EXTENSIONS.get(name)
+        if public and hasattr(sftp, public):
+            request = lambda: getattr(sftp, public)(*args)
+        elif hasattr(sftp, '_request') and hasattr(paramiko.sftp, 'CMD_EXTENDED'):
+            request = lambda: sftp._request(paramiko.sftp.CMD_EXTENDED, name, *args)
+        else:
+            self._sftp_unsupported.add(name)
+            return False
+        try:
+            request()
+        except IOError as e:
+            # SSH_FX_OP_UNSUPPORTED 被 paramiko 转换为不带 errno 的 IOError
+            if e.errno is None and 'unsupported' in str(e).lower():
+                self._sftp_unsupported.add(name)
+                return False
+            raise
+        except (TypeError, AttributeError):
+            # paramiko 内部接口改变
+            self._sftp_unsupported.add(name)
+            return False
+        return True
         
+    def connection_state(self):
+        """当前连接状态（不做存活检测）"""
+        return {
+            'connected': self.mode == 'local' or self.connected,
+            'mode': self.mode,
+            'connection': self.connection_id
+        }
+    
+    def _publish_state(self):
+        """连接状态与上次推送的不同时推送 status 事件"""
+        state = self.connection_state()
+        if state != self._published_state:
+            self._published_state = state
+            self.events.publish('status', state)
+    
     def set_mode(self, mode):
         """设置工作模式：本地或远程"""
         if mode not in ['local', 'remote']:
@@ -348,6 +4906,7 @@ class FileManager:
         self.mode = mode
         if mode == 'local':
             self.disconnect()  # 切换到本地模式时断开SSH连接
+        self._publish_state()
         return True, f"已切换到{'本地' if mode == 'local' else '远程'}模式"
     
     def get_mode(self):
@@ -360,28 +4919,8 @@ class FileManager:
             return False, "请先切换到远程模式"
             
         try:
-            self.ssh = paramiko.SSHClient()
-            self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            # 设置更健壮的连接参数
-            self.ssh.connect(
-                hostname=hostname, 
-                port=port, 
-                username=username, 
-                password=password, 
-                timeout=Config.SSH_TIMEOUT,
-                banner_timeout=Config.SSH_BANNER_TIMEOUT,
-                auth_timeout=Config.SSH_AUTH_TIMEOUT,
-                look_for_keys=False,
-                allow_agent=False
-            )
-            
-            # 设置保持连接活跃
-            transport = self.ssh.get_transport()
-            transport.set_keepalive(Config.SSH_KEEPALIVE_INTERVAL)
-            
-            self.sftp = self.ssh.open_sftp()
-            self.connected = True
+            self._open_connection(hostname, username, port, self._credential('password', password),
+                                  password=password)
             
             # 存储连接信息用于重连
             self.connection_info = {
@@ -395,25 +4934,31 @@ class FileManager:
             # 添加到连接历史
             self.add_connection_to_history(hostname, username, port, 'password')
             
+            self._publish_state()
             return True, "连接成功"
         except Exception as e:
             self.connected = False
+            self._publish_state()
             return False, f"连接失败: {str(e)}"
     
     def disconnect(self):
         """断开SSH连接"""
         try:
-            if self.sftp:
-                self.sftp.close()
-                self.sftp = None
-            if self.ssh:
-                self.ssh.close()
-                self.ssh = None
+            if self._sftp:
+                self._sftp.close()
+                self._sftp = None
+            if self.connection_id:
+                # 传输由连接池管理，其他客户端仍在使用时保持连接
+                self.pool.release_host(self.connection_id, self.ssh, close=True)
+                self.connection_id = None
+            self.ssh = None
         except:
             pass
         finally:
             self.connected = False
             self.connection_info = {}
+            self.liveness.reset()
+            self._publish_state()
     
     def is_connected(self):
         """检查连接状态"""
@@ -422,34 +4967,40 @@ class FileManager:
             
         if not self.connected:
             return False
-        if not self.ssh or not self.sftp:
+        if not self.ssh or not self._sftp:
             self.connected = False
+            self._publish_state()
             return False
-        try:
-            # 尝试执行一个简单的操作来验证连接
-            transport = self.ssh.get_transport()
-            if transport is None or not transport.is_active():
-                self.connected = False
-                return False
-            
-            # 使用轻量级命令测试连接
-            stdin, stdout, stderr = self.ssh.exec_command('echo test', timeout=5)
-            stdout.read()  # 读取输出确保命令执行完成
-            return True
-        except:
+        # 使用带缓存的存活检测，避免每次都在远程执行命令
+        if not self.liveness.check(self.ssh, self._sftp):
             self.connected = False
+            self.events.publish('keepalive_failed', {
+                'connection': self.connection_id,
+                'message': 'SSH连接存活检测失败'
+            })
+            self._publish_state()
             return False
+        return True
     
     def reconnect(self):
-        """重新连接SSH服务器"""
+        """重新连接SSH服务器，每次尝试都会推送 reconnect 事件"""
         if not self.connection_info:
             return False, "没有可用的连接信息"
         
+        # 断开会清空连接信息，需要先保存
+        info = dict(self.connection_info)
+        auth_type = info.pop('auth_type', 'password')
+        connect = self.connect_with_key if auth_type == 'key' else self.connect
         self.disconnect()  # 先断开现有连接
         
         for attempt in range(Config.SSH_MAX_RETRY):
+            self.events.publish('reconnect', {
+                'attempt': attempt + 1,
+                'max_attempts': Config.SSH_MAX_RETRY,
+                'hostname': info.get('hostname')
+            })
             try:
-                success, message = self.connect(**self.connection_info)
+                success, message = connect(**info)
                 if success:
                     return True, f"重连成功（尝试 {attempt + 1}/{Config.SSH_MAX_RETRY}）"
                 else:
@@ -461,6 +5012,7 @@ class FileManager:
                     time.sleep(2)
                 continue
         
+        self.connection_info = dict(info, auth_type=auth_type)  # 保留连接信息以便之后再次重连
         return False, f"重连失败（已尝试 {Config.SSH_MAX_RETRY} 次）"
     
     def ensure_connected(self):
@@ -500,162 +5052,238 @@ class FileManager:
         except:
             return None
     
-    def list_directory(self, path):
-        """列出目录内容"""
+    def list_directory(self, path, fresh=False):
+        """列出目录内容，使用按目录修改时间校验的列表缓存；fresh 为真时重新列出并更新缓存"""
         try:
-            items = []
-            if self.mode == 'local':
-                # Windows系统特殊处理
-                if os.name == 'nt':
-                    # 如果路径是根目录或空，显示所有磁盘驱动器
-                    if path in ['/', '', '.', 'drives']:
-                        import string
-                        for letter in string.ascii_uppercase:
-                            drive = f"{letter}:\\"
-                            if os.path.exists(drive):
-                                items.append({
-                                    'path': drive.replace('\\', '/'),
-                                    'name': f"{letter}: 驱动器",
-                                    'size': 0,
-                                    'is_dir': True,
-                                    'modified': '系统驱动器'
-                                })
-                        return items
-                    
-                    # 标准化Windows路径
-                    if path.startswith('/') and len(path) > 1:
-                        # 将类Unix路径转换为Windows路径
-                        path = path.replace('/', '\\')
-                        if not path.endswith('\\') and len(path) == 2 and path[1] == ':':
-                            path += '\\'
-                
-                # 正常目录列表
-                for item in os.listdir(path):
-                    item_path = os.path.join(path, item)
-                    stat_info = os.stat(item_path)
-                    
-                    # 为Windows系统标准化路径显示
-                    display_path = item_path
-                    if os.name == 'nt':
-                        display_path = item_path.replace('\\', '/')
-                    
-                    items.append({
-                        'path': display_path,
-                        'name': item,
-                        'size': stat_info.st_size,
-                        'is_dir': os.path.isdir(item_path),
-                        'modified': datetime.fromtimestamp(stat_info.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-                    })
-            else:
-                # 远程模式保持原逻辑
-                for item in self.sftp.listdir_attr(path):
-                    item_path = os.path.join(path, item.filename).replace('\\', '/')
-                    items.append({
-                        'path': item_path,
-                        'name': item.filename,
-                        'size': item.st_size,
-                        'is_dir': stat.S_ISDIR(item.st_mode),
-                        'modified': datetime.fromtimestamp(item.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-                    })
-            return items
+            try:
+                mtime = self._directory_mtime(path)
+            except Exception:
+                # 无法stat的路径（如Windows驱动器列表）不缓存
+                return self._read_directory(path)
+            
+            items = None if fresh else self.listing_cache.get(self.cache_host, path, mtime)
+            if items is None:
+                items = self._read_directory(path)
+                self.listing_cache.put(self.cache_host, path, mtime, items, self._directory_mtime_or_none(path))
+            # 返回副本，调用方可以自由排序
+            return list(items)
         except Exception as e:
             return []
     
-    def get_file_hash(self, filepath):
-        """获取文件的MD5哈希值"""
+    def _directory_mtime(self, path):
+        """获取目录的修改时间，用于校验列表缓存"""
+        if self.mode == 'local':
+            return os.stat(path).st_mtime
+        return self.sftp.stat(path).st_mtime
+    
+    def _directory_mtime_or_none(self, path):
+        """列出目录后再次获取修改时间，失败时返回None（不缓存）"""
         try:
-            hash_md5 = hashlib.md5()
-            if self.mode == 'local':
-                with open(filepath, 'rb') as f:
-                    for chunk in iter(lambda: f.read(Config.CHUNK_SIZE), b""):
-                        hash_md5.update(chunk)
-            else:
-                with self.sftp.open(filepath, 'rb') as f:
-                    for chunk in iter(lambda: f.read(Config.CHUNK_SIZE), b""):
-                        hash_md5.update(chunk)
-            return hash_md5.hexdigest()
-        except:
+            return self._directory_mtime(path)
+        except Exception:
             return None
     
-    def compare_directories(self, path1, path2, similarity_threshold=0.8):
-        """比较两个目录，找出重复的文件和文件夹"""
-        items1 = self.list_directory(path1)
-        items2 = self.list_directory(path2)
+    def invalidate_listing(self, path, recursive=False):
+        """本进程修改了文件系统后，使相关目录的列表缓存失效"""
+        self.listing_cache.invalidate(self.cache_host, path, recursive)
+    
+    def _read_directory(self, path):
+        """实际列出目录内容（不使用缓存，失败时抛出异常）"""
+        items = []
+        if self.mode == 'local':
+            # Windows系统特殊处理
+            if os.name == 'nt':
+                # 如果路径是根目录或空，显示所有磁盘驱动器
+                if path in ['/', '', '.', 'drives']:
+                    import string
+                    for letter in string.ascii_uppercase:
+                        drive = f"{letter}:\\"
+                        if os.path.exists(drive):
+                            items.append(DriveEntry(letter))
+                    return items
+                
+                # 标准化Windows路径
+                if path.startswith('/') and len(path) > 1:
+                    # 将类Unix路径转换为Windows路径
+                    path = path.replace('/', '\\')
+                    if not path.endswith('\\') and len(path) == 2 and path[1] == ':':
+                        path += '\\'
+            
+            # 正常目录列表（每个子项一次stat）
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        stat_info = entry.stat()
+                    except OSError:
+                        continue
+                    
+                    # 路径在访问时生成（Windows系统下标准化为 / 分隔）
+                    items.append(ListingEntry(path, entry.name, stat_info.st_size, stat_info.st_mode,
+                                              stat_info.st_mtime))
+        else:
+            # 远程模式保持原逻辑
+            for item in self.sftp.listdir_attr(path):
+                items.append(ListingEntry(path, item.filename, item.st_size, item.st_mode, item.st_mtime))
+        return items
+    
+    def browse_directory(self, path, offset=0, limit=None, sort='name', order='asc', pattern=None, cursor=None):
+        """分页浏览目录
+        
+        第一页列出目录并在服务器端排序、过滤，结果保存为游标；之后带游标的请求直接从中取页。
+        返回 (当前页, 过滤后的总数, 游标)。
+        """
+        limit = min(limit or Config.BROWSE_PAGE_SIZE, Config.BROWSE_MAX_PAGE_SIZE)
+        key = BrowseCursors.key(path, sort, order, pattern)
+        items = self.browse_cursors.get(cursor, key) if cursor else None
+        if items is None:
+            items = BrowseCursors.prepare(self.list_directory(path), sort, order, pattern)
+            cursor = self.browse_cursors.create(key, items)
+        offset = max(offset, 0)
+        return items[offset:offset + limit], len(items), cursor
+    
+    def _list_directories(self, *paths, fresh=False):
+        """列出多个目录，远程模式下通过并发遍历器同时发出请求
+        
+        fresh 为真时不使用缓存（目录修改时间不随文件内容改写而变化，缓存中的文件大小和修改时间
+        可能已过期），重新列出的结果会更新缓存。
+        """
+        if self.mode != 'remote':
+            return [self.list_directory(path, fresh) for path in paths]
+        
+        # 先用缓存（每个目录一次stat校验），只列出未命中的目录
+        host = self.cache_host
+        results = {}
+        mtimes = {}
+        for path in paths:
+            try:
+                mtimes[path] = self._directory_mtime(path)
+            except Exception:
+                mtimes[path] = None
+                continue
+            items = None if fresh else self.listing_cache.get(host, path, mtimes[path])
+            if items is not None:
+                results[path] = items
+        
+        missing = [path for path in paths if path not in results]
+        listing = dict(ConcurrentSFTPWalker(self).walk_many(missing, 1)) if missing else {}
+        for path in missing:
+            items = [
+                ListingEntry(path, entry['name'], entry['size'], entry['mode'], entry['mtime'])
+                for entry in listing.get(path.rstrip('/') or '/', ())
+            ]
+            results[path] = items
+            if (path.rstrip('/') or '/') in listing:
+                self.listing_cache.put(host, path, mtimes[path], items, self._directory_mtime_or_none(path))
+        return [list(results[path]) for path in paths]
+    
+    def get_file_hash(self, filepath):
+        """获取文件的MD5哈希值"""
+        return self.hasher.hash_file(filepath)
+    
+    def compare_directories(self, path1, path2, similarity_threshold=0.8, hash_mode=None, progress=None):
+        """比较两个目录，找出重复的文件和文件夹
+        
+        progress 为进度回调（参数同 Job.report），在列目录、匹配和分批哈希时调用
+        """
+        progress = progress or (lambda **kwargs: None)
+        progress(message='正在列出目录')
+        items1, items2 = self._list_directories(path1, path2)
+        progress(done=len(items1) + len(items2), message='正在匹配名称')
         
         duplicates = []
         similar_items = []
+        pending = []  # 名称和大小相同、待哈希确认的文件
         
-        # 按名称和类型进行初步匹配
-        for item1 in items1:
-            for item2 in items2:
-                # 完全匹配检查
-                if item1['name'] == item2['name'] and item1['is_dir'] == item2['is_dir']:
-                    # 如果是文件，进一步比较大小和哈希
-                    if not item1['is_dir']:
-                        if item1['size'] == item2['size']:
-                            hash1 = self.get_file_hash(item1['path'])
-                            hash2 = self.get_file_hash(item2['path'])
-                            if hash1 and hash2 and hash1 == hash2:
-                                duplicates.append({
-                                    'name': item1['name'],
-                                    'type': 'file',
-                                    'match_type': 'exact',
-                                    'path1': item1['path'],
-                                    'path2': item2['path'],
-                                    'size': item1['size'],
-                                    'modified1': item1['modified'],
-                                    'modified2': item2['modified'],
-                                    'similarity': 1.0
-                                })
-                    else:
-                        # 如果是目录，直接认为是重复的
-                        duplicates.append({
-                            'name': item1['name'],
-                            'type': 'directory',
-                            'match_type': 'exact',
-                            'path1': item1['path'],
-                            'path2': item2['path'],
-                            'size': '-',
-                            'modified1': item1['modified'],
-                            'modified2': item2['modified'],
-                            'similarity': 1.0
-                        })
-                
-                # 模糊匹配检查（仅当不是完全匹配时）
-                elif item1['is_dir'] == item2['is_dir']:
-                    similarity = self.calculate_name_similarity(item1['name'], item2['name'])
-                    if similarity >= similarity_threshold:
-                        # 如果是文件，还要检查大小是否相近
-                        if not item1['is_dir']:
-                            size_similarity = self.calculate_size_similarity(item1['size'], item2['size'])
-                            if size_similarity >= 0.9:  # 大小相似度阈值
-                                similar_items.append({
-                                    'name': f"{item1['name']} ≈ {item2['name']}",
-                                    'type': 'file',
-                                    'match_type': 'similar',
-                                    'path1': item1['path'],
-                                    'path2': item2['path'],
-                                    'size': f"{item1['size']} / {item2['size']}",
-                                    'modified1': item1['modified'],
-                                    'modified2': item2['modified'],
-                                    'similarity': similarity
-                                })
-                        else:
-                            # 目录只需要名称相似
-                            similar_items.append({
-                                'name': f"{item1['name']} ≈ {item2['name']}",
-                                'type': 'directory',
-                                'match_type': 'similar',
-                                'path1': item1['path'],
-                                'path2': item2['path'],
-                                'size': '-',
-                                'modified1': item1['modified'],
-                                'modified2': item2['modified'],
-                                'similarity': similarity
-                            })
+        # 用索引匹配代替两两比较
+        matcher = DirectoryMatcher(self.calculate_name_similarity, self.calculate_size_similarity,
+                                   similarity_threshold)
+        exact_pairs, similar_pairs = matcher.match(items1, items2)
+        
+        for item1, item2, _ in exact_pairs:
+            # 如果是文件，进一步比较大小和哈希
+            if not item1['is_dir']:
+                if item1['size'] == item2['size']:
+                    entry = {
+                        'name': item1['name'],
+                        'type': 'file',
+                        'match_type': 'exact',
+                        'path1': item1['path'],
+                        'path2': item2['path'],
+                        'size': item1['size'],
+                        'modified1': item1['modified'],
+                        'modified2': item2['modified'],
+                        'similarity': 1.0
+                    }
+                    duplicates.append(entry)
+                    pending.append(entry)
+            else:
+                # 如果是目录，直接认为是重复的
+                duplicates.append({
+                    'name': item1['name'],
+                    'type': 'directory',
+                    'match_type': 'exact',
+                    'path1': item1['path'],
+                    'path2': item2['path'],
+                    'size': '-',
+                    'modified1': item1['modified'],
+                    'modified2': item2['modified'],
+                    'similarity': 1.0
+                })
+        
+        for item1, item2, similarity in similar_pairs:
+            similar_items.append({
+                'name': f"{item1['name']} ≈ {item2['name']}",
+                'type': 'directory' if item1['is_dir'] else 'file',
+                'match_type': 'similar',
+                'path1': item1['path'],
+                'path2': item2['path'],
+                'size': '-' if item1['is_dir'] else f"{item1['size']} / {item2['size']}",
+                'modified1': item1['modified'],
+                'modified2': item2['modified'],
+                'similarity': similarity
+            })
+        
+        # 批量计算哈希（优先使用哈希缓存），剔除内容不同的文件
+        if pending:
+            # 哈希缓存按文件大小和修改时间校验，必须使用最新的状态，不能用可能过期的列表缓存；
+            # 只重新stat待哈希的文件
+            progress(message='正在获取文件状态')
+            file_stats = self.hasher.stat_files(
+                path for entry in pending for path in (entry['path1'], entry['path2']))
+            changed = {
+                id(entry) for entry in pending
+                if entry['path1'] not in file_stats or entry['path2'] not in file_stats
+                or file_stats[entry['path1']][0] != file_stats[entry['path2']][0]
+            }
+            duplicates = [entry for entry in duplicates if id(entry) not in changed]
+            pending = [entry for entry in pending if id(entry) not in changed]
+        if pending:
+            for entry in pending:
+                entry['size'] = file_stats[entry['path1']][0]
+            paths = [path for entry in pending for path in (entry['path1'], entry['path2'])]
+            total_bytes = sum(file_stats[path][0] for path in paths)
+            progress(done=0, total=len(paths), bytes_done=0, bytes_total=total_bytes, message='正在计算哈希')
+            
+            # 分批计算以便报告已哈希的字节数并及时响应取消
+            hashes = {}
+            hashed_bytes = 0
+            for start in range(0, len(paths), Config.DEDUPE_BATCH):
+                batch = paths[start:start + Config.DEDUPE_BATCH]
+                hashes.update(self.hasher.hash_files(batch, hash_mode, file_stats))
+                hashed_bytes += sum(file_stats[path][0] for path in batch)
+                progress(done=start + len(batch), bytes_done=hashed_bytes)
+            mismatched = {
+                id(entry) for entry in pending
+                if not hashes.get(entry['path1']) or hashes.get(entry['path1']) != hashes.get(entry['path2'])
+            }
+            duplicates = [entry for entry in duplicates if id(entry) not in mismatched]
         
         return duplicates + similar_items
     
+    def find_duplicates(self, roots, min_size=1, hash_mode=None):
+        """递归查找多个根目录下的重复文件，逐组产出结果"""
+        return self.deduper.find(roots, min_size, hash_mode)
+    
     def calculate_name_similarity(self, name1, name2):
         """计算两个文件名的相似度"""
         # 移除扩展名进行比较
@@ -671,7 +5299,7 @@ class FileManager:
         
         # 如果有数字且数字不同，降低相似度
         if digits1 and digits2 and digits1 != digits2:
-            similarity *= 0.8
+            similarity *= Config.NAME_DIGIT_PENALTY
         
         return similarity
     
@@ -688,37 +5316,44 @@ class FileManager:
     
     def delete_file_or_dir(self, path):
         """删除文件或目录"""
-        try:
-            if self.mode == 'local':
-                if os.path.isdir(path):
-                    shutil.rmtree(path)
-                else:
-                    os.remove(path)
-            else:
-                file_info = self.get_file_info(path)
-                if file_info and file_info['is_dir']:
-                    self._remove_dir_recursive(path)
-                else:
-                    self.sftp.remove(path)
-            return True, "删除成功"
-        except Exception as e:
-            return False, f"删除失败: {str(e)}"
+        results, _ = BatchDeleter(self).delete([path])
+        return results[0]['success'], results[0]['message']
     
-    def _remove_dir_recursive(self, path):
-        """递归删除目录（仅用于远程模式）"""
-        try:
-            for item in self.sftp.listdir_attr(path):
-                item_path = os.path.join(path, item.filename).replace('\\', '/')
-                if stat.S_ISDIR(item.st_mode):
-                    self._remove_dir_recursive(item_path)
-                else:
-                    self.sftp.remove(item_path)
-            self.sftp.rmdir(path)
-        except Exception as e:
-            raise e
+    def batch_delete(self, paths, progress=None):
+        """批量删除文件或目录，返回 (是否全部成功, 摘要, 逐项结果, 统计)"""
+        results, method = BatchDeleter(self).delete(paths, progress)
+        success_count = sum(1 for result in results if result['success'])
+        failed_count = len(results) - success_count
+        
+        summary_message = f'批量删除完成：成功 {success_count} 个，失败 {failed_count} 个'
+        summary = {
+            'success': success_count,
+            'failed': failed_count,
+            'total': len(paths),
+            'method': method
+        }
+        return failed_count == 0, summary_message, results, summary
+    
+    def get_remote_walker(self, sftp=None):
+        """按配置和服务器能力选择远程遍历器：能执行命令时用find，否则用并发SFTP"""
+        walker = ConcurrentSFTPWalker(self, sftp or self.sftp)
+        if Config.REMOTE_WALKER == 'sftp' or not self.can_exec():
+            return walker
+        return FindWalker(self.ssh, walker)
     
     def run_tree_command(self, directory=None, apply_gitignore=True, exclude_files=False, max_level=None):
         """运行tree命令生成目录树"""
+        success, result = self.stream_tree(directory, apply_gitignore, exclude_files, max_level)
+        if not success:
+            return False, result
+        
+        try:
+            return True, '\n'.join(result)
+        except Exception as e:
+            return False, f"生成目录树失败: {str(e)}"
+    
+    def stream_tree(self, directory=None, apply_gitignore=True, exclude_files=False, max_level=None):
+        """返回 (True, 逐行产出目录树的生成器) 或 (False, 错误信息)"""
         if directory is None:
             directory = os.getcwd() if self.mode == 'local' else '/'
         
@@ -728,13 +5363,14 @@ class FileManager:
             return False, message
         
         if self.mode == 'local':
-            return self.tree_generator.generate_tree(directory, apply_gitignore, exclude_files, max_level)
+            # 每次使用独立的生成器实例，避免并发请求共享.gitignore规则
+            return TreeGenerator().stream_tree(directory, apply_gitignore, exclude_files, max_level)
         else:
-            # 远程模式不支持gitignore，因为需要额外的文件传输
-            remote_tree_gen = RemoteTreeGenerator(self.sftp, self.ssh)
-            return remote_tree_gen.generate_tree(directory, exclude_files, max_level)
+            # .gitignore随遍历按目录读取，被忽略的目录不会产生任何请求
+            remote_tree_gen = RemoteTreeGenerator(self.sftp, self.ssh, ConcurrentSFTPWalker(self))
+            return remote_tree_gen.stream_tree(directory, exclude_files, max_level, apply_gitignore)
     
-    def clean_empty_directories(self, directory=None):
+    def clean_empty_directories(self, directory=None, progress=None):
         """清理空目录"""
         if directory is None:
             directory = os.getcwd() if self.mode == 'local' else '/'
@@ -744,11 +5380,12 @@ class FileManager:
         if not connected:
             return False, message, []
         
+        self.invalidate_listing(directory, recursive=True)
         if self.mode == 'local':
-            return self.empty_dir_cleaner.clean_empty_directories(directory)
+            return EmptyDirCleaner().clean_empty_directories(directory, progress)
         else:
-            remote_cleaner = RemoteEmptyDirCleaner(self.sftp, self.ssh)
-            return remote_cleaner.clean_empty_directories(directory)
+            remote_cleaner = RemoteEmptyDirCleaner(self.sftp, self.ssh, self.get_remote_walker())
+            return remote_cleaner.clean_empty_directories(directory, progress)
     
     def restore_directories(self, directories):
         """恢复已删除的目录"""
@@ -767,6 +5404,7 @@ class FileManager:
         sorted_dirs = sorted(directories, key=len)
         
         for dir_path in sorted_dirs:
+            self.invalidate_listing(dir_path)
             try:
                 if self.mode == 'local':
                     os.makedirs(dir_path, exist_ok=True)
@@ -802,225 +5440,264 @@ class FileManager:
                 self._create_remote_directory(parent)
                 self.sftp.mkdir(path)
     
-    def batch_rename(self, directory, rename_type, pattern=None, replacement=None, custom_text=None, sequence_position='prefix'):
-        """批量重命名文件和文件夹"""
-        if not directory:
-            return False, "请指定目录路径", []
+    def batch_rename(self, directory, pipeline, progress=None, dry_run=False):
+        """批量重命名文件和文件夹，返回 (是否成功, 摘要, 逐项结果, 执行计划)
+        
+        pipeline 为 RenamePipeline（可串联多条规则）。先规划全部改名并排除冲突项，dry_run 为真时
+        只返回规划结果；执行中任一步失败则整体回滚。progress 为进度回调（参数同 Job.report）
+        """
+        progress = progress or (lambda **kwargs: None)
+        if not directory:
+            return False, "请指定目录路径", [], []
+        
+        # 确保连接可用
+        connected, message = self.ensure_connected()
+        if not connected:
+            return False, message, [], []
+        
+        try:
+            with ExitStack() as stack:
+                if not dry_run:
+                    # 规划也在锁内进行，避免基于另一个批量重命名改名前的目录列表
+                    stack.enter_context(self._exclusive_rename(progress))
+                items = self.list_directory(directory)
+                renamer = BatchRenamer(self)
+                results, chains = renamer.plan(items, pipeline.apply)
+                plan = [{'old_name': src, 'new_name': dst} for chain in chains for src, dst, _ in chain]
+                failed_count = sum(1 for result in results if not result['success'])
+                
+                if dry_run:
+                    rename_count = sum(1 for result in results
+                                       if result['success'] and result['new_name'] != result['old_name'])
+                    return failed_count == 0, f'预览：将重命名 {rename_count} 个，无法重命名 {failed_count} 个', results, plan
+                
+                if chains:
+                    try:
+                        success, error_message = renamer.execute(directory, results, chains, progress)
+                    finally:
+                        # 改名的目录下的缓存路径也随之失效
+                        self.invalidate_listing(directory, recursive=True)
+                    if not success:
+                        return False, error_message, results, plan
+            
+            success_count = sum(1 for result in results if result['success'] and result['new_name'] != result['old_name'])
+            summary_message = f'批量重命名完成：成功 {success_count} 个，失败 {failed_count} 个'
+            return failed_count == 0, summary_message, results, plan
+            
+        except JobCancelled:
+            raise
+        except Exception as e:
+            return False, f"批量重命名操作失败: {str(e)}", [], []
+    
+    def undo_batch_rename(self, progress=None):
+        """撤销上一次批量重命名"""
+        connected, message = self.ensure_connected()
+        if not connected:
+            return False, message, []
+        
+        renamer = BatchRenamer(self)
+        with self._exclusive_rename(progress):
+            try:
+                return renamer.undo(progress)
+            except JobCancelled:
+                raise
+            except Exception as e:
+                return False, f"撤销批量重命名失败: {str(e)}", []
+            finally:
+                record = renamer.journal.load()
+                if record:
+                    self.invalidate_listing(record[0]['directory'], recursive=True)
+    
+    @contextmanager
+    def _exclusive_rename(self, progress=None):
+        """等待其他批量重命名或撤销结束；等待期间任务被取消时抛出 JobCancelled"""
+        progress = progress or (lambda **kwargs: None)
+        while not self.rename_lock.acquire(timeout=1):
+            progress(message='等待其他批量重命名完成')
+        try:
+            yield
+        finally:
+            self.rename_lock.release()
+    
+    def read_file_content(self, file_path):
+        """读取文件内容"""
+        success, message, data = self.read_file_range(file_path, length=None)
+        return success, message, data['content'] if success else ""
+    
+    def read_file_range(self, file_path, offset=0, length=Config.READ_CHUNK_SIZE, encoding=None,
+                        start_line=None, line_count=None):
+        """按字节范围（offset/length）或行窗口（start_line/line_count）读取文件，返回 (是否成功, 消息, 分块信息)
+        
+        length 为 None 时读取到文件末尾。encoding 为空时根据文件开头判断编码。
+        """
+        # 确保连接可用
+        connected, message = self.ensure_connected()
+        if not connected:
+            return False, message, None
+        
+        try:
+            with RangedFileReader(self, file_path) as reader:
+                detected = not encoding
+                encoding = encoding or reader.detect_encoding()
+                codecs.lookup(encoding)
+                if start_line is not None:
+                    data = reader.read_lines(start_line, line_count or 1, encoding)
+                else:
+                    data = reader.read_range(offset, reader.size if length is None else length, encoding)
+                    # 读取整个文件时编码只根据开头判断，整体不符合时改用建议的编码，仍不能完整解码则报错
+                    if length is None and detected and data['lossy']:
+                        if not data['suggested_encoding']:
+                            return False, "文件编码不支持，无法读取", None
+                        data = reader.read_range(offset, reader.size, data['suggested_encoding'])
+            return True, "读取成功", data
+        except UnicodeDecodeError:
+            return False, "文件编码不支持，无法读取", None
+        except LookupError:
+            return False, f"不支持的编码: {encoding}", None
+        except Exception as e:
+            return False, f"读取文件失败: {str(e)}", None
+    
+    def write_file_content(self, file_path, content, encoding='utf-8', base_version=None):
+        """写入文件内容：先写临时文件再改名替换，原文件在服务器端备份为 .backup
+        
+        base_version 为编辑器加载时的文件版本，文件已被修改时拒绝保存。返回 (是否成功, 消息, 保存结果)
+        """
+        # 确保连接可用
+        connected, message = self.ensure_connected()
+        if not connected:
+            return False, message, {}
+        
+        # 本地文件保持原来按文本模式写入时的平台换行符
+        newline = os.linesep if self.mode == 'local' and os.linesep != '\n' else None
+        try:
+            chunks = AtomicFileWriter.encode_chunks(content, encoding, newline)
+            return True, "保存成功", self.writer.write(file_path, chunks, base_version=base_version)
+        except FileConflict as e:
+            return False, "文件已被修改，请重新加载后再保存", {'conflict': True, 'version': e.version}
+        except LookupError:
+            return False, f"不支持的编码: {encoding}", {}
+        except Exception as e:
+            return False, f"保存文件失败: {str(e)}", {}
+        finally:
+            # 文件大小和修改时间改变，备份文件也会出现在目录中
+            self.invalidate_listing(file_path)
+    
+    def patch_file_content(self, file_path, hunks, base_version, encoding='utf-8'):
+        """按编辑器提交的修改块保存文件，只传输修改的部分
         
+        hunks 中每项为 {'offset': 字节偏移, 'length': 原字节数, 'text': 新内容, 'old': 原内容（可选）}，
+        offset/length 按文件的字节计算。返回值同 write_file_content。
+        """
         # 确保连接可用
         connected, message = self.ensure_connected()
         if not connected:
-            return False, message, []
+            return False, message, {}
         
         try:
-            items = self.list_directory(directory)
-            results = []
-            success_count = 0
-            failed_count = 0
-            
-            # 对文件进行排序，确保重命名顺序一致
-            items.sort(key=lambda x: (x['is_dir'], x['name'].lower()))
-            
-            # 为序号功能准备计数器
-            sequence_counter = 1
-            
-            for item in items:
-                old_name = item['name']
-                old_path = item['path']
-                
-                # 跳过 . 和 .. 目录
-                if old_name in ['.', '..']:
-                    continue
-                
-                try:
-                    new_name = self._apply_rename_rule(old_name, rename_type, pattern, replacement, custom_text, sequence_counter, sequence_position)
-                    
-                    if new_name and new_name != old_name:
-                        # 构建新路径
-                        if self.mode == 'local':
-                            new_path = os.path.join(directory, new_name)
-                            os.rename(old_path, new_path)
-                        else:
-                            new_path = os.path.join(directory, new_name).replace('\\', '/')
-                            self.sftp.rename(old_path, new_path)
-                        
-                        results.append({
-                            'success': True,
-                            'old_name': old_name,
-                            'new_name': new_name,
-                            'message': '重命名成功'
-                        })
-                        success_count += 1
-                        sequence_counter += 1
-                    else:
-                        results.append({
-                            'success': True,
-                            'old_name': old_name, 
-                            'new_name': old_name,
-                            'message': '无需重命名'
-                        })
-                
-                except Exception as e:
-                    results.append({
-                        'success': False,
-                        'old_name': old_name,
-                        'new_name': old_name,
-                        'message': f'重命名失败: {str(e)}'
-                    })
-                    failed_count += 1
-            
-            overall_success = failed_count == 0
-            summary_message = f'批量重命名完成：成功 {success_count} 个，失败 {failed_count} 个'
-            
-            return overall_success, summary_message, results
-            
-        except Exception as e:
-            return False, f"批量重命名操作失败: {str(e)}", []
-    
-    def _apply_rename_rule(self, filename, rename_type, pattern=None, replacement=None, custom_text=None, sequence_num=1, sequence_position='prefix'):
-        """应用重命名规则"""
-        original_name = filename
-        name, ext = os.path.splitext(filename)
+            # 修改块不在文件开头，不需要BOM
+            codec = 'utf-8' if encoding == 'utf-8-sig' else encoding
+            parsed = []
+            for hunk in hunks:
+                offset, length = int(hunk['offset']), int(hunk['length'])
+                old = hunk.get('old')
+                old = old.encode(codec) if old is not None else None
+                if offset < 0 or length < 0 or (old is not None and len(old) != length):
+                    raise ValueError
+                parsed.append((offset, length, (hunk.get('text') or '').encode(codec), old))
+            parsed.sort(key=lambda hunk: hunk[0])
+        except LookupError:
+            return False, f"不支持的编码: {encoding}", {}
+        except (KeyError, TypeError, ValueError, AttributeError, UnicodeEncodeError):
+            return False, "修改块格式无效", {}
         
         try:
-            if rename_type == 'remove_number_prefix':
-                # 移除数字前缀：例如 "01 文件.txt" -> "文件.txt"
-                new_name = re.sub(r'^\d+\s*[-_]?\s*', '', name)
-                return new_name + ext
-            
-            elif rename_type == 'add_sequence_prefix':
-                # 添加序号前缀：例如 "文件.txt" -> "001_文件.txt"
-                return f"{sequence_num:03d}_{filename}"
-            
-            elif rename_type == 'add_sequence_suffix':
-                # 添加序号后缀：例如 "文件.txt" -> "文件_001.txt"
-                return f"{name}_{sequence_num:03d}{ext}"
-            
-            elif rename_type == 'add_custom_prefix':
-                # 添加自定义前缀：例如 "文件.txt" -> "前缀_文件.txt"
-                if custom_text:
-                    return f"{custom_text}_{filename}"
-                return filename
-            
-            elif rename_type == 'add_custom_suffix':
-                # 添加自定义后缀：例如 "文件.txt" -> "文件_后缀.txt"
-                if custom_text:
-                    return f"{name}_{custom_text}{ext}"
-                return filename
-            
-            elif rename_type == 'remove_special_chars':
-                # 移除特殊字符：保留字母、数字、中文、下划线、连字符和点
-                clean_name = re.sub(r'[^\w\u4e00-\u9fff.-]', '', name)
-                return clean_name + ext
-            
-            elif rename_type == 'to_lowercase':
-                # 转为小写
-                return filename.lower()
-            
-            elif rename_type == 'to_uppercase':
-                # 转为大写
-                return filename.upper()
-            
-            elif rename_type == 'space_to_underscore':
-                # 空格替换为下划线
-                return filename.replace(' ', '_')
-            
-            elif rename_type == 'underscore_to_space':
-                # 下划线替换为空格
-                return filename.replace('_', ' ')
-            
-            elif rename_type == 'regex':
-                # 正则表达式替换
-                if pattern:
-                    repl = replacement if replacement is not None else ''
-                    return re.sub(pattern, repl, filename)
-                return filename
-            
-            elif rename_type == 'date_prefix':
-                # 添加日期前缀：例如 "文件.txt" -> "20231201_文件.txt"
-                from datetime import datetime
-                date_str = datetime.now().strftime('%Y%m%d')
-                return f"{date_str}_{filename}"
-            
-            elif rename_type == 'capitalize_words':
-                # 首字母大写：例如 "hello world.txt" -> "Hello World.txt"
-                capitalized_name = ' '.join(word.capitalize() for word in name.split())
-                return capitalized_name + ext
-            
-            else:
-                return filename
-                
+            return True, "保存成功", self.writer.patch(file_path, parsed, base_version=base_version)
+        except FileConflict as e:
+            return False, "文件已被修改，请重新加载后再保存", {'conflict': True, 'version': e.version}
         except Exception as e:
-            # 如果重命名规则应用失败，返回原文件名
-            return original_name
+            return False, f"保存文件失败: {str(e)}", {}
+        finally:
+            self.invalidate_listing(file_path)
     
-    def read_file_content(self, file_path):
-        """读取文件内容"""
+    def transfer_files(self, direction, source, target, progress=None, verify=None):
+        """在本地和远程之间传输文件或目录，返回 (是否全部成功, 摘要, 统计)
+        
+        direction 为 upload（本地 source 上传到远程 target）或 download。target 为已存在的目录时，
+        单个文件放入该目录，目录则合并到其中。中断后再次执行同一传输会从断点继续；progress 为进度回调（参数同 Job.report）
+        """
+        if self.mode != 'remote':
+            return False, "请先切换到远程模式", {}
+        if not source or not target:
+            return False, "请指定源路径和目标路径", {}
+        
         # 确保连接可用
         connected, message = self.ensure_connected()
         if not connected:
-            return False, message, ""
+            return False, message, {}
         
         try:
-            if self.mode == 'local':
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-            else:
-                with self.sftp.open(file_path, 'r') as f:
-                    content = f.read().decode('utf-8')
-            
-            return True, "读取成功", content
-        except UnicodeDecodeError:
-            # 尝试其他编码
-            try:
-                if self.mode == 'local':
-                    with open(file_path, 'r', encoding='gbk') as f:
-                        content = f.read()
-                else:
-                    with self.sftp.open(file_path, 'r') as f:
-                        content = f.read().decode('gbk')
-                return True, "读取成功", content
-            except:
-                return False, "文件编码不支持，无法读取", ""
+            summary = FileTransfer(self, direction).run(source, target, progress, verify)
+        except JobCancelled:
+            raise
+        except ValueError as e:
+            return False, str(e), {}
+        except FileNotFoundError as e:
+            return False, f"传输失败: {str(e)}", {}
         except Exception as e:
-            return False, f"读取文件失败: {str(e)}", ""
+            return False, f"传输中断: {str(e)}，再次执行同一传输会从断点继续", {}
+        finally:
+            if direction == 'upload':
+                self.invalidate_listing(target, recursive=True)
+        
+        failed = summary['failed']
+        action = '上传' if direction == 'upload' else '下载'
+        summary_message = f"{action}完成：{summary['files'] - len(failed)} 个文件成功，{len(failed)} 个失败"
+        if summary['resumed_bytes']:
+            summary_message += f"（从断点继续，跳过 {summary['resumed_bytes'] / 1024 / 1024:.1f} MB）"
+        return not failed, summary_message, summary
     
-    def write_file_content(self, file_path, content):
-        """写入文件内容"""
+    def sync_directories(self, direction, source, target, delete=False, dry_run=False, bwlimit=None,
+                         checksum=False, progress=None):
+        """把 source 目录同步到 target，返回 (是否全部成功, 摘要, 同步计划, 统计)
+        
+        direction 为 upload（本地 → 远程）或 download。只传输新增和修改的文件，目标已有旧版本时只传输
+        变化的块；delete 删除目标中多余的内容，dry_run 只返回计划，bwlimit 为限速（字节/秒），
+        checksum 对大小相同、修改时间不同的文件比较MD5。progress 为进度回调（参数同 Job.report）
+        """
+        if self.mode != 'remote':
+            return False, "请先切换到远程模式", [], {}
+        if direction not in ('upload', 'download'):
+            return False, f"不支持的同步方向: {direction}", [], {}
+        if not source or not target:
+            return False, "请指定源目录和目标目录", [], {}
+        
         # 确保连接可用
         connected, message = self.ensure_connected()
         if not connected:
-            return False, message
+            return False, message, [], {}
         
         try:
-            if self.mode == 'local':
-                # 创建备份
-                backup_path = file_path + '.backup'
-                if os.path.exists(file_path):
-                    shutil.copy2(file_path, backup_path)
-                
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-            else:
-                # 远程模式下的备份处理
-                backup_path = file_path + '.backup'
-                try:
-                    # 创建备份
-                    with self.sftp.open(file_path, 'r') as src:
-                        with self.sftp.open(backup_path, 'w') as dst:
-                            dst.write(src.read())
-                except:
-                    pass  # 如果备份失败，继续执行写入操作
-                
-                with self.sftp.open(file_path, 'w') as f:
-                    f.write(content.encode('utf-8'))
-            
-            return True, "保存成功"
+            plan, summary = DirectorySync(self, direction, delete, checksum, bwlimit).run(source, target, progress, dry_run)
+        except JobCancelled:
+            raise
+        except (FileNotFoundError, NotADirectoryError) as e:
+            return False, f"同步失败: {str(e)}", [], {}
         except Exception as e:
-            return False, f"保存文件失败: {str(e)}"
+            return False, f"同步中断: {str(e)}", [], {}
+        finally:
+            if direction == 'upload' and not dry_run:
+                self.invalidate_listing(target, recursive=True)
+        
+        counts = (f"新增 {summary['create']} 个，更新 {summary['update'] + summary['touch']} 个，"
+                  f"删除 {summary['delete']} 个")
+        if dry_run:
+            return True, f"预览：将{counts}", plan, summary
+        failed = summary['failed']
+        summary_message = f"同步完成：{counts}，失败 {len(failed)} 个"
+        return not failed, summary_message, plan, summary
     
-    def organize_directory(self, directory, organize_type):
-        """目录整理功能"""
+    def organize_directory(self, directory, organize_type, progress=None):
+        """目录整理功能，progress 为进度回调（参数同 Job.report）"""
         if not directory:
             return False, "请指定目录路径", []
         
@@ -1031,9 +5708,9 @@ class FileManager:
         
         try:
             if organize_type == 'create_folders_for_files':
-                return self._create_folders_for_files(directory)
+                return self._create_folders_for_files(directory, progress)
             elif organize_type == 'remove_empty_dirs':
-                success, result, cleaned_dirs = self.clean_empty_directories(directory)
+                success, result, cleaned_dirs = self.clean_empty_directories(directory, progress)
                 results = []
                 for dir_path in cleaned_dirs:
                     results.append({
@@ -1045,11 +5722,14 @@ class FileManager:
             else:
                 return False, "不支持的整理类型", []
         
+        except JobCancelled:
+            raise
         except Exception as e:
             return False, f"目录整理失败: {str(e)}", []
     
-    def _create_folders_for_files(self, directory):
+    def _create_folders_for_files(self, directory, progress=None):
         """为文件创建同名文件夹并移入"""
+        progress = progress or (lambda **kwargs: None)
         try:
             items = self.list_directory(directory)
             results = []
@@ -1057,11 +5737,13 @@ class FileManager:
             failed_count = 0
             
             # 只处理文件，跳过目录
-            files = [item for item in items if not item['is_dir']]
+            files = [item for item in items if not item.is_dir]
+            progress(done=0, total=len(files), message='正在整理')
             
-            for file_item in files:
-                filename = file_item['name']
-                file_path = file_item['path']
+            for index, file_item in enumerate(files):
+                progress(done=index)
+                filename = file_item.name
+                file_path = file_item.path
                 
                 # 获取不含扩展名的文件名作为文件夹名
                 folder_name = os.path.splitext(filename)[0]
@@ -1106,11 +5788,14 @@ class FileManager:
                     })
                     failed_count += 1
             
+            self.invalidate_listing(directory, recursive=True)
             overall_success = failed_count == 0
             summary_message = f'文件整理完成：成功 {success_count} 个，失败 {failed_count} 个'
             
             return overall_success, summary_message, results
             
+        except JobCancelled:
+            raise
         except Exception as e:
             return False, f"创建文件夹失败: {str(e)}", []
     
@@ -1140,7 +5825,7 @@ class FileManager:
         connections = self.load_connection_history()
         
         # 检查是否已存在相同连接
-        connection_id = f"{username}@{hostname}:{port}"
+        connection_id = self._make_connection_id(hostname, username, port)
         existing_index = -1
         for i, conn in enumerate(connections):
             if conn.get('id') == connection_id:
@@ -1188,9 +5873,6 @@ class FileManager:
             return False, "请先切换到远程模式"
             
         try:
-            self.ssh = paramiko.SSHClient()
-            self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
             # 加载私钥
             try:
                 if passphrase:
@@ -1215,25 +5897,8 @@ class FileManager:
                     except:
                         return False, f"无法加载私钥文件: {str(e)}"
             
-            # 连接服务器
-            self.ssh.connect(
-                hostname=hostname,
-                port=port,
-                username=username,
-                pkey=key,
-                timeout=Config.SSH_TIMEOUT,
-                banner_timeout=Config.SSH_BANNER_TIMEOUT,
-                auth_timeout=Config.SSH_AUTH_TIMEOUT,
-                look_for_keys=False,
-                allow_agent=False
-            )
-            
-            # 设置保持连接活跃
-            transport = self.ssh.get_transport()
-            transport.set_keepalive(Config.SSH_KEEPALIVE_INTERVAL)
-            
-            self.sftp = self.ssh.open_sftp()
-            self.connected = True
+            # 连接服务器（能加载私钥即持有该密钥，按公钥区分凭据）
+            self._open_connection(hostname, username, port, self._credential('key', key.get_base64()), pkey=key)
             
             # 存储连接信息用于重连
             self.connection_info = {
@@ -1248,13 +5913,131 @@ class FileManager:
             # 添加到连接历史
             self.add_connection_to_history(hostname, username, port, 'key')
             
+            self._publish_state()
             return True, "连接成功"
         except Exception as e:
             self.connected = False
+            self._publish_state()
             return False, f"连接失败: {str(e)}"
 
-# 全局文件管理器实例
-file_manager = FileManager()
+class ClientSessions:
+    """按客户端（浏览器页面）划分的 FileManager
+    
+    每个页面在请求头 X-Client-Id（推送通道用查询参数 client）中携带自己的标识，拥有独立的主SFTP通道
+    和工作模式，一个页面连接其他主机不会替换另一个页面的连接；没有携带标识的请求使用会话 cookie 中的
+    标识。SSH连接池（同一主机共用一个传输）、哈希缓存、目录列表缓存（都按主机区分）和批量重命名锁
+    由所有客户端共用。
+    超过 CLIENT_IDLE_TIMEOUT 没有请求、也没有推送订阅和运行中任务的客户端会断开连接并回收。
+    """
+    
+    ID_PATTERN = re.compile(r'[0-9a-f]{8,32}')
+    
+    def __init__(self, idle_timeout=None, max_clients=None):
+        self.idle_timeout = idle_timeout or Config.CLIENT_IDLE_TIMEOUT
+        self.max_clients = max_clients or Config.CLIENT_MAX
+        self.pool = SSHConnectionPool()
+        self.hash_cache = HashCache()
+        self.listing_cache = ListingCache()
+        self.rename_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()  # 客户端标识 -> [FileManager, 最近使用时间, 正在运行的任务数]
+        self._bound = threading.local()  # 后台任务线程所属的客户端
+    
+    def client_id(self):
+        """当前请求的客户端标识"""
+        bound = getattr(self._bound, 'client', None)
+        if bound is not None:
+            return bound[0]
+        client = request.headers.get('X-Client-Id') or request.args.get('client')
+        if client and self.ID_PATTERN.fullmatch(client):
+            return client
+        if 'client_id' not in session:
+            session['client_id'] = uuid.uuid4().hex
+        return session['client_id']
+    
+    def current(self):
+        """当前请求或后台任务所属客户端的 FileManager"""
+        bound = getattr(self._bound, 'client', None)
+        if bound is not None:
+            return bound[1]
+        return self.get(self.client_id())
+    
+    def get(self, client):
+        """获取（必要时创建）客户端的 FileManager"""
+        with self._lock:
+            entry = self._clients.get(client)
+            if entry is None:
+                manager = FileManager(self.hash_cache, self.listing_cache, self.rename_lock, self.pool)
+                entry = self._clients[client] = [manager, 0, 0]
+            entry[1] = time.time()
+            self._clients.move_to_end(client)
+            evicted = self._evict_locked(client)
+        for manager in evicted:
+            manager.disconnect()
+        return entry[0]
+    
+    @contextmanager
+    def bind(self, manager):
+        """在后台任务线程中把 file_manager 绑定到提交任务的客户端，运行期间该客户端不会被回收"""
+        with self._lock:
+            client = next((key for key, entry in self._clients.items() if entry[0] is manager), None)
+            if client is not None:
+                self._clients[client][2] += 1
+        previous = getattr(self._bound, 'client', None)
+        self._bound.client = (client, manager)
+        try:
+            yield manager
+        finally:
+            self._bound.client = previous
+            with self._lock:
+                entry = self._clients.get(client)
+                if entry is not None:
+                    entry[1] = time.time()
+                    entry[2] -= 1
+    
+    def managers(self):
+        """所有客户端的 FileManager"""
+        with self._lock:
+            return [entry[0] for entry in self._clients.values()]
+    
+    def _evict_locked(self, keep):
+        """回收空闲超时的客户端，以及超出数量上限时最近最少使用的空闲客户端（keep 为当前请求的客户端）"""
+        now = time.time()
+        evicted = []
+        for client, (manager, last_used, running) in list(self._clients.items()):
+            if client == keep or running or manager.events.subscriber_count:
+                continue
+            if now - last_used > self.idle_timeout or len(self._clients) > self.max_clients:
+                del self._clients[client]
+                evicted.append(manager)
+        return evicted
+
+# 按客户端划分的文件管理器
+clients = ClientSessions()
+
+# 当前请求（或后台任务）所属客户端的文件管理器
+file_manager = LocalProxy(clients.current)
+
+# 全局后台任务管理器
+job_manager = JobManager()
+
+# 有推送订阅者时检测连接状态
+connection_monitor = ConnectionMonitor(clients)
+
+def start_job(kind, func):
+    """提交后台任务并返回任务ID；任务在借出的SFTP通道上运行，func(job) 返回与原接口相同的结果字典"""
+    manager = clients.current()
+    
+    def run(job):
+        with clients.bind(manager), manager.sftp_session():
+            return func(job)
+    
+    job = job_manager.submit(kind, run, owner=clients.client_id(), events=manager.events)
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'message': '任务已提交'
+    })
 
 @app.route('/')
 def index():
@@ -1310,6 +6093,84 @@ def connection_status():
         'mode': file_manager.get_mode()
     })
 
+@app.route('/events')
+def events():
+    """服务器推送事件（SSE）：连接状态变化、保活失败、重连尝试和任务进度"""
+    subscription = file_manager.events.subscribe()
+    connection_monitor.ensure_running()
+    
+    def format_event(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    def generate():
+        try:
+            # 新订阅者先收到一次当前状态
+            file_manager.is_connected()
+            yield format_event('status', file_manager.connection_state())
+            while True:
+                try:
+                    event, data = subscription.get(timeout=Config.EVENT_HEARTBEAT)
+                except queue.Empty:
+                    # 心跳注释行，防止代理因空闲断开连接
+                    yield ': ping\n\n'
+                    continue
+                yield format_event(event, data)
+        finally:
+            file_manager.events.unsubscribe(subscription)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/stats')
+def stats():
+    """获取性能统计信息"""
+    return jsonify({
+        'success': True,
+        'liveness': file_manager.liveness.get_stats(),
+        'pool': file_manager.pool.get_stats(),
+        'hash_cache': file_manager.hasher.cache.get_stats() if file_manager.hasher.cache else None,
+        'listing_cache': file_manager.listing_cache.get_stats()
+    })
+
+@app.route('/jobs')
+def list_jobs():
+    """列出后台任务"""
+    return jsonify({
+        'success': True,
+        'jobs': [job.to_dict() for job in job_manager.list(clients.client_id())]
+    })
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """获取任务状态，任务结束后附带结果"""
+    job = job_manager.get(job_id, clients.client_id())
+    if job is None:
+        return jsonify({
+            'success': False,
+            'message': '任务不存在或已过期'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job.to_dict(with_result=True)
+    })
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """取消任务"""
+    job = job_manager.cancel(job_id, clients.client_id())
+    if job is None:
+        return jsonify({
+            'success': False,
+            'message': '任务不存在或已过期'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'message': '已请求取消任务',
+        'job': job.to_dict()
+    })
+
 @app.route('/compare', methods=['POST'])
 def compare():
     """比较两个目录"""
@@ -1324,6 +6185,7 @@ def compare():
     path1 = request.json.get('path1')
     path2 = request.json.get('path2')
     threshold = float(request.json.get('threshold', 0.8))
+    hash_mode = request.json.get('hash_mode')
     
     if not path1 or not path2:
         return jsonify({
@@ -1331,18 +6193,53 @@ def compare():
             'message': '请输入两个有效的路径'
         })
     
-    try:
-        duplicates = file_manager.compare_directories(path1, path2, threshold)
+    def run(job):
+        try:
+            duplicates = file_manager.compare_directories(path1, path2, threshold, hash_mode, job.report)
+            return {
+                'success': True,
+                'duplicates': duplicates,
+                'message': f'找到 {len(duplicates)} 个重复或相似项'
+            }
+        except JobCancelled:
+            raise
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'比较失败: {str(e)}'
+            }
+    
+    return start_job('compare', run)
+
+@app.route('/dedupe', methods=['POST'])
+def dedupe():
+    """递归查找重复文件，以NDJSON流的形式逐组返回"""
+    connected, conn_message = file_manager.ensure_connected()
+    if not connected:
         return jsonify({
-            'success': True,
-            'duplicates': duplicates,
-            'message': f'找到 {len(duplicates)} 个重复或相似项'
+            'success': False,
+            'message': f'连接检查失败: {conn_message}'
         })
-    except Exception as e:
+    
+    roots = [root.strip() for root in request.json.get('roots', []) if root and root.strip()]
+    min_size = int(request.json.get('min_size') or 1)
+    hash_mode = request.json.get('hash_mode')
+    
+    if not roots:
         return jsonify({
             'success': False,
-            'message': f'比较失败: {str(e)}'
+            'message': '请至少输入一个有效的路径'
         })
+    
+    def generate():
+        try:
+            with file_manager.sftp_session():
+                for event in file_manager.find_duplicates(roots, min_size, hash_mode):
+                    yield json.dumps(event, ensure_ascii=False) + '\n'
+        except Exception as e:
+            yield json.dumps({'type': 'error', 'message': f'查找重复文件失败: {str(e)}'}, ensure_ascii=False) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 @app.route('/delete', methods=['POST'])
 def delete():
@@ -1382,40 +6279,23 @@ def batch_delete():
             'message': '请选择要删除的文件'
         })
     
-    results = []
-    success_count = 0
-    failed_count = 0
-    
-    for path in paths:
-        success, message = file_manager.delete_file_or_dir(path)
-        results.append({
-            'path': path,
+    def run(job):
+        success, message, results, summary = file_manager.batch_delete(paths, job.report)
+        return {
             'success': success,
-            'message': message
-        })
-        
-        if success:
-            success_count += 1
-        else:
-            failed_count += 1
-    
-    overall_success = failed_count == 0
-    summary_message = f'批量删除完成：成功 {success_count} 个，失败 {failed_count} 个'
-    
-    return jsonify({
-        'success': overall_success,
-        'message': summary_message,
-        'results': results,
-        'summary': {
-            'success': success_count,
-            'failed': failed_count,
-            'total': len(paths)
+            'message': message,
+            'results': results,
+            'summary': summary
         }
-    })
+    
+    return start_job('batch_delete', run)
 
 @app.route('/browse')
 def browse():
-    """浏览目录"""
+    """分页浏览目录：支持 offset/limit、按名称/大小/修改时间排序和名称通配符过滤
+    
+    响应中的 cursor 可用于获取同一次列表的后续页，避免重复列出目录。
+    """
     if not file_manager.is_connected():
         return jsonify({
             'success': False,
@@ -1423,9 +6303,16 @@ def browse():
         })
     
     path = request.args.get('path', '/' if file_manager.get_mode() == 'remote' else os.getcwd())
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', Config.BROWSE_PAGE_SIZE, type=int)
+    sort = request.args.get('sort', 'name')
+    order = request.args.get('order', 'asc')
+    pattern = request.args.get('filter', '').strip()
+    cursor = request.args.get('cursor')
     
     try:
-        items = file_manager.list_directory(path)
+        with file_manager.sftp_session():
+            items, total, cursor = file_manager.browse_directory(path, offset, limit, sort, order, pattern, cursor)
         
         # 获取标准化的当前路径
         if file_manager.get_mode() == 'local':
@@ -1436,11 +6323,17 @@ def browse():
                 current_path = os.path.abspath(path)
         else:
             current_path = path
-            
+        
+        next_offset = offset + len(items)
         return jsonify({
             'success': True,
-            'items': items,
-            'current_path': current_path
+            'columns': ListingEntry.FIELDS,
+            'rows': ListingEntry.rows(items),
+            'current_path': current_path,
+            'total': total,
+            'offset': offset,
+            'next_offset': next_offset if next_offset < total else None,
+            'cursor': cursor
         })
     except Exception as e:
         return jsonify({
@@ -1450,7 +6343,7 @@ def browse():
 
 @app.route('/tree', methods=['POST'])
 def tree():
-    """生成目录树"""
+    """生成目录树，以NDJSON流的形式分批返回各行"""
     directory = request.json.get('directory')
     apply_gitignore = request.json.get('apply_gitignore', True)
     exclude_files = request.json.get('exclude_files', False)
@@ -1470,11 +6363,35 @@ def tree():
             'message': f'连接检查失败: {conn_message}'
         })
     
-    success, result = file_manager.run_tree_command(directory, apply_gitignore, exclude_files, max_level)
-    return jsonify({
-        'success': success,
-        'result': result
-    })
+    def generate():
+        # 在请求线程中边遍历边发送，客户端断开时生成器被关闭，遍历随之停止并归还通道
+        try:
+            with file_manager.sftp_session():
+                success, result = file_manager.stream_tree(directory, apply_gitignore, exclude_files, max_level)
+                if not success:
+                    yield json.dumps({'type': 'error', 'message': result}, ensure_ascii=False) + '\n'
+                    return
+                
+                # 第一批立即发送，之后按行数或时间间隔分批
+                count = 0
+                batch = []
+                last_flush = 0
+                for line in result:
+                    batch.append(line)
+                    now = time.time()
+                    if len(batch) >= Config.TREE_STREAM_BATCH or now - last_flush >= Config.TREE_STREAM_INTERVAL:
+                        count += len(batch)
+                        yield json.dumps({'type': 'lines', 'lines': batch}, ensure_ascii=False) + '\n'
+                        batch = []
+                        last_flush = now
+                if batch:
+                    count += len(batch)
+                    yield json.dumps({'type': 'lines', 'lines': batch}, ensure_ascii=False) + '\n'
+                yield json.dumps({'type': 'done', 'lines': count}) + '\n'
+        except Exception as e:
+            yield json.dumps({'type': 'error', 'message': f'生成目录树失败: {str(e)}'}, ensure_ascii=False) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 @app.route('/clean_empty_dirs', methods=['POST'])
 def clean_empty_dirs():
@@ -1497,12 +6414,15 @@ def clean_empty_dirs():
             'cleaned_directories': []
         })
     
-    success, result, cleaned_dirs = file_manager.clean_empty_directories(directory)
-    return jsonify({
-        'success': success,
-        'result': result,
-        'cleaned_directories': cleaned_dirs
-    })
+    def run(job):
+        success, result, cleaned_dirs = file_manager.clean_empty_directories(directory, job.report)
+        return {
+            'success': success,
+            'result': result,
+            'cleaned_directories': cleaned_dirs
+        }
+    
+    return start_job('clean_empty_dirs', run)
 
 @app.route('/restore_directories', methods=['POST'])
 def restore_directories():
@@ -1536,11 +6456,14 @@ def batch_rename():
         })
     
     directory = request.json.get('path')
-    rename_type = request.json.get('rename_type')
-    pattern = request.json.get('pattern')
-    replacement = request.json.get('replacement')
-    custom_text = request.json.get('custom_text')
-    sequence_position = request.json.get('sequence_position', 'prefix')
+    dry_run = bool(request.json.get('dry_run', False))
+    # rules 为串联的规则列表；兼容只传单条规则参数的旧请求
+    rules = request.json.get('rules') or ([{
+        'type': request.json.get('rename_type'),
+        'pattern': request.json.get('pattern'),
+        'replacement': request.json.get('replacement'),
+        'custom_text': request.json.get('custom_text')
+    }] if request.json.get('rename_type') else [])
     
     if not directory:
         return jsonify({
@@ -1548,21 +6471,128 @@ def batch_rename():
             'message': '请指定目录路径'
         })
     
-    if not rename_type:
+    try:
+        pipeline = RenamePipeline(rules)
+    except ValueError as e:
         return jsonify({
             'success': False,
-            'message': '请选择重命名类型'
+            'message': str(e)
         })
     
-    success, message, results = file_manager.batch_rename(
-        directory, rename_type, pattern, replacement, custom_text, sequence_position
-    )
+    def run(job):
+        success, message, results, plan = file_manager.batch_rename(directory, pipeline, job.report, dry_run)
+        return {
+            'success': success,
+            'message': message,
+            'results': results,
+            'plan': plan,
+            'dry_run': dry_run
+        }
     
-    return jsonify({
-        'success': success,
-        'message': message,
-        'results': results
-    })
+    return start_job('batch_rename', run)
+
+@app.route('/batch_rename/undo', methods=['POST'])
+def undo_batch_rename():
+    """撤销上一次批量重命名"""
+    if not file_manager.is_connected():
+        return jsonify({
+            'success': False,
+            'message': f'请先{"连接SSH服务器" if file_manager.get_mode() == "remote" else "确保本地模式正常"}'
+        })
+    
+    def run(job):
+        success, message, results = file_manager.undo_batch_rename(job.report)
+        return {
+            'success': success,
+            'message': message,
+            'results': results
+        }
+    
+    return start_job('batch_rename_undo', run)
+
+@app.route('/transfer', methods=['POST'])
+def transfer_files():
+    """上传或下载文件、目录（分块并行传输，可断点续传）"""
+    if not file_manager.is_connected() or file_manager.get_mode() != 'remote':
+        return jsonify({
+            'success': False,
+            'message': '请先连接SSH服务器'
+        })
+    
+    direction = request.json.get('direction')
+    source = (request.json.get('source') or '').strip()
+    target = (request.json.get('target') or '').strip()
+    verify = request.json.get('verify')
+    
+    if direction not in ('upload', 'download'):
+        return jsonify({
+            'success': False,
+            'message': '请选择上传或下载'
+        })
+    if not source or not target:
+        return jsonify({
+            'success': False,
+            'message': '请指定源路径和目标路径'
+        })
+    
+    def run(job):
+        success, message, summary = file_manager.transfer_files(
+            direction, source, target, job.report, None if verify is None else bool(verify))
+        return {
+            'success': success,
+            'message': message,
+            'summary': summary
+        }
+    
+    return start_job('transfer', run)
+
+@app.route('/sync', methods=['POST'])
+def sync_directories():
+    """同步本地目录和远程目录（只传输变化的部分）"""
+    if not file_manager.is_connected() or file_manager.get_mode() != 'remote':
+        return jsonify({
+            'success': False,
+            'message': '请先连接SSH服务器'
+        })
+    
+    direction = request.json.get('direction')
+    source = (request.json.get('source') or '').strip()
+    target = (request.json.get('target') or '').strip()
+    delete = bool(request.json.get('delete', False))
+    dry_run = bool(request.json.get('dry_run', False))
+    checksum = bool(request.json.get('checksum', False))
+    try:
+        # 界面中的限速单位为 KB/s，0 或空表示不限速
+        bwlimit = max(int(float(request.json.get('bwlimit') or 0) * 1024), 0) or None
+    except (TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'message': '限速必须是数字'
+        })
+    
+    if direction not in ('upload', 'download'):
+        return jsonify({
+            'success': False,
+            'message': '请选择同步方向'
+        })
+    if not source or not target:
+        return jsonify({
+            'success': False,
+            'message': '请指定源目录和目标目录'
+        })
+    
+    def run(job):
+        success, message, plan, summary = file_manager.sync_directories(
+            direction, source, target, delete, dry_run, bwlimit, checksum, job.report)
+        return {
+            'success': success,
+            'message': message,
+            'plan': plan,
+            'summary': summary,
+            'dry_run': dry_run
+        }
+    
+    return start_job('sync', run)
 
 @app.route('/organize_directory', methods=['POST'])
 def organize_directory():
@@ -1588,17 +6618,19 @@ def organize_directory():
             'message': '请选择整理类型'
         })
     
-    success, message, results = file_manager.organize_directory(directory, organize_type)
+    def run(job):
+        success, message, results = file_manager.organize_directory(directory, organize_type, job.report)
+        return {
+            'success': success,
+            'message': message,
+            'results': results
+        }
     
-    return jsonify({
-        'success': success,
-        'message': message,
-        'results': results
-    })
+    return start_job('organize_directory', run)
 
 @app.route('/read_file', methods=['POST'])
 def read_file():
-    """读取文件内容"""
+    """读取文件内容：指定 offset/length 或 start_line/line_count 时只读取该范围，用于编辑器分页加载"""
     if not file_manager.is_connected():
         return jsonify({
             'success': False,
@@ -1613,13 +6645,41 @@ def read_file():
             'message': '请指定文件路径'
         })
     
-    success, message, content = file_manager.read_file_content(file_path)
+    ranged = any(key in request.json for key in ('offset', 'length', 'start_line', 'line_count'))
+    if not ranged:
+        # 未指定范围时读取整个文件（兼容旧接口）
+        with file_manager.sftp_session():
+            success, message, content = file_manager.read_file_content(file_path)
+        return jsonify({
+            'success': success,
+            'message': message,
+            'content': content
+        })
     
-    return jsonify({
+    try:
+        offset = max(0, int(request.json.get('offset') or 0))
+        length = min(max(1, int(request.json.get('length') or Config.READ_CHUNK_SIZE)), Config.READ_MAX_LENGTH)
+        start_line = request.json.get('start_line')
+        start_line = max(0, int(start_line)) if start_line is not None else None
+        line_count = max(1, int(request.json.get('line_count') or 1000))
+    except (TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'message': '读取范围参数无效'
+        })
+    
+    with file_manager.sftp_session():
+        success, message, data = file_manager.read_file_range(
+            file_path, offset, length, request.json.get('encoding'), start_line, line_count
+        )
+    
+    response = {
         'success': success,
-        'message': message,
-        'content': content
-    })
+        'message': message
+    }
+    if success:
+        response.update(data)
+    return jsonify(response)
 
 @app.route('/write_file', methods=['POST'])
 def write_file():
@@ -1632,6 +6692,9 @@ def write_file():
     
     file_path = request.json.get('file_path')
     content = request.json.get('content')
+    hunks = request.json.get('hunks')
+    base_version = request.json.get('base_version')
+    encoding = request.json.get('encoding') or 'utf-8'
     
     if not file_path:
         return jsonify({
@@ -1639,18 +6702,31 @@ def write_file():
             'message': '请指定文件路径'
         })
     
-    if content is None:
+    if hunks is not None:
+        # 只提交修改块时必须带上加载时的版本，否则无法确认偏移仍然有效
+        if not isinstance(hunks, list) or not base_version:
+            return jsonify({
+                'success': False,
+                'message': '修改块保存需要提供修改块列表和文件版本'
+            })
+    elif content is None:
         return jsonify({
             'success': False,
             'message': '请提供文件内容'
         })
     
-    success, message = file_manager.write_file_content(file_path, content)
+    with file_manager.sftp_session():
+        if hunks is not None:
+            success, message, data = file_manager.patch_file_content(file_path, hunks, base_version, encoding)
+        else:
+            success, message, data = file_manager.write_file_content(file_path, content, encoding, base_version)
     
-    return jsonify({
+    response = {
         'success': success,
         'message': message
-    })
+    }
+    response.update(data)
+    return jsonify(response)
 
 @app.route('/connection_history')
 def get_connection_history():
@@ -11,6 +11,24 @@ let isLogVisible = false;
 let duplicatesData = [];
 let currentFileContent = '';
 let currentFilePath = '';
+let eventSource = null;
+let connectionState = null;
+
+// 每个页面独立的客户端标识（刷新后不变），服务器按它区分连接和工作模式
+const CLIENT_ID = sessionStorage.getItem('clientId') || (() => {
+    const id = Array.from(crypto.getRandomValues(new Uint8Array(16)),
+        byte => byte.toString(16).padStart(2, '0')).join('');
+    sessionStorage.setItem('clientId', id);
+    return id;
+})();
+
+// 所有请求都携带客户端标识
+const nativeFetch = window.fetch.bind(window);
+window.fetch = (resource, options = {}) => {
+    const headers = new Headers(options.headers || {});
+    headers.set('X-Client-Id', CLIENT_ID);
+    return nativeFetch(resource, { ...options, headers });
+};
 
 // DOM 加载完成后初始化
 document.addEventListener('DOMContentLoaded', function () {
@@ -29,9 +47,8 @@ document.addEventListener('DOMContentLoaded', function () {
     // 初始化浮动按钮
     updateFloatingLogButton();
 
-    // 定期检查连接状态
-    checkConnectionStatus();
-    setInterval(checkConnectionStatus, 5000);
+    // 订阅服务器推送的连接状态和任务进度
+    initializeEventStream();
 
     // 绑定事件
     bindEventListeners();
@@ -54,9 +71,12 @@ function bindEventListeners() {
     document.getElementById('connectBtn').addEventListener('click', connectSSH);
     document.getElementById('disconnectBtn').addEventListener('click', disconnectSSH);
     document.getElementById('compareBtn').addEventListener('click', comparePaths);
+    document.getElementById('dedupeBtn').addEventListener('click', findDuplicates);
     document.getElementById('selectPathBtn').addEventListener('click', selectCurrentPath);
     document.getElementById('generateTreeBtn').addEventListener('click', generateTree);
     document.getElementById('cleanEmptyDirsBtn').addEventListener('click', cleanEmptyDirectories);
+    document.getElementById('jobCancelBtn').addEventListener('click', cancelCurrentJob);
+    initializeBrowseControls();
 }
 
 // 初始化模式
@@ -158,6 +178,7 @@ function clearPreviousFunctionState() {
     // 隐藏所有结果面板
     const resultPanels = [
         'resultsPanel',      // 目录比较结果
+        'dedupeResultsPanel', // 重复文件查找结果
         'treeOutputPanel'    // 目录树输出
     ];
 
@@ -171,6 +192,7 @@ function clearPreviousFunctionState() {
     // 清除结果内容
     const resultContainers = [
         'duplicatesList',    // 重复文件列表
+        'dedupeGroups',      // 重复文件组
         'treeOutput'         // 目录树内容
     ];
 
@@ -184,6 +206,7 @@ function clearPreviousFunctionState() {
     // 清除计数显示
     const countElements = [
         'duplicateCount',    // 重复文件计数
+        'dedupeSummary',     // 重复文件查找统计
         'selectedCount'      // 选中项计数
     ];
 
@@ -198,11 +221,16 @@ function clearPreviousFunctionState() {
     const inputFields = [
         'path1',             // 比较路径1
         'path2',             // 比较路径2
+        'dedupeRoots',       // 查重根目录
         'treeDirectory',     // 目录树路径
         'cleanDirectory',    // 清理目录路径
         'renamePath',        // 重命名路径
         'organizePath',      // 整理路径
         'editorFilePath',    // 编辑器文件路径
+        'transferSource',    // 传输源路径
+        'transferTarget',    // 传输目标路径
+        'syncSource',        // 同步源目录
+        'syncTarget',        // 同步目标目录
         'customText',        // 自定义文本
         'regexPattern',      // 正则表达式模式
         'regexReplacement'   // 正则表达式替换
@@ -306,6 +334,9 @@ function clearEditorState() {
     if (typeof currentFilePath !== 'undefined') {
         currentFilePath = '';
     }
+    if (typeof editorState !== 'undefined') {
+        editorState = null;
+    }
 }
 
 // 更新模式显示
@@ -331,6 +362,7 @@ function updateFunctionMenuForMode() {
     const renameTab = document.querySelector('[data-function="rename"]');
     const organizeTab = document.querySelector('[data-function="organize"]');
     const editorTab = document.querySelector('[data-function="editor"]');
+    const transferTab = document.querySelector('[data-function="transfer"]');
 
     if (currentMode === 'local') {
         // 本地模式：隐藏连接管理，显示所有其他功能
@@ -342,6 +374,7 @@ function updateFunctionMenuForMode() {
         renameTab.style.display = 'block';
         organizeTab.style.display = 'block';
         editorTab.style.display = 'block';
+        transferTab.style.display = 'none'; // 文件传输只在远程模式下可用
 
         // 移除所有禁用状态
         [toolsTab, compareTab, treeTab, cleanTab, renameTab, organizeTab, editorTab].forEach(tab => {
@@ -349,8 +382,8 @@ function updateFunctionMenuForMode() {
             tab.style.pointerEvents = 'auto';
         });
 
-        // 如果当前在连接管理面板，切换到目录比较
-        if (connectionTab.classList.contains('active')) {
+        // 如果当前在连接管理或文件传输面板，切换到目录比较
+        if (connectionTab.classList.contains('active') || transferTab.classList.contains('active')) {
             switchFunction('compare');
         }
     } else {
@@ -363,6 +396,7 @@ function updateFunctionMenuForMode() {
         renameTab.style.display = 'block';
         organizeTab.style.display = 'block';
         editorTab.style.display = 'block';
+        transferTab.style.display = 'block';
 
         // 如果当前在本地工具面板，切换到连接管理
         if (toolsTab.classList.contains('active')) {
@@ -375,55 +409,107 @@ function updateFunctionMenuForMode() {
 }
 
 // 更新远程功能可用性
-function updateRemoteFunctionAvailability() {
+async function updateRemoteFunctionAvailability() {
     if (currentMode !== 'remote') return;
 
-    // 检查当前连接状态
-    fetch('/connection_status')
-        .then(response => response.json())
-        .then(result => {
-            const isConnected = result.connected;
-            const compareTab = document.querySelector('[data-function="compare"]');
-            const treeTab = document.querySelector('[data-function="tree"]');
-            const cleanTab = document.querySelector('[data-function="clean"]');
-            const renameTab = document.querySelector('[data-function="rename"]');
-            const organizeTab = document.querySelector('[data-function="organize"]');
-            const editorTab = document.querySelector('[data-function="editor"]');
-
-            [compareTab, treeTab, cleanTab, renameTab, organizeTab, editorTab].forEach(tab => {
-                if (tab) {
-                    if (isConnected) {
-                        tab.classList.remove('disabled');
-                        tab.style.pointerEvents = 'auto';
-                    } else {
-                        tab.classList.add('disabled');
-                        tab.style.pointerEvents = 'none';
-                    }
-                }
-            });
-
-            // 如果当前在被禁用的功能面板，且未连接，切换到连接管理
-            if (!isConnected &&
-                (compareTab?.classList.contains('active') ||
-                    treeTab?.classList.contains('active') ||
-                    cleanTab?.classList.contains('active') ||
-                    renameTab?.classList.contains('active') ||
-                    organizeTab?.classList.contains('active') ||
-                    editorTab?.classList.contains('active'))) {
-                switchFunction('connection');
-                showMessage('请先连接SSH服务器才能使用此功能', 'warning');
+    try {
+        const result = await getConnectionState();
+        applyRemoteFunctionAvailability(result.connected);
+    } catch (error) {
+        console.error('检查连接状态失败:', error);
+    }
+}
+
+// 根据连接状态启用或禁用远程功能
+function applyRemoteFunctionAvailability(isConnected) {
+    const compareTab = document.querySelector('[data-function="compare"]');
+    const treeTab = document.querySelector('[data-function="tree"]');
+    const cleanTab = document.querySelector('[data-function="clean"]');
+    const renameTab = document.querySelector('[data-function="rename"]');
+    const organizeTab = document.querySelector('[data-function="organize"]');
+    const editorTab = document.querySelector('[data-function="editor"]');
+    const transferTab = document.querySelector('[data-function="transfer"]');
+
+    [compareTab, treeTab, cleanTab, renameTab, organizeTab, editorTab, transferTab].forEach(tab => {
+        if (tab) {
+            if (isConnected) {
+                tab.classList.remove('disabled');
+                tab.style.pointerEvents = 'auto';
+            } else {
+                tab.classList.add('disabled');
+                tab.style.pointerEvents = 'none';
             }
-        })
-        .catch(error => {
-            console.error('检查连接状态失败:', error);
-        });
+        }
+    });
+
+    // 如果当前在被禁用的功能面板，且未连接，切换到连接管理
+    if (!isConnected &&
+        (compareTab?.classList.contains('active') ||
+            treeTab?.classList.contains('active') ||
+            cleanTab?.classList.contains('active') ||
+            renameTab?.classList.contains('active') ||
+            organizeTab?.classList.contains('active') ||
+            editorTab?.classList.contains('active') ||
+            transferTab?.classList.contains('active'))) {
+        switchFunction('connection');
+        showMessage('请先连接SSH服务器才能使用此功能', 'warning');
+    }
+}
+
+// 订阅服务器推送事件：连接状态变化、保活失败、重连尝试和任务进度
+function initializeEventStream() {
+    if (!window.EventSource) {
+        // 浏览器不支持推送时退回到定期查询
+        checkConnectionStatus();
+        setInterval(checkConnectionStatus, 5000);
+        return;
+    }
+
+    // 断开后浏览器会自动重连，重连后服务器会重新推送当前状态
+    eventSource = new EventSource(`/events?client=${CLIENT_ID}`);
+
+    eventSource.addEventListener('status', event => {
+        const state = JSON.parse(event.data);
+        const wasConnected = connectionState ? connectionState.connected : null;
+        connectionState = state;
+        if (state.mode !== currentMode) {
+            currentMode = state.mode;
+            updateModeDisplay();
+        }
+        updateConnectionStatus(state.connected, state.mode);
+        if (state.mode === 'remote' && wasConnected !== state.connected) {
+            applyRemoteFunctionAvailability(state.connected);
+        }
+    });
+
+    eventSource.addEventListener('keepalive_failed', event => {
+        const data = JSON.parse(event.data);
+        addOperationLog('连接状态', `${data.connection || '远程连接'}: ${data.message}`, 'error');
+    });
+
+    eventSource.addEventListener('reconnect', event => {
+        const data = JSON.parse(event.data);
+        addOperationLog('连接状态', `正在重连 ${data.hostname} (${data.attempt}/${data.max_attempts})`, 'warning');
+    });
+
+    eventSource.addEventListener('job', event => {
+        handleJobEvent(JSON.parse(event.data));
+    });
+}
+
+// 获取连接状态：推送通道可用时直接使用最近推送的状态，否则请求服务器
+async function getConnectionState() {
+    if (connectionState && eventSource && eventSource.readyState === EventSource.OPEN) {
+        return connectionState;
+    }
+    const response = await fetch('/connection_status');
+    return await response.json();
 }
 
 // 检查连接状态
 async function checkConnectionStatus() {
     try {
-        const response = await fetch('/connection_status');
-        const result = await response.json();
+        const result = await getConnectionState();
         updateConnectionStatus(result.connected, result.mode);
     } catch (error) {
         console.error('检查连接状态失败:', error);
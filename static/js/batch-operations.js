@@ -17,31 +17,160 @@ function toggleRenameInputs() {
     }
 }
 
-// 执行批量重命名
-async function executeRename() {
-    const path = document.getElementById('renamePath').value;
+// 串联的重命名规则，为空时只使用表单中当前选择的规则
+const renameRuleChain = [];
+
+// 读取表单中当前选择的规则，参数无效时返回 null
+function readRenameRule() {
     const renameType = document.getElementById('renameType').value;
     const pattern = document.getElementById('regexPattern').value;
     const replacement = document.getElementById('regexReplacement').value;
     const customText = document.getElementById('customText').value;
 
+    if (renameType === 'regex' && !pattern) {
+        showMessage('使用正则表达式时，请输入正则表达式模式', 'warning');
+        return null;
+    }
+
+    if ((renameType === 'add_custom_prefix' || renameType === 'add_custom_suffix') && !customText) {
+        showMessage('使用自定义前缀/后缀时，请输入自定义文本', 'warning');
+        return null;
+    }
+
+    return {
+        type: renameType,
+        pattern: pattern,
+        replacement: replacement,
+        custom_text: customText
+    };
+}
+
+// 把当前规则加入规则链
+function addRenameRule() {
+    const rule = readRenameRule();
+    if (rule) {
+        renameRuleChain.push(rule);
+        renderRenameRules();
+    }
+}
+
+function clearRenameRules() {
+    renameRuleChain.length = 0;
+    renderRenameRules();
+}
+
+function renderRenameRules() {
+    const container = document.getElementById('renameRuleChain');
+    container.innerHTML = '';
+    if (renameRuleChain.length === 0) {
+        container.innerHTML = '<span class="text-muted">未添加规则时只执行当前选择的规则</span>';
+        return;
+    }
+    renameRuleChain.forEach((rule, index) => {
+        const badge = document.createElement('span');
+        badge.className = 'badge bg-secondary me-1';
+        badge.textContent = `${index + 1}. ${describeRenameRule(rule)}`;
+        container.appendChild(badge);
+    });
+}
+
+function describeRenameRule(rule) {
+    let text = getRenameTypeText(rule.type);
+    if (rule.type === 'regex') {
+        text += ` ${rule.pattern} → ${rule.replacement}`;
+    } else if (rule.custom_text && (rule.type === 'add_custom_prefix' || rule.type === 'add_custom_suffix')) {
+        text += ` ${rule.custom_text}`;
+    }
+    return text;
+}
+
+// 读取并校验重命名参数，参数无效时返回 null
+function getRenameOptions() {
+    const path = document.getElementById('renamePath').value;
+
     if (!path) {
         showMessage('请输入目标目录路径', 'warning');
+        return null;
+    }
+
+    let rules = renameRuleChain.slice();
+    if (rules.length === 0) {
+        const rule = readRenameRule();
+        if (!rule) {
+            return null;
+        }
+        rules = [rule];
+    }
+
+    return {
+        path: path,
+        rules: rules
+    };
+}
+
+// 预览批量重命名：只返回规划结果，不修改文件
+async function previewRename() {
+    const options = getRenameOptions();
+    if (!options) {
         return;
     }
 
-    if (renameType === 'regex' && !pattern) {
-        showMessage('使用正则表达式时，请输入正则表达式模式', 'warning');
+    showLoading();
+    try {
+        const result = await runJob('/batch_rename', { ...options, dry_run: true });
+        hideLoading();
+
+        if (result.results) {
+            displayOperationResults('重命名预览', result.results, result.message);
+            showMessage(result.message, result.success ? 'info' : 'warning');
+        } else {
+            showMessage(result.message, 'danger');
+        }
+    } catch (error) {
+        hideLoading();
+        showMessage('预览批量重命名失败: ' + error.message, 'danger');
+    }
+}
+
+// 撤销上一次批量重命名
+async function undoRename() {
+    const confirmed = await showCustomConfirm(
+        '确定要撤销上一次批量重命名吗？',
+        '撤销重命名确认',
+        'warning'
+    );
+
+    if (!confirmed) {
         return;
     }
 
-    if ((renameType === 'add_custom_prefix' || renameType === 'add_custom_suffix') && !customText) {
-        showMessage('使用自定义前缀/后缀时，请输入自定义文本', 'warning');
+    showLoading();
+    try {
+        const result = await runJob('/batch_rename/undo', {});
+        hideLoading();
+
+        if (result.results && result.results.length > 0) {
+            displayOperationResults('撤销结果', result.results, result.message);
+        }
+        addOperationLog('批量重命名', `撤销重命名: ${result.message}`, result.success ? 'success' : 'error');
+        showMessage(result.message, result.success ? 'success' : 'danger');
+    } catch (error) {
+        hideLoading();
+        showMessage('撤销批量重命名失败: ' + error.message, 'danger');
+    }
+}
+
+// 执行批量重命名
+async function executeRename() {
+    const options = getRenameOptions();
+    if (!options) {
         return;
     }
+    const path = options.path;
+    const ruleText = options.rules.map(describeRenameRule).join(' → ');
 
     const confirmed = await showCustomConfirm(
-        `确定要对目录 <code>${path}</code> 中的文件进行批量重命名吗？<br><br><strong>重命名类型:</strong> ${getRenameTypeText(renameType)}<br><br><strong>此操作不可撤销！</strong>`,
+        `确定要对目录 <code>${path}</code> 中的文件进行批量重命名吗？<br><br><strong>重命名规则:</strong> ${ruleText}<br><br>执行中任一项失败时将回滚全部改名，完成后可以撤销。`,
         '批量重命名确认',
         'warning'
     );
@@ -51,24 +180,10 @@ async function executeRename() {
     }
 
     showLoading();
-    addOperationLog('批量重命名', `开始重命名: ${path} (${getRenameTypeText(renameType)})`, 'warning');
+    addOperationLog('批量重命名', `开始重命名: ${path} (${options.rules.map(describeRenameRule).join(' → ')})`, 'warning');
 
     try {
-        const response = await fetch('/batch_rename', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                path: path,
-                rename_type: renameType,
-                pattern: pattern,
-                replacement: replacement,
-                custom_text: customText
-            })
-        });
-
-        const result = await response.json();
+        const result = await runJob('/batch_rename', options);
         hideLoading();
 
         if (result.success) {
@@ -84,6 +199,10 @@ async function executeRename() {
             displayOperationResults('重命名结果', result.results, result.message);
             showMessage(result.message, 'success');
         } else {
+            // 有冲突项或已回滚时仍然显示逐项结果
+            if (result.results && result.results.length > 0) {
+                displayOperationResults('重命名结果', result.results, result.message);
+            }
             addOperationLog('批量重命名', `重命名失败: ${result.message}`, 'error');
             showMessage(result.message, 'danger');
         }
@@ -118,18 +237,10 @@ async function executeOrganize() {
     addOperationLog('目录整理', `开始整理: ${path} (${getOrganizeTypeText(organizeType)})`, 'warning');
 
     try {
-        const response = await fetch('/organize_directory', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                path: path,
-                organize_type: organizeType
-            })
+        const result = await runJob('/organize_directory', {
+            path: path,
+            organize_type: organizeType
         });
-
-        const result = await response.json();
         hideLoading();
 
         if (result.success) {
@@ -155,6 +266,132 @@ async function executeOrganize() {
     }
 }
 
+// 执行文件传输：中断后再次执行相同的传输会从断点继续
+async function executeTransfer() {
+    const direction = document.getElementById('transferDirection').value;
+    const source = document.getElementById('transferSource').value.trim();
+    const target = document.getElementById('transferTarget').value.trim();
+    const verify = document.getElementById('transferVerify').checked;
+    const action = direction === 'upload' ? '上传' : '下载';
+
+    if (!source || !target) {
+        showMessage('请输入源路径和目标路径', 'warning');
+        return;
+    }
+
+    showLoading();
+    addOperationLog('文件传输', `开始${action}: ${source} → ${target}`, 'info');
+
+    try {
+        const result = await runJob('/transfer', {
+            direction: direction,
+            source: source,
+            target: target,
+            verify: verify
+        });
+        hideLoading();
+
+        const summary = result.summary || {};
+        const failed = summary.failed || [];
+        if (summary.files !== undefined) {
+            const rate = summary.rate ? `，${formatFileSize(summary.rate)}/s` : '';
+            addOperationLog(
+                '文件传输',
+                `${result.message}，传输 ${formatFileSize(summary.transferred_bytes)}，用时 ${summary.elapsed} 秒${rate}`,
+                result.success ? 'success' : 'warning'
+            );
+        } else {
+            addOperationLog('文件传输', `${action}失败: ${result.message}`, 'error');
+        }
+
+        if (failed.length > 0) {
+            displayOperationResults('传输结果', failed.map(item => ({ ...item, success: false })), result.message);
+        }
+        showMessage(result.message, result.success ? 'success' : 'danger');
+    } catch (error) {
+        hideLoading();
+        addOperationLog('文件传输', `${action}异常: ${error.message}`, 'error');
+        showMessage('文件传输请求失败: ' + error.message, 'danger');
+    }
+}
+
+// 同步计划中各操作的说明
+const SYNC_ACTION_TEXT = {
+    create: '新增',
+    update: '更新',
+    touch: '内容相同，只更新修改时间',
+    delete: '删除',
+    mkdir: '创建目录',
+    skip: '跳过（不是普通文件，或目标中有类型不同的同名项）'
+};
+
+// 执行目录同步：dryRun 为真时只预览同步计划
+async function executeSync(dryRun) {
+    const direction = document.getElementById('syncDirection').value;
+    const source = document.getElementById('syncSource').value.trim();
+    const target = document.getElementById('syncTarget').value.trim();
+    const deleteExtraneous = document.getElementById('syncDelete').checked;
+
+    if (!source || !target) {
+        showMessage('请输入源目录和目标目录', 'warning');
+        return;
+    }
+
+    if (!dryRun && deleteExtraneous) {
+        const confirmed = await showCustomConfirm(
+            `同步会删除 <code>${target}</code> 中源目录没有的文件和目录，确定继续吗？<br><br><strong>此操作不可撤销！</strong>`,
+            '目录同步确认',
+            'warning'
+        );
+        if (!confirmed) {
+            return;
+        }
+    }
+
+    showLoading();
+    addOperationLog('目录同步', `${dryRun ? '预览' : '开始'}同步: ${source} → ${target}`, 'info');
+
+    try {
+        const result = await runJob('/sync', {
+            direction: direction,
+            source: source,
+            target: target,
+            delete: deleteExtraneous,
+            checksum: document.getElementById('syncChecksum').checked,
+            bwlimit: document.getElementById('syncBandwidth').value,
+            dry_run: dryRun
+        });
+        hideLoading();
+
+        const summary = result.summary || {};
+        const plan = result.plan || [];
+        if (dryRun) {
+            displayOperationResults('同步计划', plan.map(item => ({
+                path: item.path || target,
+                message: SYNC_ACTION_TEXT[item.action] || item.action,
+                success: item.action !== 'skip'
+            })), result.message);
+        } else if (summary.failed && summary.failed.length > 0) {
+            displayOperationResults('同步结果', summary.failed.map(item => ({ ...item, success: false })), result.message);
+        }
+
+        if (!dryRun && summary.elapsed !== undefined) {
+            addOperationLog(
+                '目录同步',
+                `${result.message}，传输 ${formatFileSize(summary.transferred_bytes)}，用时 ${summary.elapsed} 秒`,
+                result.success ? 'success' : 'warning'
+            );
+        } else {
+            addOperationLog('目录同步', result.message, result.success ? 'info' : 'error');
+        }
+        showMessage(result.message, result.success ? 'success' : 'danger');
+    } catch (error) {
+        hideLoading();
+        addOperationLog('目录同步', `同步异常: ${error.message}`, 'error');
+        showMessage('目录同步请求失败: ' + error.message, 'danger');
+    }
+}
+
 // 显示操作结果
 function displayOperationResults(title, results, message) {
     const resultsPanel = document.getElementById('resultsPanel');
@@ -205,6 +442,11 @@ function displayOperationResults(title, results, message) {
             html += `
                                     <strong>目录:</strong> ${item.dir_name}<br>
             `;
+        } else if (item.path !== undefined) {
+            // 文件传输结果
+            html += `
+                                    <strong>文件:</strong> ${item.path}<br>
+            `;
         }
 
         html += `
@@ -2,10 +2,9 @@
 
 // 浏览路径
 async function browsePath(inputId) {
-    // 先检查连接状态
+    // 先检查连接状态（推送通道可用时不会请求服务器）
     try {
-        const statusResponse = await fetch('/connection_status');
-        const statusResult = await statusResponse.json();
+        const statusResult = await getConnectionState();
 
         if (statusResult.mode === 'remote' && !statusResult.connected) {
             showMessage('请先连接SSH服务器', 'warning');
@@ -47,14 +46,58 @@ async function browsePath(inputId) {
     browseModal.show();
 }
 
-// 加载目录
-async function loadDirectory(path) {
+const BROWSE_ROW_HEIGHT = 41;
+const BROWSE_PAGE_SIZE = 200;
+const BROWSE_OVERSCAN = 20;
+let browseState = null;
+let browseFilterTimer = null;
+
+// 绑定排序和过滤控件
+function initializeBrowseControls() {
+    document.getElementById('browseSort').addEventListener('change', reloadDirectory);
+    document.getElementById('browseOrderBtn').addEventListener('click', function () {
+        const descending = this.dataset.order !== 'desc';
+        this.dataset.order = descending ? 'desc' : 'asc';
+        this.innerHTML = `<i class="bi bi-sort-${descending ? 'up' : 'down-alt'}"></i>`;
+        reloadDirectory();
+    });
+    document.getElementById('browseFilter').addEventListener('input', () => {
+        clearTimeout(browseFilterTimer);
+        browseFilterTimer = setTimeout(reloadDirectory, 300);
+    });
+}
+
+// 按当前的排序和过滤条件重新加载目录
+function reloadDirectory() {
+    if (browseState) {
+        loadDirectory(browseState.path, true);
+    }
+}
+
+// 加载目录：只请求第一页，其余页在滚动到时按需请求；排序和过滤在服务器端完成
+async function loadDirectory(path, keepFilter = false) {
+    if (!keepFilter) {
+        document.getElementById('browseFilter').value = '';
+    }
+    const state = {
+        path: path,
+        sort: document.getElementById('browseSort').value,
+        order: document.getElementById('browseOrderBtn').dataset.order || 'asc',
+        filter: document.getElementById('browseFilter').value.trim(),
+        cursor: null,
+        total: 0,
+        items: [],
+        pending: new Set()
+    };
+    browseState = state;
+
     try {
-        const response = await fetch(`/browse?path=${encodeURIComponent(path)}`);
-        const result = await response.json();
+        const result = await fetchBrowsePage(state, 0);
+        // 等待期间已切换到其他目录
+        if (browseState !== state) return;
 
         if (result.success) {
-            displayFileList(result.items, result.current_path);
+            displayFileList(state, result.current_path);
             updateBreadcrumb(result.current_path);
         } else {
             showMessage(result.message, 'danger');
@@ -69,8 +112,53 @@ async function loadDirectory(path) {
     }
 }
 
+// 请求一页目录项，后续页使用服务器返回的游标
+async function fetchBrowsePage(state, offset) {
+    const params = new URLSearchParams({
+        path: state.path,
+        offset: offset,
+        limit: BROWSE_PAGE_SIZE,
+        sort: state.sort,
+        order: state.order,
+        filter: state.filter
+    });
+    if (state.cursor) {
+        params.set('cursor', state.cursor);
+    }
+
+    const response = await fetch(`/browse?${params}`);
+    const result = await response.json();
+    if (result.success) {
+        state.cursor = result.cursor;
+        state.total = result.total;
+        // 每行是按 columns 排列的数组
+        result.rows.forEach((row, index) => {
+            const item = {};
+            result.columns.forEach((column, i) => { item[column] = row[i]; });
+            state.items[result.offset + index] = item;
+        });
+    }
+    return result;
+}
+
+// 按需加载一页，加载完成后刷新可见行
+async function loadBrowsePage(state, offset) {
+    if (state.pending.has(offset)) return;
+    state.pending.add(offset);
+    try {
+        const result = await fetchBrowsePage(state, offset);
+        if (result.success) {
+            renderVisibleRows(state);
+        }
+    } catch (error) {
+        console.error('加载目录项失败:', error);
+    } finally {
+        state.pending.delete(offset);
+    }
+}
+
 // 显示文件列表
-function displayFileList(items, path) {
+function displayFileList(state, path) {
     const fileList = document.getElementById('fileList');
     currentPath = path;
 
@@ -101,35 +189,75 @@ function displayFileList(items, path) {
         }
     }
 
-    // 先显示目录
-    items.filter(item => item.is_dir).forEach(item => {
-        html += `
-            <div class="list-group-item file-item" onclick="loadDirectory('${item.path}')">
+    // 目录项（服务器端已按目录在前排序）放入虚拟列表，只渲染可见的行
+    if (state.total > 0) {
+        html += `<div class="virtual-list" id="virtualList" style="height: ${state.total * BROWSE_ROW_HEIGHT}px"></div>`;
+    } else {
+        html += `<div class="list-group-item text-muted">${state.filter ? '没有匹配的项目' : '目录为空'}</div>`;
+    }
+
+    fileList.innerHTML = html;
+    fileList.scrollTop = 0;
+    fileList.onscroll = () => renderVisibleRows(state);
+    document.getElementById('browseCount').textContent = `共 ${state.total} 项`;
+    renderVisibleRows(state);
+}
+
+// 渲染可见范围内的行，缺失的页按需请求
+function renderVisibleRows(state) {
+    const list = document.getElementById('virtualList');
+    if (browseState !== state || !list) return;
+
+    const fileList = document.getElementById('fileList');
+    const top = fileList.scrollTop - list.offsetTop;
+    const first = Math.max(0, Math.floor(top / BROWSE_ROW_HEIGHT) - BROWSE_OVERSCAN);
+    const last = Math.min(state.total, Math.ceil((top + fileList.clientHeight) / BROWSE_ROW_HEIGHT) + BROWSE_OVERSCAN);
+
+    let html = '';
+    const missingPages = new Set();
+    for (let index = first; index < last; index++) {
+        const item = state.items[index];
+        if (item) {
+            html += renderFileRow(item, index);
+        } else {
+            html += `<div class="list-group-item virtual-row text-muted" style="top: ${index * BROWSE_ROW_HEIGHT}px">加载中...</div>`;
+            missingPages.add(Math.floor(index / BROWSE_PAGE_SIZE) * BROWSE_PAGE_SIZE);
+        }
+    }
+    list.innerHTML = html;
+    missingPages.forEach(offset => loadBrowsePage(state, offset));
+}
+
+// 渲染单个目录项
+function renderFileRow(item, index) {
+    const style = `style="top: ${index * BROWSE_ROW_HEIGHT}px"`;
+    if (item.is_dir) {
+        return `
+            <div class="list-group-item virtual-row file-item" ${style} onclick="openBrowseItem(${index})">
                 <i class="bi bi-folder text-warning"></i> ${item.name}
                 <small class="text-muted float-end">${item.modified}</small>
             </div>
         `;
-    });
-
-    // 再显示文件
-    items.filter(item => !item.is_dir).forEach(item => {
-        const isFileSelection = currentBrowsingInput === 'editorFilePath';
-        const fileClickHandler = isFileSelection ? `selectFile('${item.path}')` : '';
-        const fileClass = isFileSelection ? 'file-item' : '';
+    }
 
-        html += `
-            <div class="list-group-item ${fileClass}" ${isFileSelection ? `onclick="${fileClickHandler}"` : ''}>
-                <i class="bi bi-file-earmark text-primary"></i> ${item.name}
-                <small class="text-muted float-end">${formatFileSize(item.size)} | ${item.modified}</small>
-            </div>
-        `;
-    });
+    const isFileSelection = currentBrowsingInput === 'editorFilePath';
+    return `
+        <div class="list-group-item virtual-row ${isFileSelection ? 'file-item' : ''}" ${style} ${isFileSelection ? `onclick="openBrowseItem(${index})"` : ''}>
+            <i class="bi bi-file-earmark text-primary"></i> ${item.name}
+            <small class="text-muted float-end">${formatFileSize(item.size)} | ${item.modified}</small>
+        </div>
+    `;
+}
 
-    if (html === '') {
-        html = '<div class="list-group-item text-muted">目录为空</div>';
+// 点击目录项：进入目录或选择文件
+function openBrowseItem(index) {
+    const item = browseState.items[index];
+    if (!item) return;
+    if (item.is_dir) {
+        loadDirectory(item.path);
+    } else {
+        selectFile(item.path);
     }
-
-    fileList.innerHTML = html;
 }
 
 // 更新面包屑导航
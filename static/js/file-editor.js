@@ -1,7 +1,32 @@
 /* 文件编辑器模块 */
 
-// 加载文件内容
-async function loadFileContent() {
+const EDITOR_CHUNK_SIZE = 1024 * 1024;
+const EDITOR_PREFETCH_MARGIN = 2000;  // 距离底部多少像素时加载下一块
+const EDITOR_PATCH_VERIFY_LIMIT = 64 * 1024;  // 被替换的原内容不超过此长度时随修改块提交，供服务器校验
+
+// 当前文件的分页加载状态
+let editorState = null;
+
+// 读取文件的一个分块
+async function fetchFileChunk(filePath, offset, encoding) {
+    const response = await fetch('/read_file', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            file_path: filePath,
+            offset: offset,
+            length: EDITOR_CHUNK_SIZE,
+            encoding: encoding
+        })
+    });
+    return await response.json();
+}
+
+// 加载文件内容：先加载第一块，其余部分在滚动到底部时按需加载
+// encoding 为空时由服务器根据文件开头判断编码
+async function loadFileContent(encoding = null) {
     const filePath = document.getElementById('editorFilePath').value;
 
     if (!filePath) {
@@ -12,31 +37,39 @@ async function loadFileContent() {
     showLoading();
 
     try {
-        const response = await fetch('/read_file', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                file_path: filePath
-            })
-        });
-
-        const result = await response.json();
+        const result = await fetchFileChunk(filePath, 0, encoding);
         hideLoading();
 
+        // 第一块就不符合判断出的编码时，直接按建议的编码重新加载
+        if (result.success && result.lossy && result.suggested_encoding && !encoding) {
+            await loadFileContent(result.suggested_encoding);
+            return;
+        }
+
         if (result.success) {
+            editorState = {
+                path: filePath,
+                encoding: result.encoding,
+                version: result.version,
+                size: result.size,
+                nextOffset: result.next_offset,
+                eof: result.eof,
+                lossy: result.lossy,
+                loading: false
+            };
             currentFileContent = result.content;
             currentFilePath = filePath;
 
-            document.getElementById('fileEditor').value = result.content;
-            document.getElementById('fileInfo').textContent = `已加载: ${filePath}`;
+            const editor = document.getElementById('fileEditor');
+            editor.value = result.content;
+            editor.scrollTop = 0;
+            updateFileInfo();
 
             // 自动检测文件类型
             autoDetectFileType(filePath);
             updateEditorLanguage();
 
-            showMessage('文件加载成功', 'success');
+            showMessage(result.eof ? '文件加载成功' : '文件较大，滚动到底部时继续加载', 'success');
             addOperationLog('文件编辑', `成功加载文件: ${filePath}`, 'success');
         } else {
             showMessage(result.message, 'danger');
@@ -49,7 +82,154 @@ async function loadFileContent() {
     }
 }
 
-// 保存文件内容
+// 加载下一块并追加到编辑器末尾，保持光标和滚动位置
+async function loadNextFileChunk() {
+    const state = editorState;
+    if (!state || state.eof || state.loading) {
+        return;
+    }
+
+    state.loading = true;
+    try {
+        const result = await fetchFileChunk(state.path, state.nextOffset, state.encoding);
+        // 加载期间切换了文件
+        if (state !== editorState) {
+            return;
+        }
+        if (!result.success) {
+            showMessage(result.message, 'danger');
+            return;
+        }
+        // 分块之间文件被修改，继续拼接会得到错乱的内容
+        if (result.version !== state.version) {
+            showMessage('文件已被修改，请重新加载', 'warning');
+            return;
+        }
+
+        const editor = document.getElementById('fileEditor');
+        const selectionStart = editor.selectionStart;
+        const selectionEnd = editor.selectionEnd;
+        const scrollTop = editor.scrollTop;
+        editor.value += result.content;
+        editor.setSelectionRange(selectionStart, selectionEnd);
+        editor.scrollTop = scrollTop;
+
+        currentFileContent += result.content;
+        state.nextOffset = result.next_offset;
+        state.eof = result.eof;
+        state.lossy = state.lossy || result.lossy;
+        updateFileInfo();
+
+        // 编码只根据文件开头判断，后面的内容可能是其他编码
+        if (result.lossy && result.suggested_encoding) {
+            const confirmed = await showCustomConfirm(
+                `文件后面的内容不是 ${state.encoding} 编码，可能是 ${result.suggested_encoding}。<br><br>是否按 ${result.suggested_encoding} 重新加载？未保存的修改将丢失。`,
+                '文件编码不一致',
+                'warning'
+            );
+            if (confirmed && state === editorState) {
+                await loadFileContent(result.suggested_encoding);
+            }
+        }
+    } catch (error) {
+        showMessage('加载文件失败: ' + error.message, 'danger');
+    } finally {
+        state.loading = false;
+    }
+}
+
+// 在文件信息中显示编码和加载进度
+function updateFileInfo() {
+    const state = editorState;
+    let text = `已加载: ${state.path} (${state.encoding})`;
+    if (!state.eof) {
+        text += ` ${formatFileSize(state.nextOffset)} / ${formatFileSize(state.size)}`;
+    }
+    if (state.lossy) {
+        text += ' 含无法解码的内容';
+    }
+    document.getElementById('fileInfo').textContent = text;
+}
+
+// 文本按UTF-8编码后的字节数
+function utf8Length(text, start, end) {
+    let length = 0;
+    for (let i = start; i < end; i++) {
+        const code = text.charCodeAt(i);
+        if (code < 0x80) {
+            length += 1;
+        } else if (code < 0x800) {
+            length += 2;
+        } else if (isHighSurrogate(code)) {
+            // 代理对合起来占4个字节
+            length += 4;
+            i++;
+        } else {
+            length += 3;
+        }
+    }
+    return length;
+}
+
+function isHighSurrogate(code) {
+    return code >= 0xD800 && code < 0xDC00;
+}
+
+// 比较加载时的内容和当前内容，去掉公共前缀和后缀，剩下的部分作为一个修改块
+function computeEditHunk(base, text, baseOffset) {
+    const limit = Math.min(base.length, text.length);
+    let prefix = 0;
+    while (prefix < limit && base.charCodeAt(prefix) === text.charCodeAt(prefix)) {
+        prefix++;
+    }
+    if (prefix === base.length && prefix === text.length) {
+        return null;
+    }
+    let suffix = 0;
+    while (suffix < limit - prefix &&
+           base.charCodeAt(base.length - 1 - suffix) === text.charCodeAt(text.length - 1 - suffix)) {
+        suffix++;
+    }
+    // 不能把代理对拆开
+    if (prefix > 0 && isHighSurrogate(base.charCodeAt(prefix - 1))) {
+        prefix--;
+    }
+    if (suffix > 0 && isHighSurrogate(base.charCodeAt(base.length - suffix - 1))) {
+        suffix--;
+    }
+
+    const old = base.slice(prefix, base.length - suffix);
+    const replacement = text.slice(prefix, text.length - suffix);
+    const hunk = {
+        offset: baseOffset + utf8Length(base, 0, prefix),
+        length: utf8Length(old, 0, old.length),
+        text: replacement
+    };
+    if (old.length <= EDITOR_PATCH_VERIFY_LIMIT) {
+        hunk.old = old;
+    }
+    return { hunk: hunk, delta: utf8Length(replacement, 0, replacement.length) - hunk.length };
+}
+
+// 能否只提交修改块：UTF-8 编码才能在浏览器中换算字节偏移；
+// 含回车符的内容在编辑框中会被转换成换行符，无法与文件内容对应
+function canPatchFile(state) {
+    return !state.lossy && Boolean(state.version) && state.encoding.startsWith('utf-8') &&
+        !currentFileContent.includes('\r');
+}
+
+async function postWriteFile(body) {
+    const response = await fetch('/write_file', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(body)
+    });
+    return await response.json();
+}
+
+// 保存文件内容：已加载的文件只提交修改块，并带上加载时的版本，文件已被其他人修改时拒绝保存
 async function saveFileContent() {
     const filePath = document.getElementById('editorFilePath').value;
     const editor = document.getElementById('fileEditor');
@@ -60,6 +240,24 @@ async function saveFileContent() {
         return;
     }
 
+    const state = editorState && editorState.path === filePath ? editorState : null;
+    const patchable = state && canPatchFile(state);
+    if (state) {
+        if (state.lossy) {
+            showMessage(`文件包含无法按 ${state.encoding} 解码的内容，保存会损坏文件`, 'warning');
+            return;
+        }
+        // 只能整体保存时，分页加载的文件要完整加载后才能保存，否则会截断文件
+        if (!state.eof && !patchable) {
+            showMessage('文件尚未完全加载，请滚动到末尾加载全部内容后再保存', 'warning');
+            return;
+        }
+        if (patchable && content === currentFileContent) {
+            showMessage('文件没有修改', 'info');
+            return;
+        }
+    }
+
     // 验证内容一致性
     if (content !== editor.value) {
         showMessage('编辑器内容不一致，请重新加载文件', 'warning');
@@ -81,25 +279,45 @@ async function saveFileContent() {
     try {
         // 再次获取当前编辑器内容，确保最新
         const currentContent = document.getElementById('fileEditor').value;
-        
-        const response = await fetch('/write_file', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                file_path: filePath,
-                content: currentContent
-            })
-        });
+        const edit = patchable ? computeEditHunk(currentFileContent, currentContent,
+                                                 state.encoding === 'utf-8-sig' ? 3 : 0) : null;
 
-        const result = await response.json();
+        let result = null;
+        if (edit) {
+            result = await postWriteFile({
+                file_path: filePath,
+                hunks: [edit.hunk],
+                base_version: state.version,
+                encoding: state.encoding
+            });
+        }
+        // 修改块保存失败（不是冲突）时，完整加载的文件退回整体保存
+        if (!edit || (!result.success && !result.conflict && state.eof)) {
+            result = await postWriteFile({
+                file_path: filePath,
+                content: currentContent,
+                base_version: state ? state.version : null,
+                encoding: state ? state.encoding : 'utf-8'
+            });
+        }
         hideLoading();
 
         if (result.success) {
             currentFileContent = currentContent;
+            if (state) {
+                state.version = result.version;
+                state.size = result.size;
+                if (!state.eof) {
+                    // 修改块之后的内容整体移动，未加载部分的偏移随之改变
+                    state.nextOffset += edit.delta;
+                }
+                updateFileInfo();
+            }
             showMessage('文件保存成功', 'success');
             addOperationLog('文件编辑', `成功保存文件: ${filePath}`, 'success');
+        } else if (result.conflict) {
+            showMessage('文件已被其他人修改，请先复制保留当前内容，重新加载后再修改', 'warning');
+            addOperationLog('文件编辑', `保存冲突: ${filePath}`, 'error');
         } else {
             showMessage(result.message, 'danger');
             addOperationLog('文件编辑', `保存失败: ${result.message}`, 'error');
@@ -187,6 +405,15 @@ function initializeEditorEvents() {
     const editor = document.getElementById('fileEditor');
     const cursorInfo = document.getElementById('cursorInfo');
 
+    if (editor) {
+        // 接近底部时加载下一块
+        editor.addEventListener('scroll', () => {
+            if (editor.scrollTop + editor.clientHeight >= editor.scrollHeight - EDITOR_PREFETCH_MARGIN) {
+                loadNextFileChunk();
+            }
+        });
+    }
+
     if (editor && cursorInfo) {
         editor.addEventListener('keyup', updateCursorInfo);
         editor.addEventListener('click', updateCursorInfo);
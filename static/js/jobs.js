@@ -0,0 +1,146 @@
+/* 后台任务模块 */
+
+const JOB_POLL_INTERVAL = 500;
+const JOB_PUSH_FALLBACK_INTERVAL = 5000;
+let currentJobId = null;
+const jobWaiters = {};
+const jobUpdated = {};
+
+// 提交后台任务并等待完成，返回与原接口相同的结果对象
+// options.onProgress(job) 在每次轮询后调用
+async function runJob(url, body, options = {}) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(body)
+    });
+
+    const result = await response.json();
+    // 参数或连接错误时直接返回，不会创建任务
+    if (!result.job_id) {
+        return result;
+    }
+    return await waitForJob(result.job_id, options);
+}
+
+// 轮询任务直到结束
+async function waitForJob(jobId, options = {}) {
+    currentJobId = jobId;
+    showJobProgress(null);
+
+    try {
+        while (true) {
+            const response = await fetch(`/jobs/${jobId}`);
+            const result = await response.json();
+            if (!result.success) {
+                return { success: false, message: result.message };
+            }
+
+            const job = result.job;
+            showJobProgress(job);
+            if (options.onProgress) {
+                options.onProgress(job);
+            }
+
+            if (job.status === 'succeeded') {
+                return job.result;
+            } else if (job.status === 'failed') {
+                return { success: false, message: job.error, result: job.error };
+            } else if (job.status === 'cancelled') {
+                return { success: false, cancelled: true, message: '任务已取消', result: '任务已取消' };
+            }
+
+            await waitForJobUpdate(jobId);
+        }
+    } finally {
+        delete jobUpdated[jobId];
+        currentJobId = null;
+        hideJobProgress();
+    }
+}
+
+// 等待任务的下一次推送事件；推送通道不可用时按固定间隔轮询
+function waitForJobUpdate(jobId) {
+    const pushed = eventSource && eventSource.readyState === EventSource.OPEN;
+    // 上一次查询期间已经收到推送，立即再次查询
+    if (jobUpdated[jobId]) {
+        delete jobUpdated[jobId];
+        return Promise.resolve();
+    }
+    return new Promise(resolve => {
+        const timer = setTimeout(done, pushed ? JOB_PUSH_FALLBACK_INTERVAL : JOB_POLL_INTERVAL);
+        function done() {
+            clearTimeout(timer);
+            delete jobWaiters[jobId];
+            resolve();
+        }
+        jobWaiters[jobId] = done;
+    });
+}
+
+// 收到任务推送事件：更新进度显示并唤醒等待该任务的轮询
+function handleJobEvent(job) {
+    if (job.id === currentJobId) {
+        showJobProgress(job);
+    }
+    if (jobWaiters[job.id]) {
+        jobWaiters[job.id]();
+    } else if (job.id === currentJobId) {
+        jobUpdated[job.id] = true;
+    }
+}
+
+// 取消当前任务
+async function cancelCurrentJob() {
+    if (!currentJobId) {
+        return;
+    }
+
+    try {
+        const response = await fetch(`/jobs/${currentJobId}/cancel`, { method: 'POST' });
+        const result = await response.json();
+        if (result.success) {
+            document.getElementById('jobProgressText').textContent = '正在取消...';
+        }
+    } catch (error) {
+        showMessage('取消任务失败: ' + error.message, 'danger');
+    }
+}
+
+// 在加载提示中显示任务进度和取消按钮
+function showJobProgress(job) {
+    document.getElementById('jobProgress').style.display = 'block';
+    document.getElementById('jobProgressText').textContent = job ? formatJobProgress(job) : '任务已提交...';
+}
+
+function hideJobProgress() {
+    document.getElementById('jobProgress').style.display = 'none';
+    document.getElementById('jobProgressText').textContent = '';
+}
+
+// 格式化任务进度：已处理条目、已哈希字节数和预计剩余时间
+function formatJobProgress(job) {
+    if (job.status === 'pending') {
+        return '等待执行...';
+    }
+
+    const progress = job.progress;
+    const parts = [];
+    if (progress.message) {
+        parts.push(progress.message);
+    }
+    if (progress.total) {
+        parts.push(`${progress.done} / ${progress.total}`);
+    } else if (progress.done) {
+        parts.push(`已处理 ${progress.done} 项`);
+    }
+    if (progress.bytes_total) {
+        parts.push(`${formatFileSize(progress.bytes)} / ${formatFileSize(progress.bytes_total)}`);
+    }
+    if (job.eta !== null) {
+        parts.push(`剩余约 ${Math.ceil(job.eta)} 秒`);
+    }
+    return parts.join('，');
+}
@@ -14,9 +14,19 @@ async function generateTree() {
     if (maxLevel) options.push(`最大层级: ${maxLevel}`);
     const optionsText = options.length > 0 ? ` (${options.join(', ')})` : '';
 
-    showLoading();
     addOperationLog('目录树生成', `开始生成目录树: ${directoryText}${optionsText}`, 'warning');
 
+    // 隐藏其他功能的结果面板
+    document.getElementById('resultsPanel').style.display = 'none';
+    document.getElementById('dedupeResultsPanel').style.display = 'none';
+
+    const treeOutput = document.getElementById('treeOutput');
+    treeOutput.textContent = '';
+    document.getElementById('treeOutputPanel').style.display = 'block';
+
+    const button = document.getElementById('generateTreeBtn');
+    button.disabled = true;
+
     try {
         const response = await fetch('/tree', {
             method: 'POST',
@@ -31,28 +41,49 @@ async function generateTree() {
             })
         });
 
-        const result = await response.json();
-        hideLoading();
-
-        if (result.success) {
-            // 隐藏其他功能的结果面板
-            document.getElementById('resultsPanel').style.display = 'none';
-
-            document.getElementById('treeOutput').textContent = result.result;
-            document.getElementById('treeOutputPanel').style.display = 'block';
+        // 参数或连接错误时返回普通JSON
+        if (!(response.headers.get('Content-Type') || '').includes('ndjson')) {
+            const result = await response.json();
+            document.getElementById('treeOutputPanel').style.display = 'none';
+            addOperationLog('目录树生成', `生成失败: ${result.message}`, 'error');
+            showMessage(result.message, 'danger');
+            return;
+        }
 
-            // 计算树的行数作为复杂度指标
-            const lineCount = result.result.split('\n').length;
-            addOperationLog('目录树生成', `成功生成目录树: ${lineCount} 行`, 'success');
-            showMessage('目录树生成成功！', 'success');
-        } else {
-            addOperationLog('目录树生成', `生成失败: ${result.result}`, 'error');
-            showMessage(result.result, 'danger');
+        // 边接收边追加，第一批行到达后立即显示
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let first = true;
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.filter(line => line.trim()).forEach(line => {
+                const event = JSON.parse(line);
+                if (event.type === 'lines') {
+                    treeOutput.appendChild(document.createTextNode((first ? '' : '\n') + event.lines.join('\n')));
+                    first = false;
+                } else if (event.type === 'done') {
+                    addOperationLog('目录树生成', `成功生成目录树: ${event.lines} 行`, 'success');
+                    showMessage('目录树生成成功！', 'success');
+                } else if (event.type === 'error') {
+                    if (first) {
+                        document.getElementById('treeOutputPanel').style.display = 'none';
+                    }
+                    addOperationLog('目录树生成', `生成失败: ${event.message}`, 'error');
+                    showMessage(event.message, 'danger');
+                }
+            });
         }
     } catch (error) {
-        hideLoading();
         addOperationLog('目录树生成', `生成异常: ${error.message}`, 'error');
         showMessage('生成目录树失败: ' + error.message, 'danger');
+    } finally {
+        button.disabled = false;
     }
 }
 
@@ -75,17 +106,9 @@ async function cleanEmptyDirectories() {
     addOperationLog('空目录清理', `开始清理空目录: ${directoryText}`, 'warning');
 
     try {
-        const response = await fetch('/clean_empty_dirs', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                directory: directory
-            })
+        const result = await runJob('/clean_empty_dirs', {
+            directory: directory
         });
-
-        const result = await response.json();
         hideLoading();
 
         if (result.success) {
@@ -150,24 +173,17 @@ async function comparePaths() {
     addOperationLog('目录比较', `开始比较: ${path1} 与 ${path2} (相似度阈值: ${similarityThreshold}%)`, 'warning');
 
     try {
-        const response = await fetch('/compare', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                path1: path1,
-                path2: path2,
-                threshold: similarityThreshold
-            })
+        const result = await runJob('/compare', {
+            path1: path1,
+            path2: path2,
+            threshold: similarityThreshold
         });
-
-        const result = await response.json();
         hideLoading();
 
         if (result.success) {
             // 隐藏其他功能的结果面板
             document.getElementById('treeOutputPanel').style.display = 'none';
+            document.getElementById('dedupeResultsPanel').style.display = 'none';
 
             const duplicateCount = result.duplicates ? result.duplicates.length : 0;
             addOperationLog(
@@ -189,6 +205,167 @@ async function comparePaths() {
     }
 }
 
+// 递归查找重复文件（流式接收结果）
+async function findDuplicates() {
+    const roots = document.getElementById('dedupeRoots').value
+        .split('\n').map(root => root.trim()).filter(root => root);
+    const minSize = parseInt(document.getElementById('dedupeMinSize').value) || 1;
+
+    if (roots.length === 0) {
+        showMessage('请至少输入一个有效的路径', 'warning');
+        return;
+    }
+
+    // 隐藏其他功能的结果面板
+    document.getElementById('resultsPanel').style.display = 'none';
+    document.getElementById('treeOutputPanel').style.display = 'none';
+
+    const groupsContainer = document.getElementById('dedupeGroups');
+    const summary = document.getElementById('dedupeSummary');
+    groupsContainer.innerHTML = '';
+    summary.textContent = '正在扫描目录...';
+    document.getElementById('dedupeResultsPanel').style.display = 'block';
+
+    const button = document.getElementById('dedupeBtn');
+    button.disabled = true;
+    addOperationLog('重复文件查找', `开始查找: ${roots.join(', ')}`, 'warning');
+
+    try {
+        const response = await fetch('/dedupe', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                roots: roots,
+                min_size: minSize
+            })
+        });
+
+        // 参数或连接错误时返回普通JSON
+        if (!(response.headers.get('Content-Type') || '').includes('ndjson')) {
+            const result = await response.json();
+            summary.textContent = '';
+            addOperationLog('重复文件查找', `查找失败: ${result.message}`, 'error');
+            showMessage(result.message, 'danger');
+            return;
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let groupCount = 0;
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.filter(line => line.trim()).forEach(line => {
+                const event = JSON.parse(line);
+                if (event.type === 'progress') {
+                    summary.textContent = event.stage === 'scanning'
+                        ? `已扫描 ${event.stats.files} 个文件，已确认 ${groupCount} 组重复文件，继续扫描中...`
+                        : `已扫描 ${event.stats.files} 个文件，${event.stats.size_candidates} 个大小相同的候选，正在比较内容...`;
+                } else if (event.type === 'group') {
+                    // 之后遍历到的同组文件会使该组再次返回，替换之前的结果
+                    const existing = groupsContainer.querySelector(`[data-group-id="${event.id}"]`);
+                    if (existing) {
+                        existing.outerHTML = renderDuplicateGroup(event);
+                    } else {
+                        groupCount++;
+                        groupsContainer.insertAdjacentHTML('beforeend', renderDuplicateGroup(event));
+                    }
+                    summary.textContent = `已确认 ${groupCount} 组重复文件，继续比较中...`;
+                } else if (event.type === 'summary') {
+                    const stats = event.stats;
+                    summary.textContent = `${stats.groups} 组重复，${stats.duplicate_files} 个多余文件，可释放 ${formatFileSize(stats.wasted_bytes)}`;
+                    if (stats.groups === 0) {
+                        groupsContainer.innerHTML = '<div class="alert alert-info">没有找到重复文件</div>';
+                    }
+                    addOperationLog(
+                        '重复文件查找',
+                        `查找完成: 扫描 ${stats.files} 个文件，部分哈希 ${stats.partial_hashed} 个，完整哈希 ${stats.full_hashed} 个，发现 ${stats.groups} 组重复`,
+                        stats.groups > 0 ? 'warning' : 'success'
+                    );
+                } else if (event.type === 'error') {
+                    summary.textContent = '';
+                    addOperationLog('重复文件查找', event.message, 'error');
+                    showMessage(event.message, 'danger');
+                }
+            });
+        }
+    } catch (error) {
+        summary.textContent = '';
+        addOperationLog('重复文件查找', `查找异常: ${error.message}`, 'error');
+        showMessage('查找重复文件失败: ' + error.message, 'danger');
+    } finally {
+        button.disabled = false;
+    }
+}
+
+// 渲染一组重复文件
+function renderDuplicateGroup(group) {
+    const files = group.files.map(file => `
+        <li class="list-group-item d-flex justify-content-between align-items-center">
+            <div>
+                <code class="small">${file.path}</code>
+                <br><small class="text-muted">修改时间: ${file.modified}</small>
+            </div>
+            <button class="btn btn-danger btn-sm" onclick="deleteDuplicateFile('${file.path}', this)">
+                <i class="bi bi-trash"></i> 删除
+            </button>
+        </li>`).join('');
+
+    return `
+        <div class="card mb-3 duplicate-item" data-group-id="${group.id}">
+            <div class="card-header small">
+                <i class="bi bi-file-earmark"></i> ${group.files.length} 个文件，每个 ${formatFileSize(group.size)}
+                <span class="text-muted ms-2">MD5: ${group.hash}</span>
+            </div>
+            <ul class="list-group list-group-flush">${files}</ul>
+        </div>`;
+}
+
+// 删除重复文件组中的一个文件
+async function deleteDuplicateFile(path, button) {
+    const confirmed = await showCustomConfirm(
+        `确定要删除以下文件吗？<br><br><code>${path}</code><br><br><strong>此操作不可撤销！</strong>`,
+        '删除文件确认',
+        'danger'
+    );
+
+    if (!confirmed) {
+        return;
+    }
+
+    try {
+        const response = await fetch('/delete', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                path: path
+            })
+        });
+
+        const result = await response.json();
+        if (result.success) {
+            addOperationLog('文件删除', `成功删除: ${path}`, 'success');
+            button.closest('li').remove();
+            showMessage(result.message, 'success');
+        } else {
+            addOperationLog('文件删除', `删除失败: ${path} - ${result.message}`, 'error');
+            showMessage(result.message, 'danger');
+        }
+    } catch (error) {
+        addOperationLog('文件删除', `删除异常: ${path} - ${error.message}`, 'error');
+        showMessage('删除请求失败: ' + error.message, 'danger');
+    }
+}
+
 // 显示重复文件
 function displayDuplicates(duplicates) {
     duplicatesData = duplicates; // 保存数据供批量操作使用
@@ -408,17 +585,9 @@ async function performBatchDelete(paths, pathType = 'unknown') {
     addOperationLog('批量删除', `开始批量删除 ${pathType} 中的 ${paths.length} 个项目`, 'warning');
 
     try {
-        const response = await fetch('/batch_delete', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                paths: paths
-            })
+        const result = await runJob('/batch_delete', {
+            paths: paths
         });
-
-        const result = await response.json();
         hideLoading();
 
         if (result.success) {
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目录同步的辅助程序：ssh_file_manager 在本地直接导入其中的函数，服务器端通过
+python3 -c <本文件源码> serve 运行，经 exec 通道收发请求和差异记录
+服务器上的 python3 版本可能较旧，这里不使用 f-string 等新语法，也只依赖标准库
+"""
+
+import hashlib, json, mmap, os, struct, sys, zlib
+
+VERSION = 1
+MOD = 65521
+SIG = struct.Struct('>I16s')
+COPY = struct.Struct('>II')
+LENGTH = struct.Struct('>I')
+LITERAL_MAX = 1 << 20
+
+
+def read_message(read):
+    raw = read(LENGTH.size)
+    if len(raw) < LENGTH.size:
+        return None
+    length, = LENGTH.unpack(raw)
+    return json.loads(read(length).decode('utf-8'))
+
+
+def write_message(write, header):
+    data = json.dumps(header).encode('utf-8')
+    write(LENGTH.pack(len(data)) + data)
+
+
+def signature(f, block):
+    """逐块计算弱校验（adler32，可滚动）和强校验（MD5）"""
+    out = []
+    for chunk in iter(lambda: f.read(block), b''):
+        out.append(SIG.pack(zlib.adler32(chunk), hashlib.md5(chunk).digest()))
+    return b''.join(out)
+
+
+def delta(data, signatures, block, basis_size, write):
+    """在新文件 data 中逐字节滚动查找旧文件的块，输出复制记录（C）和新数据记录（L），最后是新文件的MD5（E）"""
+    sigs = [SIG.unpack_from(signatures, offset) for offset in range(0, len(signatures), SIG.size)]
+    full = basis_size // block
+    tail = basis_size - full * block
+    index = {}
+    for i in range(min(full, len(sigs))):
+        index.setdefault(sigs[i][0], []).append(i)
+    run = [0, 0]  # 待合并的连续复制块 [起始块, 块数]
+    
+    def flush_copy():
+        if run[1]:
+            write(b'C' + COPY.pack(run[0], run[1]))
+            run[1] = 0
+    
+    def copy(i):
+        if run[1] and run[0] + run[1] == i:
+            run[1] += 1
+        else:
+            flush_copy()
+            run[0], run[1] = i, 1
+    
+    def literal(start, end):
+        flush_copy()
+        for offset in range(start, end, LITERAL_MAX):
+            chunk = data[offset:min(end, offset + LITERAL_MAX)]
+            write(b'L' + LENGTH.pack(len(chunk)) + chunk)
+    
+    n = len(data)
+    pos = start = 0
+    weak = None
+    while pos + block <= n:
+        if weak is None:
+            weak = zlib.adler32(data[pos:pos + block])
+        candidates = index.get(weak)
+        if candidates:
+            strong = hashlib.md5(data[pos:pos + block]).digest()
+            match = None
+            for i in candidates:
+                if sigs[i][1] == strong:
+                    match = i
+                    # 优先选择紧接上一个复制块的块，便于合并
+                    if run[1] and i == run[0] + run[1]:
+                        break
+            if match is not None:
+                literal(start, pos)
+                copy(match)
+                pos += block
+                start = pos
+                weak = None
+                continue
+        if pos + block >= n:
+            break
+        # adler32 的滚动更新：移出 data[pos]，移入 data[pos + block]
+        out_byte, in_byte = data[pos], data[pos + block]
+        a = ((weak & 0xffff) - out_byte + in_byte) % MOD
+        b = ((weak >> 16) - block * out_byte + a - 1) % MOD
+        weak = (b << 16) | a
+        pos += 1
+        if pos - start >= LITERAL_MAX:
+            literal(start, pos)
+            start = pos
+    
+    # 旧文件末尾不足一块的部分只可能出现在新文件末尾
+    if tail and full < len(sigs) and n - tail >= start:
+        chunk = data[n - tail:]
+        if zlib.adler32(chunk) == sigs[full][0] and hashlib.md5(chunk).digest() == sigs[full][1]:
+            literal(start, n - tail)
+            copy(full)
+            start = n
+    literal(start, n)
+    flush_copy()
+    write(b'E' + hashlib.md5(data).digest())
+
+
+def patch(basis, write, read, block):
+    """按差异记录重建文件，返回 (重建内容的MD5, 发送方给出的MD5)"""
+    digest = hashlib.md5()
+    while True:
+        kind = read(1)
+        if kind == b'C':
+            index, count = COPY.unpack(read(COPY.size))
+            basis.seek(index * block)
+            remaining = count * block
+            while remaining > 0:
+                chunk = basis.read(min(remaining, LITERAL_MAX))
+                if not chunk:
+                    break
+                write(chunk)
+                digest.update(chunk)
+                remaining -= len(chunk)
+        elif kind == b'L':
+            length, = LENGTH.unpack(read(LENGTH.size))
+            chunk = read(length)
+            write(chunk)
+            digest.update(chunk)
+        elif kind == b'E':
+            return digest.digest(), read(16)
+        elif kind == b'X':
+            length, = LENGTH.unpack(read(LENGTH.size))
+            raise IOError(read(length).decode('utf-8', 'replace'))
+        else:
+            raise IOError('差异数据格式错误')
+
+
+def open_data(f):
+    size = os.fstat(f.fileno()).st_size
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+
+def apply_patch(header, read):
+    """在目标旁的临时文件中重建，校验MD5后设置修改时间、权限并改名替换目标"""
+    target = header['target']
+    directory, name = os.path.split(target)
+    temp = os.path.join(directory, '.' + name + '.sync-' + os.urandom(6).hex())
+    try:
+        with open(header['basis'], 'rb') as basis, open(temp, 'xb') as out:
+            digest, expected = patch(basis, out.write, read, header['block'])
+            out.flush()
+            os.fsync(out.fileno())
+        if digest != expected:
+            os.remove(temp)
+            return {'ok': False, 'error': 'MD5校验不一致'}
+        if header.get('mode'):
+            os.chmod(temp, header['mode'])
+        os.utime(temp, (header['mtime'], header['mtime']))
+        os.replace(temp, target)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return {'ok': True}
+
+
+def serve():
+    read, out = sys.stdin.buffer.read, sys.stdout.buffer
+    
+    def respond(header, payload=b''):
+        write_message(out.write, header)
+        out.write(payload)
+        out.flush()
+    
+    while True:
+        header = read_message(read)
+        if header is None:
+            return
+        op = header['op']
+        if op == 'hello':
+            respond({'ok': True, 'version': VERSION})
+        elif op == 'sig':
+            try:
+                with open(header['path'], 'rb') as f:
+                    size = os.fstat(f.fileno()).st_size
+                    sig = signature(f, header['block'])
+            except OSError as e:
+                respond({'ok': False, 'error': str(e)})
+                continue
+            respond({'ok': True, 'size': size, 'length': len(sig)}, sig)
+        elif op == 'delta':
+            signatures = read(header['length'])
+            try:
+                f = open(header['path'], 'rb')
+            except OSError as e:
+                respond({'ok': False, 'error': str(e)})
+                continue
+            with f:
+                respond({'ok': True})
+                data = b''
+                try:
+                    data = open_data(f)
+                    delta(data, signatures, header['block'], header['basis_size'], out.write)
+                except Exception as e:
+                    message = str(e).encode('utf-8')
+                    out.write(b'X' + LENGTH.pack(len(message)) + message)
+                finally:
+                    if isinstance(data, mmap.mmap):
+                        data.close()
+                out.flush()
+        elif op == 'patch':
+            try:
+                respond(apply_patch(header, read))
+            except Exception as e:
+                # 差异记录没有读完，无法继续处理后续请求
+                respond({'ok': False, 'error': str(e)})
+                return
+
+
+if __name__ == '__main__' and sys.argv[1:] == ['serve']:
+    serve()
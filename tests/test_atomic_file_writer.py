@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""AtomicFileWriter.patch：本地模式下按补丁修改文件（改名替换和原地修改两条路径）"""
+
+import os
+
+import pytest
+
+from ssh_file_manager import AtomicFileWriter, FileConflict, FileManager, file_version
+
+ORIGINAL = b'0123456789abcdefghij'
+
+
+@pytest.fixture
+def writer():
+    return FileManager().writer
+
+
+@pytest.fixture
+def target(tmp_path):
+    path = tmp_path / 'file.txt'
+    path.write_bytes(ORIGINAL)
+    return path
+
+
+@pytest.fixture(params=['replace', 'in_place'])
+def mode(request, target):
+    """in_place 时为文件加一个硬链接，写入方只能原地修改"""
+    if request.param == 'in_place':
+        os.link(target, str(target) + '.link')
+    return request.param
+
+
+def patch(writer, path, hunks, **kwargs):
+    kwargs.setdefault('backup', False)
+    return writer.patch(str(path), hunks, **kwargs)
+
+
+@pytest.mark.parametrize('hunks, expected', [
+    ([(2, 3, b'XYZ', None)], b'01XYZ56789abcdefghij'),
+    ([(2, 3, b'LONGER', None)], b'01LONGER56789abcdefghij'),
+    ([(2, 3, b'', None)], b'0156789abcdefghij'),
+    ([(0, 0, b'>>', None)], b'>>' + ORIGINAL),
+    ([(20, 0, b'<<', None)], ORIGINAL + b'<<'),
+    ([(1, 1, b'AA', b'1'), (10, 5, b'', b'abcde'), (18, 2, b'J', b'ij')], b'0AA23456789fghJ'),
+])
+def test_hunks_are_applied(writer, target, mode, hunks, expected):
+    result = patch(writer, target, hunks)
+    assert target.read_bytes() == expected
+    assert result['size'] == len(expected)
+    assert result['version'] == file_version(os.stat(target))
+
+
+def test_in_place_keeps_hard_link(writer, target):
+    link = str(target) + '.link'
+    os.link(target, link)
+    patch(writer, target, [(0, 1, b'ZZ', b'0')])
+    assert os.path.samefile(target, link)
+    assert target.read_bytes() == b'ZZ123456789abcdefghij'
+
+
+def test_old_content_mismatch_leaves_file_unchanged(writer, target, mode):
+    with pytest.raises(FileConflict):
+        patch(writer, target, [(0, 2, b'zz', b'01'), (5, 2, b'zz', b'xx')])
+    assert target.read_bytes() == ORIGINAL
+    assert sorted(os.listdir(target.parent)) == sorted(
+        ['file.txt'] + (['file.txt.link'] if mode == 'in_place' else []))
+
+
+def test_base_version_conflict(writer, target):
+    version = file_version(os.stat(target))
+    with pytest.raises(FileConflict) as info:
+        patch(writer, target, [(0, 1, b'x', None)], base_version=version + 'stale')
+    assert info.value.version == version
+    assert target.read_bytes() == ORIGINAL
+
+
+def test_matching_base_version(writer, target):
+    version = file_version(os.stat(target))
+    patch(writer, target, [(0, 1, b'x', b'0')], base_version=version)
+    assert target.read_bytes() == b'x' + ORIGINAL[1:]
+
+
+@pytest.mark.parametrize('hunks', [
+    [(18, 5, b'x', None)],
+    [(4, 4, b'x', None), (6, 1, b'y', None)],
+])
+def test_invalid_ranges_are_rejected(writer, target, mode, hunks):
+    with pytest.raises(ValueError):
+        patch(writer, target, hunks)
+    assert target.read_bytes() == ORIGINAL
+
+
+def test_backup_keeps_original(writer, target):
+    result = patch(writer, target, [(0, 1, b'x', None)], backup=True)
+    assert result['backup']
+    assert (target.parent / ('file.txt' + AtomicFileWriter.BACKUP_SUFFIX)).read_bytes() == ORIGINAL
+    assert target.read_bytes() == b'x' + ORIGINAL[1:]
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""BatchRenamer.plan：序号分配、冲突排除和改名链"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from ssh_file_manager import BatchRenamer, FileManager, RenamePipeline
+
+
+def items(*names):
+    return [SimpleNamespace(name=name, is_dir=False) for name in names]
+
+
+@pytest.fixture
+def renamer():
+    return BatchRenamer(FileManager())
+
+
+def planned(results):
+    return {result['old_name']: result['new_name'] for result in results if result['success']
+            and result['old_name'] != result['new_name']}
+
+
+def test_sequence_is_contiguous_over_renamed_items(renamer):
+    results, chains = renamer.plan(items('a.txt', 'b.txt', 'c.txt'), RenamePipeline([{'type': 'add_sequence_prefix'}]))
+    assert planned(results) == {'a.txt': '001_a.txt', 'b.txt': '002_b.txt', 'c.txt': '003_c.txt'}
+    assert sorted(step for chain in chains for step in chain) == [
+        ('a.txt', '001_a.txt', 'a.txt'), ('b.txt', '002_b.txt', 'b.txt'), ('c.txt', '003_c.txt', 'c.txt')]
+
+
+def test_unchanged_items_do_not_consume_sequence(renamer):
+    rename = lambda name, sequence: name if name.startswith('keep') else f'file_{sequence}.txt'
+    results, _ = renamer.plan(items('a.txt', 'keep.txt', 'b.txt'), rename)
+    assert planned(results) == {'a.txt': 'file_1.txt', 'b.txt': 'file_2.txt'}
+
+
+def test_excluded_conflicts_leave_no_gaps(renamer):
+    # a 和 b 都改成 same.txt 被排除，其余项重新编号
+    rename = lambda name, sequence: 'same.txt' if name in ('a.txt', 'b.txt') else f'{sequence}_{name}'
+    results, _ = renamer.plan(items('a.txt', 'b.txt', 'c.txt', 'd.txt'), rename)
+    by_name = {result['old_name']: result for result in results}
+    assert not by_name['a.txt']['success'] and not by_name['b.txt']['success']
+    assert planned(results) == {'c.txt': '1_c.txt', 'd.txt': '2_d.txt'}
+
+
+def test_sequence_taken_by_existing_name_is_skipped(renamer):
+    rename = lambda name, sequence: name if name.startswith('img') else f'img_{sequence}.txt'
+    results, _ = renamer.plan(items('a.txt', 'b.txt', 'c.txt', 'img_2.txt'), rename)
+    assert planned(results) == {'a.txt': 'img_1.txt', 'b.txt': 'img_3.txt', 'c.txt': 'img_4.txt'}
+
+
+def test_fixed_name_taken_by_unrenamed_item_is_a_conflict(renamer):
+    rename = lambda name, sequence: 'c.txt' if name == 'b.txt' else name
+    results, chains = renamer.plan(items('b.txt', 'c.txt'), rename)
+    by_name = {result['old_name']: result for result in results}
+    assert not by_name['b.txt']['success']
+    assert '目标名称已存在' in by_name['b.txt']['message']
+    assert chains == []
+
+
+def test_invalid_name_fails_only_that_item(renamer):
+    rename = lambda name, sequence: 'x/y' if name == 'a.txt' else name.upper()
+    results, _ = renamer.plan(items('a.txt', 'b.txt'), rename)
+    by_name = {result['old_name']: result for result in results}
+    assert not by_name['a.txt']['success']
+    assert by_name['b.txt']['new_name'] == 'B.TXT'
+
+
+def test_swap_is_split_with_temporary_name(renamer):
+    rename = lambda name, sequence: {'a': 'b', 'b': 'a'}[name]
+    results, chains = renamer.plan(items('a', 'b'), rename)
+    assert planned(results) == {'a': 'b', 'b': 'a'}
+    assert len(chains) == 1
+    chain = chains[0]
+    temp = chain[0][1]
+    assert temp not in ('a', 'b')
+    assert chain == [('a', temp, 'a'), ('b', 'a', 'b'), (temp, 'b', 'a')]
+
+
+def test_dependent_renames_run_in_order(renamer):
+    rename = lambda name, sequence: {'a': 'b', 'b': 'c'}.get(name, name)
+    results, chains = renamer.plan(items('a', 'b'), rename)
+    assert chains == [[('b', 'c', 'b'), ('a', 'b', 'a')]]
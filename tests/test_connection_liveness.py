@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""ConnectionLiveness：缓存检测结果、在锁外探测、探测超时"""
+
+import socket
+import threading
+import time
+
+import paramiko
+import pytest
+
+from ssh_file_manager import ConnectionLiveness
+
+
+class FakeChannel:
+    def __init__(self):
+        self.timeout = None
+        self.timeouts = []
+
+    def gettimeout(self):
+        return self.timeout
+
+    def settimeout(self, timeout):
+        self.timeouts.append(timeout)
+        self.timeout = timeout
+
+    def close(self):
+        pass
+
+
+class FakeSFTP:
+    """stat 调用 on_stat（默认立即返回），记录调用次数"""
+
+    def __init__(self, on_stat=None):
+        self.channel = FakeChannel()
+        self.on_stat = on_stat
+        self.stats = 0
+
+    def get_channel(self):
+        return self.channel
+
+    def stat(self, path):
+        self.stats += 1
+        if self.on_stat:
+            self.on_stat()
+
+
+class FakeTransport:
+    def __init__(self, open_session=None):
+        self.active = True
+        self.sessions = []
+        self._open_session = open_session
+
+    def is_active(self):
+        return self.active
+
+    def open_session(self, timeout=None):
+        self.sessions.append(timeout)
+        if self._open_session:
+            self._open_session()
+        return FakeChannel()
+
+
+class FakeSSH:
+    def __init__(self, transport):
+        self.transport = transport
+
+    def get_transport(self):
+        return self.transport
+
+
+@pytest.fixture
+def ssh():
+    return FakeSSH(FakeTransport())
+
+
+def test_result_is_cached_for_ttl(ssh, monkeypatch):
+    liveness = ConnectionLiveness(ttl=10, timeout=1)
+    sftp = FakeSFTP()
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+
+    assert liveness.check(ssh, sftp)
+    now[0] += 9
+    assert liveness.check(ssh, sftp)
+    assert sftp.stats == 1
+    now[0] += 2
+    assert liveness.check(ssh, sftp)
+    assert sftp.stats == 2
+    assert liveness.get_stats()['cache_hits'] == 1
+
+
+def test_mark_alive_skips_probe(ssh):
+    liveness = ConnectionLiveness(ttl=10, timeout=1)
+    sftp = FakeSFTP()
+    liveness.mark_alive()
+    assert liveness.check(ssh, sftp)
+    assert sftp.stats == 0
+
+
+def test_dead_transport_fails_without_probe(ssh):
+    liveness = ConnectionLiveness(ttl=10, timeout=1)
+    sftp = FakeSFTP()
+    liveness.mark_alive()
+    ssh.transport.active = False
+    assert not liveness.check(ssh, sftp)
+    assert sftp.stats == 0
+    assert not liveness.check(None, sftp)
+
+
+def test_probe_runs_outside_lock(ssh):
+    liveness = ConnectionLiveness(ttl=10, timeout=1)
+    held = []
+
+    def on_stat():
+        acquired = liveness._lock.acquire(blocking=False)
+        held.append(not acquired)
+        if acquired:
+            liveness._lock.release()
+
+    assert liveness.check(ssh, FakeSFTP(on_stat))
+    assert held == [False]
+
+
+def test_concurrent_checks_share_one_probe(ssh):
+    liveness = ConnectionLiveness(ttl=10, timeout=2)
+    started, release = threading.Event(), threading.Event()
+
+    def on_stat():
+        started.set()
+        release.wait(2)
+
+    sftp = FakeSFTP(on_stat)
+    results = []
+    owner = threading.Thread(target=lambda: results.append(liveness.check(ssh, sftp)))
+    owner.start()
+    assert started.wait(2)
+    waiters = [threading.Thread(target=lambda: results.append(liveness.check(ssh, sftp))) for _ in range(3)]
+    for thread in waiters:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in [owner] + waiters:
+        thread.join(2)
+
+    assert results == [True] * 4
+    assert sftp.stats == 1
+    assert liveness.get_stats()['probe_waits'] == 3
+
+
+def test_waiters_give_up_after_timeout(ssh):
+    liveness = ConnectionLiveness(ttl=10, timeout=0.1)
+    started, release = threading.Event(), threading.Event()
+
+    def on_stat():
+        started.set()
+        release.wait(2)
+
+    sftp = FakeSFTP(on_stat)
+    owner = threading.Thread(target=liveness.check, args=(ssh, sftp))
+    owner.start()
+    try:
+        assert started.wait(2)
+        start = time.monotonic()
+        assert not liveness.check(ssh, sftp)
+        assert time.monotonic() - start < 1
+    finally:
+        release.set()
+        owner.join(2)
+
+
+def test_sftp_probe_timeout_marks_dead(ssh):
+    liveness = ConnectionLiveness(ttl=10, timeout=0.5)
+
+    def on_stat():
+        raise socket.timeout()
+
+    sftp = FakeSFTP(on_stat)
+    sftp.channel.timeout = 30
+    assert not liveness.check(ssh, sftp)
+    assert sftp.channel.timeouts == [0.5, 30]
+    assert liveness.get_stats()['probe_failures'] == 1
+    # 失败不缓存，下一次检查重新探测
+    sftp.on_stat = None
+    assert liveness.check(ssh, sftp)
+    assert sftp.stats == 2
+
+
+def test_session_probe_without_sftp(ssh):
+    liveness = ConnectionLiveness(ttl=10, timeout=0.5)
+    assert liveness.check(ssh, None)
+    assert ssh.transport.sessions == [0.5]
+
+
+def test_rejected_session_counts_as_response():
+    def refuse():
+        raise paramiko.ChannelException(1, 'administratively prohibited')
+
+    liveness = ConnectionLiveness(ttl=10, timeout=0.5)
+    assert liveness.check(FakeSSH(FakeTransport(refuse)), None)
+
+
+def test_session_timeout_marks_dead():
+    def hang():
+        raise paramiko.SSHException('Timeout opening channel.')
+
+    liveness = ConnectionLiveness(ttl=10, timeout=0.5)
+    assert not liveness.check(FakeSSH(FakeTransport(hang)), None)
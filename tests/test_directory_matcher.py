@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""DirectoryMatcher：索引匹配的结果与两两比较一致"""
+
+import random
+
+import pytest
+
+from ssh_file_manager import DirectoryMatcher, FileManager
+
+WORDS = ['report', 'photo', 'IMG', 'backup', 'final', 'v2', '副本', '照片', 'a', 'ab']
+
+
+@pytest.fixture(scope='module')
+def fm():
+    return FileManager()
+
+
+def item(name, size=100, is_dir=False):
+    return {'name': name, 'path': '/x/' + name, 'size': 0 if is_dir else size, 'is_dir': is_dir}
+
+
+def pairwise(fm, items1, items2, threshold):
+    """原始实现的两两比较"""
+    exact, similar = [], []
+    for item1 in items1:
+        for item2 in items2:
+            if item1['is_dir'] != item2['is_dir']:
+                continue
+            if item1['name'] == item2['name']:
+                exact.append((item1['path'], item2['path']))
+                continue
+            similarity = fm.calculate_name_similarity(item1['name'], item2['name'])
+            if similarity >= threshold and (
+                    item1['is_dir'] or fm.calculate_size_similarity(item1['size'], item2['size']) >= 0.9):
+                similar.append((item1['path'], item2['path'], similarity))
+    return exact, similar
+
+
+def match(fm, items1, items2, threshold):
+    matcher = DirectoryMatcher(fm.calculate_name_similarity, fm.calculate_size_similarity, threshold)
+    exact, similar = matcher.match(items1, items2)
+    return ([(a['path'], b['path']) for a, b, _ in exact],
+            [(a['path'], b['path'], similarity) for a, b, similarity in similar])
+
+
+def random_items(rng, count, prefix):
+    items = []
+    for i in range(count):
+        is_dir = rng.random() < 0.15
+        name = '_'.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+        if rng.random() < 0.5:
+            name += str(rng.randint(0, 20))
+        if not is_dir:
+            name += rng.choice(['.txt', '.jpg', ''])
+        items.append({'name': name, 'path': f'/{prefix}/{i}/{name}', 'is_dir': is_dir,
+                      'size': 0 if is_dir else rng.choice([0, 1, 100, 105, 1000, 10 ** 6])})
+    return items
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('threshold', [0.5, 0.8, 1.0])
+def test_same_result_as_pairwise(fm, seed, threshold):
+    rng = random.Random(seed)
+    items1 = random_items(rng, 60, 'a')
+    items2 = random_items(rng, 60, 'b')
+    assert match(fm, items1, items2, threshold) == pairwise(fm, items1, items2, threshold)
+
+
+def test_exact_requires_same_type(fm):
+    exact, similar = match(fm, [item('data'), item('logs', is_dir=True)],
+                           [item('data', is_dir=True), item('logs', is_dir=True)], 0.8)
+    assert exact == [('/x/logs', '/x/logs')]
+    assert similar == []
+
+
+def test_digit_difference_lowers_similarity(fm):
+    # 名称只差数字时打折扣，低于阈值
+    _, similar = match(fm, [item('report_2023.txt')], [item('report_2024.txt')], 0.9)
+    assert similar == []
+    _, similar = match(fm, [item('report_2023.txt')], [item('report_2023_copy.txt')], 0.7)
+    assert [pair[:2] for pair in similar] == [('/x/report_2023.txt', '/x/report_2023_copy.txt')]
+
+
+def test_size_must_be_close_for_files(fm):
+    _, similar = match(fm, [item('holiday.jpg', 1000)], [item('holiday_copy.jpg', 2000)], 0.7)
+    assert similar == []
+    _, similar = match(fm, [item('holiday', is_dir=True)], [item('holiday_copy', is_dir=True)], 0.7)
+    assert len(similar) == 1
+
+
+def test_threshold_above_one_disables_fuzzy_matching(fm):
+    exact, similar = match(fm, [item('a.txt'), item('b.txt')], [item('a.txt'), item('b2.txt')], 1.1)
+    assert exact == [('/x/a.txt', '/x/a.txt')]
+    assert similar == []
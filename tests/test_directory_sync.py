@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""DirectorySync._plan：根据两侧目录树生成同步计划（不访问文件系统）"""
+
+import stat
+
+import pytest
+
+from ssh_file_manager import DirectorySync, FileManager, make_walk_entry
+
+FILE = stat.S_IFREG | 0o644
+DIR = stat.S_IFDIR | 0o755
+LINK = stat.S_IFLNK | 0o777
+
+
+def tree(root, entries):
+    """entries 为 {相对路径: (模式, 大小, 修改时间)}"""
+    result = {}
+    for relative, (mode, size, mtime) in entries.items():
+        parent, _, name = relative.rpartition('/')
+        result[relative] = make_walk_entry(f'{root}/{parent}'.rstrip('/'), name, mode, size, mtime)
+    return result
+
+
+def plan(source, target, delete=False, target_exists=True):
+    sync = DirectorySync(FileManager(), 'upload', delete=delete)
+    trees = {False: tree('/src', source), True: tree('/dst', target) if target_exists else None}
+    sync._scan = lambda remote, root: trees[remote]
+    return sync._plan('/src', '/dst')
+
+
+def actions(result):
+    return [(item['path'], item['action']) for item in result[0]]
+
+
+def test_create_update_and_unchanged():
+    source = {'a.txt': (FILE, 10, 1000), 'b.txt': (FILE, 20, 1000), 'c.txt': (FILE, 30, 1000), 'd': (DIR, 0, 1000)}
+    target = {'b.txt': (FILE, 21, 1000), 'c.txt': (FILE, 30, 1000)}
+    result = plan(source, target)
+    assert actions(result) == [('a.txt', 'create'), ('b.txt', 'update'), ('d', 'mkdir')]
+    files = result[1]
+    assert set(files) == {'a.txt', 'b.txt'}
+    assert files['b.txt']['basis_size'] == 21 and files['a.txt']['basis_size'] == 0
+    assert files['a.txt']['target'] == '/dst/a.txt'
+
+
+def test_mtime_within_tolerance_is_unchanged():
+    source = {'a.txt': (FILE, 10, 1000.6), 'b.txt': (FILE, 10, 1005)}
+    target = {'a.txt': (FILE, 10, 1000), 'b.txt': (FILE, 10, 1000)}
+    assert actions(plan(source, target)) == [('b.txt', 'update')]
+
+
+def test_missing_target_starts_with_mkdir():
+    result = plan({'a.txt': (FILE, 1, 1)}, {}, target_exists=False)
+    assert actions(result) == [('', 'mkdir'), ('a.txt', 'create')]
+    assert result[0][0]['target'] == '/dst'
+
+
+def test_deletes_only_top_level_extras_first_in_reverse_order():
+    source = {'keep': (DIR, 0, 1), 'keep/a.txt': (FILE, 1, 1)}
+    target = {'keep': (DIR, 0, 1), 'keep/a.txt': (FILE, 1, 1), 'keep/old.txt': (FILE, 1, 1),
+              'x': (DIR, 0, 1), 'x/y.txt': (FILE, 1, 1), 'z.txt': (FILE, 1, 1)}
+    assert actions(plan(source, target, delete=True)) == [
+        ('z.txt', 'delete'), ('x', 'delete'), ('keep/old.txt', 'delete')]
+
+
+def test_extras_kept_without_delete():
+    assert actions(plan({}, {'z.txt': (FILE, 1, 1)})) == []
+
+
+def test_type_conflict_skipped_without_delete():
+    source = {'a': (DIR, 0, 1), 'a/b.txt': (FILE, 1, 1), 'c': (FILE, 1, 1)}
+    target = {'a': (FILE, 5, 1), 'c': (DIR, 0, 1)}
+    assert actions(plan(source, target)) == [('a', 'skip'), ('a/b.txt', 'skip'), ('c', 'skip')]
+
+
+def test_type_conflict_replaced_with_delete():
+    source = {'a': (DIR, 0, 1), 'a/b.txt': (FILE, 1, 1), 'c': (FILE, 1, 1)}
+    target = {'a': (FILE, 5, 1), 'c': (DIR, 0, 1), 'c/inner.txt': (FILE, 1, 1)}
+    assert actions(plan(source, target, delete=True)) == [
+        ('c', 'delete'), ('a', 'delete'), ('a', 'mkdir'), ('a/b.txt', 'create'), ('c', 'create')]
+
+
+def test_special_files_are_skipped():
+    assert actions(plan({'link': (LINK, 0, 1)}, {})) == [('link', 'skip')]
+
+
+def test_missing_source_raises():
+    sync = DirectorySync(FileManager(), 'upload')
+    sync._scan = lambda remote, root: None
+    with pytest.raises(FileNotFoundError):
+        sync._plan('/src', '/dst')
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""GitignoreMatcher 与 IgnoreStack 的 gitignore 语义"""
+
+import pytest
+
+from ssh_file_manager import GitignoreMatcher, IgnoreStack
+
+
+def ignored(lines, path, is_dir=False):
+    return GitignoreMatcher(lines).match(path, path.rpartition('/')[2], is_dir)
+
+
+@pytest.mark.parametrize('lines, path, is_dir, expected', [
+    # 文件名规则在任意层级生效
+    (['*.log'], 'a.log', False, True),
+    (['*.log'], 'src/deep/a.log', False, True),
+    (['*.log'], 'a.log.txt', False, None),
+    (['node_modules'], 'web/node_modules', True, True),
+    # 末尾 / 只匹配目录
+    (['build/'], 'build', True, True),
+    (['build/'], 'build', False, None),
+    # 开头或中间的 / 表示相对 .gitignore 所在目录锚定
+    (['/todo.txt'], 'todo.txt', False, True),
+    (['/todo.txt'], 'docs/todo.txt', False, None),
+    (['doc/*.txt'], 'doc/notes.txt', False, True),
+    (['doc/*.txt'], 'doc/sub/notes.txt', False, None),
+    # ** 匹配任意层目录
+    (['**/logs'], 'a/b/logs', True, True),
+    (['a/**/b'], 'a/b', True, True),
+    (['a/**/b'], 'a/x/y/b', True, True),
+    (['abc/**'], 'abc/x/y', False, True),
+    # ? 和 [] 通配
+    (['file?.txt'], 'file1.txt', False, True),
+    (['file?.txt'], 'file10.txt', False, None),
+    (['[ab].txt'], 'b.txt', False, True),
+    (['[!ab].txt'], 'b.txt', False, None),
+    # * 不跨越目录分隔符
+    (['a/*'], 'a/b/c', False, None),
+    # 注释、空行和转义
+    (['# comment', '', r'\#keep'], '#keep', False, True),
+    (['# comment'], '# comment', False, None),
+    ([r'\!important'], '!important', False, True),
+    # 行尾空格被忽略
+    (['trailing.txt   '], 'trailing.txt', False, True),
+])
+def test_patterns(lines, path, is_dir, expected):
+    assert ignored(lines, path, is_dir) is expected
+
+
+def test_later_rule_wins():
+    lines = ['*.log', '!keep.log']
+    assert ignored(lines, 'keep.log') is False
+    assert ignored(lines, 'other.log') is True
+    assert ignored(['!keep.log', '*.log'], 'keep.log') is True
+
+
+def test_negation_across_rule_kinds():
+    # 名称字典、后缀字典和正则中的规则按出现顺序比较优先级
+    lines = ['debug*', '!debug.log', '*.log']
+    assert ignored(lines, 'debug.log') is True
+    assert ignored(lines, 'debug.txt') is True
+    assert ignored(['*.log', '!debug*'], 'debug.log') is False
+
+
+def test_from_bytes_tolerates_invalid_utf8():
+    matcher = GitignoreMatcher.from_bytes(b'*.tmp\n\xff\xfe\n')
+    assert matcher.match('x.tmp', 'x.tmp', False) is True
+
+
+def test_stack_deeper_rules_win():
+    # 遍历时每个目录使用自己的规则栈，src 的规则只作用于 src 之下
+    root = IgnoreStack().push('', GitignoreMatcher(['*.log']))
+    src = root.push('src', GitignoreMatcher(['!keep.log']))
+    assert src.is_ignored('src/keep.log', False) is False
+    assert src.is_ignored('src/other.log', False) is True
+    assert root.is_ignored('keep.log', False) is True
+
+
+def test_stack_rules_are_relative_to_their_directory():
+    stack = IgnoreStack().push('src', GitignoreMatcher(['/out']))
+    assert stack.is_ignored('src/out', True) is True
+    assert stack.is_ignored('out', True) is False
+    assert stack.is_ignored('src/lib/out', True) is False
+
+
+def test_git_directory_always_ignored():
+    assert IgnoreStack().is_ignored('sub/.git', True) is True
+    assert IgnoreStack().is_ignored('sub/.git', False) is False
+
+
+def test_push_without_matcher_returns_same_stack():
+    stack = IgnoreStack()
+    assert stack.push('a', None) is stack
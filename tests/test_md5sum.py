@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""FileHasher._parse_md5sum_line：解析服务器端 md5sum 的输出"""
+
+import pytest
+
+from ssh_file_manager import FileHasher, FileManager
+
+DIGEST = 'd41d8cd98f00b204e9800998ecf8427e'
+
+
+@pytest.fixture(scope='module')
+def parse():
+    return FileHasher(FileManager(), None)._parse_md5sum_line
+
+
+def test_plain_line(parse):
+    assert parse(f'{DIGEST}  /data/a file.txt') == (DIGEST, '/data/a file.txt')
+
+
+def test_digest_is_lowercased(parse):
+    assert parse(f'{DIGEST.upper()}  /a') == (DIGEST, '/a')
+
+
+def test_path_with_two_spaces_is_kept_whole(parse):
+    assert parse(f'{DIGEST}  /data/a  b') == (DIGEST, '/data/a  b')
+
+
+@pytest.mark.parametrize('escaped, path', [
+    (r'/data/new\nline', '/data/new\nline'),
+    (r'/data/back\\slash', '/data/back\\slash'),
+    (r'/data/cr\rname', '/data/cr\rname'),
+    # \\n 是反斜杠加字母 n，不是换行
+    (r'/data/a\\nb', '/data/a\\nb'),
+])
+def test_escaped_names(parse, escaped, path):
+    assert parse(f'\\{DIGEST}  {escaped}') == (DIGEST, path)
+
+
+def test_backslash_in_unescaped_line_is_literal(parse):
+    assert parse(f'{DIGEST}  /data/a\\nb') == (DIGEST, '/data/a\\nb')
+
+
+@pytest.mark.parametrize('line', [
+    '',
+    'md5sum: /data/missing: No such file or directory',
+    f'{DIGEST} /data/one-space',
+    f'{DIGEST[:31]}  /data/short',
+    f'{DIGEST}0  /data/long',
+])
+def test_invalid_lines(parse, line):
+    assert parse(line) == (None, None)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""RenamePipeline：规则串联、构造时的参数检查和预编译"""
+
+from datetime import datetime
+
+import pytest
+
+import ssh_file_manager
+from ssh_file_manager import RenamePipeline
+
+
+def test_rules_are_chained_in_order():
+    pipeline = RenamePipeline([
+        {'type': 'remove_number_prefix'},
+        {'type': 'to_lowercase'},
+        {'type': 'add_sequence_prefix'},
+    ])
+    assert pipeline('01 - Report.TXT', 7) == '007_report.txt'
+    assert pipeline.types == ['remove_number_prefix', 'to_lowercase', 'add_sequence_prefix']
+
+
+def test_regex_is_compiled_once(monkeypatch):
+    pipeline = RenamePipeline([{'type': 'regex', 'pattern': r'(\d+)', 'replacement': r'<\1>'}])
+    monkeypatch.setattr(ssh_file_manager.re, 'compile', None)
+    monkeypatch.setattr(ssh_file_manager.re, 'sub', None)
+    assert pipeline('a12b3.txt') == 'a<12>b<3>.txt'
+
+
+def test_date_prefix_is_fixed_at_construction(monkeypatch):
+    pipeline = RenamePipeline([{'type': 'date_prefix'}])
+
+    class Tomorrow:
+        @staticmethod
+        def now():
+            return datetime(2099, 1, 2)
+
+    monkeypatch.setattr(ssh_file_manager, 'datetime', Tomorrow)
+    first = pipeline('a.txt')
+    assert pipeline('b.txt') == first.replace('a.txt', 'b.txt')
+    assert not first.startswith('20990102')
+
+
+@pytest.mark.parametrize('rule, message', [
+    ({'type': 'unknown'}, '未知的重命名类型'),
+    ({'type': 'regex', 'pattern': '('}, '正则表达式无效'),
+    ({'type': 'regex', 'pattern': 'a', 'replacement': r'\2'}, '替换内容无效'),
+    ({'type': 'add_custom_prefix', 'custom_text': 'a/b'}, '自定义文本无效'),
+])
+def test_invalid_rules_are_rejected(rule, message):
+    with pytest.raises(ValueError, match=message):
+        RenamePipeline([rule])
+
+
+def test_invalid_rule_output_is_rejected():
+    pipeline = RenamePipeline([{'type': 'regex', 'pattern': '.*', 'replacement': ''}])
+    with pytest.raises(ValueError, match='regex'):
+        pipeline('a.txt')
+
+
+def test_rules_are_not_modified():
+    rule = {'type': 'regex', 'pattern': 'a', 'replacement': 'b'}
+    RenamePipeline([rule])
+    assert rule == {'type': 'regex', 'pattern': 'a', 'replacement': 'b'}
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""SSHConnectionPool：多个客户端共用同一主机的传输，关闭连接时不持有锁"""
+
+import threading
+import time
+
+import pytest
+
+from ssh_file_manager import SSHConnectionPool
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+
+class FakeSSH:
+    def __init__(self, close_delay=0):
+        self.transport = FakeTransport()
+        self.closed = False
+        self.close_delay = close_delay
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        time.sleep(self.close_delay)
+        self.closed = True
+
+
+class Connector:
+    """记录新建的连接"""
+
+    def __init__(self, close_delay=0):
+        self.opened = []
+        self.close_delay = close_delay
+
+    def __call__(self):
+        ssh = FakeSSH(self.close_delay)
+        self.opened.append(ssh)
+        return ssh
+
+
+@pytest.fixture
+def pool():
+    return SSHConnectionPool(max_hosts=2, idle_timeout=60)
+
+
+def test_clients_share_authenticated_transport(pool):
+    connect = Connector()
+    first = pool.open('u@h:22', b'secret', connect)
+    second = pool.open('u@h:22', b'secret', connect)
+    assert first is second
+    assert len(connect.opened) == 1
+    assert pool.get_stats()['hosts']['u@h:22']['holders'] == 2
+
+
+def test_unknown_credential_authenticates_before_sharing(pool):
+    connect = Connector()
+    first = pool.open('u@h:22', b'secret', connect)
+    second = pool.open('u@h:22', b'other', connect)
+    assert second is first
+    assert len(connect.opened) == 2 and connect.opened[1].closed
+    # 验证过的凭据之后直接共用
+    pool.open('u@h:22', b'other', connect)
+    assert len(connect.opened) == 2
+
+
+def test_failed_authentication_does_not_register(pool):
+    pool.open('u@h:22', b'secret', Connector())
+
+    def refuse():
+        raise OSError('Authentication failed.')
+
+    with pytest.raises(OSError):
+        pool.open('u@h:22', b'wrong', refuse)
+    assert pool.get_stats()['hosts']['u@h:22']['holders'] == 1
+
+
+def test_dead_transport_is_replaced(pool):
+    connect = Connector()
+    old = pool.open('u@h:22', b'secret', connect)
+    pool.open('u@h:22', b'secret', connect)
+    old.transport.active = False
+    new = pool.open('u@h:22', b'secret', connect)
+    assert new is not old and old.closed
+    assert pool.get_stats()['hosts']['u@h:22']['holders'] == 1
+    # 原传输的持有者释放时不影响新传输
+    pool.release_host('u@h:22', old, close=True)
+    assert not new.closed
+    assert pool.get_client('u@h:22') is new
+
+
+def test_close_waits_for_last_holder(pool):
+    ssh = pool.open('u@h:22', b'secret', Connector())
+    pool.open('u@h:22', b'secret', Connector())
+    pool.release_host('u@h:22', ssh, close=True)
+    assert not ssh.closed
+    pool.release_host('u@h:22', ssh, close=True)
+    assert ssh.closed
+    assert pool.get_client('u@h:22') is None
+
+
+def test_released_hosts_are_evicted_over_limit(pool):
+    hosts = [pool.open(f'u@h{i}:22', b'secret', Connector()) for i in range(2)]
+    pool.release_host('u@h0:22', hosts[0])
+    pool.open('u@h2:22', b'secret', Connector())
+    assert hosts[0].closed and not hosts[1].closed
+    assert sorted(pool.get_stats()['hosts']) == ['u@h1:22', 'u@h2:22']
+
+
+def test_eviction_closes_outside_lock():
+    pool = SSHConnectionPool(idle_timeout=0.01)
+    ssh = pool.open('u@h:22', b'secret', Connector(close_delay=0.5))
+    pool.release_host('u@h:22', ssh)
+    time.sleep(0.05)
+
+    evicting = threading.Thread(target=pool.evict_idle)
+    evicting.start()
+    time.sleep(0.05)
+    start = time.monotonic()
+    pool.get_stats()
+    assert time.monotonic() - start < 0.2
+    evicting.join(2)
+    assert ssh.closed
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""sync_helper：块签名、滚动校验查找差异和按差异记录重建文件"""
+
+import io
+import random
+
+import pytest
+
+import sync_helper
+
+BLOCK = 64
+
+
+def make_delta(basis, data, block=BLOCK):
+    signatures = sync_helper.signature(io.BytesIO(basis), block)
+    out = io.BytesIO()
+    sync_helper.delta(data, signatures, block, len(basis), out.write)
+    return out.getvalue()
+
+
+def rebuild(basis, records, block=BLOCK):
+    out = io.BytesIO()
+    digest, expected = sync_helper.patch(io.BytesIO(basis), out.write, io.BytesIO(records).read, block)
+    return out.getvalue(), digest, expected
+
+
+def literal_bytes(records):
+    """差异记录中新数据的总字节数"""
+    stream, total = io.BytesIO(records), 0
+    while True:
+        kind = stream.read(1)
+        if kind == b'C':
+            stream.read(sync_helper.COPY.size)
+        elif kind == b'L':
+            length, = sync_helper.LENGTH.unpack(stream.read(sync_helper.LENGTH.size))
+            stream.read(length)
+            total += length
+        else:
+            return total
+
+
+rng = random.Random(7)
+BASIS = bytes(rng.randrange(256) for _ in range(BLOCK * 40 + 17))
+
+
+@pytest.mark.parametrize('data', [
+    BASIS,
+    b'',
+    b'inserted' + BASIS,
+    BASIS[:1000] + b'middle' + BASIS[1000:],
+    BASIS[:700] + BASIS[900:],
+    BASIS + b'appended',
+    BASIS[BLOCK * 10:] + BASIS[:BLOCK * 10],
+    bytes(rng.randrange(256) for _ in range(500)),
+], ids=['same', 'empty', 'prefix', 'insert', 'remove', 'append', 'rotate', 'unrelated'])
+def test_round_trip(data):
+    records = make_delta(BASIS, data)
+    rebuilt, digest, expected = rebuild(BASIS, records)
+    assert rebuilt == data
+    assert digest == expected
+
+
+def test_unchanged_file_sends_no_data():
+    assert literal_bytes(make_delta(BASIS, BASIS)) == 0
+
+
+def test_small_edit_sends_about_one_block():
+    data = BASIS[:1000] + b'X' + BASIS[1001:]
+    assert literal_bytes(make_delta(BASIS, data)) <= 2 * BLOCK
+
+
+def test_empty_basis():
+    records = make_delta(b'', b'new content')
+    assert rebuild(b'', records)[0] == b'new content'
+
+
+def test_corrupt_basis_is_detected():
+    records = make_delta(BASIS, BASIS + b'tail')
+    damaged = BASIS[:100] + b'\0' + BASIS[101:]
+    _, digest, expected = rebuild(damaged, records)
+    assert digest != expected
+
+
+def test_error_record_is_raised():
+    message = '无法读取'.encode('utf-8')
+    records = b'X' + sync_helper.LENGTH.pack(len(message)) + message
+    with pytest.raises(IOError, match='无法读取'):
+        rebuild(BASIS, records)